@@ -6,6 +6,7 @@ import json
 import logging
 from django.conf import settings
 from alert_system.models import AlertHistory, AlertRadar, AlertGeofence
+from shared.services.geofence_engine import GeofenceEngine, PreparedGeofence
 
 logger = logging.getLogger(__name__)
 
@@ -14,9 +15,14 @@ NODEJS_API_BASE_URL = getattr(settings, 'NODEJS_API_BASE_URL', 'https://node.myl
 NODEJS_ALERT_NOTIFICATION_ENDPOINT = f"{NODEJS_API_BASE_URL}/api/alert-notification"
 
 
+# Prepared AlertGeofence boundaries with a grid index per institute
+alert_geofence_engine = GeofenceEngine(AlertGeofence, 'updated_at')
+
+
 def is_point_in_polygon(lat, lng, boundary):
     """
-    Check if a point is inside a polygon using ray casting algorithm
+    Check if a point is inside a boundary (holes and every polygon of a MultiPolygon included)
+    Parses the boundary on every call, use find_matching_geofence_ids for stored geofences
     
     Args:
         lat: Point latitude
@@ -27,64 +33,37 @@ def is_point_in_polygon(lat, lng, boundary):
         bool: True if point is inside polygon
     """
     try:
-        if not boundary:
-            return False
-        
-        # Handle GeoJSON format
-        if isinstance(boundary, dict):
-            if boundary.get('type') == 'Polygon':
-                # Extract coordinates from GeoJSON Polygon: coordinates[0] = exterior ring
-                coordinates = boundary.get('coordinates', [[]])[0]
-            elif boundary.get('type') == 'MultiPolygon':
-                # Extract first polygon's exterior ring from MultiPolygon
-                coordinates = boundary.get('coordinates', [[[]]])[0][0]
-            else:
-                logger.error(f"Unknown GeoJSON type: {boundary.get('type')}")
-                return False
-            
-            # GeoJSON coordinates are [lng, lat], convert to polygon format
-            polygon = []
-            for coord in coordinates:
-                if isinstance(coord, list) and len(coord) >= 2:
-                    polygon.append({'lat': float(coord[1]), 'lng': float(coord[0])})
-        
-        # Handle legacy formats (string or array)
-        else:
-            polygon = []
-            coord_list = boundary if isinstance(boundary, list) else []
-            
-            for coord_str in coord_list:
-                if isinstance(coord_str, str) and ',' in coord_str:
-                    # Format: "lat,lng"
-                    parts = coord_str.split(',')
-                    if len(parts) == 2:
-                        polygon.append({'lat': float(parts[0].strip()), 'lng': float(parts[1].strip())})
-                elif isinstance(coord_str, list) and len(coord_str) == 2:
-                    # Format: [lat, lng]
-                    polygon.append({'lat': float(coord_str[0]), 'lng': float(coord_str[1])})
-        
-        if len(polygon) < 3:
-            return False
-        
-        # Ray casting algorithm
-        inside = False
-        x, y = lng, lat
-        
-        for i in range(len(polygon)):
-            j = (i - 1) % len(polygon)
-            xi, yi = polygon[i]['lng'], polygon[i]['lat']
-            xj, yj = polygon[j]['lng'], polygon[j]['lat']
-            
-            if ((yi > y) != (yj > y)) and (x < (xj - xi) * (y - yi) / (yj - yi) + xi):
-                inside = not inside
-        
-        return inside
-    
+        return PreparedGeofence.from_boundary(None, boundary).contains(float(lat), float(lng))
     except Exception as e:
         logger.error(f"Error in point-in-polygon check: {e}")
         return False
 
 
+def find_matching_geofence_ids(latitude, longitude, institute_id):
+    """
+    Find the alert geofences of an institute containing a location
+    
+    Args:
+        latitude: Location latitude
+        longitude: Location longitude
+        institute_id: Institute ID
+    
+    Returns:
+        list: IDs of the matching AlertGeofences
+    """
+    try:
+        matching_geofence_ids = alert_geofence_engine.locate(latitude, longitude, institute_id=institute_id)
+    except Exception as e:
+        logger.error(f"Error locating alert geofences for ({latitude}, {longitude}): {e}")
+        return []
+    
+    if matching_geofence_ids:
+        logger.info(f"Location ({latitude}, {longitude}) matches geofences: {matching_geofence_ids}")
+    else:
+        logger.info(f"No matching geofences found for alert at ({latitude}, {longitude})")
+    return matching_geofence_ids
+
+
 def find_matching_radar_tokens(alert_latitude, alert_longitude, alert_institute_id):
     """
     Find radar tokens that have geofences containing the alert location
@@ -98,18 +77,8 @@ def find_matching_radar_tokens(alert_latitude, alert_longitude, alert_institute_
         list: List of radar tokens that match the alert location
     """
     try:
-        # Get all geofences from the same institute
-        geofences = AlertGeofence.objects.filter(institute_id=alert_institute_id)
-        
-        matching_geofence_ids = []
-        
-        for geofence in geofences:
-            if geofence.boundary and is_point_in_polygon(alert_latitude, alert_longitude, geofence.boundary):
-                matching_geofence_ids.append(geofence.id)
-                logger.info(f"Alert location matches geofence: {geofence.title} (ID: {geofence.id})")
-        
+        matching_geofence_ids = find_matching_geofence_ids(alert_latitude, alert_longitude, alert_institute_id)
         if not matching_geofence_ids:
-            logger.info(f"No matching geofences found for alert at ({alert_latitude}, {alert_longitude})")
             return []
         
         # Find radars that contain any of the matching geofences
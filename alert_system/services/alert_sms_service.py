@@ -9,8 +9,8 @@ from typing import List, Dict, Any
 from django.db.models import Q
 from api_common.utils.sms_service import sms_service
 from api_common.utils.tcp_service import tcp_service
-from alert_system.models import AlertHistory, AlertContact, AlertBuzzer, AlertGeofence
-from alert_system.services.alert_notification_service import is_point_in_polygon
+from alert_system.models import AlertHistory, AlertContact, AlertBuzzer
+from alert_system.services.alert_notification_service import find_matching_geofence_ids
 from django.utils import timezone
 from shared.models import ShortLink
 
@@ -102,6 +102,15 @@ def get_alert_switch(alert_history: AlertHistory):
         return None
 
 
+def _matching_geofence_ids(alert_history: AlertHistory) -> List[int]:
+    """Geofences containing the alert location, looked up once per alert instance."""
+    if not hasattr(alert_history, '_alert_geofence_ids'):
+        alert_history._alert_geofence_ids = find_matching_geofence_ids(
+            float(alert_history.latitude), float(alert_history.longitude), alert_history.institute_id
+        )
+    return alert_history._alert_geofence_ids
+
+
 def find_matching_alert_contacts(alert_history: AlertHistory) -> List[AlertContact]:
     """
     Find alert contacts that should receive SMS notifications for this alert.
@@ -119,22 +128,9 @@ def find_matching_alert_contacts(alert_history: AlertHistory) -> List[AlertConta
         List of AlertContact instances that should be notified
     """
     try:
-        # Get all geofences from the same institute
-        institute_geofences = AlertGeofence.objects.filter(institute=alert_history.institute)
-        
-        # Find geofences containing the alert location
-        matching_geofence_ids = []
-        for geofence in institute_geofences:
-            if geofence.boundary and is_point_in_polygon(
-                float(alert_history.latitude), 
-                float(alert_history.longitude), 
-                geofence.boundary
-            ):
-                matching_geofence_ids.append(geofence.id)
-                logger.info(f"Alert location matches geofence: {geofence.title} (ID: {geofence.id})")
-        
+        # Find geofences of the institute containing the alert location
+        matching_geofence_ids = _matching_geofence_ids(alert_history)
         if not matching_geofence_ids:
-            logger.info(f"No matching geofences found for alert at ({alert_history.latitude}, {alert_history.longitude})")
             return []
         
         # Find contacts that match:
@@ -179,22 +175,9 @@ def find_matching_buzzers(alert_history: AlertHistory) -> List[AlertBuzzer]:
         List of AlertBuzzer instances that should be activated
     """
     try:
-        # Get all geofences from the same institute
-        institute_geofences = AlertGeofence.objects.filter(institute=alert_history.institute)
-        
-        # Find geofences containing the alert location
-        matching_geofence_ids = []
-        for geofence in institute_geofences:
-            if geofence.boundary and is_point_in_polygon(
-                float(alert_history.latitude), 
-                float(alert_history.longitude), 
-                geofence.boundary
-            ):
-                matching_geofence_ids.append(geofence.id)
-                logger.info(f"Alert location matches geofence: {geofence.title} (ID: {geofence.id})")
-        
+        # Find geofences of the institute containing the alert location
+        matching_geofence_ids = _matching_geofence_ids(alert_history)
         if not matching_geofence_ids:
-            logger.info(f"No matching geofences found for alert at ({alert_history.latitude}, {alert_history.longitude})")
             return []
         
         # Find buzzers associated with matching geofences
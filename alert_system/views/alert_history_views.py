@@ -135,7 +135,7 @@ def get_alert_histories_by_radar(request, radar_id):
         # Get the radar with its geofences
         try:
             from alert_system.models import AlertRadar
-            from alert_system.services.alert_notification_service import is_point_in_polygon
+            from alert_system.services.alert_notification_service import alert_geofence_engine
             
             radar = AlertRadar.objects.prefetch_related('alert_geofences').select_related('institute').get(id=radar_id)
         except AlertRadar.DoesNotExist:
@@ -148,17 +148,12 @@ def get_alert_histories_by_radar(request, radar_id):
         ).order_by('-datetime')
         
         # Filter alerts that fall within any of the radar's geofences
-        matching_histories = []
-        for history in all_histories:
-            # Check if alert location is within any of the radar's geofences
-            for geofence in radar.alert_geofences.all():
-                if geofence.boundary and is_point_in_polygon(
-                    float(history.latitude),
-                    float(history.longitude),
-                    geofence.boundary
-                ):
-                    matching_histories.append(history)
-                    break  # Alert matches, no need to check other geofences
+        radar_geofence_ids = sorted(geofence.id for geofence in radar.alert_geofences.all())
+        geofence_index = alert_geofence_engine.index(pk__in=tuple(radar_geofence_ids))
+        matching_histories = [
+            history for history in all_histories
+            if geofence_index.locate(history.latitude, history.longitude)
+        ]
         
         serializer = AlertHistoryListSerializer(matching_histories, many=True)
         
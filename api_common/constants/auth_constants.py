@@ -75,16 +75,42 @@ AUTH_ERROR_CODES = {
 }
 
 # Public Routes (No Authentication Required)
+# (match, path, methods): match is 'exact', 'prefix' or 'regex' (matched against
+# the whole path), methods None allows every method.
+# Compiled once by AuthMiddleware (api_common.utils.public_routes).
 PUBLIC_ROUTES = [
-    '/api/core/auth/login',
-    '/api/core/auth/register/send-otp',
-    '/api/core/auth/register/verify-otp',
-    '/api/core/auth/register/resend-otp',
-    '/api/core/auth/forgot-password/send-otp',
-    '/api/core/auth/forgot-password/verify-otp',
-    '/api/core/auth/forgot-password/reset-password',
-    '/api/health/blood-donation',
-    '/api/shared/popup/active',
+    ('exact', '/api/core/auth/login', None),
+    ('exact', '/api/core/auth/register/send-otp', None),
+    ('exact', '/api/core/auth/register/verify-otp', None),
+    ('exact', '/api/core/auth/register/resend-otp', None),
+    ('exact', '/api/core/auth/forgot-password/send-otp', None),
+    ('exact', '/api/core/auth/forgot-password/verify-otp', None),
+    ('exact', '/api/core/auth/forgot-password/reset-password', None),
+    ('exact', '/api/core/auth/biometric-login', None),
+    ('exact', '/api/core/auth/delete-account-public', None),
+    ('exact', '/api/shared/popup/active', None),
+    # Blood donation endpoints
+    ('prefix', '/api/health/blood-donation', None),
+    # Viewing shared track links
+    ('prefix', '/api/fleet/share-track/token/', None),
+    # Radar token pages
+    ('prefix', '/api/alert-system/alert-radar/token/', None),
+    ('prefix', '/api/alert-system/alert-history/by-radar/', None),
+    # Called by the Node.js services
+    ('prefix', '/api/alert-system/alert-history/create/', ('POST',)),
+    ('prefix', '/api/community-siren/community-siren-history/create/', ('POST',)),
+    # Vehicle tag alert page: /api/vehicle-tag/VTID84/, .../latest-alert/, .../qr/
+    # (not /api/vehicle-tag/generate/, /api/vehicle-tag/history/, ...)
+    ('prefix', '/api/vehicle-tag/alert/', None),
+    ('regex', r'/api/vehicle-tag/VTID\d+/(?:latest-alert/|qr/)?', None),
+    ('prefix', '/api/shared/short-links/', None),
+    ('prefix', '/media/', None),
+    # Django admin has its own login
+    ('prefix', '/admin', None),
+    # GT06 handler (Node.js)
+    ('prefix', '/api/device/status/', ('POST',)),
+    ('prefix', '/api/device/location/', ('POST',)),
+    ('prefix', '/api/device/telemetry/', ('POST',)),
 ]
 
 # Role-based Access Control
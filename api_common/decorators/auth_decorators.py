@@ -2,14 +2,18 @@
 Authentication Decorators
 Handles authentication and authorization decorators
 """
+import logging
 from functools import wraps
 from django.http import JsonResponse
 from django.contrib.auth.models import AnonymousUser
 from api_common.utils.response_utils import error_response
 from api_common.constants.api_constants import ERROR_MESSAGES
-from core.models import InstituteModule, Module
+from api_common.middleware.auth_middleware import get_auth_headers
+from api_common.services.auth_context_service import AuthContextService
 from core.models.user import User
 
+logger = logging.getLogger(__name__)
+
 
 def require_auth(view_func):
     """
@@ -42,96 +46,58 @@ def require_role(allowed_roles):
     def decorator(view_func):
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            # Debug logging for vehicle tag endpoints
-            is_vehicle_tag_endpoint = request.path and '/api/vehicle-tag/' in request.path
-            if is_vehicle_tag_endpoint:
-                print(f"[require_role] Checking authentication for {request.path}")
-                print(f"[require_role] Has user attr: {hasattr(request, 'user')}")
-                if hasattr(request, 'user'):
-                    print(f"[require_role] User: {request.user}, is_authenticated: {request.user.is_authenticated}")
-                else:
-                    print(f"[require_role] User not set on request")
-            
             # Check if user is AnonymousUser (set by Django's AuthenticationMiddleware)
-            # If so, try to authenticate using our custom auth headers
+            # If so, try to authenticate using our custom auth headers (fallback if middleware didn't run)
             if hasattr(request, 'user') and isinstance(request.user, AnonymousUser):
-                if is_vehicle_tag_endpoint:
-                    print(f"[require_role] User is AnonymousUser, attempting to authenticate from headers")
-                
-                # Try to authenticate from headers (fallback if middleware didn't run)
-                # Check multiple header formats (some proxies/servers might transform them)
-                phone = (
-                    request.META.get('HTTP_X_PHONE') or
-                    request.META.get('X-PHONE') or
-                    request.META.get('x-phone') or
-                    request.META.get('HTTP_X_PHONE_NORMALIZED') or
-                    (request.headers.get('X-PHONE') if hasattr(request, 'headers') else None) or
-                    (request.headers.get('x-phone') if hasattr(request, 'headers') else None)
-                )
-                token = (
-                    request.META.get('HTTP_X_TOKEN') or
-                    request.META.get('X-TOKEN') or
-                    request.META.get('x-token') or
-                    request.META.get('HTTP_X_TOKEN_NORMALIZED') or
-                    (request.headers.get('X-TOKEN') if hasattr(request, 'headers') else None) or
-                    (request.headers.get('x-token') if hasattr(request, 'headers') else None)
-                )
-                
-                if is_vehicle_tag_endpoint:
-                    print(f"[require_role] Checking headers - HTTP_X_PHONE: {request.META.get('HTTP_X_PHONE')}, HTTP_X_TOKEN: {'SET' if request.META.get('HTTP_X_TOKEN') else 'NOT SET'}")
-                    print(f"[require_role] After fallback - phone: {phone}, token: {'SET' if token else 'NOT SET'}")
-                    print(f"[require_role] All META keys with X/PHONE/TOKEN: {[k for k in request.META.keys() if 'X' in k.upper() or 'PHONE' in k.upper() or 'TOKEN' in k.upper()]}")
+                phone, token = get_auth_headers(request)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        f"[require_role] AnonymousUser on {request.path}, header fallback - "
+                        f"phone: {phone}, token: {'SET' if token else 'NOT SET'}"
+                    )
                 
                 if phone and token:
                     try:
-                        user = User.objects.get(phone=phone)
-                        if user.token == token and user.is_active:
+                        auth_context = AuthContextService.authenticate(phone, token)
+                        if auth_context.user.is_active:
                             # Overwrite AnonymousUser with authenticated user
-                            request.user = user
-                            if is_vehicle_tag_endpoint:
-                                print(f"[require_role] Successfully authenticated from headers: {user.phone}")
+                            request.user = auth_context.user
+                            request.auth_context = auth_context
                         else:
-                            if is_vehicle_tag_endpoint:
-                                print(f"[require_role] Token mismatch or user inactive")
                             return error_response(
                                 message='Invalid token',
                                 status_code=401
                             )
+                    except PermissionError:
+                        return error_response(
+                            message='Invalid token',
+                            status_code=401
+                        )
                     except User.DoesNotExist:
-                        if is_vehicle_tag_endpoint:
-                            print(f"[require_role] User not found with phone: {phone}")
                         return error_response(
                             message='User matching query does not exist.',
                             status_code=404
                         )
                     except Exception as e:
-                        if is_vehicle_tag_endpoint:
-                            print(f"[require_role] Exception during authentication: {str(e)}")
+                        logger.exception(f"[require_role] Exception during authentication: {str(e)}")
                         return error_response(
                             message='Authentication error',
                             status_code=500
                         )
                 else:
-                    if is_vehicle_tag_endpoint:
-                        print(f"[require_role] No auth headers found for AnonymousUser")
                     return error_response(
                         message='Phone and token required',
                         status_code=401
                     )
             
             if not hasattr(request, 'user') or not request.user.is_authenticated:
-                if is_vehicle_tag_endpoint:
-                    print(f"[require_role] Authentication failed - returning 401")
                 return error_response(
                     message='Authentication required',
                     status_code=401
                 )
             
             # Check if user has any of the allowed roles
-            user_groups = request.user.groups.all()
-            user_role_names = [group.name for group in user_groups]
-            
-            if not any(role_name in allowed_roles for role_name in user_role_names):
+            if not AuthContextService.for_request(request).has_role(allowed_roles):
                 return error_response(
                     message='Access denied. Insufficient permissions',
                     status_code=403
@@ -179,23 +145,11 @@ def require_school_module_access(model_class=None, id_param_name='id'):
                 )
             
             # Check if user is Super Admin - always allow
-            user_groups = request.user.groups.all()
-            user_role_names = [group.name for group in user_groups]
-            is_super_admin = 'Super Admin' in user_role_names
-            
-            if is_super_admin:
+            auth_context = AuthContextService.for_request(request)
+            if auth_context.is_super_admin:
                 return view_func(request, *args, **kwargs)
             
             # For non-Super Admin users, check institute module access
-            try:
-                # Get the school module
-                school_module = Module.objects.get(slug='school')
-            except Module.DoesNotExist:
-                return error_response(
-                    message='School module not found',
-                    status_code=500
-                )
-            
             # Get institute_id(s) based on HTTP method
             institute_ids = []
             
@@ -245,13 +199,7 @@ def require_school_module_access(model_class=None, id_param_name='id'):
             
             # Check if user has access to any of the institutes
             if institute_ids:
-                has_access = InstituteModule.objects.filter(
-                    module=school_module,
-                    institute_id__in=institute_ids,
-                    users=request.user
-                ).exists()
-                
-                if not has_access:
+                if not auth_context.has_module_access('school', institute_ids):
                     return error_response(
                         message='Access denied. Insufficient permissions',
                         status_code=403
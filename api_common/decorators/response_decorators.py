@@ -16,9 +16,9 @@ def api_response(view_func):
         try:
             result = view_func(request, *args, **kwargs)
             
-            # If result is already a JsonResponse, return it directly
-            from django.http import JsonResponse
-            if isinstance(result, JsonResponse):
+            # If result is already a response (JsonResponse, StreamingHttpResponse), return it directly
+            from django.http.response import HttpResponseBase
+            if isinstance(result, HttpResponseBase):
                 return result
             
             # If result is a dict, wrap it in success response
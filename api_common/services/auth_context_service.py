@@ -0,0 +1,204 @@
+"""
+Auth Context Service
+Resolves the authenticated user, role names and module access once per request
+"""
+import hashlib
+import hmac
+import logging
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.db.models import Prefetch
+
+from core.models import InstituteModule
+from core.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+class AuthContext:
+    """
+    Everything the auth path needs to know about the user of a request.
+
+    Attributes:
+        user: User instance, its groups are prefetched so user.groups.all()
+              and user.groups.first() don't query again
+        role_names: group names ordered by id (the first one is user.groups.first())
+        module_institutes: module slug -> set of institute ids the user is assigned to
+    """
+
+    def __init__(self, user, role_names, module_institutes):
+        self.user = user
+        self.role_names = list(role_names)
+        self.module_institutes = {slug: set(ids) for slug, ids in module_institutes.items()}
+
+    @property
+    def role(self):
+        """Primary role name (first group), None without groups."""
+        return self.role_names[0] if self.role_names else None
+
+    @property
+    def is_super_admin(self):
+        return 'Super Admin' in self.role_names
+
+    def has_role(self, allowed_roles):
+        return any(role_name in allowed_roles for role_name in self.role_names)
+
+    def institute_ids(self, module_slug):
+        """Ids of the institutes the user is assigned to for a module."""
+        return self.module_institutes.get(module_slug, set())
+
+    def has_module_access(self, module_slug, institute_ids):
+        """Check the user is assigned to the module of any of the institutes."""
+        allowed = self.institute_ids(module_slug)
+        for institute_id in institute_ids:
+            try:
+                if int(institute_id) in allowed:
+                    return True
+            except (TypeError, ValueError):
+                continue
+        return False
+
+
+class AuthContextService:
+    """
+    AuthContext store keyed by (phone, token).
+
+    An entry is created on the first request of a token and serves the
+    following ones for CACHE_TIMEOUT_AUTH_CONTEXT seconds without touching the
+    database. The keys of a user are indexed by user id so core.signals can
+    drop them when the token, the user, its groups or its institute modules
+    change. The store lives in the 'auth_context' cache (Redis in production)
+    so an invalidation reaches every worker process. If the cache is
+    unreachable every request falls back to the DB.
+    """
+
+    CACHE_ALIAS = 'auth_context'
+
+    @classmethod
+    def _cache(cls):
+        alias = cls.CACHE_ALIAS if cls.CACHE_ALIAS in settings.CACHES else 'default'
+        return caches[alias]
+
+    @staticmethod
+    def _key(phone, token):
+        # The raw token never becomes part of a cache key
+        digest = hashlib.sha256(f'{phone}:{token}'.encode('utf-8')).hexdigest()
+        return f'auth_context:{digest}'
+
+    @staticmethod
+    def _index_key(user_id):
+        return f'auth_context_keys:{user_id}'
+
+    @classmethod
+    def _timeout(cls):
+        return getattr(settings, 'CACHE_TIMEOUT_AUTH_CONTEXT', 60)
+
+    @classmethod
+    def authenticate(cls, phone, token):
+        """
+        Resolve the context of a phone/token pair.
+
+        Returns:
+            AuthContext
+
+        Raises:
+            User.DoesNotExist: no user with the phone
+            PermissionError: the token doesn't match
+        """
+        key = cls._key(phone, token)
+        try:
+            context = cls._cache().get(key)
+        except Exception as e:
+            logger.warning(f"Auth context cache unavailable: {e}")
+            context = None
+        # The digest covers the token, the stored one is compared anyway
+        if context is not None and context.user.phone == phone and context.user.token \
+                and hmac.compare_digest(context.user.token, token):
+            return context
+
+        user = cls._get_user(phone=phone)
+        if not user.token or not hmac.compare_digest(user.token, token):
+            raise PermissionError('Invalid token')
+        context = cls._build(user)
+        cls._store(key, context)
+        return context
+
+    @classmethod
+    def for_user(cls, user):
+        """
+        Context of a user authenticated elsewhere (cached when it has a token).
+        """
+        if user.token:
+            try:
+                return cls.authenticate(user.phone, user.token)
+            except (User.DoesNotExist, PermissionError):
+                pass
+        return cls._build(cls._get_user(id=user.pk))
+
+    @classmethod
+    def for_request(cls, request):
+        """
+        Context of request.user: the one resolved by AuthMiddleware or built now.
+
+        Returns:
+            AuthContext, None for anonymous requests
+        """
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated or not user.pk:
+            return None
+        context = getattr(request, 'auth_context', None)
+        if context is None or context.user.pk != user.pk:
+            context = cls.for_user(user)
+            request.auth_context = context
+        return context
+
+    @classmethod
+    def invalidate(cls, user_ids):
+        """Drop the cached contexts of users (token, role or module access changed)."""
+        index_keys = [cls._index_key(user_id) for user_id in set(user_ids) if user_id]
+        if not index_keys:
+            return
+        try:
+            cache = cls._cache()
+            keys = list(index_keys)
+            for entry_keys in cache.get_many(index_keys).values():
+                keys.extend(entry_keys)
+            cache.delete_many(keys)
+        except Exception as e:
+            logger.warning(f"Auth context cache invalidation failed: {e}")
+
+    @staticmethod
+    def _get_user(**lookup):
+        return User.objects.prefetch_related(
+            # Ordered like groups.first(), so first() is served from the prefetch
+            Prefetch('groups', queryset=Group.objects.order_by('pk'))
+        ).get(**lookup)
+
+    @staticmethod
+    def _build(user):
+        module_institutes = {}
+        for slug, institute_id in InstituteModule.objects.filter(
+            users=user, module__isnull=False
+        ).values_list('module__slug', 'institute_id'):
+            module_institutes.setdefault(slug, set()).add(institute_id)
+        return AuthContext(
+            user=user,
+            role_names=[group.name for group in user.groups.all()],
+            module_institutes=module_institutes,
+        )
+
+    @classmethod
+    def _store(cls, key, context):
+        try:
+            cache = cls._cache()
+            timeout = cls._timeout()
+            index_key = cls._index_key(context.user.pk)
+            keys = set(cache.get(index_key) or ())
+            keys.add(key)
+            cache.set(key, context, timeout)
+            # The index outlives the contexts it points to
+            cache.set(index_key, keys, timeout * 2)
+        except Exception as e:
+            logger.warning(f"Auth context cache unavailable: {e}")
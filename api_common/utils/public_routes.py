@@ -0,0 +1,79 @@
+"""
+Public Route Matching
+Compiles the PUBLIC_ROUTES table into one regular expression per HTTP method
+"""
+import re
+
+# Trie node markers (not a single character, so never confused with a path character)
+_PREFIX_END = 'prefix'
+_EXACT_END = 'exact'
+
+
+def _trie_pattern(node):
+    """Regex for a trie of literal paths: shared prefixes are matched once."""
+    if _PREFIX_END in node:
+        # Anything may follow, longer literals below this point don't matter
+        return ''
+    alternatives = [
+        re.escape(char) + _trie_pattern(child)
+        for char, child in sorted(node.items()) if len(char) == 1
+    ]
+    if _EXACT_END in node:
+        alternatives.append(r'\Z')
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return '(?:' + '|'.join(alternatives) + ')'
+
+
+def compile_routes(routes):
+    """
+    Compile (match, path, methods) routes into a single anchored regex.
+
+    Exact and prefix paths are merged into a prefix trie, regex routes are
+    alternatives next to it and must match the whole path.
+
+    Returns:
+        re.Pattern, None when there are no routes
+    """
+    trie = {}
+    patterns = []
+    for match, path, _methods in routes:
+        if match == 'regex':
+            patterns.append(f'(?:{path})\\Z')
+            continue
+        if match not in (_PREFIX_END, _EXACT_END):
+            raise ValueError(f'Unknown public route match type: {match}')
+        node = trie
+        for char in path:
+            node = node.setdefault(char, {})
+        node[match] = True
+    if trie:
+        patterns.insert(0, _trie_pattern(trie))
+    if not patterns:
+        return None
+    return re.compile('(?:' + '|'.join(patterns) + ')')
+
+
+class PublicRouteMatcher:
+    """
+    Answers "is this request public" with one regex match.
+
+    A regex is compiled per method that has method-only routes (e.g. POST),
+    every other method uses the one of the routes open to all methods.
+    """
+
+    def __init__(self, routes):
+        routes = list(routes)
+        methods = {method.upper() for _, _, route_methods in routes for method in (route_methods or ())}
+        self._any = compile_routes(route for route in routes if not route[2])
+        self._by_method = {
+            method: compile_routes(
+                route for route in routes
+                if not route[2] or method in {route_method.upper() for route_method in route[2]}
+            )
+            for method in methods
+        }
+
+    def is_public(self, path, method):
+        pattern = self._by_method.get(method, self._any)
+        return pattern is not None and pattern.match(path) is not None
@@ -3,11 +3,24 @@ Response Utilities
 Handles API response formatting
 Matches Node.js response_handler.js functionality
 """
-from django.http import JsonResponse
+import json
+import logging
+import msgpack
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
 
-def success_response(data=None, message="Success", status_code=200):
+STREAM_FORMATS = ('json', 'ndjson')
+
+MSGPACK_CONTENT_TYPE = 'application/x-msgpack'
+
+# Serialized items are flushed in chunks of roughly this many bytes
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def success_response(data=None, message="Success", status_code=200, meta=None):
     """
     Create success response
     Matches Node.js successResponse function
@@ -18,6 +31,8 @@ def success_response(data=None, message="Success", status_code=200):
         'data': data,
         'timestamp': datetime.now().isoformat()
     }
+    if meta is not None:
+        response_data['meta'] = meta
     return JsonResponse(response_data, status=status_code)
 
 
@@ -44,3 +59,105 @@ def format_response(data=None, message="Success", status_code=200, success=True)
         return success_response(data=data, message=message, status_code=status_code)
     else:
         return error_response(message=message, status_code=status_code, data=data)
+
+
+def get_stream_format(request):
+    """
+    Streaming format requested with ?stream=json|ndjson, None for a regular response
+    (?format= is taken by DRF's renderer negotiation)
+    """
+    stream_format = request.GET.get('stream')
+    return stream_format if stream_format in STREAM_FORMATS else None
+
+
+def _chunked(parts):
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_BYTES:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _stream_json(items, message, meta):
+    yield '{"success": true, "message": %s, "data": [' % json.dumps(message)
+    for index, item in enumerate(items):
+        yield (',' if index else '') + json.dumps(item, cls=DjangoJSONEncoder)
+    yield ']'
+    if meta is not None:
+        # Evaluated after the data so it can report on the streamed rows
+        yield ', "meta": %s' % json.dumps(meta() if callable(meta) else meta, cls=DjangoJSONEncoder)
+    yield ', "timestamp": %s}' % json.dumps(datetime.now().isoformat())
+
+
+def _stream_ndjson(items):
+    for item in items:
+        yield json.dumps(item, cls=DjangoJSONEncoder) + '\n'
+
+
+def _logged(chunks):
+    # Headers are already sent, an error can only cut the body short
+    try:
+        yield from chunks
+    except Exception:
+        logger.exception('Streaming response aborted')
+        raise
+
+
+def streaming_success_response(items, message="Success", stream_format='json', meta=None):
+    """
+    Stream a success response for a large iterable of dicts
+    json: same envelope as success_response, the data array is written incrementally
+          and meta (a dict, or a callable evaluated after the data) is written after it
+    ndjson: one JSON object per line, no envelope and no meta
+    """
+    if stream_format == 'ndjson':
+        parts = _stream_ndjson(items)
+        content_type = 'application/x-ndjson'
+    else:
+        parts = _stream_json(items, message, meta)
+        content_type = 'application/json'
+
+    response = StreamingHttpResponse(_logged(_chunked(parts)), content_type=content_type)
+    # Let reverse proxies pass chunks through instead of buffering the whole body
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def get_response_encoding(request):
+    """
+    Binary encoding requested with ?encoding=msgpack, None for JSON
+    """
+    if request.GET.get('encoding') == 'msgpack':
+        return 'msgpack'
+    return None
+
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def msgpack_success_response(data=None, message="Success", status_code=200, meta=None):
+    """
+    Create success response encoded as msgpack, same envelope as success_response
+    """
+    response_data = {
+        'success': True,
+        'message': message,
+        'data': data,
+        'timestamp': datetime.now().isoformat()
+    }
+    if meta is not None:
+        response_data['meta'] = meta
+    return HttpResponse(
+        msgpack.packb(response_data, use_bin_type=True, default=_msgpack_default),
+        content_type=MSGPACK_CONTENT_TYPE,
+        status=status_code
+    )
@@ -16,7 +16,7 @@ from api_common.constants.api_constants import SUCCESS_MESSAGES, ERROR_MESSAGES,
 from api_common.decorators.response_decorators import api_response
 from api_common.decorators.auth_decorators import require_auth
 from api_common.exceptions.api_exceptions import NotFoundError
-from core.models import Module, InstituteModule
+from api_common.services.auth_context_service import AuthContextService
 from functools import wraps
 
 
@@ -34,23 +34,13 @@ def require_community_siren_module_access(model_class=None, id_param_name='id'):
                 )
             
             # Check if user is Super Admin - always allow
-            user_groups = request.user.groups.all()
-            user_role_names = [group.name for group in user_groups]
-            is_super_admin = 'Super Admin' in user_role_names
+            auth_context = AuthContextService.for_request(request)
+            is_super_admin = auth_context.is_super_admin
             
             if is_super_admin:
                 return view_func(request, *args, **kwargs)
             
             # For non-Super Admin users, check institute module access
-            try:
-                # Get the community-siren module
-                community_siren_module = Module.objects.get(slug='community-siren')
-            except Module.DoesNotExist:
-                return error_response(
-                    message='Community siren module not found',
-                    status_code=500
-                )
-            
             # Get institute_id(s) based on HTTP method
             institute_ids = []
             
@@ -79,11 +69,7 @@ def require_community_siren_module_access(model_class=None, id_param_name='id'):
             
             # Check if user has access to any of the institutes
             if institute_ids:
-                has_access = InstituteModule.objects.filter(
-                    module=community_siren_module,
-                    institute_id__in=institute_ids,
-                    users=request.user
-                ).exists()
+                has_access = auth_context.has_module_access('community-siren', institute_ids)
                 
                 if not has_access:
                     return error_response(
@@ -15,7 +15,7 @@ from api_common.constants.api_constants import SUCCESS_MESSAGES, ERROR_MESSAGES,
 from api_common.decorators.response_decorators import api_response
 from api_common.decorators.auth_decorators import require_auth
 from api_common.exceptions.api_exceptions import NotFoundError
-from core.models import Module, InstituteModule
+from api_common.services.auth_context_service import AuthContextService
 from functools import wraps
 
 
@@ -27,18 +27,12 @@ def require_community_siren_module_access(model_class=None, id_param_name='id'):
             if not hasattr(request, 'user') or not request.user.is_authenticated:
                 return error_response(message='Authentication required', status_code=401)
             
-            user_groups = request.user.groups.all()
-            user_role_names = [group.name for group in user_groups]
-            is_super_admin = 'Super Admin' in user_role_names
+            auth_context = AuthContextService.for_request(request)
+            is_super_admin = auth_context.is_super_admin
             
             if is_super_admin:
                 return view_func(request, *args, **kwargs)
             
-            try:
-                community_siren_module = Module.objects.get(slug='community-siren')
-            except Module.DoesNotExist:
-                return error_response(message='Community siren module not found', status_code=500)
-            
             institute_ids = []
             if request.method == 'POST':
                 institute_id = request.data.get('institute')
@@ -62,11 +56,7 @@ def require_community_siren_module_access(model_class=None, id_param_name='id'):
                         pass
             
             if institute_ids:
-                has_access = InstituteModule.objects.filter(
-                    module=community_siren_module,
-                    institute_id__in=institute_ids,
-                    users=request.user
-                ).exists()
+                has_access = auth_context.has_module_access('community-siren', institute_ids)
                 if not has_access:
                     return error_response(message='Access denied. Insufficient permissions', status_code=403)
             else:
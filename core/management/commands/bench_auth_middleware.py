@@ -0,0 +1,136 @@
+"""
+Django Management Command to Benchmark the AuthMiddleware Request Path
+
+Times the compiled public-route matcher against the old chain of startswith,
+list membership and re.match checks, and the whole process_request for public
+routes and for requests rejected before any lookup (missing headers). Runs in
+memory, no database or cache is used.
+Run with: python manage.py bench_auth_middleware [--requests 200000]
+"""
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from api_common.constants.auth_constants import PUBLIC_ROUTES
+from api_common.middleware.auth_middleware import AuthMiddleware
+from api_common.utils.public_routes import PublicRouteMatcher
+
+# (method, path) mix: mostly authenticated API traffic, some public routes
+SAMPLE_REQUESTS = [
+    ('GET', '/api/fleet/vehicle'),
+    ('GET', '/api/fleet/vehicle/paginated'),
+    ('GET', '/api/device/location/imei/865083030000001'),
+    ('POST', '/api/device/location/'),
+    ('GET', '/api/device/status/'),
+    ('GET', '/api/school/school-bus'),
+    ('GET', '/api/alert-system/alert-contact/institute/5'),
+    ('POST', '/api/alert-system/alert-history/create/'),
+    ('GET', '/api/vehicle-tag/VTID84/'),
+    ('GET', '/api/vehicle-tag/VTID84/qr/'),
+    ('GET', '/api/vehicle-tag/generate/'),
+    ('POST', '/api/core/auth/login'),
+    ('GET', '/api/core/user/profile'),
+    ('GET', '/api/fleet/share-track/token/abc123'),
+    ('GET', '/media/uploads/avatars/a.png'),
+    ('GET', '/admin/'),
+]
+
+LEGACY_PUBLIC_PATHS = [
+    '/api/core/auth/login',
+    '/api/core/auth/register/send-otp',
+    '/api/core/auth/register/verify-otp',
+    '/api/core/auth/register/resend-otp',
+    '/api/core/auth/forgot-password/send-otp',
+    '/api/core/auth/forgot-password/verify-otp',
+    '/api/core/auth/forgot-password/reset-password',
+    '/api/core/auth/biometric-login',
+    '/api/core/auth/delete-account-public',
+    '/api/health/blood-donation',
+    '/api/shared/popup/active',
+]
+
+
+def legacy_is_public(path, method):
+    """The checks process_request used to run on every request (without the prints)."""
+    if path.startswith('/api/fleet/share-track/token/'):
+        return True
+    if path.startswith('/api/alert-system/alert-radar/token/'):
+        return True
+    if path.startswith('/api/alert-system/alert-history/by-radar/'):
+        return True
+    if path.startswith('/api/alert-system/alert-history/create/') and method == 'POST':
+        return True
+    if path.startswith('/api/community-siren/community-siren-history/create/') and method == 'POST':
+        return True
+    if path.startswith('/api/vehicle-tag/alert/'):
+        return True
+    if (re.match(r'^/api/vehicle-tag/VTID\d+/(latest-alert/|qr/)$', path) or
+            re.match(r'^/api/vehicle-tag/VTID\d+/$', path)):
+        return True
+    if path.startswith('/media/'):
+        return True
+    if path.startswith('/api/shared/short-links/'):
+        return True
+    if path.startswith('/api/health/blood-donation'):
+        return True
+    if path.startswith('/admin'):
+        return True
+    if path.startswith('/admin/'):
+        return True
+    if path.startswith('/api/device/status/') and method == 'POST':
+        return True
+    if path.startswith('/api/device/location/') and method == 'POST':
+        return True
+    if path.startswith('/api/device/telemetry/') and method == 'POST':
+        return True
+    return path in LEGACY_PUBLIC_PATHS
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the AuthMiddleware public-route matching and per-request overhead'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200_000,
+            help='Number of simulated requests per measurement (default: 200000)',
+        )
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        if count < len(SAMPLE_REQUESTS):
+            raise CommandError(f'--requests must be at least {len(SAMPLE_REQUESTS)}')
+
+        started = time.perf_counter()
+        matcher = PublicRouteMatcher(PUBLIC_ROUTES)
+        self.stdout.write(f'Compiled {len(PUBLIC_ROUTES)} public routes in {(time.perf_counter() - started) * 1e3:.2f} ms')
+
+        for method, path in SAMPLE_REQUESTS:
+            if matcher.is_public(path, method) != legacy_is_public(path, method):
+                raise CommandError(f'Matcher and legacy checks disagree on {method} {path}')
+
+        samples = (SAMPLE_REQUESTS * (count // len(SAMPLE_REQUESTS) + 1))[:count]
+        legacy = self._time(lambda: [legacy_is_public(path, method) for method, path in samples], count)
+        compiled = self._time(lambda: [matcher.is_public(path, method) for method, path in samples], count)
+        self.stdout.write(f'Legacy checks:    {legacy:8.3f} us/request')
+        self.stdout.write(f'Compiled matcher: {compiled:8.3f} us/request')
+
+        # Whole middleware: public routes return early, the others are rejected
+        # for missing headers before any user lookup
+        middleware = AuthMiddleware(lambda request: None)
+        factory = RequestFactory()
+        requests = [factory.generic(method, path) for method, path in SAMPLE_REQUESTS]
+        requests = (requests * (count // len(requests) + 1))[:count]
+        overhead = self._time(lambda: [middleware.process_request(request) for request in requests], count)
+        self.stdout.write(f'process_request:  {overhead:8.3f} us/request (public or rejected, no lookups)')
+
+        self.stdout.write(self.style.SUCCESS(f'Results match, matcher speedup {legacy / compiled:.1f}x'))
+
+    @staticmethod
+    def _time(run, count):
+        started = time.perf_counter()
+        run()
+        return (time.perf_counter() - started) / count * 1e6
@@ -0,0 +1,55 @@
+"""
+Django Signals for the auth context cache
+Drops cached auth contexts when a user's token, roles or module access change
+"""
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from api_common.services.auth_context_service import AuthContextService
+from .models import InstituteModule, Module
+from .models.user import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_auth_context(sender, instance, **kwargs):
+    """Token, phone or is_active may have changed"""
+    AuthContextService.invalidate([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=InstituteModule.users.through)
+def invalidate_membership_auth_context(sender, instance, action, pk_set, **kwargs):
+    """Roles or institute module assignments changed"""
+    if isinstance(instance, User):
+        if action.startswith('post_'):
+            AuthContextService.invalidate([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        AuthContextService.invalidate(pk_set or [])
+    elif action == 'pre_clear':
+        # post_clear from the group/institute module side doesn't pass the users
+        users = instance.user_set if isinstance(instance, Group) else instance.users
+        AuthContextService.invalidate(users.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_auth_context(sender, instance, **kwargs):
+    """Role renamed or removed"""
+    AuthContextService.invalidate(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=InstituteModule)
+@receiver(pre_delete, sender=InstituteModule)
+def invalidate_institute_module_auth_context(sender, instance, **kwargs):
+    """Module or institute of an assignment changed"""
+    AuthContextService.invalidate(instance.users.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Module)
+def invalidate_module_auth_context(sender, instance, **kwargs):
+    """Module slug changed"""
+    AuthContextService.invalidate(
+        User.objects.filter(institute_modules__module=instance).values_list('pk', flat=True)
+    )
@@ -0,0 +1,78 @@
+from django.contrib.auth.models import Group
+from django.test import RequestFactory, TestCase
+from api_common.decorators.auth_decorators import require_school_module_access
+from api_common.middleware.auth_middleware import AuthMiddleware
+from api_common.services.auth_context_service import AuthContextService
+from core.models import Institute, InstituteModule, Module
+from core.models.user import User
+
+
+class AuthContextTest(TestCase):
+    def setUp(self):
+        AuthContextService._cache().clear()
+        self.middleware = AuthMiddleware(lambda request: None)
+        self.user = User.objects.create(phone='9800000001', name='Admin', token='token-1')
+        self.user.groups.add(Group.objects.create(name='School Admin'))
+        self.institute = Institute.objects.create(name='Institute 1')
+        self.institute_module = InstituteModule.objects.create(
+            institute=self.institute, module=Module.objects.create(name='School', slug='school')
+        )
+        self.institute_module.users.add(self.user)
+
+    def _request(self, token='token-1', method='get'):
+        request = getattr(RequestFactory(), method)('/api/fleet/vehicle', HTTP_X_PHONE='9800000001', HTTP_X_TOKEN=token)
+        return request, self.middleware.process_request(request)
+
+    def test_cached_context_needs_no_queries(self):
+        """Test the second request with the same phone/token doesn't touch the database"""
+        self._request()
+
+        with self.assertNumQueries(0):
+            request, response = self._request()
+            self.assertIsNone(response)
+            self.assertEqual(request.user.pk, self.user.pk)
+            self.assertEqual(request.user.groups.first().name, 'School Admin')
+            self.assertEqual(request.auth_context.role_names, ['School Admin'])
+            self.assertEqual(request.auth_context.institute_ids('school'), {self.institute.id})
+            self.assertTrue(request.auth_context.has_module_access('school', [str(self.institute.id)]))
+
+    def test_token_change_invalidates(self):
+        """Test a logout/new login rejects the old token right away"""
+        self._request()
+        self.user.token = 'token-2'
+        self.user.save()
+
+        _, response = self._request()
+        self.assertEqual(response.status_code, 401)
+        request, response = self._request(token='token-2')
+        self.assertIsNone(response)
+
+    def test_role_and_module_changes_invalidate(self):
+        """Test group and institute module assignment changes reach the cached context"""
+        self._request()
+        self.user.groups.add(Group.objects.create(name='Super Admin'))
+        self.institute_module.users.remove(self.user)
+
+        request, _ = self._request()
+        self.assertTrue(request.auth_context.is_super_admin)
+        self.assertEqual(request.auth_context.institute_ids('school'), set())
+
+    def test_module_access_decorator_uses_context(self):
+        """Test require_school_module_access answers from the context"""
+        view = require_school_module_access()(lambda request: 'ok')
+        request, _ = self._request(method='post')
+        request.data = {'institute': self.institute.id}
+
+        with self.assertNumQueries(0):
+            self.assertEqual(view(request), 'ok')
+        request.data = {'institute': self.institute.id + 1}
+        self.assertEqual(view(request).status_code, 403)
+
+    def test_inactive_user_rejected(self):
+        """Test deactivating a user takes effect for the cached token"""
+        self._request()
+        self.user.is_active = False
+        self.user.save()
+
+        _, response = self._request()
+        self.assertEqual(response.status_code, 403)
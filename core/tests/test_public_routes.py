@@ -0,0 +1,42 @@
+from django.test import TestCase
+from api_common.constants.auth_constants import PUBLIC_ROUTES
+from api_common.utils.public_routes import PublicRouteMatcher
+from core.management.commands.bench_auth_middleware import legacy_is_public
+
+
+class PublicRouteMatcherTest(TestCase):
+    def setUp(self):
+        self.matcher = PublicRouteMatcher(PUBLIC_ROUTES)
+
+    def test_matches_legacy_checks(self):
+        """Test the compiled table gives the same answer as the old startswith/re.match chain"""
+        paths = [
+            '/api/core/auth/login', '/api/core/auth/login/', '/api/core/auth/loginx',
+            '/api/core/auth/biometric-login', '/api/core/user/profile',
+            '/api/health/blood-donation', '/api/health/blood-donation/5',
+            '/api/fleet/share-track/token/abc', '/api/fleet/share-track/',
+            '/api/alert-system/alert-radar/token/x', '/api/alert-system/alert-history/by-radar/3',
+            '/api/alert-system/alert-history/create/', '/api/community-siren/community-siren-history/create/',
+            '/api/vehicle-tag/alert/1', '/api/vehicle-tag/VTID84/', '/api/vehicle-tag/VTID84/qr/',
+            '/api/vehicle-tag/VTID84/latest-alert/', '/api/vehicle-tag/VTID84/history/',
+            '/api/vehicle-tag/VTID/', '/api/vehicle-tag/generate/',
+            '/media/a.png', '/api/shared/short-links/abc', '/api/shared/popup/active',
+            '/admin', '/admin/login/', '/api/device/status/', '/api/device/location/',
+            '/api/device/telemetry/', '/api/device/location/imei/1', '/',
+        ]
+        for path in paths:
+            for method in ('GET', 'POST', 'PUT', 'DELETE'):
+                self.assertEqual(
+                    self.matcher.is_public(path, method), legacy_is_public(path, method), f'{method} {path}'
+                )
+
+    def test_method_constraints(self):
+        """Test method-only routes don't open other methods"""
+        self.assertTrue(self.matcher.is_public('/api/device/location/', 'POST'))
+        self.assertFalse(self.matcher.is_public('/api/device/location/', 'GET'))
+        self.assertFalse(self.matcher.is_public('/api/alert-system/alert-history/create/', 'PATCH'))
+
+    def test_unknown_match_type(self):
+        """Test a typo in the route table fails at startup"""
+        with self.assertRaises(ValueError):
+            PublicRouteMatcher([('startswith', '/api/x/', None)])
@@ -9,7 +9,6 @@ from django.conf import settings
 from datetime import datetime
 import requests
 import json
-import math
 
 from core.models.user import User
 from core.models.my_setting import MySetting
@@ -19,6 +18,7 @@ from device.models.status import Status
 from device.models.buzzer_status import BuzzerStatus
 from device.models.sos_status import SosStatus
 from fleet.models.vehicle import Vehicle
+from device.services.daily_odometer_service import DailyOdometerService
 from api_common.utils.response_utils import success_response, error_response
 from api_common.constants.api_constants import HTTP_STATUS
 from api_common.decorators.response_decorators import api_response
@@ -105,31 +105,10 @@ def get_sms_balance():
         return 0
 
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """
-    Calculate distance between two points using Haversine formula
-    Returns distance in kilometers
-    """
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1_rad = math.radians(float(lat1))
-    lon1_rad = math.radians(float(lon1))
-    lat2_rad = math.radians(float(lat2))
-    lon2_rad = math.radians(float(lon2))
-    
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    return R * c
-
-
 def calculate_today_km():
     """
-    Calculate total kilometers traveled today from all location data
-    Optimized with caching and memory-efficient iteration
+    Calculate total kilometers traveled today across all vehicles
+    Sums the per-vehicle daily odometer summaries, cached briefly
     """
     cache_key = 'today_km'
     cached_km = cache.get(cache_key)
@@ -138,45 +117,7 @@ def calculate_today_km():
         return cached_km
     
     try:
-        today = datetime.now().date()
-        start_of_day = datetime.combine(today, datetime.min.time())
-        end_of_day = datetime.combine(today, datetime.max.time())
-        
-        # Use iterator() to avoid loading all data into memory at once
-        # Only select necessary fields for better performance
-        locations = Location.objects.filter(
-            createdAt__gte=start_of_day,
-            createdAt__lte=end_of_day
-        ).order_by('imei', 'createdAt').only('imei', 'latitude', 'longitude').iterator(chunk_size=1000)
-        
-        total_distance = 0.0
-        current_imei = None
-        prev_loc = None
-        location_count = 0
-        
-        for loc in locations:
-            location_count += 1
-            
-            # If this is a new IMEI, reset previous location
-            if current_imei != loc.imei:
-                current_imei = loc.imei
-                prev_loc = loc
-                continue
-            
-            # Calculate distance between consecutive locations for same IMEI
-            if prev_loc:
-                distance = calculate_distance(
-                    float(prev_loc.latitude), float(prev_loc.longitude),
-                    float(loc.latitude), float(loc.longitude)
-                )
-                total_distance += distance
-            
-            prev_loc = loc
-        
-        if location_count < 2:
-            result = 0.0
-        else:
-            result = round(total_distance, 2)
+        result = DailyOdometerService.get_fleet_today_km()
         
         # Cache the result
         cache_timeout = getattr(settings, 'CACHE_TIMEOUT_TODAY_KM', 120)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Device, Location, Status, UserDevice, BuzzerStatus, SosStatus, AlarmData
+from .models import Device, Location, Status, UserDevice, BuzzerStatus, SosStatus, AlarmData, VehicleDailySummary, VehicleTrip, VehicleCurrentState
 
 @admin.register(Device)
 class DeviceAdmin(admin.ModelAdmin):
@@ -48,3 +48,24 @@ class AlarmDataAdmin(admin.ModelAdmin):
     list_filter = ('alarm', 'realTimeGps', 'createdAt')
     search_fields = ('imei', 'device__imei', 'alarm')
     readonly_fields = ('createdAt',)
+
+@admin.register(VehicleDailySummary)
+class VehicleDailySummaryAdmin(admin.ModelAdmin):
+    list_display = ('imei', 'date', 'distanceKm', 'pointCount', 'maxSpeed', 'runningMinutes', 'summarizedAt')
+    list_filter = ('date',)
+    search_fields = ('imei',)
+    readonly_fields = ('createdAt', 'updatedAt')
+
+@admin.register(VehicleTrip)
+class VehicleTripAdmin(admin.ModelAdmin):
+    list_display = ('imei', 'startAt', 'endAt', 'distanceKm', 'durationMinutes', 'maxSpeed')
+    list_filter = ('startAt',)
+    search_fields = ('imei',)
+    readonly_fields = ('createdAt',)
+
+@admin.register(VehicleCurrentState)
+class VehicleCurrentStateAdmin(admin.ModelAdmin):
+    list_display = ('imei', 'state', 'stateChangedAt', 'lastSeenAt', 'speed', 'ignition', 'battery')
+    list_filter = ('state',)
+    search_fields = ('imei',)
+    readonly_fields = ('updatedAt',)
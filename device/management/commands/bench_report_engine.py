@@ -0,0 +1,127 @@
+"""
+Django management command to benchmark the vectorized report engine against the
+pure-Python reference (compute_day_stats / segment_trips) on a synthetic track
+Runs entirely in memory, no database rows are read or written
+Usage: python manage.py bench_report_engine [--points N] [--days N] [--seed N]
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from device.services import report_engine
+from device.services.daily_summary_service import DEFAULT_SPEED_LIMIT, compute_day_stats, segment_trips
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the NumPy report engine against the pure-Python daily stats on a synthetic track'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--points',
+            type=int,
+            default=1_000_000,
+            help='Number of synthetic location points (default: 1000000)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Number of days the track spans (default: 30)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed for the synthetic track (default: 1)',
+        )
+
+    def handle(self, *args, **options):
+        if options['points'] < 2 or options['days'] < 1:
+            raise CommandError('--points must be at least 2 and --days at least 1')
+
+        points, statuses = self._synthetic_track(options['points'], options['days'], options['seed'])
+        self.stdout.write(f'Synthetic track: {len(points)} points, {len(statuses)} statuses over {options["days"]} day(s)')
+
+        started = time.perf_counter()
+        reference = self._reference(points, statuses)
+        reference_seconds = time.perf_counter() - started
+        self.stdout.write(f'Reference (pure Python): {reference_seconds:.2f}s')
+
+        started = time.perf_counter()
+        track = report_engine.Track.from_columns(*report_engine.columns(points, 4))
+        ignitions = report_engine.Ignitions.from_columns(*report_engine.columns(statuses, 2))
+        stats = report_engine.compute_daily_stats(track, ignitions, DEFAULT_SPEED_LIMIT)
+        trips = report_engine.segment_trips(track)
+        engine_seconds = time.perf_counter() - started
+        self.stdout.write(f'Report engine (NumPy): {engine_seconds:.2f}s')
+
+        self._compare(reference, (stats, trips))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Results match, speedup {reference_seconds / engine_seconds:.1f}x'
+            )
+        )
+
+    def _synthetic_track(self, point_count, days, seed):
+        """Points every few seconds with stop-and-go speeds, statuses every ~5 minutes."""
+        rng = random.Random(seed)
+        start = datetime(2025, 1, 1)
+        step = days * 86400 / point_count
+
+        points = []
+        latitude, longitude = 27.70, 85.30
+        for index in range(point_count):
+            moving = (index // 200) % 3 != 0
+            speed = rng.randint(5, 90) if moving else 0
+            if moving:
+                latitude += rng.uniform(-0.0005, 0.0005)
+                longitude += rng.uniform(-0.0005, 0.0005)
+            points.append((start + timedelta(seconds=index * step), latitude, longitude, speed))
+
+        statuses = []
+        status_time = start
+        end = start + timedelta(days=days)
+        while status_time < end:
+            statuses.append((status_time, rng.random() > 0.2))
+            status_time += timedelta(seconds=rng.randint(60, 600))
+        return points, statuses
+
+    def _reference(self, points, statuses):
+        """Per-day pure-Python stats and trips, the way the summarizer used to run."""
+        day_points = {}
+        for point in points:
+            day_points.setdefault(point[0].date(), []).append(point)
+        day_statuses = {}
+        for status in statuses:
+            day_statuses.setdefault(status[0].date(), []).append(status)
+
+        stats = {}
+        trips = []
+        for day in sorted(set(day_points) | set(day_statuses)):
+            stats[day] = compute_day_stats(day_points.get(day, []), day_statuses.get(day, []), DEFAULT_SPEED_LIMIT)
+            trips.extend(segment_trips(day_points.get(day, [])))
+        return stats, trips
+
+    def _compare(self, reference, engine):
+        reference_stats, reference_trips = reference
+        engine_stats, engine_trips = engine
+
+        if set(reference_stats) != set(engine_stats):
+            raise CommandError('Engine and reference produced different days')
+        for day, expected in reference_stats.items():
+            for field, value in expected.items():
+                self._check(value, engine_stats[day][field], f'{day} {field}')
+
+        if len(reference_trips) != len(engine_trips):
+            raise CommandError(f'Trip count differs: {len(reference_trips)} vs {len(engine_trips)}')
+        for index, (expected, actual) in enumerate(zip(reference_trips, engine_trips)):
+            for field, value in expected.items():
+                self._check(value, actual[field], f'trip {index} {field}')
+
+    @staticmethod
+    def _check(expected, actual, label):
+        if isinstance(expected, float) or isinstance(actual, float):
+            if abs(float(expected) - float(actual)) > 1e-6 * max(1.0, abs(float(expected))):
+                raise CommandError(f'{label} differs: {expected} vs {actual}')
+        elif expected != actual:
+            raise CommandError(f'{label} differs: {expected} vs {actual}')
@@ -0,0 +1,26 @@
+"""
+Django management command to fill the vehicle_current_state table from the latest locations/statuses
+Migration 0019 fills the table once, run this to repair rows afterwards
+Usage: python manage.py rebuild_current_state [--imei IMEI ...]
+"""
+from django.core.management.base import BaseCommand
+from device.services.current_state_service import CurrentStateService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-IMEI current state (position, status, vehicle state) from raw data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--imei',
+            nargs='+',
+            default=None,
+            help='Only rebuild these IMEIs (default: every device)',
+        )
+
+    def handle(self, *args, **options):
+        count = CurrentStateService.rebuild(imeis=options['imei'])
+        swept = CurrentStateService.sweep_inactive()
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt current state of {count} IMEI(s), {swept} marked inactive')
+        )
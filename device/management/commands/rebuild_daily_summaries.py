@@ -0,0 +1,57 @@
+"""
+Django management command to summarize raw locations/statuses into daily summaries and trips
+Meant to run nightly (e.g. cron at 00:30) for the day that just closed
+Usage: python manage.py rebuild_daily_summaries [--date YYYY-MM-DD] [--days N] [--imei IMEI ...]
+"""
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from device.services.daily_odometer_service import DailyOdometerService
+from device.services.daily_summary_service import DailySummaryService
+
+
+class Command(BaseCommand):
+    help = 'Build vehicle daily summaries (km, speed, running/idle/stop time) and trips from raw data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=str,
+            default=None,
+            help='Last date to summarize in YYYY-MM-DD (default: yesterday, Nepal time)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=1,
+            help='Number of days to summarize, counting back from --date (default: 1)',
+        )
+        parser.add_argument(
+            '--imei',
+            nargs='+',
+            default=None,
+            help='Only summarize these IMEIs (default: all with data)',
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                end_date = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Invalid --date, expected YYYY-MM-DD')
+        else:
+            end_date = DailyOdometerService.today() - timedelta(days=1)
+
+        days = options['days']
+        if days < 1:
+            raise CommandError('--days must be at least 1')
+
+        total = 0
+        for offset in range(days - 1, -1, -1):
+            day = end_date - timedelta(days=offset)
+            count = DailySummaryService.summarize_day(day, imeis=options['imei'])
+            total += count
+            self.stdout.write(f'{day}: {count} summary row(s) written')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Summarized {total} daily row(s) over {days} day(s)')
+        )
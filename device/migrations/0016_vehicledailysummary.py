@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device', '0015_device_serial_number_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleDailySummary',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('imei', models.CharField(max_length=15)),
+                ('date', models.DateField()),
+                ('distanceKm', models.FloatField(db_column='distance_km', default=0)),
+                ('pointCount', models.IntegerField(db_column='point_count', default=0)),
+                ('firstPointAt', models.DateTimeField(blank=True, db_column='first_point_at', null=True)),
+                ('lastPointAt', models.DateTimeField(blank=True, db_column='last_point_at', null=True)),
+                ('lastLatitude', models.DecimalField(blank=True, db_column='last_latitude', decimal_places=8, max_digits=12, null=True)),
+                ('lastLongitude', models.DecimalField(blank=True, db_column='last_longitude', decimal_places=8, max_digits=13, null=True)),
+                ('createdAt', models.DateTimeField(auto_now_add=True, db_column='created_at')),
+                ('updatedAt', models.DateTimeField(auto_now=True, db_column='updated_at')),
+            ],
+            options={
+                'db_table': 'vehicle_daily_summaries',
+                'indexes': [models.Index(fields=['date'], name='vehicle_dai_date_4b16ec_idx')],
+                'unique_together': {('imei', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-17 02:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device', '0016_vehicledailysummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicledailysummary',
+            name='avgSpeed',
+            field=models.FloatField(db_column='avg_speed', default=0),
+        ),
+        migrations.AddField(
+            model_name='vehicledailysummary',
+            name='idleMinutes',
+            field=models.FloatField(db_column='idle_minutes', default=0),
+        ),
+        migrations.AddField(
+            model_name='vehicledailysummary',
+            name='maxSpeed',
+            field=models.FloatField(db_column='max_speed', default=0),
+        ),
+        migrations.AddField(
+            model_name='vehicledailysummary',
+            name='overspeedMinutes',
+            field=models.FloatField(db_column='overspeed_minutes', default=0),
+        ),
+        migrations.AddField(
+            model_name='vehicledailysummary',
+            name='runningMinutes',
+            field=models.FloatField(db_column='running_minutes', default=0),
+        ),
+        migrations.AddField(
+            model_name='vehicledailysummary',
+            name='stopMinutes',
+            field=models.FloatField(db_column='stop_minutes', default=0),
+        ),
+        migrations.AddField(
+            model_name='vehicledailysummary',
+            name='summarizedAt',
+            field=models.DateTimeField(blank=True, db_column='summarized_at', null=True),
+        ),
+        migrations.AddField(
+            model_name='vehicledailysummary',
+            name='totalMinutes',
+            field=models.FloatField(db_column='total_minutes', default=0),
+        ),
+        migrations.CreateModel(
+            name='VehicleTrip',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('imei', models.CharField(max_length=15)),
+                ('startAt', models.DateTimeField(db_column='start_at')),
+                ('endAt', models.DateTimeField(db_column='end_at')),
+                ('startLatitude', models.DecimalField(db_column='start_latitude', decimal_places=8, max_digits=12)),
+                ('startLongitude', models.DecimalField(db_column='start_longitude', decimal_places=8, max_digits=13)),
+                ('endLatitude', models.DecimalField(db_column='end_latitude', decimal_places=8, max_digits=12)),
+                ('endLongitude', models.DecimalField(db_column='end_longitude', decimal_places=8, max_digits=13)),
+                ('distanceKm', models.FloatField(db_column='distance_km', default=0)),
+                ('durationMinutes', models.FloatField(db_column='duration_minutes', default=0)),
+                ('avgSpeed', models.FloatField(db_column='avg_speed', default=0)),
+                ('maxSpeed', models.FloatField(db_column='max_speed', default=0)),
+                ('pointCount', models.IntegerField(db_column='point_count', default=0)),
+                ('createdAt', models.DateTimeField(auto_now_add=True, db_column='created_at')),
+            ],
+            options={
+                'db_table': 'vehicle_trips',
+                'indexes': [models.Index(fields=['imei', 'startAt'], name='vehicle_tri_imei_eb05c2_idx')],
+            },
+        ),
+    ]
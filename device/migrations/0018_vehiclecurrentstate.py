@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device', '0017_vehicle_summary_stats_and_trips'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleCurrentState',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('imei', models.CharField(max_length=15, unique=True)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=12, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=13, null=True)),
+                ('speed', models.IntegerField(blank=True, null=True)),
+                ('course', models.IntegerField(blank=True, null=True)),
+                ('locationAt', models.DateTimeField(blank=True, db_column='location_at', null=True)),
+                ('locationUpdatedAt', models.DateTimeField(blank=True, db_column='location_updated_at', null=True)),
+                ('ignition', models.BooleanField(blank=True, null=True)),
+                ('battery', models.IntegerField(blank=True, null=True)),
+                ('signal', models.IntegerField(blank=True, null=True)),
+                ('charging', models.BooleanField(blank=True, null=True)),
+                ('relay', models.BooleanField(blank=True, null=True)),
+                ('statusAt', models.DateTimeField(blank=True, db_column='status_at', null=True)),
+                ('statusUpdatedAt', models.DateTimeField(blank=True, db_column='status_updated_at', null=True)),
+                ('lastSeenAt', models.DateTimeField(blank=True, db_column='last_seen_at', null=True)),
+                ('state', models.CharField(default='nodata', max_length=12)),
+                ('stateChangedAt', models.DateTimeField(blank=True, db_column='state_changed_at', null=True)),
+                ('updatedAt', models.DateTimeField(auto_now=True, db_column='updated_at')),
+            ],
+            options={
+                'db_table': 'vehicle_current_state',
+                'indexes': [
+                    models.Index(fields=['state', 'lastSeenAt'], name='vehicle_cur_state_63ea21_idx'),
+                    models.Index(fields=['lastSeenAt'], name='vehicle_cur_last_se_d0d066_idx'),
+                ],
+            },
+        ),
+    ]
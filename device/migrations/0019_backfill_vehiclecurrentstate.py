@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def backfill_current_state(apps, schema_editor):
+    """Fill vehicle_current_state from the latest locations/statuses of existing devices"""
+    Device = apps.get_model('device', 'Device')
+    if not Device.objects.exists():
+        return
+    # The same rebuild as the rebuild_current_state command, so the state rules live in one place
+    from device.services.current_state_service import CurrentStateService
+    CurrentStateService.rebuild()
+    CurrentStateService.sweep_inactive()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('device', '0018_vehiclecurrentstate'),
+        ('fleet', '0008_vehicle_number_plate_photo_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_current_state, migrations.RunPython.noop),
+    ]
@@ -11,5 +11,8 @@ from .user_luna_tag import UserLunaTag
 from .luna_tag_data import LunaTagData
 from .device_order import DeviceOrder, DeviceOrderItem
 from .device_cart import DeviceCart, DeviceCartItem
+from .vehicle_daily_summary import VehicleDailySummary
+from .vehicle_trip import VehicleTrip
+from .vehicle_current_state import VehicleCurrentState
 
-__all__ = ['Device', 'Location', 'Status', 'UserDevice', 'SubscriptionPlan', 'SubscriptionPlanPermission', 'BuzzerStatus', 'SosStatus', 'AlarmData', 'LunaTag', 'UserLunaTag', 'LunaTagData', 'DeviceOrder', 'DeviceOrderItem', 'DeviceCart', 'DeviceCartItem']
+__all__ = ['Device', 'Location', 'Status', 'UserDevice', 'SubscriptionPlan', 'SubscriptionPlanPermission', 'BuzzerStatus', 'SosStatus', 'AlarmData', 'LunaTag', 'UserLunaTag', 'LunaTagData', 'DeviceOrder', 'DeviceOrderItem', 'DeviceCart', 'DeviceCartItem', 'VehicleDailySummary', 'VehicleTrip', 'VehicleCurrentState']
@@ -0,0 +1,42 @@
+from django.db import models
+
+
+class VehicleCurrentState(models.Model):
+    """
+    One row per IMEI with the latest position/status and the precomputed
+    vehicle state (VehicleStateService values). Upserted by the location and
+    status ingest paths, the inactive state is set by a periodic sweep.
+    Timestamps are Nepal local time, matching Location/Status.
+    """
+    id = models.BigAutoField(primary_key=True)
+    imei = models.CharField(max_length=15, unique=True)
+    # Latest location
+    latitude = models.DecimalField(max_digits=12, decimal_places=8, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=13, decimal_places=8, null=True, blank=True)
+    speed = models.IntegerField(null=True, blank=True)
+    course = models.IntegerField(null=True, blank=True)
+    locationAt = models.DateTimeField(null=True, blank=True, db_column='location_at')
+    locationUpdatedAt = models.DateTimeField(null=True, blank=True, db_column='location_updated_at')
+    # Latest GPS status
+    ignition = models.BooleanField(null=True, blank=True)
+    battery = models.IntegerField(null=True, blank=True)
+    signal = models.IntegerField(null=True, blank=True)
+    charging = models.BooleanField(null=True, blank=True)
+    relay = models.BooleanField(null=True, blank=True)
+    statusAt = models.DateTimeField(null=True, blank=True, db_column='status_at')
+    statusUpdatedAt = models.DateTimeField(null=True, blank=True, db_column='status_updated_at')
+    # Most recent of locationUpdatedAt/statusUpdatedAt
+    lastSeenAt = models.DateTimeField(null=True, blank=True, db_column='last_seen_at')
+    state = models.CharField(max_length=12, default='nodata')
+    stateChangedAt = models.DateTimeField(null=True, blank=True, db_column='state_changed_at')
+    updatedAt = models.DateTimeField(auto_now=True, db_column='updated_at')
+
+    class Meta:
+        db_table = 'vehicle_current_state'
+        indexes = [
+            models.Index(fields=['state', 'lastSeenAt']),
+            models.Index(fields=['lastSeenAt']),
+        ]
+
+    def __str__(self):
+        return f"{self.imei}: {self.state}"
@@ -0,0 +1,39 @@
+from django.db import models
+
+
+class VehicleDailySummary(models.Model):
+    """
+    Per-IMEI daily summary. Distance and last point are accumulated as locations
+    are ingested, speed and time stats are filled by the daily summarizer.
+    Dates are Nepal local dates (Asia/Kathmandu), matching Location.createdAt.
+    """
+    id = models.BigAutoField(primary_key=True)
+    imei = models.CharField(max_length=15)
+    date = models.DateField()
+    distanceKm = models.FloatField(default=0, db_column='distance_km')
+    pointCount = models.IntegerField(default=0, db_column='point_count')
+    firstPointAt = models.DateTimeField(null=True, blank=True, db_column='first_point_at')
+    lastPointAt = models.DateTimeField(null=True, blank=True, db_column='last_point_at')
+    lastLatitude = models.DecimalField(max_digits=12, decimal_places=8, null=True, blank=True, db_column='last_latitude')
+    lastLongitude = models.DecimalField(max_digits=13, decimal_places=8, null=True, blank=True, db_column='last_longitude')
+    # Filled by the summarizer once the day is closed
+    avgSpeed = models.FloatField(default=0, db_column='avg_speed')
+    maxSpeed = models.FloatField(default=0, db_column='max_speed')
+    totalMinutes = models.FloatField(default=0, db_column='total_minutes')
+    runningMinutes = models.FloatField(default=0, db_column='running_minutes')
+    idleMinutes = models.FloatField(default=0, db_column='idle_minutes')
+    stopMinutes = models.FloatField(default=0, db_column='stop_minutes')
+    overspeedMinutes = models.FloatField(default=0, db_column='overspeed_minutes')
+    summarizedAt = models.DateTimeField(null=True, blank=True, db_column='summarized_at')
+    createdAt = models.DateTimeField(auto_now_add=True, db_column='created_at')
+    updatedAt = models.DateTimeField(auto_now=True, db_column='updated_at')
+
+    class Meta:
+        db_table = 'vehicle_daily_summaries'
+        unique_together = ['imei', 'date']
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.imei} on {self.date}: {self.distanceKm:.2f} km"
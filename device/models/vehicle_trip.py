@@ -0,0 +1,30 @@
+from django.db import models
+
+
+class VehicleTrip(models.Model):
+    """
+    A continuous movement segment of a vehicle, built by the daily summarizer.
+    """
+    id = models.BigAutoField(primary_key=True)
+    imei = models.CharField(max_length=15)
+    startAt = models.DateTimeField(db_column='start_at')
+    endAt = models.DateTimeField(db_column='end_at')
+    startLatitude = models.DecimalField(max_digits=12, decimal_places=8, db_column='start_latitude')
+    startLongitude = models.DecimalField(max_digits=13, decimal_places=8, db_column='start_longitude')
+    endLatitude = models.DecimalField(max_digits=12, decimal_places=8, db_column='end_latitude')
+    endLongitude = models.DecimalField(max_digits=13, decimal_places=8, db_column='end_longitude')
+    distanceKm = models.FloatField(default=0, db_column='distance_km')
+    durationMinutes = models.FloatField(default=0, db_column='duration_minutes')
+    avgSpeed = models.FloatField(default=0, db_column='avg_speed')
+    maxSpeed = models.FloatField(default=0, db_column='max_speed')
+    pointCount = models.IntegerField(default=0, db_column='point_count')
+    createdAt = models.DateTimeField(auto_now_add=True, db_column='created_at')
+
+    class Meta:
+        db_table = 'vehicle_trips'
+        indexes = [
+            models.Index(fields=['imei', 'startAt']),
+        ]
+
+    def __str__(self):
+        return f"Trip {self.imei} {self.startAt} - {self.endAt} ({self.distanceKm:.2f} km)"
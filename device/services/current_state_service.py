@@ -0,0 +1,229 @@
+"""
+Current State Service
+Maintains the one-row-per-IMEI VehicleCurrentState table as locations/statuses are ingested
+"""
+import logging
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import DateTimeField, ExpressionWrapper, F
+
+from device.models.device import Device
+from device.models.location import Location
+from device.models.status import Status
+from device.models.vehicle_current_state import VehicleCurrentState
+from device.services.latest_state_service import LatestStateService
+from fleet.services.vehicle_state_service import VehicleStateService
+
+logger = logging.getLogger(__name__)
+
+
+LOCATION_COLUMNS = ['latitude', 'longitude', 'speed', 'course', 'locationAt', 'locationUpdatedAt']
+STATUS_COLUMNS = ['ignition', 'battery', 'signal', 'charging', 'relay', 'statusAt', 'statusUpdatedAt']
+STATE_COLUMNS = ['lastSeenAt', 'state', 'stateChangedAt', 'updatedAt']
+
+
+class CurrentStateService:
+    """
+    Upserts VehicleCurrentState from newly stored locations and GPS statuses.
+
+    Each row keeps the newest location and status of an IMEI (a replayed older
+    point never replaces a newer one) and the state VehicleStateService gives
+    for them, with the time it last changed. A single point (the per-request
+    write paths) is written back with an UPDATE conditioned on the row's
+    updatedAt, so it needs no transaction; batches, new rows and points that
+    lost that race lock their rows with SELECT ... FOR UPDATE. Either way
+    concurrent workers don't mix a location from one request with a status
+    from another.
+
+    'inactive' depends on the clock rather than on new data, sweep_inactive()
+    (periodic task) moves rows without updates for 12 hours to it.
+    """
+
+    REBUILD_CHUNK_SIZE = 1000
+
+    @classmethod
+    def record_many(cls, kind, instances, speed_limits=None):
+        """
+        Fold newly stored rows into the current state of their IMEIs.
+
+        Args:
+            kind: 'location' or 'status' (GPS Status only)
+            instances: iterable of Location or Status instances
+            speed_limits: imei -> vehicle speed limit, looked up in the
+                          telemetry device cache when not given
+        """
+        newest = {}
+        for instance in instances:
+            current = newest.get(instance.imei)
+            if current is None or LatestStateService._is_newer(instance, current):
+                newest[instance.imei] = instance
+
+        if not newest:
+            return
+
+        if speed_limits is None:
+            speed_limits = cls._speed_limits(list(newest))
+        columns = (LOCATION_COLUMNS if kind == 'location' else STATUS_COLUMNS) + STATE_COLUMNS
+
+        if len(newest) == 1:
+            instance = next(iter(newest.values()))
+            if cls._record_one(kind, instance, speed_limits.get(instance.imei), columns):
+                return
+
+        with transaction.atomic():
+            # Make sure every row exists before locking, a concurrent insert is ignored by the unique imei
+            VehicleCurrentState.objects.bulk_create(
+                [VehicleCurrentState(imei=imei) for imei in newest],
+                ignore_conflicts=True
+            )
+
+            changed = []
+            for row in VehicleCurrentState.objects.select_for_update().filter(imei__in=list(newest)):
+                if cls._apply(kind, row, newest[row.imei]):
+                    cls._update_state(row, speed_limits.get(row.imei))
+                    changed.append(row)
+
+            if changed:
+                VehicleCurrentState.objects.bulk_update(changed, columns)
+
+    @classmethod
+    def _record_one(cls, kind, instance, speed_limit, columns):
+        """
+        Update the row of one point without a transaction.
+
+        The row is written back only if its updatedAt is still the one that
+        was read, i.e. no other worker changed it in between.
+
+        Returns:
+            bool: False when the row doesn't exist yet or was changed concurrently
+        """
+        row = VehicleCurrentState.objects.filter(imei=instance.imei).first()
+        if row is None:
+            return False
+        read_at = row.updatedAt
+        if not cls._apply(kind, row, instance):
+            return True
+        cls._update_state(row, speed_limit)
+        return VehicleCurrentState.objects.filter(pk=row.pk, updatedAt=read_at).update(
+            **{column: getattr(row, column) for column in columns}
+        ) == 1
+
+    @staticmethod
+    def _speed_limits(imeis):
+        # Served from the ingest device cache, a known IMEI costs no query
+        from device.services.telemetry_ingest_service import TelemetryIngestService
+        devices = TelemetryIngestService.resolve_devices(imeis)
+        return {imei: device['speed_limit'] for imei, device in devices.items() if device is not None}
+
+    @classmethod
+    def record_location(cls, location):
+        """Fold a single newly stored Location into the current state."""
+        cls.record_many('location', [location])
+
+    @classmethod
+    def record_status(cls, status):
+        """Fold a single newly stored GPS Status into the current state."""
+        cls.record_many('status', [status])
+
+    @classmethod
+    def sweep_inactive(cls):
+        """
+        Mark rows without updates for 12 hours inactive.
+
+        Returns:
+            int: number of rows changed
+        """
+        return VehicleCurrentState.objects.filter(lastSeenAt__lt=VehicleStateService.inactive_before()).exclude(
+            state__in=[VehicleStateService.INACTIVE, VehicleStateService.NO_DATA]
+        ).update(
+            state=VehicleStateService.INACTIVE,
+            stateChangedAt=ExpressionWrapper(
+                F('lastSeenAt') + VehicleStateService.INACTIVE_AFTER, output_field=DateTimeField()
+            ),
+            updatedAt=datetime.now(),
+        )
+
+    @classmethod
+    def rebuild(cls, imeis=None):
+        """
+        Fill the table from the latest Location/Status rows (backfill, repair).
+
+        Args:
+            imeis: only these IMEIs (default: every device)
+
+        Returns:
+            int: number of IMEIs processed
+        """
+        if imeis is None:
+            imeis = list(Device.objects.values_list('imei', flat=True))
+        imeis = list(imeis)
+
+        for start in range(0, len(imeis), cls.REBUILD_CHUNK_SIZE):
+            states = LatestStateService.get_many(imeis[start:start + cls.REBUILD_CHUNK_SIZE])
+            for kind in ('location', 'status'):
+                cls.record_many(kind, [state[kind] for state in states.values() if state[kind] is not None])
+        return len(imeis)
+
+    @staticmethod
+    def _is_older(created_at, stored_at):
+        if created_at is None or stored_at is None:
+            return False
+        try:
+            return created_at < stored_at
+        except TypeError:
+            # Mixed naive/aware timestamps, prefer the row that was just written
+            return False
+
+    @classmethod
+    def _apply(cls, kind, row, instance):
+        if kind == 'location':
+            return cls._apply_location(row, instance)
+        return cls._apply_status(row, instance)
+
+    @classmethod
+    def _apply_location(cls, row, location):
+        if cls._is_older(location.createdAt, row.locationAt):
+            return False
+        row.latitude = location.latitude
+        row.longitude = location.longitude
+        row.speed = location.speed
+        row.course = location.course
+        row.locationAt = location.createdAt
+        # updatedAt is filled by the database on insert
+        row.locationUpdatedAt = location.updatedAt or datetime.now()
+        return True
+
+    @classmethod
+    def _apply_status(cls, row, status):
+        if cls._is_older(status.createdAt, row.statusAt):
+            return False
+        row.ignition = status.ignition
+        row.battery = status.battery
+        row.signal = status.signal
+        row.charging = status.charging
+        row.relay = status.relay
+        row.statusAt = status.createdAt
+        row.statusUpdatedAt = status.updatedAt or datetime.now()
+        return True
+
+    @staticmethod
+    def _update_state(row, speed_limit):
+        latest_status = Status(
+            imei=row.imei, ignition=row.ignition, updatedAt=row.statusUpdatedAt
+        ) if row.statusAt is not None else None
+        latest_location = Location(
+            imei=row.imei, latitude=row.latitude, speed=row.speed, updatedAt=row.locationUpdatedAt
+        ) if row.locationAt is not None else None
+
+        seen = [at for at in (row.statusUpdatedAt, row.locationUpdatedAt) if at is not None]
+        try:
+            row.lastSeenAt = max(seen) if seen else None
+        except TypeError:
+            row.lastSeenAt = seen[-1]
+
+        state = VehicleStateService.classify(latest_status, latest_location, speed_limit, imei=row.imei)
+        if state != row.state or row.stateChangedAt is None:
+            row.state = state
+            row.stateChangedAt = row.lastSeenAt or datetime.now()
+        row.updatedAt = datetime.now()
@@ -0,0 +1,184 @@
+"""
+Daily Odometer Service
+Maintains per-IMEI daily distance in VehicleDailySummary as locations are ingested
+"""
+import logging
+import math
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.db import transaction
+from django.db.models import Sum
+
+from device.models.vehicle_daily_summary import VehicleDailySummary
+
+logger = logging.getLogger(__name__)
+
+NEPAL_TZ = ZoneInfo('Asia/Kathmandu')
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Calculate distance between two points using Haversine formula
+    Returns distance in kilometers
+    """
+    R = 6371  # Earth's radius in kilometers
+
+    lat1_rad = math.radians(float(lat1))
+    lon1_rad = math.radians(float(lon1))
+    lat2_rad = math.radians(float(lat2))
+    lon2_rad = math.radians(float(lon2))
+
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
+    return R * 2 * math.asin(math.sqrt(a))
+
+
+class DailyOdometerService:
+    """
+    Rolling daily-distance accumulator keyed by (imei, Nepal local date).
+
+    Each summary row keeps the last point of the day and the running km, so a new
+    location only adds one haversine segment and today's km is a single row read.
+    Days roll over at local midnight: the first point of a day starts a new row and
+    is not joined to the previous day's last point.
+
+    Points older than the row's last point (replayed from a tracker buffer) are
+    counted but add no distance. A late point for a closed day clears its
+    summarizedAt so the daily summarizer recomputes that day from raw rows.
+    """
+
+    @staticmethod
+    def today():
+        """Current Nepal local date."""
+        return datetime.now(NEPAL_TZ).date()
+
+    @staticmethod
+    def _local_date(created_at):
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(NEPAL_TZ)
+        return created_at.date()
+
+    @staticmethod
+    def _naive(created_at):
+        if created_at.tzinfo is not None:
+            return created_at.astimezone(NEPAL_TZ).replace(tzinfo=None)
+        return created_at
+
+    @classmethod
+    def record_locations(cls, locations):
+        """
+        Fold newly stored locations into their daily summaries.
+
+        Rows are locked with SELECT ... FOR UPDATE so concurrent workers
+        ingesting the same IMEI don't lose segments.
+
+        Args:
+            locations: iterable of Location instances (or objects with imei,
+                       latitude, longitude, createdAt)
+        """
+        points_by_key = {}
+        for location in locations:
+            if location.createdAt is None or location.latitude is None or location.longitude is None:
+                continue
+            key = (location.imei, cls._local_date(location.createdAt))
+            points_by_key.setdefault(key, []).append(location)
+
+        if not points_by_key:
+            return
+
+        imeis = {imei for imei, _ in points_by_key}
+        dates = {day for _, day in points_by_key}
+
+        with transaction.atomic():
+            # Make sure every (imei, date) row exists before locking, a concurrent
+            # insert of the same row is ignored by the unique constraint
+            VehicleDailySummary.objects.bulk_create(
+                [VehicleDailySummary(imei=imei, date=day) for imei, day in points_by_key],
+                ignore_conflicts=True
+            )
+
+            summaries = {
+                (summary.imei, summary.date): summary
+                for summary in VehicleDailySummary.objects.select_for_update().filter(
+                    imei__in=imeis, date__in=dates
+                )
+                if (summary.imei, summary.date) in points_by_key
+            }
+
+            today = cls.today()
+            for key, points in points_by_key.items():
+                summary = summaries[key]
+                points.sort(key=lambda point: cls._naive(point.createdAt))
+                for point in points:
+                    cls._apply_point(summary, point)
+                if summary.date < today:
+                    summary.summarizedAt = None
+
+            VehicleDailySummary.objects.bulk_update(
+                list(summaries.values()),
+                ['distanceKm', 'pointCount', 'firstPointAt', 'lastPointAt', 'lastLatitude', 'lastLongitude', 'summarizedAt', 'updatedAt']
+            )
+
+    @classmethod
+    def record_location(cls, location):
+        """Fold a single newly stored location into its daily summary."""
+        cls.record_locations([location])
+
+    @classmethod
+    def _apply_point(cls, summary, point):
+        created_at = cls._naive(point.createdAt)
+        summary.pointCount += 1
+        summary.updatedAt = datetime.now()
+
+        if summary.firstPointAt is None or created_at < summary.firstPointAt:
+            summary.firstPointAt = created_at
+
+        if summary.lastPointAt is not None and created_at < summary.lastPointAt:
+            # Out-of-order point, can't be placed on the running track
+            return
+
+        if summary.lastLatitude is not None and summary.lastLongitude is not None:
+            summary.distanceKm += haversine_km(
+                summary.lastLatitude, summary.lastLongitude,
+                point.latitude, point.longitude
+            )
+
+        summary.lastPointAt = created_at
+        summary.lastLatitude = point.latitude
+        summary.lastLongitude = point.longitude
+
+    @classmethod
+    def get_today_km(cls, imei):
+        """Today's kilometers for one IMEI."""
+        return cls.get_today_km_many([imei]).get(imei, 0.0)
+
+    @classmethod
+    def get_today_km_many(cls, imeis):
+        """
+        Today's kilometers for many IMEIs in one query.
+
+        Returns:
+            dict: imei -> km rounded to 2 decimals (0.0 when no points today)
+        """
+        imeis = [imei for imei in imeis if imei]
+        today_km = {imei: 0.0 for imei in imeis}
+        if not imeis:
+            return today_km
+
+        rows = VehicleDailySummary.objects.filter(
+            imei__in=imeis, date=cls.today()
+        ).values_list('imei', 'distanceKm')
+        for imei, distance in rows:
+            today_km[imei] = round(distance or 0.0, 2)
+        return today_km
+
+    @classmethod
+    def get_fleet_today_km(cls):
+        """Total kilometers traveled today by all IMEIs."""
+        total = VehicleDailySummary.objects.filter(date=cls.today()).aggregate(
+            total=Sum('distanceKm')
+        )['total']
+        return round(total or 0.0, 2)
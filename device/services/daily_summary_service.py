@@ -0,0 +1,347 @@
+"""
+Daily Summary Service
+Turns raw Location/Status rows into per-vehicle daily summaries and trips
+"""
+import logging
+from datetime import datetime, timedelta
+
+from django.db import transaction
+
+from device.models.location import Location
+from device.models.status import Status
+from device.models.vehicle_daily_summary import VehicleDailySummary
+from device.models.vehicle_trip import VehicleTrip
+from device.services import report_engine
+from device.services.daily_odometer_service import DailyOdometerService, haversine_km
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_SPEED_LIMIT = 60
+
+# A trip ends once the vehicle hasn't moved for this long
+TRIP_STOP_MINUTES = 5
+
+
+def day_bounds(day):
+    """Start (inclusive) and end (exclusive) of a local date."""
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+def compute_day_stats(points, statuses, speed_limit):
+    """
+    Compute one day's stats from time-ordered raw rows.
+
+    Args:
+        points: list of (createdAt, latitude, longitude, speed) ordered by createdAt
+        statuses: list of (createdAt, ignition) ordered by createdAt
+        speed_limit: overspeed threshold in km/h
+
+    Returns:
+        dict: VehicleDailySummary field values
+
+    Time stats follow the report rules: each interval between consecutive
+    statuses is stop time when ignition was off, otherwise running time if any
+    location in the interval moved (overspeed too if above the limit), else idle.
+    """
+    distance = 0.0
+    for prev, curr in zip(points, points[1:]):
+        distance += haversine_km(prev[1], prev[2], curr[1], curr[2])
+
+    speeds = [float(point[3]) if point[3] else 0 for point in points]
+
+    total_minutes = running_minutes = idle_minutes = stop_minutes = overspeed_minutes = 0.0
+
+    # Both lists are time ordered, so locations are swept once across all intervals
+    first_in_interval = 0
+    for prev_status, status in zip(statuses, statuses[1:]):
+        interval_start, ignition = prev_status
+        interval_end = status[0]
+        minutes = (interval_end - interval_start).total_seconds() / 60
+        total_minutes += minutes
+
+        while first_in_interval < len(points) and points[first_in_interval][0] < interval_start:
+            first_in_interval += 1
+
+        if not ignition:
+            stop_minutes += minutes
+            continue
+
+        max_speed_in_interval = 0
+        index = first_in_interval
+        while index < len(points) and points[index][0] < interval_end:
+            max_speed_in_interval = max(max_speed_in_interval, speeds[index])
+            index += 1
+
+        if max_speed_in_interval > 0:
+            running_minutes += minutes
+            if max_speed_in_interval > speed_limit:
+                overspeed_minutes += minutes
+        else:
+            # Ignition on without movement (or without location data) is idle
+            idle_minutes += minutes
+
+    last_point = points[-1] if points else None
+
+    return {
+        'distanceKm': distance,
+        'pointCount': len(points),
+        'avgSpeed': sum(speeds) / len(speeds) if speeds else 0,
+        'maxSpeed': max(speeds) if speeds else 0,
+        'totalMinutes': total_minutes,
+        'runningMinutes': running_minutes,
+        'idleMinutes': idle_minutes,
+        'stopMinutes': stop_minutes,
+        'overspeedMinutes': overspeed_minutes,
+        'firstPointAt': points[0][0] if points else None,
+        'lastPointAt': last_point[0] if last_point else None,
+        'lastLatitude': last_point[1] if last_point else None,
+        'lastLongitude': last_point[2] if last_point else None,
+    }
+
+
+def segment_trips(points, stop_minutes=TRIP_STOP_MINUTES):
+    """
+    Split a day's time-ordered points into trips.
+
+    A trip starts at a moving point (speed > 0) and ends at the last moving point
+    before the vehicle stays still (or sends nothing) for stop_minutes.
+    Short halts such as traffic lights stay inside the trip.
+
+    Returns:
+        list of dicts with VehicleTrip field values (without imei)
+    """
+    # Cumulative distance so any trip's distance is a subtraction
+    cumulative = [0.0]
+    for prev, curr in zip(points, points[1:]):
+        cumulative.append(cumulative[-1] + haversine_km(prev[1], prev[2], curr[1], curr[2]))
+
+    stop_gap = timedelta(minutes=stop_minutes)
+    ranges = []
+    start_index = last_moving_index = None
+
+    for index, point in enumerate(points):
+        if not point[3]:
+            continue
+        if start_index is not None and point[0] - points[last_moving_index][0] > stop_gap:
+            ranges.append((start_index, last_moving_index))
+            start_index = None
+        if start_index is None:
+            start_index = index
+        last_moving_index = index
+
+    if start_index is not None:
+        ranges.append((start_index, last_moving_index))
+
+    trips = []
+    for start_index, end_index in ranges:
+        if end_index == start_index:
+            continue
+        start, end = points[start_index], points[end_index]
+        speeds = [float(point[3]) if point[3] else 0 for point in points[start_index:end_index + 1]]
+        trips.append({
+            'startAt': start[0],
+            'endAt': end[0],
+            'startLatitude': start[1],
+            'startLongitude': start[2],
+            'endLatitude': end[1],
+            'endLongitude': end[2],
+            'distanceKm': cumulative[end_index] - cumulative[start_index],
+            'durationMinutes': (end[0] - start[0]).total_seconds() / 60,
+            'avgSpeed': sum(speeds) / len(speeds),
+            'maxSpeed': max(speeds),
+            'pointCount': len(speeds),
+        })
+    return trips
+
+
+class DailySummaryService:
+    """
+    Background summarizer for VehicleDailySummary and VehicleTrip.
+
+    Closed days are summarized once (nightly command, or lazily the first time a
+    report needs them); the still-open current day is always computed from raw rows.
+    Raw rows are crunched by the vectorized report_engine; compute_day_stats and
+    segment_trips above stay as the readable reference implementation.
+    """
+
+    # IMEIs and days summarized per transaction, bounds memory for large runs
+    IMEI_CHUNK_SIZE = 200
+    DAY_CHUNK_SIZE = 7
+
+    SUMMARY_FIELDS = [
+        'distanceKm', 'pointCount', 'avgSpeed', 'maxSpeed', 'totalMinutes', 'runningMinutes',
+        'idleMinutes', 'stopMinutes', 'overspeedMinutes', 'firstPointAt', 'lastPointAt',
+        'lastLatitude', 'lastLongitude', 'summarizedAt', 'updatedAt',
+    ]
+
+    @staticmethod
+    def get_speed_limits(imeis):
+        """Speed limit per IMEI from the vehicle, defaulting to 60 km/h."""
+        from fleet.models import Vehicle
+
+        limits = dict(Vehicle.objects.filter(imei__in=imeis).values_list('imei', 'speedLimit'))
+        return {imei: limits.get(imei) or DEFAULT_SPEED_LIMIT for imei in imeis}
+
+    @classmethod
+    def summarize_day(cls, day, imeis=None):
+        """
+        Build and store the summary rows and trips of one day.
+
+        Args:
+            day: local date to summarize
+            imeis: optional list of IMEIs. When given, a row is written for each of
+                   them even without data, so the day isn't rescanned later.
+                   Defaults to every IMEI with locations or statuses that day.
+
+        Returns:
+            int: number of summary rows written
+        """
+        start, end = day_bounds(day)
+
+        if imeis is None:
+            imeis = set(
+                Location.objects.filter(createdAt__gte=start, createdAt__lt=end)
+                .values_list('imei', flat=True).distinct()
+            ) | set(
+                Status.objects.filter(createdAt__gte=start, createdAt__lt=end)
+                .values_list('imei', flat=True).distinct()
+            )
+        return cls.summarize_days([day], imeis)
+
+    @classmethod
+    def summarize_days(cls, days, imeis):
+        """
+        Build and store summaries and trips for several days of the given IMEIs.
+
+        Raw rows are loaded for up to DAY_CHUNK_SIZE days and IMEI_CHUNK_SIZE IMEIs
+        at a time, so backfilling a quarter for one vehicle costs a few range scans
+        instead of two per day.
+
+        Returns:
+            int: number of summary rows written
+        """
+        days = sorted(set(days))
+        imeis = sorted(set(imeis))
+
+        written = 0
+        for day_offset in range(0, len(days), cls.DAY_CHUNK_SIZE):
+            day_chunk = days[day_offset:day_offset + cls.DAY_CHUNK_SIZE]
+            for imei_offset in range(0, len(imeis), cls.IMEI_CHUNK_SIZE):
+                written += cls._summarize_chunk(day_chunk, imeis[imei_offset:imei_offset + cls.IMEI_CHUNK_SIZE])
+        return written
+
+    @classmethod
+    def _summarize_chunk(cls, days, imeis):
+        if not days or not imeis:
+            return 0
+
+        start, end = day_bounds(days[0])[0], day_bounds(days[-1])[1]
+        tracks = report_engine.load_tracks(imeis, start, end)
+        ignitions = report_engine.load_ignitions(imeis, start, end)
+        speed_limits = cls.get_speed_limits(imeis)
+        empty_stats = compute_day_stats([], [], DEFAULT_SPEED_LIMIT)
+        now = datetime.now()
+
+        # imei -> date -> stats, one vectorized pass per IMEI over all days of the chunk
+        day_stats = {}
+        trips = []
+        for imei in imeis:
+            track = tracks.get(imei) or report_engine.Track.empty()
+            day_stats[imei] = report_engine.compute_daily_stats(
+                track, ignitions.get(imei) or report_engine.Ignitions.empty(), speed_limits[imei]
+            )
+            trips.extend(
+                VehicleTrip(imei=imei, **trip) for trip in report_engine.segment_trips(track, TRIP_STOP_MINUTES)
+            )
+
+        with transaction.atomic():
+            VehicleDailySummary.objects.bulk_create(
+                [VehicleDailySummary(imei=imei, date=day) for day in days for imei in imeis],
+                ignore_conflicts=True
+            )
+            summaries = list(
+                VehicleDailySummary.objects.select_for_update().filter(imei__in=imeis, date__in=days)
+            )
+
+            for summary in summaries:
+                stats = day_stats[summary.imei].get(summary.date, empty_stats)
+                for field, value in stats.items():
+                    setattr(summary, field, value)
+                summary.summarizedAt = now
+                summary.updatedAt = now
+
+            VehicleDailySummary.objects.bulk_update(summaries, cls.SUMMARY_FIELDS, batch_size=500)
+
+            for day in days:
+                start, end = day_bounds(day)
+                VehicleTrip.objects.filter(imei__in=imeis, startAt__gte=start, startAt__lt=end).delete()
+            VehicleTrip.objects.bulk_create(trips, batch_size=1000)
+
+        return len(summaries)
+
+    @classmethod
+    def get_days(cls, imei, first_day, last_day, speed_limit=None):
+        """
+        Daily summaries and trips of one IMEI for a date range.
+
+        Closed days are read from the summary tables (and summarized on the spot
+        if the summarizer hasn't reached them yet). Today is computed from raw
+        rows and not stored. Future days are skipped.
+
+        Returns:
+            tuple: (summaries, trips) where summaries maps date -> VehicleDailySummary
+                   and trips is a list of VehicleTrip ordered by start
+        """
+        today = DailyOdometerService.today()
+        last_closed_day = min(last_day, today - timedelta(days=1))
+
+        summaries = {}
+        if first_day <= last_closed_day:
+            summaries = {
+                summary.date: summary
+                for summary in VehicleDailySummary.objects.filter(
+                    imei=imei, date__gte=first_day, date__lte=last_closed_day
+                )
+            }
+
+            stale_days = []
+            day = first_day
+            while day <= last_closed_day:
+                summary = summaries.get(day)
+                if summary is None or summary.summarizedAt is None or summary.summarizedAt < day_bounds(day)[1]:
+                    stale_days.append(day)
+                day += timedelta(days=1)
+
+            if stale_days:
+                cls.summarize_days(stale_days, [imei])
+                summaries.update({
+                    summary.date: summary
+                    for summary in VehicleDailySummary.objects.filter(imei=imei, date__in=stale_days)
+                })
+
+        trips = []
+        if first_day <= last_closed_day:
+            trips = list(VehicleTrip.objects.filter(
+                imei=imei,
+                startAt__gte=day_bounds(first_day)[0],
+                startAt__lt=day_bounds(last_closed_day)[1]
+            ).order_by('startAt'))
+
+        if first_day <= today <= last_day:
+            if speed_limit is None:
+                speed_limit = cls.get_speed_limits([imei])[imei]
+            start, end = day_bounds(today)
+            track = report_engine.load_tracks([imei], start, end).get(imei) or report_engine.Track.empty()
+            ignitions = report_engine.load_ignitions([imei], start, end).get(imei) or report_engine.Ignitions.empty()
+            stats = report_engine.compute_daily_stats(track, ignitions, speed_limit).get(today)
+            summaries[today] = VehicleDailySummary(
+                imei=imei, date=today,
+                **(stats or compute_day_stats([], [], speed_limit))
+            )
+            trips.extend(
+                VehicleTrip(imei=imei, **trip) for trip in report_engine.segment_trips(track, TRIP_STOP_MINUTES)
+            )
+
+        return summaries, trips
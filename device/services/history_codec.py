@@ -0,0 +1,156 @@
+"""
+History Codec
+Compact columnar encoding of location history (?encoding=msgpack)
+
+Schema v1, a msgpack map:
+
+    v       int     schema version (1)
+    imei    str
+    count   int     number of points, ascending by createdAt
+    tz      str     "Asia/Kathmandu", times are wall-clock in this zone
+    scale   map     {"coord": 10000000, "course": 2}
+    base    map     {"t": int, "id": int, "lat": int, "lon": int}
+    dtypes  map     column name -> NumPy style little-endian dtype, e.g. "<u2", "<i4"
+    cols    map     column name -> bin, packed little-endian array of `count` items
+
+Columns:
+
+    t       delta   ms since the previous point (first is 0), t[0] = base.t
+                    base.t is ms since 1970-01-01T00:00 of the wall clock
+    id      delta   Location id
+    lat     delta   latitude * scale.coord (1e-7 degrees, ~1 cm)
+    lon     delta   longitude * scale.coord
+    speed   plain   km/h clamped to 0-255 (uint8)
+    course  plain   degrees / scale.course, 0-179 (uint8)
+    sat     plain   satellites clamped to 0-255 (uint8)
+    rtg     bits    realTimeGps, MSB-first bitmap of `count` bits (numpy.packbits)
+
+Decoding a delta column: values = base[name] + cumsum(deltas). Integer columns
+use the smallest dtype that fits, so always read the dtype from `dtypes`.
+decode_locations() below is the reference decoder.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from device.services import report_engine
+
+SCHEMA_VERSION = 1
+COORD_SCALE = 10_000_000
+COURSE_SCALE = 2
+
+_EPOCH = datetime(1970, 1, 1)
+_INT_DTYPES = ('<i1', '<i2', '<i4', '<i8')
+_UINT_DTYPES = ('<u1', '<u2', '<u4', '<u8')
+
+
+def _smallest_dtype(values):
+    """Smallest little-endian integer dtype holding every value."""
+    if len(values) == 0:
+        return '<u1'
+    low, high = int(values.min()), int(values.max())
+    for dtype in (_UINT_DTYPES if low >= 0 else _INT_DTYPES):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return '<i8'
+
+
+def _deltas(values):
+    """Base value and per-point deltas (first delta 0) of an int64 array."""
+    if len(values) == 0:
+        return 0, values
+    return int(values[0]), np.diff(values, prepend=values[0])
+
+
+def encode_locations(rows, imei):
+    """
+    Encode location rows into a schema v1 columnar map.
+
+    Args:
+        rows: list of (createdAt, id, imei, latitude, longitude, speed, course,
+              satellite, realTimeGps) tuples ascending by createdAt, i.e.
+              LocationHistoryService.LOCATION_FIELDS order
+        imei: IMEI the rows belong to
+    """
+    count = len(rows)
+    if count:
+        times, ids, _, latitudes, longitudes, speeds, courses, satellites, real_time_gps = report_engine.columns(rows, 9)
+    else:
+        times = ids = latitudes = longitudes = speeds = courses = satellites = real_time_gps = []
+
+    milliseconds = report_engine.to_datetime64(times).astype('datetime64[ms]').astype(np.int64)
+    integer_columns = {
+        't': milliseconds,
+        'id': np.array(ids, dtype=np.int64),
+        'lat': np.rint(np.array(latitudes, dtype=np.float64) * COORD_SCALE).astype(np.int64),
+        'lon': np.rint(np.array(longitudes, dtype=np.float64) * COORD_SCALE).astype(np.int64),
+    }
+
+    base = {}
+    dtypes = {}
+    cols = {}
+    for name, values in integer_columns.items():
+        base[name], deltas = _deltas(values)
+        dtypes[name] = _smallest_dtype(deltas)
+        cols[name] = deltas.astype(dtypes[name]).tobytes()
+
+    byte_columns = {
+        'speed': np.clip(np.array(speeds, dtype=np.int64), 0, 255),
+        'course': (np.rint(np.array(courses, dtype=np.float64) / COURSE_SCALE).astype(np.int64) % (360 // COURSE_SCALE)),
+        'sat': np.clip(np.array(satellites, dtype=np.int64), 0, 255),
+    }
+    for name, values in byte_columns.items():
+        dtypes[name] = '<u1'
+        cols[name] = values.astype('<u1').tobytes()
+
+    dtypes['rtg'] = 'bits'
+    cols['rtg'] = np.packbits(np.array(real_time_gps, dtype=bool)).tobytes()
+
+    return {
+        'v': SCHEMA_VERSION,
+        'imei': imei,
+        'count': count,
+        'tz': 'Asia/Kathmandu',
+        'scale': {'coord': COORD_SCALE, 'course': COURSE_SCALE},
+        'base': base,
+        'dtypes': dtypes,
+        'cols': cols,
+    }
+
+
+def decode_locations(payload):
+    """
+    Reference decoder, returns the points as dicts like the JSON history rows.
+
+    Coordinates come back rounded to 1e-7 degrees and course to COURSE_SCALE degrees.
+    """
+    count = payload['count']
+    cols, dtypes, base = payload['cols'], payload['dtypes'], payload['base']
+
+    def column(name):
+        return np.frombuffer(cols[name], dtype=dtypes[name], count=count).astype(np.int64)
+
+    milliseconds = base['t'] + np.cumsum(column('t'))
+    ids = base['id'] + np.cumsum(column('id'))
+    latitudes = (base['lat'] + np.cumsum(column('lat'))) / payload['scale']['coord']
+    longitudes = (base['lon'] + np.cumsum(column('lon'))) / payload['scale']['coord']
+    speeds = column('speed')
+    courses = column('course') * payload['scale']['course']
+    satellites = column('sat')
+    real_time_gps = np.unpackbits(np.frombuffer(cols['rtg'], dtype=np.uint8), count=count).astype(bool)
+
+    return [
+        {
+            'id': int(ids[i]),
+            'imei': payload['imei'],
+            'latitude': float(latitudes[i]),
+            'longitude': float(longitudes[i]),
+            'speed': int(speeds[i]),
+            'course': int(courses[i]),
+            'satellite': int(satellites[i]),
+            'realTimeGps': bool(real_time_gps[i]),
+            'createdAt': (_EPOCH + timedelta(milliseconds=int(milliseconds[i]))).isoformat(),
+        }
+        for i in range(count)
+    ]
@@ -0,0 +1,216 @@
+"""
+Latest State Service
+Keeps the latest location and GPS status of every IMEI in a shared cache
+"""
+import logging
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import OuterRef, Subquery
+
+from device.models.device import Device
+from device.models.location import Location
+from device.models.status import Status
+
+logger = logging.getLogger(__name__)
+
+
+LOCATION_FIELDS = ('id', 'imei', 'latitude', 'longitude', 'speed', 'course', 'realTimeGps', 'satellite', 'createdAt', 'updatedAt')
+STATUS_FIELDS = ('id', 'imei', 'battery', 'signal', 'ignition', 'charging', 'relay', 'createdAt', 'updatedAt')
+
+
+class LatestStateService:
+    """
+    Latest location/status store keyed by IMEI.
+
+    Entries are written through by the location/status create endpoints and the
+    bulk ingest, and lazily filled from the database on a miss. The store lives in
+    the 'latest_state' cache (Redis in production) so every worker process sees
+    the same state. If the cache is unreachable every call falls back to the DB.
+    """
+
+    CACHE_ALIAS = 'latest_state'
+    DB_CHUNK_SIZE = 1000
+
+    # kind -> (model class, cached fields)
+    KINDS = {
+        'location': (Location, LOCATION_FIELDS),
+        'status': (Status, STATUS_FIELDS),
+    }
+
+    # Stored for IMEIs without any row so misses aren't re-queried on every call
+    EMPTY = {}
+
+    @classmethod
+    def _cache(cls):
+        alias = cls.CACHE_ALIAS if cls.CACHE_ALIAS in settings.CACHES else 'default'
+        return caches[alias]
+
+    @staticmethod
+    def _key(kind, imei):
+        return f'latest_{kind}:{imei}'
+
+    @classmethod
+    def _timeout(cls):
+        return getattr(settings, 'CACHE_TIMEOUT_LATEST_STATE', 3600)
+
+    @classmethod
+    def get(cls, imei):
+        """
+        Get latest state for a single IMEI.
+
+        Returns:
+            dict: {'location': Location or None, 'status': Status or None}
+        """
+        return cls.get_many([imei])[imei]
+
+    @classmethod
+    def get_many(cls, imeis):
+        """
+        Get latest location and status for many IMEIs at once.
+
+        Cache misses are filled with one query per kind for all missing IMEIs.
+        Returned instances are unsaved copies and must not be saved back.
+
+        Args:
+            imeis: iterable of IMEI strings
+
+        Returns:
+            dict: imei -> {'location': Location or None, 'status': Status or None}
+        """
+        imeis = list(dict.fromkeys(imei for imei in imeis if imei))
+        states = {imei: {'location': None, 'status': None} for imei in imeis}
+        if not imeis:
+            return states
+
+        keys = {cls._key(kind, imei): (kind, imei) for kind in cls.KINDS for imei in imeis}
+
+        try:
+            cached = cls._cache().get_many(list(keys.keys()))
+        except Exception as e:
+            logger.warning(f"Latest state cache read failed, falling back to DB: {e}")
+            cached = None
+
+        missing = {kind: [] for kind in cls.KINDS}
+        for key, (kind, imei) in keys.items():
+            if cached is not None and key in cached:
+                states[imei][kind] = cls._load(kind, cached[key])
+            else:
+                missing[kind].append(imei)
+
+        to_cache = {}
+        for kind, missing_imeis in missing.items():
+            if not missing_imeis:
+                continue
+
+            rows = cls._fetch_latest(kind, missing_imeis)
+            for imei in missing_imeis:
+                row = rows.get(imei)
+                states[imei][kind] = row
+                to_cache[cls._key(kind, imei)] = cls._dump(kind, row) if row else cls.EMPTY
+
+        if to_cache and cached is not None:
+            try:
+                cls._cache().set_many(to_cache, timeout=cls._timeout())
+            except Exception as e:
+                logger.warning(f"Latest state cache fill failed: {e}")
+
+        return states
+
+    @classmethod
+    def record_location(cls, location):
+        """Write a newly stored Location through to the cache."""
+        cls.record_many('location', [location])
+
+    @classmethod
+    def record_status(cls, status):
+        """Write a newly stored GPS Status through to the cache."""
+        cls.record_many('status', [status])
+
+    @classmethod
+    def record_many(cls, kind, instances):
+        """
+        Write newly stored rows through to the cache.
+
+        Only the newest row per IMEI is kept, and a cached row is never replaced
+        by an older one (trackers replay buffered points after reconnecting).
+        """
+        newest = {}
+        for instance in instances:
+            current = newest.get(instance.imei)
+            if current is None or cls._is_newer(instance, current):
+                newest[instance.imei] = instance
+
+        if not newest:
+            return
+
+        try:
+            cache = cls._cache()
+            keys = {cls._key(kind, imei): imei for imei in newest}
+            cached = cache.get_many(list(keys.keys()))
+
+            to_cache = {}
+            for key, imei in keys.items():
+                previous = cls._load(kind, cached.get(key)) if key in cached else None
+                if previous is None or cls._is_newer(newest[imei], previous):
+                    to_cache[key] = cls._dump(kind, newest[imei])
+
+            if to_cache:
+                cache.set_many(to_cache, timeout=cls._timeout())
+        except Exception as e:
+            logger.warning(f"Latest state cache write failed: {e}")
+
+    @classmethod
+    def invalidate(cls, imei):
+        """Drop cached state for an IMEI (e.g. after its history is deleted)."""
+        try:
+            cls._cache().delete_many([cls._key(kind, imei) for kind in cls.KINDS])
+        except Exception as e:
+            logger.warning(f"Latest state cache invalidate failed: {e}")
+
+    @classmethod
+    def _fetch_latest(cls, kind, imeis):
+        """Fetch the latest row per IMEI, returns imei -> instance."""
+        model_class = cls.KINDS[kind][0]
+        rows = {}
+
+        for start in range(0, len(imeis), cls.DB_CHUNK_SIZE):
+            chunk = imeis[start:start + cls.DB_CHUNK_SIZE]
+            # One correlated subquery per device uses the (imei, createdAt) index
+            latest_ids = dict(
+                Device.objects.filter(imei__in=chunk)
+                .annotate(latest_id=Subquery(
+                    model_class.objects.filter(imei=OuterRef('imei')).order_by('-createdAt').values('id')[:1]
+                ))
+                .exclude(latest_id=None)
+                .values_list('latest_id', 'imei')
+            )
+            for row_id, instance in model_class.objects.in_bulk(list(latest_ids.keys())).items():
+                rows[latest_ids[row_id]] = instance
+
+        return rows
+
+    @classmethod
+    def _dump(cls, kind, instance):
+        data = {field: getattr(instance, field) for field in cls.KINDS[kind][1]}
+        # updatedAt is filled by the database on insert, keep the state usable without a refetch
+        if data['updatedAt'] is None:
+            data['updatedAt'] = datetime.now()
+        return data
+
+    @classmethod
+    def _load(cls, kind, data):
+        if not data:
+            return None
+        return cls.KINDS[kind][0](device_id=data['imei'], **data)
+
+    @staticmethod
+    def _is_newer(instance, other):
+        if instance.createdAt is None or other.createdAt is None:
+            return True
+        try:
+            return instance.createdAt >= other.createdAt
+        except TypeError:
+            # Mixed naive/aware timestamps, prefer the row that was just written
+            return True
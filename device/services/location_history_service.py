@@ -0,0 +1,127 @@
+"""
+Location History Service
+Ordered, bounded-memory iteration over location/status history for history endpoints
+"""
+import heapq
+
+from django.db.models import Q
+
+from device.models.location import Location
+from device.models.status import Status
+
+
+def iter_keyset(queryset, fields, descending=False, chunk_size=5000):
+    """
+    Yield values_list rows of queryset ordered by (createdAt, id), one page at a time.
+
+    PyMySQL buffers a whole result set client side, so .iterator() alone doesn't
+    bound memory. Pages are cut on the (createdAt, id) keyset instead, each page is
+    an index range scan on (imei, createdAt) and never more than chunk_size rows.
+
+    Args:
+        queryset: filtered Location/Status queryset
+        fields: values_list fields, must start with 'createdAt', 'id'
+        descending: newest first when True
+        chunk_size: rows per page
+    """
+    order = ('-createdAt', '-id') if descending else ('createdAt', 'id')
+    queryset = queryset.order_by(*order).values_list(*fields)
+    page = list(queryset[:chunk_size])
+
+    while page:
+        yield from page
+        if len(page) < chunk_size:
+            return
+        last_created_at, last_id = page[-1][0], page[-1][1]
+        if descending:
+            after = Q(createdAt__lt=last_created_at) | Q(createdAt=last_created_at, id__lt=last_id)
+        else:
+            after = Q(createdAt__gt=last_created_at) | Q(createdAt=last_created_at, id__gt=last_id)
+        page = list(queryset.filter(after)[:chunk_size])
+
+
+class LocationHistoryService:
+    """
+    Location and combined location/status history as generators of response dicts.
+
+    Views either collect them into a list (classic response) or hand them to
+    streaming_success_response so memory stays flat regardless of the range.
+    """
+
+    CHUNK_SIZE = 5000
+
+    LOCATION_FIELDS = ('createdAt', 'id', 'imei', 'latitude', 'longitude', 'speed', 'course', 'satellite', 'realTimeGps')
+    STATUS_FIELDS = ('createdAt', 'id', 'imei', 'battery', 'signal', 'ignition', 'charging', 'relay')
+
+    @staticmethod
+    def serialize_location(row, with_type=False):
+        created_at, location_id, imei, latitude, longitude, speed, course, satellite, real_time_gps = row
+        data = {
+            'id': location_id,
+            'imei': imei,
+            'latitude': float(latitude),
+            'longitude': float(longitude),
+            'speed': float(speed) if speed else 0,
+            'course': float(course) if course else 0,
+            'satellite': satellite,
+            'realTimeGps': real_time_gps,
+            'createdAt': created_at.isoformat()
+        }
+        if with_type:
+            data = {'type': 'location', **data}
+        return data
+
+    @staticmethod
+    def serialize_status(row):
+        created_at, status_id, imei, battery, signal, ignition, charging, relay = row
+        return {
+            'type': 'status',
+            'id': status_id,
+            'imei': imei,
+            'battery': battery,
+            'signal': signal,
+            'ignition': ignition,
+            'charging': charging,
+            'relay': relay,
+            'createdAt': created_at.isoformat()
+        }
+
+    @classmethod
+    def iter_location_rows(cls, imei, start=None, end=None, descending=True):
+        """Raw LOCATION_FIELDS tuples of an IMEI, optionally within [start, end]."""
+        queryset = Location.objects.filter(imei=imei)
+        if start is not None and end is not None:
+            queryset = queryset.filter(createdAt__range=[start, end])
+        return iter_keyset(queryset, cls.LOCATION_FIELDS, descending=descending, chunk_size=cls.CHUNK_SIZE)
+
+    @classmethod
+    def iter_locations(cls, imei, start=None, end=None, descending=True):
+        """Locations of an IMEI, optionally within [start, end], newest first by default."""
+        for row in cls.iter_location_rows(imei, start, end, descending=descending):
+            yield cls.serialize_location(row)
+
+    @classmethod
+    def iter_combined(cls, imei, start, end):
+        """
+        Locations and ignition-off statuses within [start, end], oldest first.
+
+        Both keyset cursors are already ordered by createdAt, so a k-way merge
+        interleaves them without materializing or re-sorting either side.
+        """
+        locations = iter_keyset(
+            Location.objects.filter(imei=imei, createdAt__range=[start, end]),
+            cls.LOCATION_FIELDS, chunk_size=cls.CHUNK_SIZE
+        )
+        statuses = iter_keyset(
+            Status.objects.filter(imei=imei, createdAt__range=[start, end], ignition=False),
+            cls.STATUS_FIELDS, chunk_size=cls.CHUNK_SIZE
+        )
+
+        tagged_locations = ((row[0], 0, row) for row in locations)
+        tagged_statuses = ((row[0], 1, row) for row in statuses)
+        # Ties on createdAt keep locations first, like the old stable sort
+        for _, kind, row in heapq.merge(tagged_locations, tagged_statuses, key=lambda item: item[:2]):
+            if kind == 0:
+                yield cls.serialize_location(row, with_type=True)
+            else:
+                yield cls.serialize_status(row)
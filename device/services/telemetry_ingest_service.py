@@ -0,0 +1,310 @@
+"""
+Telemetry Ingest Service
+Handles batched location/status ingest for the Node.js GT06 handler
+"""
+import logging
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DataError, transaction
+
+from device.models.device import Device
+from device.models.location import Location
+from device.models.status import Status
+from device.models.buzzer_status import BuzzerStatus
+from device.models.sos_status import SosStatus
+from device.services.latest_state_service import LatestStateService
+from device.services.daily_odometer_service import DailyOdometerService
+from device.services.current_state_service import CurrentStateService
+
+logger = logging.getLogger(__name__)
+
+
+LOCATION_REQUIRED_FIELDS = ['imei', 'latitude', 'longitude', 'speed', 'course', 'real_time_gps', 'satellite', 'created_at']
+STATUS_REQUIRED_FIELDS = ['imei', 'battery', 'signal', 'ignition', 'charging', 'relay', 'created_at']
+
+# Status rows are routed to a table by device type, GPS is the default
+STATUS_MODELS = {
+    'gps': Status,
+    'buzzer': BuzzerStatus,
+    'sos': SosStatus,
+}
+
+
+def parse_created_at(created_at_str):
+    """
+    Parse the created_at value sent by the GT06 handler.
+    Timestamps are Nepal local time, a trailing 'Z' is ignored.
+    Falls back to the current Nepal time when the value can't be parsed.
+    Returns a naive datetime since USE_TZ is off.
+    """
+    try:
+        return datetime.fromisoformat(created_at_str.replace('Z', ''))
+    except Exception:
+        return datetime.now(ZoneInfo('Asia/Kathmandu')).replace(tzinfo=None)
+
+
+class TelemetryIngestService:
+    """
+    Validates and stores batches of mixed location/status points.
+
+    Device lookups are answered from a per-process TTL cache that is filled
+    with one query per batch, so a batch costs one SELECT for unknown IMEIs
+    plus one INSERT per target table.
+    """
+
+    MAX_BATCH_SIZE = 5000
+    BULK_CREATE_BATCH_SIZE = 500
+
+    _device_cache = TTLCache(
+        maxsize=getattr(settings, 'TELEMETRY_DEVICE_CACHE_SIZE', 50000),
+        ttl=getattr(settings, 'CACHE_TIMEOUT_TELEMETRY_DEVICE', 60),
+    )
+    _device_cache_lock = threading.Lock()
+
+    @classmethod
+    def resolve_devices(cls, imeis):
+        """
+        Resolve device type, active-vehicle flag and speed limit for a set of IMEIs.
+
+        The speed limit is the one of the active vehicle (any vehicle of the
+        IMEI when none is active), used for the overspeed state.
+
+        Returns:
+            dict: imei -> {'type': str, 'has_active_vehicle': bool, 'speed_limit': int or None}
+                  or None if the device doesn't exist
+        """
+        resolved = {}
+        missing = []
+
+        with cls._device_cache_lock:
+            for imei in imeis:
+                if imei in cls._device_cache:
+                    resolved[imei] = cls._device_cache[imei]
+                else:
+                    missing.append(imei)
+
+        if missing:
+            from fleet.models import Vehicle
+
+            device_types = dict(
+                Device.objects.filter(imei__in=missing).values_list('imei', 'type')
+            )
+            active_imeis = set()
+            speed_limits = {}
+            # Inactive vehicles first so an active vehicle's speed limit wins
+            for imei, is_active, speed_limit in Vehicle.objects.filter(
+                imei__in=list(device_types.keys())
+            ).order_by('is_active').values_list('imei', 'is_active', 'speedLimit'):
+                if is_active:
+                    active_imeis.add(imei)
+                speed_limits[imei] = speed_limit
+
+            fetched = {}
+            for imei in missing:
+                if imei in device_types:
+                    fetched[imei] = {
+                        'type': (device_types[imei] or 'gps').lower(),
+                        'has_active_vehicle': imei in active_imeis,
+                        'speed_limit': speed_limits.get(imei),
+                    }
+                else:
+                    # Cache unknown IMEIs too so a misconfigured tracker can't hammer the DB
+                    fetched[imei] = None
+
+            with cls._device_cache_lock:
+                cls._device_cache.update(fetched)
+            resolved.update(fetched)
+
+        return resolved
+
+    @classmethod
+    def invalidate_device(cls, imei):
+        """Drop a cached device lookup (e.g. after the device or its vehicle changes)."""
+        with cls._device_cache_lock:
+            cls._device_cache.pop(imei, None)
+
+    @classmethod
+    def ingest(cls, points):
+        """
+        Validate and store a batch of telemetry points.
+
+        Args:
+            points: list of dicts, each with 'type' ('location' or 'status')
+                    plus the same fields accepted by the single-point endpoints
+
+        Returns:
+            tuple: (results, summary) where results has one entry per input point.
+                   A stored point's entry carries its row 'id' only when the
+                   backend returns it, MySQL doesn't for bulk inserts.
+        """
+        results = [None] * len(points)
+        pending = []  # (index, kind, point)
+
+        for index, point in enumerate(points):
+            if not isinstance(point, dict):
+                results[index] = cls._result(index, None, None, False, 'Point must be an object', 400)
+                continue
+
+            kind = (point.get('type') or '').lower()
+            imei = point.get('imei')
+
+            if kind == 'location':
+                required_fields = LOCATION_REQUIRED_FIELDS
+            elif kind == 'status':
+                required_fields = STATUS_REQUIRED_FIELDS
+            else:
+                results[index] = cls._result(index, kind, imei, False, "Invalid type. Must be 'location' or 'status'", 400)
+                continue
+
+            missing_field = next((field for field in required_fields if field not in point), None)
+            if missing_field:
+                results[index] = cls._result(index, kind, imei, False, f'Missing required field: {missing_field}', 400)
+                continue
+
+            pending.append((index, kind, point))
+
+        devices = cls.resolve_devices({str(point['imei']) for _, _, point in pending})
+        speed_limits = {imei: device['speed_limit'] for imei, device in devices.items() if device is not None}
+
+        # model class -> list of (index, kind, imei, instance)
+        rows_by_model = {}
+        received_at = datetime.now()
+
+        for index, kind, point in pending:
+            imei = str(point['imei'])
+            device = devices.get(imei)
+
+            if device is None:
+                results[index] = cls._result(index, kind, imei, False, 'Device not found with IMEI: ' + imei, 404)
+                continue
+
+            # Buzzer and SOS devices may not have associated vehicles
+            if (kind == 'location' or device['type'] == 'gps') and not device['has_active_vehicle']:
+                results[index] = cls._result(index, kind, imei, False, 'No active vehicle found with IMEI: ' + imei, 400)
+                continue
+
+            if kind == 'location':
+                model_class = Location
+                instance = Location(
+                    device_id=imei,
+                    imei=imei,
+                    latitude=point['latitude'],
+                    longitude=point['longitude'],
+                    speed=point['speed'],
+                    course=point['course'],
+                    realTimeGps=point['real_time_gps'],
+                    satellite=point['satellite'],
+                    createdAt=parse_created_at(point['created_at']),
+                    updatedAt=received_at
+                )
+            else:
+                model_class = STATUS_MODELS.get(device['type'], Status)
+                instance = model_class(
+                    device_id=imei,
+                    imei=imei,
+                    battery=point['battery'],
+                    signal=point['signal'],
+                    ignition=point['ignition'],
+                    charging=point['charging'],
+                    relay=point['relay'],
+                    createdAt=parse_created_at(point['created_at']),
+                    updatedAt=received_at
+                )
+
+            rows_by_model.setdefault(model_class, []).append((index, kind, imei, instance))
+
+        created_counts = {}
+        for model_class, rows in rows_by_model.items():
+            rows = cls._insert(model_class, rows, results)
+            if not rows:
+                continue
+
+            created_counts[model_class._meta.db_table] = len(rows)
+            if model_class is Location:
+                locations = [instance for _, _, _, instance in rows]
+                LatestStateService.record_many('location', locations)
+                try:
+                    DailyOdometerService.record_locations(locations)
+                except Exception as e:
+                    logger.error(f"Daily odometer update failed: {e}")
+                try:
+                    CurrentStateService.record_many('location', locations, speed_limits)
+                except Exception as e:
+                    logger.error(f"Current state update failed: {e}")
+            elif model_class is Status:
+                statuses = [instance for _, _, _, instance in rows]
+                LatestStateService.record_many('status', statuses)
+                try:
+                    CurrentStateService.record_many('status', statuses, speed_limits)
+                except Exception as e:
+                    logger.error(f"Current state update failed: {e}")
+            for index, kind, imei, instance in rows:
+                results[index] = cls._result(index, kind, imei, True, 'Created', 201, instance.pk)
+
+        created = sum(created_counts.values())
+        summary = {
+            'total': len(points),
+            'created': created,
+            'failed': len(points) - created,
+            'tables': created_counts,
+        }
+        return results, summary
+
+    @classmethod
+    def _insert(cls, model_class, rows, results):
+        """
+        Bulk insert (index, kind, imei, instance) rows of one table.
+
+        When the bulk insert fails (e.g. a value the column rejects) the rows
+        are inserted one by one, so only the bad points fail.
+
+        Returns:
+            list: the rows that were stored
+        """
+        table = model_class._meta.db_table
+        try:
+            with transaction.atomic():
+                model_class.objects.bulk_create(
+                    [instance for _, _, _, instance in rows],
+                    batch_size=cls.BULK_CREATE_BATCH_SIZE
+                )
+            return rows
+        except Exception as e:
+            logger.warning(f"Bulk insert into {table} failed, inserting {len(rows)} rows one by one: {e}")
+
+        stored = []
+        for row in rows:
+            index, kind, imei, instance = row
+            # Keys returned by the rolled back bulk insert are gone
+            instance.pk = None
+            try:
+                with transaction.atomic():
+                    instance.save(force_insert=True)
+            except (ValueError, TypeError, ValidationError, DataError) as e:
+                results[index] = cls._result(index, kind, imei, False, f'Invalid value: {e}', 400)
+                continue
+            except Exception as e:
+                logger.error(f"Insert into {table} failed: {e}")
+                results[index] = cls._result(index, kind, imei, False, str(e), 500)
+                continue
+            stored.append(row)
+        return stored
+
+    @staticmethod
+    def _result(index, kind, imei, success, message, status_code, record_id=None):
+        result = {
+            'index': index,
+            'type': kind,
+            'imei': imei,
+            'success': success,
+            'message': message,
+            'statusCode': status_code,
+        }
+        if record_id is not None:
+            result['id'] = record_id
+        return result
@@ -0,0 +1,192 @@
+"""
+Track Simplifier
+Streaming Douglas-Peucker simplification of history rows for map playback
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+# Tolerance used when only max_points is requested
+DEFAULT_TOLERANCE_M = 5.0
+
+# Rows buffered per Douglas-Peucker window, bounds memory on long moving stretches
+WINDOW_SIZE = 10000
+
+# Spans shorter than this are scanned in plain Python
+SMALL_SPAN = 64
+
+# Tolerance doublings tried to get under max_points
+MAX_TOLERANCE_STEPS = 12
+
+
+class SimplifyStats:
+    """Row counters filled while a simplification generator is consumed."""
+
+    __slots__ = ('original', 'returned')
+
+    def __init__(self):
+        self.original = 0
+        self.returned = 0
+
+    def as_meta(self, tolerance_m):
+        return {
+            'originalCount': self.original,
+            'simplifiedCount': self.returned,
+            # How many times fewer rows were sent, e.g. 12.5 means 12.5x smaller
+            'reductionRatio': round(self.original / self.returned, 2) if self.returned else 1.0,
+            'toleranceM': tolerance_m,
+        }
+
+
+def _farthest(xs, ys, first, last):
+    """Index and distance of the point farthest from segment first-last (vectorized)."""
+    dx, dy = xs[last] - xs[first], ys[last] - ys[first]
+    px, py = xs[first + 1:last] - xs[first], ys[first + 1:last] - ys[first]
+    length_sq = dx * dx + dy * dy
+    # Distance to the segment (not the infinite line), so back-tracking is caught
+    t = np.clip((px * dx + py * dy) / length_sq, 0, 1) if length_sq else 0
+    distances = np.hypot(px - t * dx, py - t * dy)
+    farthest = int(np.argmax(distances))
+    return first + 1 + farthest, distances[farthest]
+
+
+def _farthest_small(xs, ys, first, last):
+    """Same as _farthest on plain lists, cheaper than NumPy call overhead for short spans."""
+    x0, y0 = xs[first], ys[first]
+    dx, dy = xs[last] - x0, ys[last] - y0
+    length_sq = dx * dx + dy * dy
+    best_index, best_distance = first + 1, -1.0
+    for index in range(first + 1, last):
+        px, py = xs[index] - x0, ys[index] - y0
+        t = min(max((px * dx + py * dy) / length_sq, 0.0), 1.0) if length_sq else 0.0
+        distance = math.hypot(px - t * dx, py - t * dy)
+        if distance > best_distance:
+            best_index, best_distance = index, distance
+    return best_index, best_distance
+
+
+def _douglas_peucker(rows, tolerance_m):
+    """
+    Indices of rows kept by Douglas-Peucker on a local equirectangular projection.
+
+    The max-speed row of every kept span is kept too, so speed peaks survive
+    even where the geometry is a straight line.
+    """
+    count = len(rows)
+    if count <= 2:
+        return list(range(count))
+
+    latitudes = np.radians(np.fromiter((row['latitude'] for row in rows), np.float64, count))
+    longitudes = np.radians(np.fromiter((row['longitude'] for row in rows), np.float64, count))
+    speeds = np.fromiter((row['speed'] for row in rows), np.float64, count)
+    ys = latitudes * EARTH_RADIUS_M
+    xs = longitudes * math.cos(latitudes[0]) * EARTH_RADIUS_M
+
+    x_list, y_list = xs.tolist(), ys.tolist()
+
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    keep[int(np.argmax(speeds))] = True
+
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        if last - first < SMALL_SPAN:
+            split, distance = _farthest_small(x_list, y_list, first, last)
+        else:
+            split, distance = _farthest(xs, ys, first, last)
+        if distance > tolerance_m:
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return np.flatnonzero(keep).tolist()
+
+
+def simplify_rows(rows, tolerance_m, stats=None, window_size=WINDOW_SIZE):
+    """
+    Simplify time-ordered history rows in a single streaming pass.
+
+    Rows are the dicts produced by LocationHistoryService. Anchors split the
+    track into independently simplified spans and are always kept:
+    status rows (ignition transitions in combined history) and the first/last
+    row of every stopped (speed 0) run. Each span also keeps its speed peak.
+
+    Args:
+        rows: iterable of location (and optionally 'type': 'status') dicts
+        tolerance_m: max perpendicular deviation in meters
+        stats: optional SimplifyStats updated as rows are consumed
+        window_size: max rows buffered before a span is cut
+
+    Yields:
+        kept rows in input order
+    """
+    stats = stats if stats is not None else SimplifyStats()
+    span = []
+    span_moving = None
+
+    def flush(span, keep_last=True):
+        kept = _douglas_peucker(span, tolerance_m)
+        if not keep_last:
+            kept = kept[:-1]
+        stats.returned += len(kept)
+        for index in kept:
+            yield span[index]
+
+    for row in rows:
+        stats.original += 1
+
+        if row.get('type') == 'status':
+            if span:
+                yield from flush(span)
+                span = []
+            stats.returned += 1
+            yield row
+            continue
+
+        moving = bool(row['speed'])
+        if span and moving != span_moving:
+            # Moving <-> stopped transition, both sides of it are kept
+            yield from flush(span)
+            span = []
+        span.append(row)
+        span_moving = moving
+
+        if len(span) >= window_size:
+            # The cut row ends this span and starts the next one
+            yield from flush(span, keep_last=False)
+            span = [span[-1]]
+
+    if span:
+        yield from flush(span)
+
+
+def simplify_to_limit(rows, tolerance_m=None, max_points=None, stats=None):
+    """
+    Simplify rows and, with max_points, raise the tolerance until the result fits.
+
+    The input is still streamed once; only the (already simplified) output is
+    held in memory and re-simplified with a doubled tolerance while it is over
+    max_points. Anchors are never dropped, so a track with more anchors than
+    max_points can stay above the limit.
+
+    Returns:
+        tuple: (list of kept rows, tolerance used in meters)
+    """
+    tolerance_m = tolerance_m or DEFAULT_TOLERANCE_M
+    stats = stats if stats is not None else SimplifyStats()
+    kept = list(simplify_rows(rows, tolerance_m, stats))
+
+    if max_points:
+        for _ in range(MAX_TOLERANCE_STEPS):
+            if len(kept) <= max_points:
+                break
+            tolerance_m *= 2
+            kept = list(simplify_rows(kept, tolerance_m))
+        stats.returned = len(kept)
+
+    return kept, tolerance_m
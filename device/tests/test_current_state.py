@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from device.models.device import Device
+from device.models.location import Location
+from device.models.status import Status
+from device.models.vehicle_current_state import VehicleCurrentState
+from device.services.current_state_service import CurrentStateService
+from device.services.latest_state_service import LatestStateService
+from device.services.telemetry_ingest_service import TelemetryIngestService
+from fleet.models import Vehicle
+from fleet.services.vehicle_state_service import VehicleStateService
+
+
+class CurrentStateServiceTest(TestCase):
+    def setUp(self):
+        caches[LatestStateService.CACHE_ALIAS].clear()
+        TelemetryIngestService._device_cache.clear()
+        self.device = Device.objects.create(imei="111111111111111", phone="9800000001", sim="NTC", model="EC08")
+        Vehicle.objects.create(
+            imei=self.device.imei, device=self.device, name='Bus', vehicleNo='BA 1 KHA 1',
+            odometer=0, mileage=0, minimumFuel=0, speedLimit=60
+        )
+        self.now = datetime.now().replace(microsecond=0)
+
+    def _location(self, created_at, speed):
+        return Location(
+            device=self.device, imei=self.device.imei, latitude=27.7, longitude=85.3,
+            speed=speed, course=90, realTimeGps=True, satellite=8,
+            createdAt=created_at, updatedAt=created_at
+        )
+
+    def _status(self, created_at, ignition):
+        return Status(
+            device=self.device, imei=self.device.imei, battery=5, signal=4,
+            ignition=ignition, charging=True, relay=False, createdAt=created_at, updatedAt=created_at
+        )
+
+    def _row(self):
+        return VehicleCurrentState.objects.get(imei=self.device.imei)
+
+    def test_upsert_computes_state(self):
+        """Test locations and statuses are merged into one row with its state"""
+        CurrentStateService.record_status(self._status(self.now - timedelta(minutes=2), True))
+        self.assertEqual(self._row().state, VehicleStateService.NO_DATA)
+
+        CurrentStateService.record_many('location', [
+            self._location(self.now - timedelta(minutes=1), 3),
+            self._location(self.now, 40),
+        ])
+        row = self._row()
+        self.assertEqual(row.state, VehicleStateService.RUNNING)
+        self.assertEqual(row.speed, 40)
+        self.assertTrue(row.ignition)
+        self.assertEqual(row.lastSeenAt, self.now)
+        self.assertEqual(row.stateChangedAt, self.now)
+
+        CurrentStateService.record_location(self._location(self.now + timedelta(minutes=1), 80))
+        self.assertEqual(self._row().state, VehicleStateService.OVERSPEED)
+
+    def test_older_rows_do_not_replace_newer(self):
+        """Test a replayed older point leaves the current state alone"""
+        CurrentStateService.record_status(self._status(self.now, False))
+        CurrentStateService.record_location(self._location(self.now, 0))
+        changed_at = self._row().stateChangedAt
+
+        CurrentStateService.record_status(self._status(self.now - timedelta(hours=1), True))
+        CurrentStateService.record_location(self._location(self.now - timedelta(hours=1), 50))
+
+        row = self._row()
+        self.assertEqual(row.state, VehicleStateService.STOPPED)
+        self.assertEqual(row.speed, 0)
+        self.assertEqual(row.stateChangedAt, changed_at)
+
+    def test_single_point_is_one_read_and_one_update(self):
+        """Test a point for an existing row skips the lock and the vehicle lookup"""
+        CurrentStateService.record_status(self._status(self.now, True))
+        CurrentStateService.record_location(self._location(self.now, 0))
+
+        with CaptureQueriesContext(connection) as queries:
+            CurrentStateService.record_location(self._location(self.now + timedelta(minutes=1), 80))
+
+        self.assertEqual(len(queries.captured_queries), 2)
+        self.assertEqual(self._row().state, VehicleStateService.OVERSPEED)
+
+    def test_sweep_marks_inactive(self):
+        """Test rows without updates for 12 hours are swept to inactive"""
+        stale = self.now - timedelta(hours=11)
+        CurrentStateService.record_status(self._status(stale, False))
+        CurrentStateService.record_location(self._location(stale, 0))
+        self.assertEqual(CurrentStateService.sweep_inactive(), 0)
+
+        VehicleCurrentState.objects.update(lastSeenAt=self.now - timedelta(hours=13))
+        self.assertEqual(CurrentStateService.sweep_inactive(), 1)
+        row = self._row()
+        self.assertEqual(row.state, VehicleStateService.INACTIVE)
+        self.assertEqual(row.stateChangedAt, self.now - timedelta(hours=1))
+        self.assertEqual(CurrentStateService.sweep_inactive(), 0)
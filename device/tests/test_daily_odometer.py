@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from django.test import TestCase
+from device.models.device import Device
+from device.models.location import Location
+from device.models.vehicle_daily_summary import VehicleDailySummary
+from device.services.daily_odometer_service import DailyOdometerService, haversine_km
+from device.services.daily_summary_service import DailySummaryService
+
+
+class DailyOdometerServiceTest(TestCase):
+    def setUp(self):
+        self.device = Device.objects.create(imei="111111111111111", phone="9800000001", sim="NTC", model="EC08")
+        today = DailyOdometerService.today()
+        self.start = datetime.combine(today, datetime.min.time()) + timedelta(hours=8)
+        self.track = [(27.70, 85.30), (27.71, 85.30), (27.71, 85.32), (27.72, 85.32)]
+
+    def _location(self, created_at, latitude, longitude):
+        return Location.objects.create(
+            device=self.device, imei=self.device.imei, latitude=latitude, longitude=longitude,
+            speed=30, course=0, realTimeGps=True, satellite=8,
+            createdAt=created_at, updatedAt=created_at
+        )
+
+    def _expected_km(self):
+        return sum(haversine_km(*a, *b) for a, b in zip(self.track, self.track[1:]))
+
+    def test_incremental_matches_rebuild(self):
+        """Test accumulating points one by one matches the summarizer's full rescan"""
+        for i, (lat, lon) in enumerate(self.track):
+            DailyOdometerService.record_location(self._location(self.start + timedelta(minutes=i), lat, lon))
+
+        self.assertAlmostEqual(DailyOdometerService.get_today_km(self.device.imei), round(self._expected_km(), 2))
+        incremental = VehicleDailySummary.objects.get(imei=self.device.imei)
+        self.assertEqual(incremental.pointCount, 4)
+
+        DailySummaryService.summarize_day(DailyOdometerService.today())
+        rebuilt = VehicleDailySummary.objects.get(imei=self.device.imei)
+        self.assertAlmostEqual(rebuilt.distanceKm, incremental.distanceKm)
+
+    def test_rolls_over_at_midnight(self):
+        """Test the first point of a day isn't joined to the previous day's last point"""
+        yesterday = self.start - timedelta(days=1)
+        DailyOdometerService.record_locations([
+            self._location(yesterday, 27.0, 85.0),
+            self._location(self.start, 27.70, 85.30),
+            self._location(self.start + timedelta(minutes=1), 27.71, 85.30),
+        ])
+
+        self.assertEqual(VehicleDailySummary.objects.count(), 2)
+        self.assertAlmostEqual(
+            DailyOdometerService.get_today_km(self.device.imei),
+            round(haversine_km(27.70, 85.30, 27.71, 85.30), 2)
+        )
+        self.assertEqual(DailyOdometerService.get_today_km_many(["999999999999999"]), {"999999999999999": 0.0})
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+from django.test import TestCase
+from device.models.device import Device
+from device.models.location import Location
+from device.models.vehicle_daily_summary import VehicleDailySummary
+from device.models.vehicle_trip import VehicleTrip
+from device.services.daily_odometer_service import DailyOdometerService
+from device.services.daily_summary_service import DailySummaryService, compute_day_stats, segment_trips
+
+
+class DailySummaryFunctionsTest(TestCase):
+    def setUp(self):
+        self.start = datetime(2025, 1, 1, 8, 0)
+
+    def _at(self, minutes):
+        return self.start + timedelta(minutes=minutes)
+
+    def test_compute_day_stats_time_buckets(self):
+        """Test status intervals are split into running, overspeed, idle and stop time"""
+        points = [
+            (self._at(1), 27.70, 85.30, 40),
+            (self._at(11), 27.71, 85.30, 80),
+            (self._at(21), 27.71, 85.30, 0),
+        ]
+        statuses = [
+            (self._at(0), True),    # 0-10 running
+            (self._at(10), True),   # 10-20 running + overspeed
+            (self._at(20), True),   # 20-30 idle
+            (self._at(30), False),  # 30-45 stop
+            (self._at(45), False),
+        ]
+
+        stats = compute_day_stats(points, statuses, speed_limit=60)
+
+        self.assertEqual(stats['pointCount'], 3)
+        self.assertEqual(stats['maxSpeed'], 80)
+        self.assertAlmostEqual(stats['avgSpeed'], 40)
+        self.assertEqual(stats['totalMinutes'], 45)
+        self.assertEqual(stats['runningMinutes'], 20)
+        self.assertEqual(stats['overspeedMinutes'], 10)
+        self.assertEqual(stats['idleMinutes'], 10)
+        self.assertEqual(stats['stopMinutes'], 15)
+
+    def test_segment_trips_splits_on_long_stops(self):
+        """Test short halts stay in a trip and long stops start a new one"""
+        points = [
+            (self._at(0), 27.70, 85.30, 30),
+            (self._at(1), 27.71, 85.30, 0),    # traffic light
+            (self._at(2), 27.72, 85.30, 30),
+            (self._at(3), 27.72, 85.30, 0),    # parked
+            (self._at(30), 27.72, 85.31, 20),
+            (self._at(31), 27.73, 85.31, 25),
+        ]
+
+        trips = segment_trips(points)
+
+        self.assertEqual(len(trips), 2)
+        self.assertEqual(trips[0]['startAt'], self._at(0))
+        self.assertEqual(trips[0]['endAt'], self._at(2))
+        self.assertEqual(trips[0]['pointCount'], 3)
+        self.assertEqual(trips[1]['startAt'], self._at(30))
+        self.assertGreater(trips[1]['distanceKm'], 0)
+
+
+class DailySummaryServiceTest(TestCase):
+    def setUp(self):
+        self.device = Device.objects.create(imei="111111111111111", phone="9800000001", sim="NTC", model="EC08")
+        self.yesterday = DailyOdometerService.today() - timedelta(days=1)
+        start = datetime.combine(self.yesterday, datetime.min.time()) + timedelta(hours=9)
+        for i, (lat, speed) in enumerate([(27.70, 30), (27.71, 40), (27.72, 0)]):
+            created_at = start + timedelta(minutes=i)
+            Location.objects.create(
+                device=self.device, imei=self.device.imei, latitude=lat, longitude=85.3,
+                speed=speed, course=0, realTimeGps=True, satellite=8,
+                createdAt=created_at, updatedAt=created_at
+            )
+
+    def test_get_days_summarizes_closed_days_once(self):
+        """Test closed days are summarized on first use and then read from the tables"""
+        summaries, trips = DailySummaryService.get_days(self.device.imei, self.yesterday, self.yesterday)
+
+        self.assertEqual(summaries[self.yesterday].pointCount, 3)
+        self.assertEqual(summaries[self.yesterday].maxSpeed, 40)
+        self.assertEqual(len(trips), 1)
+        self.assertEqual(VehicleTrip.objects.count(), 1)
+
+        with self.assertNumQueries(2):
+            summaries, trips = DailySummaryService.get_days(self.device.imei, self.yesterday, self.yesterday)
+        self.assertEqual(summaries[self.yesterday].pointCount, 3)
+
+    def test_get_days_writes_empty_rows(self):
+        """Test days without data are stored so they aren't rescanned"""
+        day = self.yesterday - timedelta(days=1)
+        summaries, _ = DailySummaryService.get_days(self.device.imei, day, day)
+
+        self.assertEqual(summaries[day].pointCount, 0)
+        self.assertIsNotNone(VehicleDailySummary.objects.get(imei=self.device.imei, date=day).summarizedAt)
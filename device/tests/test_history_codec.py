@@ -0,0 +1,75 @@
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+import msgpack
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from device.models.device import Device
+from device.models.location import Location
+from device.services.history_codec import decode_locations, encode_locations
+from device.services.location_history_service import LocationHistoryService
+from device.views.location_views import get_location_by_date_range
+
+
+class HistoryCodecTest(TestCase):
+    def setUp(self):
+        self.imei = "111111111111111"
+        start = datetime(2025, 1, 1, 8, 0, 0)
+        self.rows = [
+            (
+                start + timedelta(seconds=10 * i), 1000 + i * 37, self.imei,
+                Decimal('27.70000000') + Decimal(i) * Decimal('0.00012345'),
+                Decimal('85.30000000') - Decimal(i) * Decimal('0.00004321'),
+                (i * 7) % 120, (i * 13) % 360, 8 + i % 4, i % 5 != 0
+            )
+            for i in range(1000)
+        ]
+
+    def test_round_trip(self):
+        """Test decoding returns the original points within the fixed-point precision"""
+        decoded = decode_locations(msgpack.unpackb(msgpack.packb(encode_locations(self.rows, self.imei))))
+
+        self.assertEqual(len(decoded), len(self.rows))
+        for row, point in zip(self.rows, decoded):
+            created_at, location_id, _, latitude, longitude, speed, course, satellite, real_time_gps = row
+            self.assertEqual(point['id'], location_id)
+            self.assertEqual(point['createdAt'], created_at.isoformat())
+            self.assertAlmostEqual(point['latitude'], float(latitude), delta=6e-8)
+            self.assertAlmostEqual(point['longitude'], float(longitude), delta=6e-8)
+            self.assertEqual(point['speed'], speed)
+            course_error = abs(point['course'] - course)
+            self.assertLessEqual(min(course_error, 360 - course_error), 1)
+            self.assertEqual(point['satellite'], satellite)
+            self.assertEqual(point['realTimeGps'], real_time_gps)
+
+    def test_payload_is_much_smaller_than_json(self):
+        """Test the columnar payload is at least 5x smaller than the JSON rows"""
+        json_size = len(json.dumps([LocationHistoryService.serialize_location(row) for row in self.rows]))
+        packed_size = len(msgpack.packb(encode_locations(self.rows, self.imei)))
+
+        self.assertGreater(json_size / packed_size, 5)
+
+    def test_empty(self):
+        """Test an empty range encodes and decodes to no points"""
+        self.assertEqual(decode_locations(encode_locations([], self.imei)), [])
+
+    def test_date_range_endpoint(self):
+        """Test ?encoding=msgpack returns the columnar payload oldest first"""
+        device = Device.objects.create(imei=self.imei, phone="9800000001", sim="NTC", model="EC08")
+        for row in self.rows[:5]:
+            Location.objects.create(
+                device=device, imei=self.imei, latitude=row[3], longitude=row[4], speed=row[5],
+                course=row[6], satellite=row[7], realTimeGps=row[8], createdAt=row[0], updatedAt=row[0]
+            )
+        request = APIRequestFactory().get(
+            f'/api/device/location/{self.imei}/date-range',
+            {'startDate': '2025-01-01T00:00:00', 'endDate': '2025-01-02T00:00:00', 'encoding': 'msgpack'}
+        )
+
+        response = get_location_by_date_range(request, imei=self.imei)
+
+        self.assertEqual(response['Content-Type'], 'application/x-msgpack')
+        body = msgpack.unpackb(response.content)
+        points = decode_locations(body['data'])
+        self.assertTrue(body['success'])
+        self.assertEqual([point['createdAt'] for point in points], [row[0].isoformat() for row in self.rows[:5]])
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from django.core.cache import caches
+from django.test import TestCase
+from device.models.device import Device
+from device.models.location import Location
+from device.models.status import Status
+from device.services.latest_state_service import LatestStateService
+
+
+class LatestStateServiceTest(TestCase):
+    def setUp(self):
+        caches[LatestStateService.CACHE_ALIAS].clear()
+        self.device = Device.objects.create(imei="111111111111111", phone="9800000001", sim="NTC", model="EC08")
+        self.other = Device.objects.create(imei="222222222222222", phone="9800000002", sim="NTC", model="EC08")
+        self.now = datetime.now().replace(microsecond=0)
+
+    def _location(self, created_at, **overrides):
+        data = {
+            'device': self.device, 'imei': self.device.imei, 'latitude': 27.7, 'longitude': 85.3,
+            'speed': 20, 'course': 90, 'realTimeGps': True, 'satellite': 8,
+            'createdAt': created_at, 'updatedAt': created_at
+        }
+        data.update(overrides)
+        return Location.objects.create(**data)
+
+    def test_get_many_fills_from_db(self):
+        """Test misses are loaded from the DB and then served from the cache"""
+        self._location(self.now - timedelta(minutes=5))
+        latest = self._location(self.now)
+        Status.objects.create(
+            device=self.device, imei=self.device.imei, battery=5, signal=4,
+            ignition=True, charging=True, relay=False, updatedAt=self.now
+        )
+
+        states = LatestStateService.get_many([self.device.imei, self.other.imei])
+
+        self.assertEqual(states[self.device.imei]['location'].id, latest.id)
+        self.assertTrue(states[self.device.imei]['status'].ignition)
+        self.assertIsNone(states[self.other.imei]['location'])
+
+        with self.assertNumQueries(0):
+            cached = LatestStateService.get_many([self.device.imei, self.other.imei])
+        self.assertEqual(cached[self.device.imei]['location'].id, latest.id)
+        self.assertIsNone(cached[self.other.imei]['status'])
+
+    def test_write_through_keeps_newest(self):
+        """Test recorded rows replace cached state only when they are newer"""
+        LatestStateService.get(self.device.imei)
+
+        newest = self._location(self.now, speed=40)
+        LatestStateService.record_location(newest)
+        LatestStateService.record_location(self._location(self.now - timedelta(hours=1), speed=10))
+
+        with self.assertNumQueries(0):
+            state = LatestStateService.get(self.device.imei)
+        self.assertEqual(state['location'].id, newest.id)
+        self.assertEqual(state['location'].speed, 40)
@@ -0,0 +1,95 @@
+import json
+from datetime import datetime, timedelta
+from unittest import mock
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+from device.models.device import Device
+from device.models.location import Location
+from device.models.status import Status
+from device.services.location_history_service import LocationHistoryService
+from device.views.location_views import get_combined_history_by_date_range
+
+
+class LocationHistoryServiceTest(TestCase):
+    def setUp(self):
+        self.device = Device.objects.create(imei="111111111111111", phone="9800000001", sim="NTC", model="EC08")
+        self.start = datetime(2025, 1, 1, 8, 0)
+        for i in range(7):
+            # Two points per timestamp so keyset pages split on equal createdAt
+            created_at = self.start + timedelta(minutes=i // 2)
+            Location.objects.create(
+                device=self.device, imei=self.device.imei, latitude=27.7, longitude=85.3,
+                speed=i, course=0, realTimeGps=True, satellite=8,
+                createdAt=created_at, updatedAt=created_at
+            )
+        for minute, ignition in [(0, False), (2, True), (5, False)]:
+            status = Status.objects.create(
+                device=self.device, imei=self.device.imei, battery=5, signal=4,
+                ignition=ignition, charging=True, relay=False, updatedAt=self.start
+            )
+            Status.objects.filter(id=status.id).update(createdAt=self.start + timedelta(minutes=minute))
+
+    def test_keyset_pages_cover_every_row_once(self):
+        """Test small keyset pages return every location once, newest first"""
+        with mock.patch.object(LocationHistoryService, 'CHUNK_SIZE', 2):
+            rows = list(LocationHistoryService.iter_locations(self.device.imei))
+
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(len({row['id'] for row in rows}), 7)
+        self.assertEqual([row['createdAt'] for row in rows], sorted((row['createdAt'] for row in rows), reverse=True))
+
+    def test_combined_history_is_merged_in_order(self):
+        """Test locations and ignition-off statuses are interleaved by createdAt"""
+        with mock.patch.object(LocationHistoryService, 'CHUNK_SIZE', 3):
+            rows = list(LocationHistoryService.iter_combined(
+                self.device.imei, self.start, self.start + timedelta(hours=1)
+            ))
+
+        self.assertEqual([row['type'] for row in rows].count('status'), 2)
+        self.assertEqual([row['createdAt'] for row in rows], sorted(row['createdAt'] for row in rows))
+        # Ties keep the location before the status
+        self.assertEqual([row['type'] for row in rows[:3]], ['location', 'location', 'status'])
+
+    def test_streamed_response_matches_buffered(self):
+        """Test ?stream=json and ?stream=ndjson return the same rows as the regular response"""
+        factory = APIRequestFactory()
+        params = {'startDate': '2025-01-01', 'endDate': '2025-01-01'}
+        url = f'/api/device/location/{self.device.imei}/combined-history'
+
+        buffered = get_combined_history_by_date_range(factory.get(url, params), imei=self.device.imei)
+        streamed = get_combined_history_by_date_range(factory.get(url, {**params, 'stream': 'json'}), imei=self.device.imei)
+        ndjson = get_combined_history_by_date_range(factory.get(url, {**params, 'stream': 'ndjson'}), imei=self.device.imei)
+
+        expected = json.loads(buffered.content)['data']
+        self.assertEqual(len(expected), 9)
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(json.loads(b''.join(streamed.streaming_content))['data'], expected)
+        self.assertEqual(ndjson['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(ndjson.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_simplified_response_reports_meta(self):
+        """Test ?tolerance_m= adds the reduction meta to regular and streamed responses"""
+        factory = APIRequestFactory()
+        params = {'startDate': '2025-01-01', 'endDate': '2025-01-01', 'tolerance_m': '50'}
+        url = f'/api/device/location/{self.device.imei}/combined-history'
+
+        buffered = json.loads(get_combined_history_by_date_range(factory.get(url, params), imei=self.device.imei).content)
+        streamed = get_combined_history_by_date_range(factory.get(url, {**params, 'stream': 'json'}), imei=self.device.imei)
+        streamed = json.loads(b''.join(streamed.streaming_content))
+
+        self.assertEqual(buffered['meta']['originalCount'], 9)
+        self.assertEqual(buffered['meta']['simplifiedCount'], len(buffered['data']))
+        self.assertEqual(streamed['meta'], buffered['meta'])
+        self.assertEqual(streamed['data'], buffered['data'])
+
+    def test_invalid_simplification_params(self):
+        """Test non-numeric tolerance_m is rejected"""
+        request = APIRequestFactory().get(
+            f'/api/device/location/{self.device.imei}/combined-history',
+            {'startDate': '2025-01-01', 'endDate': '2025-01-01', 'tolerance_m': 'abc'}
+        )
+
+        response = get_combined_history_by_date_range(request, imei=self.device.imei)
+
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from django.test import TestCase
+from device.services import report_engine
+from device.services.daily_summary_service import compute_day_stats, segment_trips
+
+
+class ReportEngineTest(TestCase):
+    def setUp(self):
+        self.start = datetime(2025, 1, 1, 22, 0)
+        # Two days of stop-and-go driving across midnight
+        self.points = [
+            (self.start + timedelta(minutes=i * 3), 27.70 + i * 0.001, 85.30, (i * 17) % 70 if i % 7 else 0)
+            for i in range(80)
+        ]
+        self.statuses = [
+            (self.start + timedelta(minutes=i * 10 + 1), i % 4 != 0)
+            for i in range(25)
+        ]
+
+    def _by_day(self, rows):
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row[0].date(), []).append(row)
+        return grouped
+
+    def test_daily_stats_match_reference(self):
+        """Test the vectorized stats equal compute_day_stats for every day"""
+        track = report_engine.Track.from_columns(*report_engine.columns(self.points, 4))
+        ignitions = report_engine.Ignitions.from_columns(*report_engine.columns(self.statuses, 2))
+
+        stats = report_engine.compute_daily_stats(track, ignitions, speed_limit=50)
+
+        day_points, day_statuses = self._by_day(self.points), self._by_day(self.statuses)
+        self.assertEqual(set(stats), set(day_points) | set(day_statuses))
+        for day, day_stats in stats.items():
+            expected = compute_day_stats(day_points.get(day, []), day_statuses.get(day, []), 50)
+            for field, value in expected.items():
+                if isinstance(value, float):
+                    self.assertAlmostEqual(day_stats[field], value, places=6, msg=f'{day} {field}')
+                else:
+                    self.assertEqual(day_stats[field], value, msg=f'{day} {field}')
+
+    def test_trips_match_reference(self):
+        """Test vectorized trips equal segment_trips and never span midnight"""
+        track = report_engine.Track.from_columns(*report_engine.columns(self.points, 4))
+
+        trips = report_engine.segment_trips(track)
+
+        expected = []
+        for rows in self._by_day(self.points).values():
+            expected.extend(segment_trips(rows))
+        self.assertEqual(len(trips), len(expected))
+        for trip, expected_trip in zip(trips, expected):
+            self.assertEqual(trip['startAt'], expected_trip['startAt'])
+            self.assertEqual(trip['endAt'], expected_trip['endAt'])
+            self.assertEqual(trip['pointCount'], expected_trip['pointCount'])
+            self.assertAlmostEqual(trip['distanceKm'], expected_trip['distanceKm'], places=6)
+            self.assertEqual(trip['startAt'].date(), trip['endAt'].date())
+
+    def test_empty_track(self):
+        """Test an IMEI without rows yields no days and no trips"""
+        self.assertEqual(
+            report_engine.compute_daily_stats(report_engine.Track.empty(), report_engine.Ignitions.empty(), 60), {}
+        )
+        self.assertEqual(report_engine.segment_trips(report_engine.Track.empty()), [])
@@ -0,0 +1,86 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from device.models.device import Device
+from device.models.location import Location
+from device.models.status import Status
+from device.models.buzzer_status import BuzzerStatus
+from device.services.latest_state_service import LatestStateService
+from device.services.telemetry_ingest_service import TelemetryIngestService
+from fleet.models import Vehicle
+
+
+class TelemetryIngestServiceTest(TestCase):
+    def setUp(self):
+        TelemetryIngestService._device_cache.clear()
+        caches[LatestStateService.CACHE_ALIAS].clear()
+        self.gps = Device.objects.create(imei="111111111111111", phone="9800000001", sim="NTC", model="EC08", type="gps")
+        self.buzzer = Device.objects.create(imei="222222222222222", phone="9800000002", sim="NTC", model="EC08", type="buzzer")
+        Vehicle.objects.create(
+            imei=self.gps.imei, device=self.gps, name="Test", vehicleNo="BA 1 PA 1",
+            odometer=0, mileage=0, minimumFuel=0
+        )
+
+    def _location(self, imei, **overrides):
+        point = {
+            'type': 'location', 'imei': imei, 'latitude': 27.7, 'longitude': 85.3,
+            'speed': 20, 'course': 90, 'real_time_gps': True, 'satellite': 8,
+            'created_at': '2025-01-01T10:00:00Z'
+        }
+        point.update(overrides)
+        return point
+
+    def _status(self, imei):
+        return {
+            'type': 'status', 'imei': imei, 'battery': 5, 'signal': 4,
+            'ignition': True, 'charging': True, 'relay': False,
+            'created_at': '2025-01-01T10:00:00Z'
+        }
+
+    def test_mixed_batch(self):
+        """Test a batch is routed per type and reports per-point results in order"""
+        points = [
+            self._location(self.gps.imei),
+            self._status(self.gps.imei),
+            self._status(self.buzzer.imei),
+            self._location(self.buzzer.imei),
+            self._location("999999999999999"),
+            {'type': 'location', 'imei': self.gps.imei},
+        ]
+
+        results, summary = TelemetryIngestService.ingest(points)
+
+        self.assertEqual([r['statusCode'] for r in results], [201, 201, 201, 400, 404, 400])
+        self.assertEqual(summary['created'], 3)
+        self.assertEqual(summary['failed'], 3)
+        self.assertEqual(Location.objects.count(), 1)
+        self.assertEqual(Status.objects.count(), 1)
+        self.assertEqual(BuzzerStatus.objects.count(), 1)
+
+    def test_bad_value_fails_only_its_point(self):
+        """Test a value the column rejects fails its point, not the whole batch"""
+        points = [
+            self._location(self.gps.imei),
+            self._location(self.gps.imei, latitude='north', created_at='2025-01-01T10:00:05Z'),
+            self._location(self.gps.imei, created_at='2025-01-01T10:00:10Z'),
+        ]
+
+        results, summary = TelemetryIngestService.ingest(points)
+
+        self.assertEqual([r['statusCode'] for r in results], [201, 400, 201])
+        self.assertEqual(summary['created'], 2)
+        self.assertEqual(Location.objects.count(), 2)
+
+    def test_device_lookup_is_cached(self):
+        """Test repeated batches don't re-query known devices"""
+        TelemetryIngestService.ingest([self._location(self.gps.imei)])
+
+        with CaptureQueriesContext(connection) as queries:
+            TelemetryIngestService.ingest([self._location(self.gps.imei)])
+
+        lookups = [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].startswith('SELECT') and ('"devices"' in q['sql'] or '"vehicles"' in q['sql'])
+        ]
+        self.assertEqual(lookups, [])
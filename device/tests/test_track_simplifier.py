@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from django.test import TestCase
+from device.services.track_simplifier import SimplifyStats, simplify_rows, simplify_to_limit
+
+
+class TrackSimplifierTest(TestCase):
+    def setUp(self):
+        start = datetime(2025, 1, 1, 8, 0)
+        self.rows = []
+        # 300 points driving north on a straight road, ~1 m of sideways jitter
+        for i in range(300):
+            self.rows.append(self._row(i, start, 27.70 + i * 0.0001, 85.30 + (i % 2) * 0.00001, 40))
+        self.rows[150]['speed'] = 95  # speed peak on the straight
+        # Parked for 50 points
+        for i in range(300, 350):
+            self.rows.append(self._row(i, start, 27.73, 85.30, 0))
+
+    def _row(self, i, start, latitude, longitude, speed):
+        return {
+            'type': 'location', 'id': i, 'latitude': latitude, 'longitude': longitude,
+            'speed': speed, 'createdAt': (start + timedelta(seconds=10 * i)).isoformat()
+        }
+
+    def test_keeps_anchors_and_drops_straight_points(self):
+        """Test straight stretches collapse while stops and speed peaks are kept"""
+        stats = SimplifyStats()
+        kept = list(simplify_rows(self.rows, tolerance_m=10, stats=stats))
+        kept_ids = [row['id'] for row in kept]
+
+        self.assertLess(len(kept), 10)
+        self.assertEqual(kept_ids, sorted(kept_ids))
+        self.assertIn(150, kept_ids)      # speed peak
+        self.assertIn(299, kept_ids)      # last moving point
+        self.assertIn(300, kept_ids)      # stop start
+        self.assertIn(349, kept_ids)      # stop end
+        self.assertEqual(stats.original, 350)
+        self.assertEqual(stats.returned, len(kept))
+        self.assertGreater(stats.as_meta(10)['reductionRatio'], 30)
+
+    def test_status_rows_are_kept(self):
+        """Test ignition transitions from combined history always survive"""
+        rows = self.rows[:100] + [{'type': 'status', 'id': 'status', 'ignition': False}] + self.rows[100:]
+
+        kept = list(simplify_rows(rows, tolerance_m=10))
+
+        self.assertIn('status', [row['id'] for row in kept])
+
+    def test_window_cut_does_not_duplicate_rows(self):
+        """Test spans cut at the window size share their boundary row once"""
+        kept = list(simplify_rows(self.rows, tolerance_m=10, window_size=64))
+        kept_ids = [row['id'] for row in kept]
+
+        self.assertEqual(len(kept_ids), len(set(kept_ids)))
+        self.assertIn(150, kept_ids)
+
+    def test_max_points_raises_tolerance(self):
+        """Test max_points keeps doubling the tolerance until the result fits"""
+        zigzag = [
+            self._row(i, datetime(2025, 1, 1), 27.70 + i * 0.0001, 85.30 + (i % 2) * 0.001, 40)
+            for i in range(500)
+        ]
+
+        kept, tolerance = simplify_to_limit(zigzag, tolerance_m=1, max_points=50)
+
+        self.assertLessEqual(len(kept), 50)
+        self.assertGreater(tolerance, 1)
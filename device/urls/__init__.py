@@ -10,6 +10,9 @@ urlpatterns = [
     # Status tracking routes
     path('status/', include('device.urls.status_urls')),
     
+    # Batched telemetry ingest routes
+    path('telemetry/', include('device.urls.telemetry_urls')),
+    
     # Relay control routes
     path('relay/', include('device.urls.relay_urls')),
     
@@ -0,0 +1,10 @@
+"""
+Telemetry URL patterns
+Batched ingest routes for the Node.js GT06 handler
+"""
+from django.urls import path
+from device.views import telemetry_views
+
+urlpatterns = [
+    path('bulk', telemetry_views.create_telemetry_bulk, name='create_telemetry_bulk'),  # POST endpoint
+]
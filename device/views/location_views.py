@@ -12,7 +12,18 @@ from datetime import datetime, timedelta
 
 from device.models.location import Location
 from device.models.device import Device
-from api_common.utils.response_utils import success_response, error_response
+from device.services.telemetry_ingest_service import parse_created_at
+from device.services.latest_state_service import LatestStateService
+from device.services.daily_odometer_service import DailyOdometerService
+from device.services.current_state_service import CurrentStateService
+from device.services.daily_summary_service import DailySummaryService
+from device.services.location_history_service import LocationHistoryService
+from device.services.track_simplifier import SimplifyStats, simplify_rows, simplify_to_limit
+from device.services.history_codec import encode_locations
+from api_common.utils.response_utils import (
+    success_response, error_response, streaming_success_response, get_stream_format,
+    msgpack_success_response, get_response_encoding
+)
 from api_common.constants.api_constants import SUCCESS_MESSAGES, ERROR_MESSAGES, HTTP_STATUS
 from api_common.decorators.response_decorators import api_response
 from api_common.exceptions.api_exceptions import NotFoundError, ValidationError
@@ -56,25 +67,8 @@ def create_location(request):
             )
 
         
-        # Convert timestamp to timezone-aware datetime object
-        import pytz
-        
-        try:
-            created_at_str = data['created_at']
-            
-            if created_at_str.endswith('Z'):
-                # Remove Z and parse the datetime
-                created_at_str = created_at_str[:-1]
-                dt = datetime.fromisoformat(created_at_str)
-                # Keep as naive datetime (Nepal time) - Django will treat it as Nepal time due to TIME_ZONE setting
-                createdAt = dt
-            else:
-                # Handle other formats
-                dt = datetime.fromisoformat(created_at_str.replace('Z', ''))
-                createdAt = dt
-        except Exception as dt_error:
-            nepal_tz = pytz.timezone('Asia/Kathmandu')
-            createdAt = datetime.now(nepal_tz)
+        # Convert timestamp (Nepal local time) to datetime object
+        createdAt = parse_created_at(data['created_at'])
         
         # Create location record
         try:
@@ -94,6 +88,18 @@ def create_location(request):
             print("LOCATION: Error type:", type(create_error).__name__)
             raise create_error
         
+        LatestStateService.record_location(location_obj)
+        
+        try:
+            DailyOdometerService.record_location(location_obj)
+        except Exception as odometer_error:
+            print("LOCATION: Error updating daily odometer:", str(odometer_error))
+        
+        try:
+            CurrentStateService.record_location(location_obj)
+        except Exception as state_error:
+            print("LOCATION: Error updating current state:", str(state_error))
+        
         location_data = {
             'id': location_obj.id,
             'imei': location_obj.imei,
@@ -122,6 +128,53 @@ def create_location(request):
         )
 
 
+def _history_response(request, rows, message):
+    """
+    Build a history response from a row generator, honoring optional query params:
+    stream=json|ndjson  stream rows instead of buffering the whole list
+    tolerance_m=<m>     Douglas-Peucker simplification (stops, speed peaks and
+                        ignition transitions are always kept)
+    max_points=<n>      simplify until at most n rows are returned
+    When simplified, response meta carries the original/simplified counts and ratio
+    """
+    try:
+        tolerance_m = float(request.GET['tolerance_m']) if request.GET.get('tolerance_m') else None
+        max_points = int(request.GET['max_points']) if request.GET.get('max_points') else None
+    except ValueError:
+        return error_response(
+            message='tolerance_m must be a number and max_points an integer',
+            status_code=HTTP_STATUS['BAD_REQUEST']
+        )
+    if (tolerance_m is not None and tolerance_m <= 0) or (max_points is not None and max_points < 2):
+        return error_response(
+            message='tolerance_m must be positive and max_points at least 2',
+            status_code=HTTP_STATUS['BAD_REQUEST']
+        )
+    
+    meta = None
+    if max_points or tolerance_m:
+        stats = SimplifyStats()
+        if max_points:
+            rows, tolerance_m = simplify_to_limit(rows, tolerance_m, max_points, stats)
+        else:
+            rows = simplify_rows(rows, tolerance_m, stats)
+        
+        def meta():
+            # Counts are only known once the rows have been consumed
+            return stats.as_meta(tolerance_m)
+    
+    stream_format = get_stream_format(request)
+    if stream_format:
+        return streaming_success_response(rows, message=message, stream_format=stream_format, meta=meta)
+    
+    rows = list(rows)
+    return success_response(
+        data=rows,
+        message=message,
+        meta=meta() if meta else None
+    )
+
+
 @api_view(['GET'])
 @api_response
 def get_location_by_imei(request, imei):
@@ -130,26 +183,8 @@ def get_location_by_imei(request, imei):
     Matches Node.js LocationController.getLocationByImei
     """
     try:
-        locations = Location.objects.filter(imei=imei).order_by('-createdAt')
-        locations_data = []
-        
-        for location in locations:
-            locations_data.append({
-                'id': location.id,
-                'imei': location.imei,
-                'latitude': float(location.latitude),
-                'longitude': float(location.longitude),
-                'speed': float(location.speed) if location.speed else 0,
-                'course': float(location.course) if location.course else 0,
-                'satellite': location.satellite,
-                'realTimeGps': location.realTimeGps,
-                'createdAt': location.createdAt.isoformat()
-            })
-        
-        return success_response(
-            data=locations_data,
-            message=SUCCESS_MESSAGES['LOCATION_RETRIEVED']
-        )
+        locations_data = LocationHistoryService.iter_locations(imei)
+        return _history_response(request, locations_data, SUCCESS_MESSAGES['LOCATION_RETRIEVED'])
     except Exception as e:
         return error_response(
             message=str(e),
@@ -222,29 +257,21 @@ def get_location_by_date_range(request, imei):
         start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
         end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
         
-        locations = Location.objects.filter(
-            imei=imei,
-            createdAt__range=[start, end]
-        ).order_by('-createdAt')
-        
-        locations_data = []
-        for location in locations:
-            locations_data.append({
-                'id': location.id,
-                'imei': location.imei,
-                'latitude': float(location.latitude),
-                'longitude': float(location.longitude),
-                'speed': float(location.speed) if location.speed else 0,
-                'course': float(location.course) if location.course else 0,
-                'satellite': location.satellite,
-                'realTimeGps': location.realTimeGps,
-                'createdAt': location.createdAt.isoformat()
-            })
+        if get_response_encoding(request) == 'msgpack':
+            if request.GET.get('tolerance_m') or request.GET.get('max_points'):
+                return error_response(
+                    message='tolerance_m and max_points are not supported with encoding=msgpack',
+                    status_code=HTTP_STATUS['BAD_REQUEST']
+                )
+            # Columnar schema v1 (see device/services/history_codec.py), oldest first
+            rows = list(LocationHistoryService.iter_location_rows(imei, start, end, descending=False))
+            return msgpack_success_response(
+                data=encode_locations(rows, imei),
+                message='Location data retrieved successfully'
+            )
         
-        return success_response(
-            data=locations_data,
-            message='Location data retrieved successfully'
-        )
+        locations_data = LocationHistoryService.iter_locations(imei, start, end)
+        return _history_response(request, locations_data, 'Location data retrieved successfully')
     except Exception as e:
         return error_response(
             message=str(e),
@@ -276,59 +303,8 @@ def get_combined_history_by_date_range(request, imei):
         end = datetime.fromisoformat(end_date.replace('Z', '+23:59'))
         end = end.replace(hour=23, minute=59, second=59, microsecond=999000)
         
-        # Get location data
-        locations = Location.objects.filter(
-            imei=imei,
-            createdAt__range=[start, end]
-        ).order_by('createdAt')
-        
-        # Get status data with ignition off
-        from device.models.status import Status
-        statuses = Status.objects.filter(
-            imei=imei,
-            createdAt__range=[start, end],
-            ignition=False
-        ).order_by('createdAt')
-        
-        # Combine data
-        combined_data = []
-        
-        # Add location data
-        for location in locations:
-            combined_data.append({
-                'type': 'location',
-                'id': location.id,
-                'imei': location.imei,
-                'latitude': float(location.latitude),
-                'longitude': float(location.longitude),
-                'speed': float(location.speed) if location.speed else 0,
-                'course': float(location.course) if location.course else 0,
-                'satellite': location.satellite,
-                'realTimeGps': location.realTimeGps,
-                'createdAt': location.createdAt.isoformat()
-            })
-        
-        # Add status data
-        for status in statuses:
-            combined_data.append({
-                'type': 'status',
-                'id': status.id,
-                'imei': status.imei,
-                'battery': status.battery,
-                'signal': status.signal,
-                'ignition': status.ignition,
-                'charging': status.charging,
-                'relay': status.relay,
-                'createdAt': status.createdAt.isoformat()
-            })
-        
-        # Sort by created_at
-        combined_data.sort(key=lambda x: x['createdAt'])
-        
-        return success_response(
-            data=combined_data,
-            message='Combined history data retrieved successfully'
-        )
+        combined_data = LocationHistoryService.iter_combined(imei, start, end)
+        return _history_response(request, combined_data, 'Combined history data retrieved successfully')
     except Exception as e:
         return error_response(
             message=str(e),
@@ -369,57 +345,6 @@ def generate_report(request, imei):
                 status_code=HTTP_STATUS['BAD_REQUEST']
             )
         
-        # Get location data
-        locations = Location.objects.filter(
-            imei=imei,
-            createdAt__range=[start, end]
-        ).order_by('createdAt')
-        
-        # Get status data
-        from device.models.status import Status
-        statuses = Status.objects.filter(
-            imei=imei,
-            createdAt__range=[start, end]
-        ).order_by('createdAt')
-        
-        # Calculate report statistics
-        total_locations = locations.count()
-        total_statuses = statuses.count()
-        
-        # Calculate total distance
-        total_distance = 0
-        if total_locations > 1:
-            prev_location = None
-            for location in locations:
-                if prev_location:
-                    # Simple distance calculation (Haversine formula would be better)
-                    lat1, lon1 = float(prev_location.latitude), float(prev_location.longitude)
-                    lat2, lon2 = float(location.latitude), float(location.longitude)
-                    
-                    # Rough distance calculation
-                    import math
-                    R = 6371  # Earth's radius in kilometers
-                    dlat = math.radians(lat2 - lat1)
-                    dlon = math.radians(lon2 - lon1)
-                    a = math.sin(dlat/2) * math.sin(dlat/2) + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2) * math.sin(dlon/2)
-                    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-                    distance = R * c
-                    total_distance += distance
-                
-                prev_location = location
-        
-        # Calculate comprehensive statistics
-        speeds = [float(loc.speed) if loc.speed else 0 for loc in locations]
-        avg_speed = sum(speeds) / len(speeds) if speeds else 0
-        max_speed = max(speeds) if speeds else 0
-        
-        # Calculate time-based statistics
-        total_time_minutes = 0
-        idle_time_minutes = 0
-        running_time_minutes = 0
-        overspeed_time_minutes = 0
-        stop_time_minutes = 0
-        
         # Get vehicle speed limit for overspeed calculation
         try:
             from fleet.models import Vehicle
@@ -428,42 +353,18 @@ def generate_report(request, imei):
         except:
             speed_limit = 60
         
-        # Process status data for time calculations
-        if statuses.exists():
-            prev_status = None
-            for status in statuses:
-                if prev_status:
-                    # Calculate time difference in minutes
-                    time_diff = (status.createdAt - prev_status.createdAt).total_seconds() / 60
-                    total_time_minutes += time_diff
-                    
-                    # Categorize time based on status
-                    if prev_status.ignition:
-                        # Get locations in this time period
-                        period_locations = locations.filter(
-                            createdAt__gte=prev_status.createdAt, 
-                            createdAt__lt=status.createdAt
-                        )
-                        
-                        if period_locations.exists():
-                            # Check if vehicle was moving (speed > 0)
-                            max_speed_in_period = max([float(loc.speed) if loc.speed else 0 for loc in period_locations], default=0)
-                            
-                            if max_speed_in_period > 0:
-                                running_time_minutes += time_diff
-                                
-                                # Check for overspeed
-                                if max_speed_in_period > speed_limit:
-                                    overspeed_time_minutes += time_diff
-                            else:
-                                idle_time_minutes += time_diff
-                        else:
-                            # No location data in this period, assume idle
-                            idle_time_minutes += time_diff
-                    else:
-                        stop_time_minutes += time_diff
-                
-                prev_status = status
+        # Closed days come from the daily summary tables, only today is scanned raw
+        summaries, trips = DailySummaryService.get_days(imei, start.date(), end.date(), speed_limit)
+        
+        total_distance = 0
+        total_locations = 0
+        speed_sum = 0
+        max_speed = 0
+        total_time_minutes = 0
+        idle_time_minutes = 0
+        running_time_minutes = 0
+        overspeed_time_minutes = 0
+        stop_time_minutes = 0
         
         # Generate daily data with proper structure
         daily_data = []
@@ -471,43 +372,40 @@ def generate_report(request, imei):
         end_date_obj = end.date()
         
         while current_date <= end_date_obj:
-            day_locations = locations.filter(createdAt__date=current_date)
-            day_statuses = statuses.filter(createdAt__date=current_date)
-            
-            # Calculate daily statistics
-            day_speeds = [float(loc.speed) if loc.speed else 0 for loc in day_locations]
-            day_avg_speed = sum(day_speeds) / len(day_speeds) if day_speeds else 0
-            day_max_speed = max(day_speeds) if day_speeds else 0
-            
-            # Calculate daily distance
-            day_distance = 0
-            if day_locations.count() > 1:
-                prev_loc = None
-                for loc in day_locations:
-                    if prev_loc:
-                        lat1, lon1 = float(prev_loc.latitude), float(prev_loc.longitude)
-                        lat2, lon2 = float(loc.latitude), float(loc.longitude)
-                        
-                        R = 6371  # Earth's radius in kilometers
-                        dlat = math.radians(lat2 - lat1)
-                        dlon = math.radians(lon2 - lon1)
-                        a = math.sin(dlat/2) * math.sin(dlat/2) + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2) * math.sin(dlon/2)
-                        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-                        distance = R * c
-                        day_distance += distance
-                    
-                    prev_loc = loc
-            
+            summary = summaries.get(current_date)
+        
+            if summary:
+                total_distance += summary.distanceKm
+                total_locations += summary.pointCount
+                speed_sum += summary.avgSpeed * summary.pointCount
+                max_speed = max(max_speed, summary.maxSpeed)
+                total_time_minutes += summary.totalMinutes
+                idle_time_minutes += summary.idleMinutes
+                running_time_minutes += summary.runningMinutes
+                overspeed_time_minutes += summary.overspeedMinutes
+                stop_time_minutes += summary.stopMinutes
+        
             daily_data.append({
                 'date': current_date.isoformat(),
-                'averageSpeed': round(day_avg_speed, 2),
-                'maxSpeed': round(day_max_speed, 2),
-                'totalKm': round(day_distance, 2),
-                'locationCount': day_locations.count()
+                'averageSpeed': round(summary.avgSpeed, 2) if summary else 0,
+                'maxSpeed': round(summary.maxSpeed, 2) if summary else 0,
+                'totalKm': round(summary.distanceKm, 2) if summary else 0,
+                'locationCount': summary.pointCount if summary else 0
             })
-            
+        
             current_date += timedelta(days=1)
         
+        avg_speed = speed_sum / total_locations if total_locations else 0
+        
+        # Raw points are still returned for the map/chart views
+        locations = Location.objects.filter(
+            imei=imei,
+            createdAt__range=[start, end]
+        ).order_by('createdAt').values(
+            'id', 'imei', 'latitude', 'longitude', 'speed', 'course', 'realTimeGps', 'satellite', 'createdAt'
+        )
+        encoding = get_response_encoding(request)
+        
         # Create comprehensive report data matching frontend expectations
         report_data = {
             'stats': {
@@ -521,23 +419,46 @@ def generate_report(request, imei):
                 'totalStopTime': round(stop_time_minutes, 2)
             },
             'dailyData': daily_data,
+            'trips': [
+                {
+                    'startAt': trip.startAt.isoformat(),
+                    'endAt': trip.endAt.isoformat(),
+                    'startLatitude': float(trip.startLatitude),
+                    'startLongitude': float(trip.startLongitude),
+                    'endLatitude': float(trip.endLatitude),
+                    'endLongitude': float(trip.endLongitude),
+                    'distanceKm': round(trip.distanceKm, 2),
+                    'durationMinutes': round(trip.durationMinutes, 2),
+                    'averageSpeed': round(trip.avgSpeed, 2),
+                    'maxSpeed': round(trip.maxSpeed, 2)
+                } for trip in trips
+            ],
             'rawData': {
-                'locations': [
+                # Columnar schema v1 (see device/services/history_codec.py) for msgpack clients
+                'locations': encode_locations(
+                    list(LocationHistoryService.iter_location_rows(imei, start, end, descending=False)), imei
+                ) if encoding == 'msgpack' else [
                     {
-                        'id': loc.id,
-                        'imei': loc.imei,
-                        'latitude': str(loc.latitude),
-                        'longitude': str(loc.longitude),
-                        'speed': float(loc.speed) if loc.speed else 0,
-                        'course': float(loc.course) if loc.course else 0,
-                        'realTimeGps': loc.realTimeGps,
-                        'satellite': loc.satellite,
-                        'createdAt': loc.createdAt.isoformat()
-                    } for loc in locations
+                        'id': loc['id'],
+                        'imei': loc['imei'],
+                        'latitude': str(loc['latitude']),
+                        'longitude': str(loc['longitude']),
+                        'speed': float(loc['speed']) if loc['speed'] else 0,
+                        'course': float(loc['course']) if loc['course'] else 0,
+                        'realTimeGps': loc['realTimeGps'],
+                        'satellite': loc['satellite'],
+                        'createdAt': loc['createdAt'].isoformat()
+                    } for loc in locations.iterator(chunk_size=5000)
                 ]
             }
         }
         
+        if encoding == 'msgpack':
+            return msgpack_success_response(
+                data=report_data,
+                message='Report generated successfully'
+            )
+        
         return success_response(
             data=report_data,
             message='Report generated successfully'
@@ -14,6 +14,8 @@ from device.models.status import Status
 from device.models.buzzer_status import BuzzerStatus
 from device.models.sos_status import SosStatus
 from device.models.device import Device
+from device.services.latest_state_service import LatestStateService
+from device.services.current_state_service import CurrentStateService
 from api_common.utils.response_utils import success_response, error_response
 from api_common.constants.api_constants import SUCCESS_MESSAGES, ERROR_MESSAGES, HTTP_STATUS
 from api_common.decorators.response_decorators import api_response
@@ -97,6 +99,11 @@ def create_status(request):
                 relay=data['relay'],
                 createdAt=data['created_at']
             )
+            LatestStateService.record_status(status_obj)
+            try:
+                CurrentStateService.record_status(status_obj)
+            except Exception as state_error:
+                print("STATUS: Error updating current state:", str(state_error))
         
         status_data = {
             'id': status_obj.id,
@@ -0,0 +1,51 @@
+"""
+Telemetry Views
+Handles batched location/status ingest from the Node.js GT06 handler
+"""
+from rest_framework.decorators import api_view
+
+from device.services.telemetry_ingest_service import TelemetryIngestService
+from api_common.utils.response_utils import success_response, error_response
+from api_common.constants.api_constants import HTTP_STATUS
+from api_common.decorators.response_decorators import api_response
+
+
+@api_view(['POST'])
+@api_response
+def create_telemetry_bulk(request):
+    """
+    Create location and status records in bulk
+    Accepts {"points": [...]} or a bare list, each point carries
+    'type' ('location' or 'status') plus the fields of the single-point endpoints.
+    Returns one result per point in input order.
+    """
+    try:
+        data = request.data
+        points = data.get('points') if isinstance(data, dict) else data
+
+        if not isinstance(points, list):
+            return error_response(
+                message='points must be a list',
+                status_code=HTTP_STATUS['BAD_REQUEST']
+            )
+
+        if len(points) > TelemetryIngestService.MAX_BATCH_SIZE:
+            return error_response(
+                message=f'Batch too large. Maximum {TelemetryIngestService.MAX_BATCH_SIZE} points per request',
+                status_code=HTTP_STATUS['BAD_REQUEST']
+            )
+
+        results, summary = TelemetryIngestService.ingest(points)
+
+        return success_response(
+            data={
+                'results': results,
+                'summary': summary
+            },
+            message='Telemetry batch processed'
+        )
+    except Exception as e:
+        return error_response(
+            message=str(e),
+            status_code=HTTP_STATUS['INTERNAL_ERROR']
+        )
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from device.models.vehicle_current_state import VehicleCurrentState
+from device.services.current_state_service import CurrentStateService
+from fleet.services.vehicle_state_service import VehicleStateService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Mark vehicles without updates for 12 hours inactive in the vehicle_current_state table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be marked inactive without changing anything',
+        )
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Show detailed output',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        verbose = options['verbose']
+
+        if dry_run or verbose:
+            stale = VehicleCurrentState.objects.filter(
+                lastSeenAt__lt=VehicleStateService.inactive_before()
+            ).exclude(
+                state__in=[VehicleStateService.INACTIVE, VehicleStateService.NO_DATA]
+            )
+            stale_rows = list(stale.values_list('imei', 'state', 'lastSeenAt'))
+
+        if dry_run:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: Would mark {len(stale_rows)} vehicle(s) inactive'
+                )
+            )
+            if verbose:
+                for imei, state, last_seen_at in stale_rows:
+                    self.stdout.write(f'  - IMEI: {imei}, State: {state}, Last seen: {last_seen_at}')
+            return
+
+        try:
+            updated_count = CurrentStateService.sweep_inactive()
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'Error sweeping inactive vehicle states: {e}')
+            )
+            logger.error(f'Error in sweep_inactive_vehicle_states: {e}')
+            raise
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Marked {updated_count} vehicle(s) inactive')
+        )
+        if verbose:
+            for imei, state, last_seen_at in stale_rows:
+                self.stdout.write(f'  - IMEI: {imei}, Was: {state}, Last seen: {last_seen_at}')
+        logger.info(f'Marked {updated_count} vehicles inactive')
@@ -1,6 +1,6 @@
 from celery.schedules import crontab
 from celery import shared_task
-from fleet.tasks import cleanup_expired_share_tracks
+from fleet.tasks import cleanup_expired_share_tracks, sweep_inactive_vehicle_states
 
 # Celery Beat periodic task configuration
 CELERY_BEAT_SCHEDULE = {
@@ -8,6 +8,10 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'fleet.tasks.cleanup_expired_share_tracks',
         'schedule': crontab(minute='*/10'),  # Run every 10 minutes
     },
+    'sweep-inactive-vehicle-states': {
+        'task': 'fleet.tasks.sweep_inactive_vehicle_states',
+        'schedule': crontab(minute='*/5'),  # Run every 5 minutes
+    },
 }
 
 # Alternative: Using interval instead of crontab
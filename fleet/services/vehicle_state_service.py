@@ -1,7 +1,8 @@
 from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db.models import Case, CharField, Count, F, Q, Value, When
 from django.utils import timezone
-from device.models.status import Status
-from device.models.location import Location
+from device.models.vehicle_current_state import VehicleCurrentState
+from device.services.latest_state_service import LatestStateService
 import logging
 
 
@@ -18,6 +19,10 @@ class VehicleStateService:
     IDLE = 'idle'
     RUNNING = 'running'
     OVERSPEED = 'overspeed'
+    STATES = (NO_DATA, INACTIVE, STOPPED, IDLE, RUNNING, OVERSPEED)
+    
+    # No update for this long means inactive
+    INACTIVE_AFTER = timedelta(hours=12)
     
     @staticmethod
     def get_vehicle_state(vehicle, latest_status=None, latest_location=None):
@@ -32,20 +37,35 @@ class VehicleStateService:
         Returns:
             str: Vehicle state ('nodata', 'inactive', 'stop', 'idle', 'running', 'overspeed')
         """
-        # Fetch latest status if not provided
-        if latest_status is None:
+        # Fetch latest status/location from the latest state store if not provided
+        if latest_status is None or latest_location is None:
             try:
-                latest_status = Status.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_state = LatestStateService.get(vehicle.imei)
             except Exception:
-                latest_status = None
+                latest_state = {'status': None, 'location': None}
+            
+            if latest_status is None:
+                latest_status = latest_state['status']
+            if latest_location is None:
+                latest_location = latest_state['location']
         
-        # Fetch latest location if not provided
-        if latest_location is None:
-            try:
-                latest_location = Location.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
-            except Exception:
-                latest_location = None
+        speed_limit = vehicle.speedLimit if hasattr(vehicle, 'speedLimit') else None
+        return VehicleStateService.classify(latest_status, latest_location, speed_limit, imei=vehicle.imei)
+    
+    @staticmethod
+    def classify(latest_status, latest_location, speed_limit=None, imei=None):
+        """
+        Vehicle state from a latest status/location pair, without any lookup.
         
+        Args:
+            latest_status: Latest Status instance or None
+            latest_location: Latest Location instance or None
+            speed_limit: Vehicle speed limit in km/h (None: never overspeed)
+            imei: IMEI for log messages
+        
+        Returns:
+            str: Vehicle state ('nodata', 'inactive', 'stop', 'idle', 'running', 'overspeed')
+        """
         # Check for no data condition (matching Flutter logic)
         # No data if: both are None, OR (ignition is None AND latitude is None)
         if (latest_status is None and latest_location is None) or \
@@ -85,13 +105,13 @@ class VehicleStateService:
                 
                 difference = now_utc - timestamp_utc
                 
-                if difference.total_seconds() > 12 * 3600:  # 12 hours in seconds
+                if difference > VehicleStateService.INACTIVE_AFTER:
                     return VehicleStateService.INACTIVE
             except (ValueError, TypeError, AttributeError) as e:
                 # If timezone conversion fails, skip inactive check
                 # Log error for debugging but continue with state calculation
                 logger = logging.getLogger(__name__)
-                logger.warning(f"Timezone conversion error for vehicle {vehicle.imei}: {e}")
+                logger.warning(f"Timezone conversion error for vehicle {imei}: {e}")
                 # Continue without inactive check - will fall through to other state checks
                 pass
         
@@ -109,7 +129,6 @@ class VehicleStateService:
                 
                 if speed is not None and speed > 5:
                     # Check for overspeed
-                    speed_limit = vehicle.speedLimit if hasattr(vehicle, 'speedLimit') else None
                     if speed_limit is not None:
                         try:
                             speed_limit_int = int(speed_limit) if isinstance(speed_limit, (int, float)) else None
@@ -122,6 +141,58 @@ class VehicleStateService:
         
         return VehicleStateService.NO_DATA
     
+    @staticmethod
+    def inactive_before():
+        """Cutoff of the inactive state, naive local time like the stored timestamps (USE_TZ is off)."""
+        return datetime.now() - VehicleStateService.INACTIVE_AFTER
+    
+    @staticmethod
+    def filter_by_state(queryset, state):
+        """
+        Vehicles of a queryset currently in the given state.
+        
+        Reads the (state, lastSeenAt) index of VehicleCurrentState, so filtering,
+        counting and paginating stay in the database. Rows without updates for
+        INACTIVE_AFTER count as inactive even before the sweep moved them.
+        """
+        rows = VehicleCurrentState.objects
+        stale = Q(lastSeenAt__lt=VehicleStateService.inactive_before())
+        if state == VehicleStateService.NO_DATA:
+            return queryset.exclude(
+                imei__in=rows.exclude(state=state).values('imei')
+            )
+        if state == VehicleStateService.INACTIVE:
+            rows = rows.filter(Q(state=state) | (stale & ~Q(state=VehicleStateService.NO_DATA)))
+        else:
+            rows = rows.filter(state=state).exclude(stale)
+        return queryset.filter(imei__in=rows.values('imei'))
+    
+    @staticmethod
+    def count_by_state(queryset):
+        """
+        Number of vehicles of a queryset in each state, for the filter badges.
+        
+        Returns:
+            dict: state -> count, every state present
+        """
+        current_state = Case(
+            When(
+                Q(lastSeenAt__lt=VehicleStateService.inactive_before()) & ~Q(state=VehicleStateService.NO_DATA),
+                then=Value(VehicleStateService.INACTIVE)
+            ),
+            default=F('state'),
+            output_field=CharField(),
+        )
+        counts = dict.fromkeys(VehicleStateService.STATES, 0)
+        counts.update(
+            VehicleCurrentState.objects.filter(imei__in=queryset.values('imei'))
+            .annotate(current_state=current_state)
+            .values_list('current_state').annotate(count=Count('id')).order_by()
+        )
+        # Vehicles without a row have no data
+        counts[VehicleStateService.NO_DATA] += queryset.count() - sum(counts.values())
+        return counts
+    
     @staticmethod
     def map_filter_name_to_state(filter_name):
         """
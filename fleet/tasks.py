@@ -95,3 +95,31 @@ def cleanup_expired_share_tracks_with_notification():
             'error': str(e),
             'timestamp': timezone.now().isoformat()
         }
+
+
+@shared_task
+def sweep_inactive_vehicle_states():
+    """
+    Celery task to mark vehicles without updates for 12 hours inactive in
+    the vehicle_current_state table.
+    This task should be scheduled to run every 5 minutes
+    (without Celery: python manage.py sweep_inactive_vehicle_states).
+    """
+    from device.services.current_state_service import CurrentStateService
+    
+    try:
+        updated_count = CurrentStateService.sweep_inactive()
+        if updated_count:
+            logger.info(f'Marked {updated_count} vehicles inactive')
+        return {
+            'status': 'success',
+            'updated_count': updated_count,
+            'timestamp': timezone.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f'Error in sweep_inactive_vehicle_states task: {e}')
+        return {
+            'status': 'error',
+            'error': str(e),
+            'timestamp': timezone.now().isoformat()
+        }
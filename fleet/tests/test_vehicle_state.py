@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+from io import StringIO
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase
+from device.models.device import Device
+from device.models.location import Location
+from device.models.status import Status
+from device.models.vehicle_current_state import VehicleCurrentState
+from device.services.current_state_service import CurrentStateService
+from device.services.latest_state_service import LatestStateService
+from device.services.telemetry_ingest_service import TelemetryIngestService
+from fleet.models.vehicle import Vehicle
+from fleet.services.vehicle_state_service import VehicleStateService
+
+
+class VehicleStateFilterTest(TestCase):
+    def setUp(self):
+        caches[LatestStateService.CACHE_ALIAS].clear()
+        TelemetryIngestService._device_cache.clear()
+        self.now = datetime.now().replace(microsecond=0)
+        self.count = 0
+
+    def _vehicle(self, ignition=None, speed=None, age=timedelta(minutes=1), speed_limit=60):
+        """Vehicle with an optional latest status/location, older rows that must be ignored"""
+        self.count += 1
+        imei = f'{self.count:015d}'
+        device = Device.objects.create(imei=imei, phone=f'98{self.count:08d}', sim='NTC', model='EC08')
+        vehicle = Vehicle.objects.create(
+            imei=imei, device=device, name=f'V{self.count}', vehicleNo=f'BA {self.count}',
+            odometer=0, mileage=0, minimumFuel=0, speedLimit=speed_limit
+        )
+        seen = self.now - age
+        if ignition is not None:
+            for created_at, row_ignition in ((seen - timedelta(hours=1), not ignition), (seen, ignition)):
+                status = Status.objects.create(
+                    device=device, imei=imei, battery=5, signal=4, ignition=row_ignition,
+                    charging=True, relay=False, updatedAt=created_at
+                )
+                # createdAt is auto_now_add
+                Status.objects.filter(id=status.id).update(createdAt=created_at)
+        if speed is not None:
+            for created_at, row_speed in ((seen - timedelta(hours=1), 0 if speed > 5 else 80), (seen, speed)):
+                Location.objects.create(
+                    device=device, imei=imei, latitude=27.7, longitude=85.3, speed=row_speed, course=90,
+                    realTimeGps=True, satellite=8, createdAt=created_at, updatedAt=created_at
+                )
+        return vehicle
+
+    def test_stored_state_matches_python_rules(self):
+        """Test filtering by state gives the same states as get_vehicle_state"""
+        expected = {
+            self._vehicle().id: VehicleStateService.NO_DATA,
+            self._vehicle(ignition=True, speed=40, age=timedelta(hours=13)).id: VehicleStateService.INACTIVE,
+            self._vehicle(ignition=False, speed=0).id: VehicleStateService.STOPPED,
+            self._vehicle(ignition=True, speed=5).id: VehicleStateService.IDLE,
+            self._vehicle(ignition=True, speed=40).id: VehicleStateService.RUNNING,
+            self._vehicle(ignition=True, speed=61).id: VehicleStateService.OVERSPEED,
+            self._vehicle(ignition=True, speed=60).id: VehicleStateService.RUNNING,
+            self._vehicle(ignition=True).id: VehicleStateService.NO_DATA,
+            self._vehicle(speed=30).id: VehicleStateService.NO_DATA,
+        }
+
+        CurrentStateService.rebuild()
+        for state in VehicleStateService.STATES:
+            ids = set(VehicleStateService.filter_by_state(Vehicle.objects.all(), state).values_list('id', flat=True))
+            self.assertEqual(ids, {vehicle_id for vehicle_id, expected_state in expected.items() if expected_state == state}, state)
+        for vehicle in Vehicle.objects.all():
+            self.assertEqual(VehicleStateService.get_vehicle_state(vehicle), expected[vehicle.id])
+
+    def test_filter_by_state_paginates_in_sql(self):
+        """Test filtering by state is a single query"""
+        running = self._vehicle(ignition=True, speed=40)
+        self._vehicle(ignition=False, speed=0)
+        no_data = self._vehicle()
+        CurrentStateService.rebuild()
+
+        with self.assertNumQueries(1):
+            ids = list(
+                VehicleStateService.filter_by_state(Vehicle.objects.all(), VehicleStateService.RUNNING)
+                .order_by('id').values_list('id', flat=True)[:25]
+            )
+        self.assertEqual(ids, [running.id])
+        no_data_vehicles = VehicleStateService.filter_by_state(Vehicle.objects.all(), VehicleStateService.NO_DATA)
+        self.assertEqual(list(no_data_vehicles.values_list('id', flat=True)), [no_data.id])
+
+    def test_count_by_state(self):
+        """Test badge counts include vehicles without a current state row"""
+        self._vehicle(ignition=True, speed=40)
+        self._vehicle(ignition=True, speed=50)
+        self._vehicle(ignition=False, speed=0)
+        CurrentStateService.rebuild()
+        self._vehicle()
+
+        counts = VehicleStateService.count_by_state(Vehicle.objects.all())
+        self.assertEqual(counts[VehicleStateService.RUNNING], 2)
+        self.assertEqual(counts[VehicleStateService.STOPPED], 1)
+        self.assertEqual(counts[VehicleStateService.NO_DATA], 1)
+        self.assertEqual(counts[VehicleStateService.IDLE], 0)
+
+    def test_stale_rows_are_inactive_before_the_sweep(self):
+        """Test vehicles that stopped reporting count as inactive between sweeps"""
+        running = self._vehicle(ignition=True, speed=40)
+        self._vehicle(ignition=False, speed=0)
+        CurrentStateService.rebuild()
+        VehicleCurrentState.objects.filter(imei=running.imei).update(
+            lastSeenAt=self.now - timedelta(hours=13)
+        )
+
+        vehicles = Vehicle.objects.all()
+        self.assertFalse(VehicleStateService.filter_by_state(vehicles, VehicleStateService.RUNNING).exists())
+        self.assertEqual(
+            list(VehicleStateService.filter_by_state(vehicles, VehicleStateService.INACTIVE).values_list('id', flat=True)),
+            [running.id]
+        )
+        counts = VehicleStateService.count_by_state(vehicles)
+        self.assertEqual(counts[VehicleStateService.RUNNING], 0)
+        self.assertEqual(counts[VehicleStateService.INACTIVE], 1)
+        self.assertEqual(counts[VehicleStateService.STOPPED], 1)
+
+        call_command('sweep_inactive_vehicle_states', stdout=StringIO())
+        self.assertEqual(
+            VehicleCurrentState.objects.get(imei=running.imei).state, VehicleStateService.INACTIVE
+        )
@@ -373,15 +373,15 @@ def get_share_track_by_token(request, token):
         # Get vehicle information
         try:
             from fleet.models.vehicle import Vehicle
-            from device.models.location import Location
-            from device.models.status import Status
+            from device.services.latest_state_service import LatestStateService
             
             vehicle = Vehicle.objects.get(imei=share_track.imei)
+            latest_state = LatestStateService.get(share_track.imei)
             
             # Get latest location
             latest_location = None
             try:
-                location = Location.objects.filter(imei=share_track.imei).order_by('-createdAt').first()
+                location = latest_state['location']
                 if location:
                     latest_location = {
                         'id': location.id,
@@ -400,7 +400,7 @@ def get_share_track_by_token(request, token):
             # Get latest status
             latest_status = None
             try:
-                status = Status.objects.filter(imei=share_track.imei).order_by('-createdAt').first()
+                status = latest_state['status']
                 if status:
                     latest_status = {
                         'id': status.id,
@@ -6,7 +6,6 @@ from django.db.models import Q
 from django.core.paginator import Paginator
 import json
 import re
-import logging
 
 from api_common.utils.response_utils import success_response, error_response
 from api_common.decorators.auth_decorators import require_auth, require_role
@@ -24,8 +23,9 @@ from shared.models import SimBalance
 from shared_utils.constants import VehicleType
 from shared_utils.numeral_utils import get_search_variants
 from fleet.services.vehicle_state_service import VehicleStateService
+from device.services.latest_state_service import LatestStateService
+from device.services.daily_odometer_service import DailyOdometerService
 from datetime import datetime, timedelta
-import math
 from openpyxl import Workbook
 from io import BytesIO
 
@@ -111,58 +111,12 @@ def exclude_school_bus_for_parents(queryset, user):
         return queryset
 
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """
-    Calculate distance between two points using Haversine formula
-    Returns distance in kilometers
-    """
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1_rad = math.radians(float(lat1))
-    lon1_rad = math.radians(float(lon1))
-    lat2_rad = math.radians(float(lat2))
-    lon2_rad = math.radians(float(lon2))
-    
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    return R * c
-
-
 def calculate_today_km(imei):
     """
-    Calculate today's kilometers for a vehicle based on location data
+    Get today's kilometers for a vehicle from its daily odometer summary
     """
     try:
-        today = datetime.now().date()
-        start_of_day = datetime.combine(today, datetime.min.time())
-        end_of_day = datetime.combine(today, datetime.max.time())
-        
-        # Get today's location data ordered by time
-        locations = Location.objects.filter(
-            imei=imei,
-            createdAt__gte=start_of_day,
-            createdAt__lte=end_of_day
-        ).order_by('createdAt')
-        
-        if len(locations) < 2:
-            return 0.0
-        
-        total_distance = 0.0
-        for i in range(1, len(locations)):
-            prev_loc = locations[i-1]
-            curr_loc = locations[i]
-            
-            distance = calculate_distance(
-                prev_loc.latitude, prev_loc.longitude,
-                curr_loc.latitude, curr_loc.longitude
-            )
-            total_distance += distance
-        
-        return round(total_distance, 2)
+        return DailyOdometerService.get_today_km(imei)
     except Exception as e:
         print(f"Error calculating today's km for {imei}: {e}")
         return 0.0
@@ -193,6 +147,9 @@ def get_all_vehicles(request):
             vehicles = exclude_school_bus_for_parents(vehicles, user)
         
         vehicles_data = []
+        # Latest status/location for all vehicles in one batch (cache first, then DB)
+        latest_states = LatestStateService.get_many([vehicle.imei for vehicle in vehicles])
+        today_kms = DailyOdometerService.get_today_km_many([vehicle.imei for vehicle in vehicles])
         for vehicle in vehicles:
             # Check if vehicle is expired and deactivate if needed
             if vehicle.expireDate and vehicle.expireDate <= datetime.now() and vehicle.is_active:
@@ -203,11 +160,11 @@ def get_all_vehicles(request):
             user_vehicle = vehicle.userVehicles.filter(user=user).first()
             
             # Calculate today's km
-            today_km = calculate_today_km(vehicle.imei)
+            today_km = today_kms.get(vehicle.imei, 0.0)
             
             # Get latest status
             try:
-                latest_status_obj = Status.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_status_obj = latest_states[vehicle.imei]['status']
                 latest_status = {
                     'id': latest_status_obj.id,
                     'imei': latest_status_obj.imei,
@@ -224,7 +181,7 @@ def get_all_vehicles(request):
             
             # Get latest location
             try:
-                latest_location_obj = Location.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_location_obj = latest_states[vehicle.imei]['location']
                 latest_location = {
                     'id': latest_location_obj.id,
                     'imei': latest_location_obj.imei,
@@ -306,6 +263,9 @@ def get_all_vehicles_detailed(request):
             vehicles = exclude_school_bus_for_parents(vehicles, user)
         
         vehicles_data = []
+        # Latest status/location for all vehicles in one batch (cache first, then DB)
+        latest_states = LatestStateService.get_many([vehicle.imei for vehicle in vehicles])
+        today_kms = DailyOdometerService.get_today_km_many([vehicle.imei for vehicle in vehicles])
         for vehicle in vehicles:
             # Check if vehicle is expired and deactivate if needed
             if vehicle.expireDate and vehicle.expireDate <= datetime.now() and vehicle.is_active:
@@ -427,11 +387,11 @@ def get_all_vehicles_detailed(request):
                 sim_balance = None
             
             # Calculate today's km
-            today_km = calculate_today_km(vehicle.imei)
+            today_km = today_kms.get(vehicle.imei, 0.0)
             
             # Get latest status
             try:
-                latest_status_obj = Status.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_status_obj = latest_states[vehicle.imei]['status']
                 latest_status = {
                     'id': latest_status_obj.id,
                     'imei': latest_status_obj.imei,
@@ -448,7 +408,7 @@ def get_all_vehicles_detailed(request):
             
             # Get latest location
             try:
-                latest_location_obj = Location.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_location_obj = latest_states[vehicle.imei]['location']
                 latest_location = {
                     'id': latest_location_obj.id,
                     'imei': latest_location_obj.imei,
@@ -1861,44 +1821,16 @@ def get_vehicles_paginated(request):
             # Exclude school bus vehicles for parents (they access via school bus endpoints)
             all_vehicles = exclude_school_bus_for_parents(all_vehicles, user)
         
-        # Convert queryset to list for filtering
-        vehicles_list = list(all_vehicles)
-        
-        # Filter by state if filter is not 'All'
+        # Filter by state in the database (see VehicleStateService.filter_by_state)
         if filter_param and filter_param != 'All':
             # Map filter name to state value
             target_state = VehicleStateService.map_filter_name_to_state(filter_param)
             
             if target_state is not None:
-                # Filter vehicles by state
-                filtered_vehicles = []
-                for vehicle in vehicles_list:
-                    # Get latest status and location for this vehicle
-                    try:
-                        latest_status = Status.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
-                    except Exception:
-                        latest_status = None
-                    
-                    try:
-                        latest_location = Location.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
-                    except Exception:
-                        latest_location = None
-                    
-                    # Calculate vehicle state
-                    vehicle_state = VehicleStateService.get_vehicle_state(
-                        vehicle, 
-                        latest_status=latest_status, 
-                        latest_location=latest_location
-                    )
-                    
-                    # Add to filtered list if state matches
-                    if vehicle_state == target_state:
-                        filtered_vehicles.append(vehicle)
-                
-                vehicles_list = filtered_vehicles
+                all_vehicles = VehicleStateService.filter_by_state(all_vehicles, target_state)
         
-        # Create paginator with filtered vehicles
-        paginator = Paginator(vehicles_list, page_size)
+        # Paginate in the database, only the requested page is loaded
+        paginator = Paginator(all_vehicles.order_by('id'), page_size)
         
         # Get the requested page
         try:
@@ -1907,6 +1839,9 @@ def get_vehicles_paginated(request):
             return error_response('Invalid page number', HTTP_STATUS['BAD_REQUEST'])
         
         vehicles_data = []
+        # Latest status/location for all vehicles in one batch (cache first, then DB)
+        latest_states = LatestStateService.get_many([vehicle.imei for vehicle in page_obj])
+        today_kms = DailyOdometerService.get_today_km_many([vehicle.imei for vehicle in page_obj])
         for vehicle in page_obj:
             # Check if vehicle is expired and deactivate if needed
             if vehicle.expireDate and vehicle.expireDate <= datetime.now() and vehicle.is_active:
@@ -2028,11 +1963,11 @@ def get_vehicles_paginated(request):
                 sim_balance = None
             
             # Calculate today's km
-            today_km = calculate_today_km(vehicle.imei)
+            today_km = today_kms.get(vehicle.imei, 0.0)
             
             # Get latest status
             try:
-                latest_status_obj = Status.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_status_obj = latest_states[vehicle.imei]['status']
                 latest_status = {
                     'id': latest_status_obj.id,
                     'imei': latest_status_obj.imei,
@@ -2049,7 +1984,7 @@ def get_vehicles_paginated(request):
             
             # Get latest location
             try:
-                latest_location_obj = Location.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_location_obj = latest_states[vehicle.imei]['location']
                 latest_location = {
                     'id': latest_location_obj.id,
                     'imei': latest_location_obj.imei,
@@ -2168,59 +2103,23 @@ def get_vehicles_filtered(request):
             # Exclude school bus vehicles for parents (they access via school bus endpoints)
             all_vehicles = exclude_school_bus_for_parents(all_vehicles, user)
         
-        # Convert queryset to list for filtering
-        vehicles_list = list(all_vehicles)
+        # Vehicle count per state for the filter badges, from the current state table
+        state_counts = VehicleStateService.count_by_state(all_vehicles)
+        state_counts = {
+            name: state_counts[VehicleStateService.map_filter_name_to_state(name)] if name != 'All' else sum(state_counts.values())
+            for name in valid_filters
+        }
         
-        # Filter by state (even if 'All', we still process it for consistency)
+        # Filter by state in the database (see VehicleStateService.filter_by_state)
         if filter_param != 'All':
             # Map filter name to state value
             target_state = VehicleStateService.map_filter_name_to_state(filter_param)
             
             if target_state is not None:
-                # Filter vehicles by state
-                filtered_vehicles = []
-                logger = logging.getLogger(__name__)
-                
-                for vehicle in vehicles_list:
-                    # Defensive check: skip vehicles without IMEI
-                    if not vehicle or not hasattr(vehicle, 'imei') or not vehicle.imei:
-                        logger.warning(f"Skipping vehicle without IMEI: {vehicle}")
-                        continue
-                    
-                    # Get latest status and location for this vehicle
-                    try:
-                        latest_status = Status.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
-                    except Exception as e:
-                        logger.error(f"Error fetching status for vehicle {vehicle.imei}: {e}")
-                        latest_status = None
-                    
-                    try:
-                        latest_location = Location.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
-                    except Exception as e:
-                        logger.error(f"Error fetching location for vehicle {vehicle.imei}: {e}")
-                        latest_location = None
-                    
-                    # Calculate vehicle state with error handling
-                    try:
-                        vehicle_state = VehicleStateService.get_vehicle_state(
-                            vehicle, 
-                            latest_status=latest_status, 
-                            latest_location=latest_location
-                        )
-                        
-                        # Add to filtered list if state matches
-                        if vehicle_state == target_state:
-                            filtered_vehicles.append(vehicle)
-                    except Exception as e:
-                        # Log error but continue processing other vehicles
-                        logger.error(f"Error calculating state for vehicle {vehicle.imei}: {e}", exc_info=True)
-                        # Skip this vehicle and continue with next
-                        continue
-                
-                vehicles_list = filtered_vehicles
+                all_vehicles = VehicleStateService.filter_by_state(all_vehicles, target_state)
         
-        # Create paginator with filtered vehicles
-        paginator = Paginator(vehicles_list, page_size)
+        # Paginate in the database, only the requested page is loaded
+        paginator = Paginator(all_vehicles.order_by('id'), page_size)
         
         # Get the requested page
         try:
@@ -2229,6 +2128,9 @@ def get_vehicles_filtered(request):
             return error_response('Invalid page number', HTTP_STATUS['BAD_REQUEST'])
         
         vehicles_data = []
+        # Latest status/location for all vehicles in one batch (cache first, then DB)
+        latest_states = LatestStateService.get_many([vehicle.imei for vehicle in page_obj])
+        today_kms = DailyOdometerService.get_today_km_many([vehicle.imei for vehicle in page_obj])
         for vehicle in page_obj:
             # Check if vehicle is expired and deactivate if needed
             if vehicle.expireDate and vehicle.expireDate <= datetime.now() and vehicle.is_active:
@@ -2352,11 +2254,11 @@ def get_vehicles_filtered(request):
                 sim_balance = None
             
             # Calculate today's km
-            today_km = calculate_today_km(vehicle.imei)
+            today_km = today_kms.get(vehicle.imei, 0.0)
             
             # Get latest status
             try:
-                latest_status_obj = Status.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_status_obj = latest_states[vehicle.imei]['status']
                 latest_status = {
                     'id': latest_status_obj.id,
                     'imei': latest_status_obj.imei,
@@ -2373,7 +2275,7 @@ def get_vehicles_filtered(request):
             
             # Get latest location
             try:
-                latest_location_obj = Location.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_location_obj = latest_states[vehicle.imei]['location']
                 latest_location = {
                     'id': latest_location_obj.id,
                     'imei': latest_location_obj.imei,
@@ -2439,7 +2341,8 @@ def get_vehicles_filtered(request):
         
         response_data = {
             'vehicles': vehicles_data,
-            'pagination': pagination_info
+            'pagination': pagination_info,
+            'state_counts': state_counts
         }
         
         return success_response(response_data, 'Filtered vehicles retrieved successfully')
@@ -2538,6 +2441,9 @@ def search_vehicles(request):
             return error_response('Invalid page number', HTTP_STATUS['BAD_REQUEST'])
         
         vehicles_data = []
+        # Latest status/location for all vehicles in one batch (cache first, then DB)
+        latest_states = LatestStateService.get_many([vehicle.imei for vehicle in page_obj])
+        today_kms = DailyOdometerService.get_today_km_many([vehicle.imei for vehicle in page_obj])
         for vehicle in page_obj:
             # Get all users with access to this vehicle
             user_vehicles = []
@@ -2640,11 +2546,11 @@ def search_vehicles(request):
                 sim_balance = None
             
             # Calculate today's km
-            today_km = calculate_today_km(vehicle.imei)
+            today_km = today_kms.get(vehicle.imei, 0.0)
             
             # Get latest status
             try:
-                latest_status_obj = Status.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_status_obj = latest_states[vehicle.imei]['status']
                 latest_status = {
                     'id': latest_status_obj.id,
                     'imei': latest_status_obj.imei,
@@ -2661,7 +2567,7 @@ def search_vehicles(request):
             
             # Get latest location
             try:
-                latest_location_obj = Location.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_location_obj = latest_states[vehicle.imei]['location']
                 latest_location = {
                     'id': latest_location_obj.id,
                     'imei': latest_location_obj.imei,
@@ -2802,6 +2708,9 @@ def search_vehicles_by_expire(request):
             return error_response('Invalid page number', HTTP_STATUS['BAD_REQUEST'])
         
         vehicles_data = []
+        # Latest status/location for all vehicles in one batch (cache first, then DB)
+        latest_states = LatestStateService.get_many([vehicle.imei for vehicle in page_obj])
+        today_kms = DailyOdometerService.get_today_km_many([vehicle.imei for vehicle in page_obj])
         for vehicle in page_obj:
             # Get all users with access to this vehicle
             user_vehicles = []
@@ -2904,11 +2813,11 @@ def search_vehicles_by_expire(request):
                 sim_balance = None
             
             # Calculate today's km
-            today_km = calculate_today_km(vehicle.imei)
+            today_km = today_kms.get(vehicle.imei, 0.0)
             
             # Get latest status
             try:
-                latest_status_obj = Status.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_status_obj = latest_states[vehicle.imei]['status']
                 latest_status = {
                     'id': latest_status_obj.id,
                     'imei': latest_status_obj.imei,
@@ -2925,7 +2834,7 @@ def search_vehicles_by_expire(request):
             
             # Get latest location
             try:
-                latest_location_obj = Location.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_location_obj = latest_states[vehicle.imei]['location']
                 latest_location = {
                     'id': latest_location_obj.id,
                     'imei': latest_location_obj.imei,
@@ -3052,6 +2961,9 @@ def search_vehicles_by_vehicle_type(request):
             return error_response('Invalid page number', HTTP_STATUS['BAD_REQUEST'])
         
         vehicles_data = []
+        # Latest status/location for all vehicles in one batch (cache first, then DB)
+        latest_states = LatestStateService.get_many([vehicle.imei for vehicle in page_obj])
+        today_kms = DailyOdometerService.get_today_km_many([vehicle.imei for vehicle in page_obj])
         for vehicle in page_obj:
             # Get all users with access to this vehicle
             user_vehicles = []
@@ -3154,11 +3066,11 @@ def search_vehicles_by_vehicle_type(request):
                 sim_balance = None
             
             # Calculate today's km
-            today_km = calculate_today_km(vehicle.imei)
+            today_km = today_kms.get(vehicle.imei, 0.0)
             
             # Get latest status
             try:
-                latest_status_obj = Status.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_status_obj = latest_states[vehicle.imei]['status']
                 latest_status = {
                     'id': latest_status_obj.id,
                     'imei': latest_status_obj.imei,
@@ -3175,7 +3087,7 @@ def search_vehicles_by_vehicle_type(request):
             
             # Get latest location
             try:
-                latest_location_obj = Location.objects.filter(imei=vehicle.imei).order_by('-createdAt').first()
+                latest_location_obj = latest_states[vehicle.imei]['location']
                 latest_location = {
                     'id': latest_location_obj.id,
                     'imei': latest_location_obj.imei,
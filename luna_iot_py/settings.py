@@ -261,6 +261,18 @@ TINGTING_API_BASE_URL = 'https://app.tingting.io/api/v1'
 TCP_SERVICE_PUBLIC_IP = '82.180.145.220'
 TCP_SERVICE_JT808_PORT = 6665
 TCP_SERVICE_JT1078_PORT = 6664
+# Live video frames per fMP4 fragment, 0 = one GOP per fragment (lower overhead, +1 GOP latency)
+TCP_SERVICE_VIDEO_FRAMES_PER_FRAGMENT = int(os.getenv('TCP_SERVICE_VIDEO_FRAMES_PER_FRAGMENT', '1'))
+# Record live streams to hourly fMP4 segment files under this directory, empty = off
+TCP_SERVICE_RECORDING_DIR = os.getenv('TCP_SERVICE_RECORDING_DIR', '')
+TCP_SERVICE_RECORDING_RETENTION_HOURS = int(os.getenv('TCP_SERVICE_RECORDING_RETENTION_HOURS', '168'))
+# Fragments waiting for the recorder thread, more are dropped until the stream's next keyframe
+TCP_SERVICE_RECORDING_QUEUE_SIZE = int(os.getenv('TCP_SERVICE_RECORDING_QUEUE_SIZE', '1000'))
+# Dashcam locations are written in batches: every FLUSH_MS or BATCH_SIZE reports,
+# device connections wait while QUEUE_SIZE reports are pending
+TCP_SERVICE_LOCATION_FLUSH_MS = int(os.getenv('TCP_SERVICE_LOCATION_FLUSH_MS', '200'))
+TCP_SERVICE_LOCATION_BATCH_SIZE = int(os.getenv('TCP_SERVICE_LOCATION_BATCH_SIZE', '500'))
+TCP_SERVICE_LOCATION_QUEUE_SIZE = int(os.getenv('TCP_SERVICE_LOCATION_QUEUE_SIZE', '10000'))
 
 # NCHL ConnectIPS Payment Gateway Configuration
 NCHL_MERCHANT_ID = os.getenv('NCHL_MERCHANT_ID', '3856')
@@ -338,6 +350,27 @@ CACHES = {
         'OPTIONS': {
             'MAX_ENTRIES': 1000
         }
+    },
+    # Latest location/status per IMEI, shared by all worker processes
+    'latest_state': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        'KEY_PREFIX': 'luna:latest',
+        'OPTIONS': {
+            'socket_connect_timeout': 1,
+            'socket_timeout': 1,
+        }
+    },
+    # Resolved user/roles/module access per (phone, token), shared so invalidations reach every worker.
+    # Same Redis db as latest_state, the key prefixes keep the two apart
+    'auth_context': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+        'KEY_PREFIX': 'luna:auth',
+        'OPTIONS': {
+            'socket_connect_timeout': 1,
+            'socket_timeout': 1,
+        }
     }
 }
 
@@ -356,6 +389,9 @@ CACHES = {
 CACHE_TIMEOUT_DASHBOARD_STATS = 300  # 5 minutes
 CACHE_TIMEOUT_SMS_BALANCE = 600  # 10 minutes
 CACHE_TIMEOUT_TODAY_KM = 120  # 2 minutes
+CACHE_TIMEOUT_TELEMETRY_DEVICE = 60  # 1 minute, per-process device lookup cache for bulk ingest
+CACHE_TIMEOUT_LATEST_STATE = 3600  # 1 hour, entries are written through on every location/status
+CACHE_TIMEOUT_AUTH_CONTEXT = 60  # 1 minute, also dropped by core.signals on token/role/module changes
 
 # Session Configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # Use database-backed sessions
@@ -20,9 +20,8 @@ from api_common.constants.api_constants import SUCCESS_MESSAGES, ERROR_MESSAGES,
 from api_common.decorators.response_decorators import api_response
 from api_common.decorators.auth_decorators import require_auth
 from api_common.exceptions.api_exceptions import NotFoundError
-from core.models import Module, InstituteModule
-from device.models import Location
-from device.models.status import Status
+from api_common.services.auth_context_service import AuthContextService
+from device.services.latest_state_service import LatestStateService
 
 
 def require_public_vehicle_module_access(model_class=None, id_param_name='id'):
@@ -50,23 +49,13 @@ def require_public_vehicle_module_access(model_class=None, id_param_name='id'):
                 )
             
             # Check if user is Super Admin - always allow
-            user_groups = request.user.groups.all()
-            user_role_names = [group.name for group in user_groups]
-            is_super_admin = 'Super Admin' in user_role_names
+            auth_context = AuthContextService.for_request(request)
+            is_super_admin = auth_context.is_super_admin
             
             if is_super_admin:
                 return view_func(request, *args, **kwargs)
             
             # For non-Super Admin users, check institute module access
-            try:
-                # Get the public-vehicle module
-                public_vehicle_module = Module.objects.get(slug='public-vehicle')
-            except Module.DoesNotExist:
-                return error_response(
-                    message='Public vehicle module not found',
-                    status_code=500
-                )
-            
             # Get institute_id(s) based on HTTP method
             institute_ids = []
             
@@ -115,11 +104,7 @@ def require_public_vehicle_module_access(model_class=None, id_param_name='id'):
             
             # Check if user has access to any of the institutes
             if institute_ids:
-                has_access = InstituteModule.objects.filter(
-                    module=public_vehicle_module,
-                    institute_id__in=institute_ids,
-                    users=request.user
-                ).exists()
+                has_access = auth_context.has_module_access('public-vehicle', institute_ids)
                 
                 if not has_access:
                     return error_response(
@@ -527,14 +512,15 @@ def get_all_public_vehicles_with_locations(request):
         print(f"Total IMEIs for location lookup: {len(all_imeis)}")
         
         # Get latest locations for all vehicles in one query
+        # Latest status/location for all IMEIs in one batch (cache first, then DB)
+        latest_states = LatestStateService.get_many(all_imeis) if all_imeis else {}
+        
         locations_dict = {}
         if all_imeis:
             print(f"=== FETCHING LOCATIONS ===")
             # Get latest location for each IMEI
             for imei in all_imeis:
-                latest_location = Location.objects.filter(
-                    imei=imei
-                ).order_by('-createdAt').first()
+                latest_location = latest_states.get(imei, {}).get('location')
                 
                 if latest_location:
                     locations_dict[imei] = {
@@ -561,7 +547,7 @@ def get_all_public_vehicles_with_locations(request):
             print(f"=== FETCHING STATUSES ===")
             # Get latest status for each IMEI
             for imei in all_imeis:
-                latest_status = Status.objects.filter(imei=imei).order_by('-createdAt').first()
+                latest_status = latest_states.get(imei, {}).get('status')
                 
                 if latest_status:
                     statuses_dict[imei] = {
@@ -21,9 +21,8 @@ from device.models import Device
 from device.models.location import Location
 from device.models.status import Status
 from fleet.services.vehicle_state_service import VehicleStateService
+from device.services.daily_odometer_service import DailyOdometerService
 from shared.models.recharge import Recharge
-from datetime import datetime
-import math
 
 
 @api_view(['GET'])
@@ -184,58 +183,12 @@ def get_school_parents_by_bus(request, bus_id):
         )
 
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """
-    Calculate distance between two points using Haversine formula
-    Returns distance in kilometers
-    """
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1_rad = math.radians(float(lat1))
-    lon1_rad = math.radians(float(lon1))
-    lat2_rad = math.radians(float(lat2))
-    lon2_rad = math.radians(float(lon2))
-    
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    return R * c
-
-
 def calculate_today_km(imei):
     """
-    Calculate today's kilometers for a vehicle based on location data
+    Get today's kilometers for a vehicle from its daily odometer summary
     """
     try:
-        today = datetime.now().date()
-        start_of_day = datetime.combine(today, datetime.min.time())
-        end_of_day = datetime.combine(today, datetime.max.time())
-        
-        # Get today's location data ordered by time
-        locations = Location.objects.filter(
-            imei=imei,
-            createdAt__gte=start_of_day,
-            createdAt__lte=end_of_day
-        ).order_by('createdAt')
-        
-        if len(locations) < 2:
-            return 0.0
-        
-        total_distance = 0.0
-        for i in range(1, len(locations)):
-            prev_loc = locations[i-1]
-            curr_loc = locations[i]
-            
-            distance = calculate_distance(
-                prev_loc.latitude, prev_loc.longitude,
-                curr_loc.latitude, curr_loc.longitude
-            )
-            total_distance += distance
-        
-        return round(total_distance, 2)
+        return DailyOdometerService.get_today_km(imei)
     except Exception as e:
         print(f"Error calculating today's km for {imei}: {e}")
         return 0.0
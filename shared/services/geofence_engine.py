@@ -0,0 +1,249 @@
+"""
+Geofence Engine
+
+Point-in-geofence lookups shared by alerts (AlertGeofence), radar token
+matching and the vehicle geofences (shared.models.Geofence).
+
+Boundaries are parsed once into prepared polygons: flat float arrays
+(lng, lat, lng, lat, ...) per ring with bounding boxes, holes of Polygon and
+MultiPolygon boundaries excluded. Prepared polygons are cached per process,
+keyed by geofence id + updated time, so a geofence is only re-parsed after it
+was edited. The geofences of a scope (e.g. an institute) are put in a grid
+index, locate() then only ray-casts the geofences whose cell and bounding box
+contain the point.
+
+Supported boundary formats:
+    GeoJSON Polygon / MultiPolygon ([lng, lat] positions, first ring exterior, others holes)
+    Legacy list of "lat,lng" strings or [lat, lng] pairs (vehicle geofences)
+"""
+import logging
+import math
+import threading
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+from shared.models import Geofence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRID_CELL_DEGREES = 0.05
+# Geofences covering more cells are kept in a list checked by bounding box only
+MAX_CELLS_PER_GEOFENCE = 4096
+
+BBox = Tuple[float, float, float, float]
+
+
+def _ring(points) -> Optional[array]:
+    """Flat lng/lat array of a ring, None with fewer than 3 points."""
+    ring = array('d')
+    for lng, lat in points:
+        ring.append(lng)
+        ring.append(lat)
+    return ring if len(ring) >= 6 else None
+
+
+def _geojson_ring(positions):
+    return ((float(position[0]), float(position[1]))
+            for position in positions if isinstance(position, (list, tuple)) and len(position) >= 2)
+
+
+def _legacy_points(boundary):
+    for point in boundary:
+        if isinstance(point, str) and ',' in point:
+            parts = point.split(',')
+            if len(parts) == 2:
+                yield float(parts[1].strip()), float(parts[0].strip())
+        elif isinstance(point, (list, tuple)) and len(point) == 2:
+            yield float(point[1]), float(point[0])
+
+
+def parse_boundary(boundary) -> List[List[array]]:
+    """
+    Parse a boundary into polygons, each a list of rings (exterior first, then holes).
+
+    Raises:
+        ValueError: unknown GeoJSON type or malformed coordinates
+    """
+    if not boundary:
+        return []
+
+    if isinstance(boundary, dict):
+        geometry_type = boundary.get('type')
+        if geometry_type == 'Polygon':
+            polygons = [boundary.get('coordinates') or []]
+        elif geometry_type == 'MultiPolygon':
+            polygons = boundary.get('coordinates') or []
+        else:
+            raise ValueError(f"Unknown GeoJSON type: {geometry_type}")
+
+        parsed = []
+        for polygon in polygons:
+            rings = [_ring(_geojson_ring(positions)) for positions in polygon or []]
+            # A polygon without a valid exterior ring covers nothing
+            if rings and rings[0] is not None:
+                parsed.append([rings[0]] + [ring for ring in rings[1:] if ring is not None])
+        return parsed
+
+    exterior = _ring(_legacy_points(boundary)) if isinstance(boundary, list) else None
+    return [[exterior]] if exterior is not None else []
+
+
+def _bbox(ring: array) -> BBox:
+    xs = ring[0::2]
+    ys = ring[1::2]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _in_bbox(bbox: BBox, x: float, y: float) -> bool:
+    return bbox[0] <= x <= bbox[2] and bbox[1] <= y <= bbox[3]
+
+
+def _ring_contains(ring: array, x: float, y: float) -> bool:
+    """Even-odd ray casting over a flat lng/lat ring."""
+    inside = False
+    xj, yj = ring[-2], ring[-1]
+    for i in range(0, len(ring), 2):
+        xi, yi = ring[i], ring[i + 1]
+        if ((yi > y) != (yj > y)) and (x < (xj - xi) * (y - yi) / (yj - yi) + xi):
+            inside = not inside
+        xj, yj = xi, yi
+    return inside
+
+
+class PreparedGeofence:
+    """Parsed boundary of one geofence."""
+
+    __slots__ = ('id', 'polygons', 'bbox')
+
+    def __init__(self, geofence_id, polygons: List[List[array]]):
+        self.id = geofence_id
+        # (bbox of the exterior, exterior, holes)
+        self.polygons = [(_bbox(rings[0]), rings[0], rings[1:]) for rings in polygons]
+        if self.polygons:
+            boxes = [polygon[0] for polygon in self.polygons]
+            self.bbox = (
+                min(box[0] for box in boxes), min(box[1] for box in boxes),
+                max(box[2] for box in boxes), max(box[3] for box in boxes),
+            )
+        else:
+            self.bbox = None
+
+    @classmethod
+    def from_boundary(cls, geofence_id, boundary) -> 'PreparedGeofence':
+        try:
+            polygons = parse_boundary(boundary)
+        except (ValueError, TypeError, IndexError) as e:
+            logger.error(f"Invalid boundary for geofence {geofence_id}: {e}")
+            polygons = []
+        return cls(geofence_id, polygons)
+
+    def contains(self, lat: float, lng: float) -> bool:
+        if self.bbox is None or not _in_bbox(self.bbox, lng, lat):
+            return False
+        for bbox, exterior, holes in self.polygons:
+            if _in_bbox(bbox, lng, lat) and _ring_contains(exterior, lng, lat) and \
+                    not any(_ring_contains(hole, lng, lat) for hole in holes):
+                return True
+        return False
+
+
+class GeofenceIndex:
+    """Uniform grid over the bounding boxes of a set of prepared geofences."""
+
+    def __init__(self, geofences: Sequence[PreparedGeofence], cell_size: float = DEFAULT_GRID_CELL_DEGREES):
+        self.cell_size = cell_size
+        self.geofences = [geofence for geofence in geofences if geofence.bbox is not None]
+        self._cells: Dict[Tuple[int, int], List[PreparedGeofence]] = {}
+        self._large: List[PreparedGeofence] = []
+
+        for geofence in self.geofences:
+            min_x, min_y, max_x, max_y = (self._cell(value) for value in geofence.bbox)
+            if (max_x - min_x + 1) * (max_y - min_y + 1) > MAX_CELLS_PER_GEOFENCE:
+                self._large.append(geofence)
+                continue
+            for cell_x in range(min_x, max_x + 1):
+                for cell_y in range(min_y, max_y + 1):
+                    self._cells.setdefault((cell_x, cell_y), []).append(geofence)
+
+    def _cell(self, value: float) -> int:
+        return math.floor(value / self.cell_size)
+
+    def locate(self, lat: float, lng: float) -> List:
+        """Ids of the geofences containing the point, in index order."""
+        try:
+            lat = float(lat)
+            lng = float(lng)
+        except (TypeError, ValueError):
+            return []
+        candidates = self._cells.get((self._cell(lng), self._cell(lat)), [])
+        if self._large:
+            candidates = candidates + self._large
+        return [geofence.id for geofence in candidates if geofence.contains(lat, lng)]
+
+
+class GeofenceEngine:
+    """
+    Cached geofence lookups for one model with a `boundary` JSON field.
+
+    index(**scope) returns the GeofenceIndex of model.objects.filter(**scope).
+    Each call reads only (id, updated time) of the scope to check the cached
+    index is current; boundaries are loaded for new or edited geofences only.
+    """
+
+    def __init__(self, model, updated_field: str, boundary_field: str = 'boundary'):
+        self.model = model
+        self.updated_field = updated_field
+        self.boundary_field = boundary_field
+        self._lock = threading.Lock()
+        # geofence id -> (updated time, PreparedGeofence)
+        self._prepared: Dict = {}
+        # scope -> (signature, GeofenceIndex)
+        self._indexes: Dict = {}
+
+    @staticmethod
+    def _cell_size() -> float:
+        return getattr(settings, 'GEOFENCE_GRID_CELL_DEGREES', DEFAULT_GRID_CELL_DEGREES)
+
+    def index(self, **scope) -> GeofenceIndex:
+        signature = tuple(
+            self.model.objects.filter(**scope).order_by('pk').values_list('pk', self.updated_field)
+        )
+        key = tuple(sorted(scope.items()))
+        cached = self._indexes.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        stale = [pk for pk, updated in signature if self._prepared.get(pk, (None,))[0] != updated]
+        if stale:
+            boundaries = self.model.objects.filter(pk__in=stale).values_list('pk', self.updated_field, self.boundary_field)
+            with self._lock:
+                for pk, updated, boundary in boundaries:
+                    self._prepared[pk] = (updated, PreparedGeofence.from_boundary(pk, boundary))
+
+        with self._lock:
+            if cached is not None:
+                # Forget geofences that left the scope and aren't used by another one
+                current = {pk for pk, _ in signature}
+                in_use = {pk for other_key, (other, _) in self._indexes.items() if other_key != key for pk, _ in other}
+                for pk, _ in cached[0]:
+                    if pk not in current and pk not in in_use:
+                        self._prepared.pop(pk, None)
+            geofences = [self._prepared[pk][1] for pk, _ in signature if pk in self._prepared]
+            index = GeofenceIndex(geofences, self._cell_size())
+            self._indexes[key] = (signature, index)
+        return index
+
+    def locate(self, lat: float, lng: float, **scope) -> List:
+        """Ids of the geofences of the scope containing the point."""
+        return self.index(**scope).locate(lat, lng)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._prepared.clear()
+            self._indexes.clear()
+
+
+# Vehicle geofences (GeofenceVehicle links them to vehicles)
+vehicle_geofence_engine = GeofenceEngine(Geofence, 'updatedAt')
@@ -0,0 +1,85 @@
+from django.test import TestCase
+from shared.models import Geofence
+from shared.services.geofence_engine import GeofenceEngine, GeofenceIndex, PreparedGeofence
+from shared_utils.constants import GeofenceType
+
+
+def square(min_lng, min_lat, max_lng, max_lat):
+    """GeoJSON ring ([lng, lat] positions, closed)"""
+    return [[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]]
+
+
+class PreparedGeofenceTest(TestCase):
+    def test_polygon_hole_excluded(self):
+        """Test a point in the hole of a Polygon is outside"""
+        geofence = PreparedGeofence.from_boundary(1, {
+            'type': 'Polygon', 'coordinates': [square(85.0, 27.0, 86.0, 28.0), square(85.4, 27.4, 85.6, 27.6)]
+        })
+        self.assertTrue(geofence.contains(27.2, 85.2))
+        self.assertFalse(geofence.contains(27.5, 85.5))
+        self.assertFalse(geofence.contains(28.5, 85.5))
+
+    def test_every_multipolygon_part(self):
+        """Test every polygon of a MultiPolygon counts, not only the first one"""
+        geofence = PreparedGeofence.from_boundary(1, {
+            'type': 'MultiPolygon',
+            'coordinates': [[square(80.0, 20.0, 81.0, 21.0)], [square(85.0, 27.0, 86.0, 28.0)]],
+        })
+        self.assertTrue(geofence.contains(20.5, 80.5))
+        self.assertTrue(geofence.contains(27.5, 85.5))
+
+    def test_legacy_lat_lng_strings(self):
+        """Test vehicle geofence boundaries ("lat,lng" strings)"""
+        geofence = PreparedGeofence.from_boundary(1, ['27.0,85.0', '27.0,86.0', '28.0,86.0', '28.0,85.0'])
+        self.assertTrue(geofence.contains(27.5, 85.5))
+        self.assertFalse(geofence.contains(85.5, 27.5))
+
+    def test_invalid_boundary_matches_nothing(self):
+        """Test unknown or too short boundaries never match"""
+        index = GeofenceIndex([
+            PreparedGeofence.from_boundary(1, {'type': 'Point', 'coordinates': [85.0, 27.0]}),
+            PreparedGeofence.from_boundary(2, ['27.0,85.0', '27.1,85.1']),
+        ])
+        self.assertEqual(index.locate(27.0, 85.0), [])
+
+    def test_grid_and_large_geofences(self):
+        """Test geofences indexed by cell and geofences too large for the grid are both found"""
+        index = GeofenceIndex([
+            PreparedGeofence.from_boundary(1, {'type': 'Polygon', 'coordinates': [square(85.3, 27.7, 85.32, 27.72)]}),
+            PreparedGeofence.from_boundary(2, {'type': 'Polygon', 'coordinates': [square(80.0, 26.0, 88.0, 30.0)]}),
+        ], cell_size=0.01)
+        self.assertEqual(sorted(index.locate(27.71, 85.31)), [1, 2])
+        self.assertEqual(index.locate(29.0, 81.0), [2])
+        self.assertEqual(index.locate(10.0, 10.0), [])
+
+
+class GeofenceEngineTest(TestCase):
+    def setUp(self):
+        self.engine = GeofenceEngine(Geofence, 'updatedAt')
+        self.inner = Geofence.objects.create(
+            title='Inner', type=GeofenceType.ENTRY, boundary=['27.0,85.0', '27.0,86.0', '28.0,86.0', '28.0,85.0']
+        )
+        self.outer = Geofence.objects.create(
+            title='Outer', type=GeofenceType.EXIT, boundary={'type': 'Polygon', 'coordinates': [square(84.0, 26.0, 87.0, 29.0)]}
+        )
+
+    def test_locate_scoped(self):
+        """Test locate only returns geofences of the scope"""
+        self.assertEqual(sorted(self.engine.locate(27.5, 85.5)), sorted([self.inner.id, self.outer.id]))
+        self.assertEqual(self.engine.locate(27.5, 85.5, type=GeofenceType.EXIT), [self.outer.id])
+        self.assertEqual(self.engine.locate(26.5, 84.5, type=GeofenceType.ENTRY), [])
+
+    def test_cached_until_edited(self):
+        """Test boundaries are parsed once and re-parsed after an edit"""
+        self.engine.locate(27.5, 85.5)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.engine.locate(27.5, 85.5)), 2)
+
+        self.inner.boundary = ['30.0,85.0', '30.0,86.0', '31.0,86.0', '31.0,85.0']
+        self.inner.save()
+        self.assertEqual(self.engine.locate(27.5, 85.5), [self.outer.id])
+        self.assertEqual(self.engine.locate(30.5, 85.5), [self.inner.id])
+
+        self.outer.delete()
+        self.assertEqual(self.engine.locate(27.5, 85.5), [])
+        self.assertNotIn(self.outer.id, self.engine._prepared)
@@ -8,6 +8,8 @@ from abc import ABC, abstractmethod
 from typing import Optional, Dict, Any
 from datetime import datetime
 from asgiref.sync import sync_to_async
+from cachetools import TTLCache
+from django.conf import settings
 from django.db.models import Q
 
 from device.models import Device
@@ -18,6 +20,13 @@ logger = logging.getLogger(__name__)
 class BaseHandler(ABC):
     """Abstract base class for JT808 message handlers."""
     
+    # Per-process device existence cache shared by all handlers, every
+    # message of a device is validated
+    _device_exists_cache = TTLCache(
+        maxsize=getattr(settings, 'TELEMETRY_DEVICE_CACHE_SIZE', 50000),
+        ttl=getattr(settings, 'CACHE_TIMEOUT_TELEMETRY_DEVICE', 60),
+    )
+    
     def __init__(self, device_manager=None):
         """
         Initialize handler with optional device manager.
@@ -74,12 +83,18 @@ class BaseHandler(ABC):
         Returns:
             True if device exists, False otherwise
         """
+        exists = self._device_exists_cache.get(identifier)
+        if exists is not None:
+            return exists
+        
+        # Read-only lookup, runs in the thread pool instead of the shared thread
         exists = await sync_to_async(
             Device.objects.filter(
                 Q(serial_number=identifier) | Q(imei=identifier)
             ).exists,
-            thread_sensitive=True
+            thread_sensitive=False
         )()
+        self._device_exists_cache[identifier] = exists
         if not exists:
             logger.warning(f"[{self.__class__.__name__}] Device NOT REGISTERED: {identifier}")
         return exists
@@ -8,6 +8,7 @@ import logging
 from typing import Optional, Dict, Any
 
 from .base_handler import BaseHandler
+from ..services.location_writer import LocationWriter
 from ..protocol.jt808_parser import build_general_response, parse_location_report
 from ..protocol.constants import JT808MsgID, JT808ResponseResult
 
@@ -22,8 +23,20 @@ class LocationHandler(BaseHandler):
     This handler implements deduplication logic similar to the Node.js GT06 handler:
     - If location data changed: INSERT new record
     - If location data same: UPDATE only updated_at timestamp
+    Rows are written in batches by a LocationWriter.
     """
     
+    def __init__(self, device_manager=None, location_writer: Optional[LocationWriter] = None):
+        """
+        Initialize handler.
+        
+        Args:
+            device_manager: DeviceManager instance for tracking connections
+            location_writer: Write-behind queue for locations (default: a new one)
+        """
+        super().__init__(device_manager)
+        self.location_writer = location_writer or LocationWriter()
+    
     async def handle(self, message: Dict[str, Any], writer=None) -> Optional[bytes]:
         """
         Handle location report.
@@ -71,26 +84,16 @@ class LocationHandler(BaseHandler):
     
     async def _save_location(self, phone: str, location_data: Dict[str, Any]) -> None:
         """
-        Save location data with deduplication.
+        Queue location data for the write-behind LocationWriter.
         
-        Following the Node.js GT06 handler pattern:
-        - Fetch latest location from database
-        - Compare all fields
-        - If different: INSERT new record
+        Deduplication follows the Node.js GT06 handler pattern:
+        - If different from the device's last point: INSERT new record
         - If same: UPDATE only updated_at timestamp
+        The writer compares with the last point in memory and writes in batches.
         """
         try:
-            from asgiref.sync import sync_to_async
-            from ..models import DashcamLocation
-            
             nepal_time = self.get_nepal_datetime()
             
-            # Fetch latest location for comparison
-            latest = await sync_to_async(
-                lambda: DashcamLocation.objects.filter(imei=phone).order_by('-created_at').first(),
-                thread_sensitive=True
-            )()
-            
             # Prepare new location data
             new_data = {
                 'latitude': location_data['latitude'],
@@ -102,28 +105,8 @@ class LocationHandler(BaseHandler):
                 'status_flags': location_data['status_flags'],
             }
             
-            # Check if data changed (deduplication)
-            should_insert = True
-            if latest:
-                should_insert = not self._locations_equal(latest, new_data)
-            
-            if should_insert:
-                # Data changed - insert new record
-                await sync_to_async(
-                    DashcamLocation.objects.create,
-                    thread_sensitive=True
-                )(
-                    imei=phone,
-                    **new_data
-                )
-                logger.debug(f"[LOCATION] Inserted new location for {phone}")
-            else:
-                # Data same - update timestamp only
-                await sync_to_async(
-                    lambda: DashcamLocation.objects.filter(id=latest.id).update(updated_at=nepal_time),
-                    thread_sensitive=True
-                )()
-                logger.debug(f"[LOCATION] Updated timestamp for {phone}")
+            # Waits while the writer's queue is full (backpressure on this connection)
+            await self.location_writer.submit(phone, new_data, nepal_time)
             
             # Update device manager with current location
             if self.device_manager:
@@ -135,19 +118,6 @@ class LocationHandler(BaseHandler):
         except Exception as e:
             logger.error(f"[LOCATION] Failed to save for {phone}: {e}")
     
-    def _locations_equal(self, latest, new_data: Dict) -> bool:
-        """Check if two locations are equal (for deduplication)."""
-        try:
-            return (
-                abs(float(latest.latitude) - float(new_data['latitude'])) < 0.000001 and
-                abs(float(latest.longitude) - float(new_data['longitude'])) < 0.000001 and
-                abs(float(latest.speed) - float(new_data['speed'])) < 0.1 and
-                int(latest.direction) == int(new_data['direction']) and
-                int(latest.altitude) == int(new_data['altitude'])
-            )
-        except Exception:
-            return False
-    
     async def _trigger_notifications(self, phone: str, location_data: Dict[str, Any]) -> None:
         """
         Trigger notification services (non-blocking).
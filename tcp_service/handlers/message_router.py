@@ -24,12 +24,13 @@ class MessageRouter:
     and dispatches incoming messages accordingly.
     """
     
-    def __init__(self, device_manager=None):
+    def __init__(self, device_manager=None, location_writer=None):
         """
         Initialize router with handlers.
         
         Args:
             device_manager: DeviceManager instance for tracking connections
+            location_writer: LocationWriter for location reports (default: a new one)
         """
         self.device_manager = device_manager
         
@@ -38,7 +39,7 @@ class MessageRouter:
             JT808MsgID.TERMINAL_REGISTRATION: RegistrationHandler(device_manager),
             JT808MsgID.TERMINAL_AUTH: AuthHandler(device_manager),
             JT808MsgID.TERMINAL_HEARTBEAT: HeartbeatHandler(device_manager),
-            JT808MsgID.LOCATION_REPORT: LocationHandler(device_manager),
+            JT808MsgID.LOCATION_REPORT: LocationHandler(device_manager, location_writer),
         }
         
         # Message IDs that don't need a response
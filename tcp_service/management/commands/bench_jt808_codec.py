@@ -0,0 +1,201 @@
+"""
+Django Management Command to Benchmark JT808 Byte Codecs
+
+Runs synthetic JT808 frames through escape/unescape, the XOR checksum and the
+BCD phone codec, once with the old per-byte loops and once with the current
+jt808_parser functions, checks both give identical output and reports
+per-frame throughput. Runs in memory.
+Run with: python manage.py bench_jt808_codec [--frames 20000]
+"""
+import random
+import struct
+import time
+
+from django.core.management.base import BaseCommand
+
+from tcp_service.protocol.jt808_parser import (
+    calculate_checksum,
+    encode_bcd,
+    escape_data,
+    parse_bcd,
+    unescape_data,
+)
+
+
+def legacy_escape_data(data):
+    result = bytearray()
+    for b in data:
+        if b == 0x7E:
+            result.extend([0x7D, 0x02])
+        elif b == 0x7D:
+            result.extend([0x7D, 0x01])
+        else:
+            result.append(b)
+    return bytes(result)
+
+
+def legacy_unescape_data(data):
+    result = bytearray()
+    i = 0
+    while i < len(data):
+        if data[i] == 0x7D and i + 1 < len(data):
+            if data[i + 1] == 0x02:
+                result.append(0x7E)
+                i += 2
+            elif data[i + 1] == 0x01:
+                result.append(0x7D)
+                i += 2
+            else:
+                result.append(data[i])
+                i += 1
+        else:
+            result.append(data[i])
+            i += 1
+    return bytes(result)
+
+
+def legacy_calculate_checksum(data):
+    checksum = 0
+    for b in data:
+        checksum ^= b
+    return checksum
+
+
+def legacy_parse_bcd(data):
+    result = ""
+    for b in data:
+        result += f"{(b >> 4) & 0x0F}{b & 0x0F}"
+    return result.lstrip("0") or "0"
+
+
+def legacy_encode_bcd(number, length=6):
+    number = number.zfill(length * 2)
+    result = bytearray()
+    for i in range(0, len(number), 2):
+        high = int(number[i]) if i < len(number) else 0
+        low = int(number[i + 1]) if i + 1 < len(number) else 0
+        result.append((high << 4) | low)
+    return bytes(result)
+
+
+CODECS = {
+    'legacy': (legacy_escape_data, legacy_unescape_data, legacy_calculate_checksum,
+               legacy_parse_bcd, legacy_encode_bcd),
+    'current': (escape_data, unescape_data, calculate_checksum, parse_bcd, encode_bcd),
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark JT808 escape/unescape, checksum and BCD codecs (per-frame throughput)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--frames',
+            type=int,
+            default=20000,
+            help='Number of synthetic frames (default: 20000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Timing runs, the fastest is reported (default: 5)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        messages = [self._message(rng) for _ in range(options['frames'])]
+        wire_frames = [legacy_escape_data(message) for message in messages]
+        phones = [message[4:10] for message in messages]
+        phone_digits = [legacy_parse_bcd(phone).zfill(12) for phone in phones]
+
+        # (name, function index in CODECS, inputs)
+        stages = (
+            ('unescape_data', 1, wire_frames),
+            ('calculate_checksum', 2, messages),
+            ('parse_bcd', 3, phones),
+            ('escape_data', 0, messages),
+            ('encode_bcd', 4, phone_digits),
+        )
+        for name, index, inputs in stages:
+            legacy_function, current_function = CODECS['legacy'][index], CODECS['current'][index]
+            if [legacy_function(item) for item in inputs] != [current_function(item) for item in inputs]:
+                self.stdout.write(self.style.ERROR(f'{name}: outputs differ'))
+                return
+            legacy_time = self._best(lambda: [legacy_function(item) for item in inputs], options['repeat'])
+            current_time = self._best(lambda: [current_function(item) for item in inputs], options['repeat'])
+            self.stdout.write(
+                f'{name}: legacy {legacy_time * 1e6 / len(inputs):.2f} us, '
+                f'current {current_time * 1e6 / len(inputs):.2f} us per frame, '
+                f'{legacy_time / current_time:.1f}x'
+            )
+
+        outputs = {}
+        timings = {}
+        for label, codec in CODECS.items():
+            outputs[label] = (self._decode(codec, wire_frames), self._encode(codec, messages))
+            timings[label] = (
+                self._best(lambda: self._decode(codec, wire_frames), options['repeat']),
+                self._best(lambda: self._encode(codec, messages), options['repeat']),
+            )
+            decode_time, encode_time = timings[label]
+            self.stdout.write(
+                f'{label} frame path: decode {len(messages) / decode_time:,.0f} frames/s '
+                f'({decode_time * 1e6 / len(messages):.2f} us/frame), '
+                f'encode {len(messages) / encode_time:,.0f} frames/s '
+                f'({encode_time * 1e6 / len(messages):.2f} us/frame)'
+            )
+
+        if outputs['legacy'] != outputs['current']:
+            self.stdout.write(self.style.ERROR('Outputs differ between legacy and current codecs'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Outputs match, frame path speedup decode {timings['legacy'][0] / timings['current'][0]:.1f}x, "
+            f"encode {timings['legacy'][1] / timings['current'][1]:.1f}x"
+        ))
+
+    @staticmethod
+    def _best(run, repeat):
+        """Fastest of `repeat` runs in seconds."""
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    @staticmethod
+    def _decode(codec, wire_frames):
+        """Inbound path: unescape, verify checksum, read the phone from the header."""
+        _, unescape, checksum, parse_phone, _ = codec
+        decoded = []
+        for frame in wire_frames:
+            data = unescape(frame)
+            decoded.append((checksum(data[:-1]) == data[-1], parse_phone(data[4:10])))
+        return decoded
+
+    @staticmethod
+    def _encode(codec, messages):
+        """Outbound path: encode the phone into the header, checksum and escape."""
+        escape, _, checksum, parse_phone, encode_phone = codec
+        encoded = []
+        for message in messages:
+            body = message[:4] + encode_phone(parse_phone(message[4:10]), 6) + message[10:-1]
+            encoded.append(escape(body + bytes([checksum(body)])))
+        return encoded
+
+    @staticmethod
+    def _message(rng):
+        """Unescaped location-report sized message with header, body and checksum."""
+        body = rng.randbytes(rng.randint(28, 160))
+        phone = ''.join(rng.choice('0123456789') for _ in range(12))
+        header = struct.pack('>HH', 0x0200, len(body)) + bytes.fromhex(phone) + struct.pack('>H', rng.randint(0, 65535))
+        message = header + body
+        return message + bytes([legacy_calculate_checksum(message)])
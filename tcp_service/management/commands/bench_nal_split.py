@@ -0,0 +1,155 @@
+"""
+Django Management Command to Benchmark Annex B NAL Splitting
+
+Splits synthetic HD H.264 frames (large I-frames, smaller P-frames) into NAL
+units, once with the old byte-by-byte scanner of VideoConverter and once with
+video.nal, checks both find the same NAL units, and reports CPU time per
+frame for splitting, for Annex B -> AVCC conversion and for the whole
+VideoConverter.add_nal_unit. Runs in memory.
+Run with: python manage.py bench_nal_split [--frames 250]
+"""
+import random
+import struct
+import time
+
+from django.core.management.base import BaseCommand
+
+from tcp_service.video.converter import VideoConverter
+from tcp_service.video.nal import annexb_to_avcc, split_nal_units
+
+START_CODE = b'\x00\x00\x00\x01'
+# x264 1280x720, High profile level 3.1, 25 fps
+SPS = bytes.fromhex('6764001facd9405005bb011000000300100000030320f1831960')
+PPS = bytes([0x68, 0xEB, 0xE3, 0xCB, 0x22, 0xC0])
+
+
+def legacy_split_nal_units(data):
+    """VideoConverter._split_nal_units before video.nal."""
+    nal_units = []
+    i = 0
+    while i < len(data) - 3:
+        start_code_len = 0
+        if data[i:i + 4] == b'\x00\x00\x00\x01':
+            start_code_len = 4
+        elif data[i:i + 3] == b'\x00\x00\x01':
+            start_code_len = 3
+        if start_code_len > 0:
+            nal_start = i + start_code_len
+            nal_end = legacy_find_next_start_code(data, nal_start)
+            if nal_end > nal_start:
+                nal_unit = data[nal_start:nal_end]
+                if len(nal_unit) > 0:
+                    nal_units.append(nal_unit)
+            i = nal_end
+        else:
+            i += 1
+    if not nal_units and len(data) > 0:
+        nal_units.append(data)
+    return nal_units
+
+
+def legacy_find_next_start_code(data, start):
+    i = start
+    while i < len(data) - 2:
+        if data[i:i + 3] == b'\x00\x00\x01':
+            if i > 0 and data[i - 1] == 0:
+                return i - 1
+            return i
+        i += 1
+    return len(data)
+
+
+def legacy_to_avcc(data):
+    """Split, then length-prefix each NAL unit as FMP4Builder did per sample."""
+    return b''.join(struct.pack('>I', len(nal)) + nal for nal in legacy_split_nal_units(data))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the Annex B NAL splitter (CPU per HD frame, old vs new)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--frames',
+            type=int,
+            default=250,
+            help='Frames to split, one I-frame per 25 (default: 250)'
+        )
+        parser.add_argument(
+            '--slices',
+            type=int,
+            default=1,
+            help='Slices (NAL units) per picture (default: 1)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per measurement, the best is reported (default: 3)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        frames = [self._frame(rng, index % 25 == 0, options['slices']) for index in range(options['frames'])]
+        i_frames = [frame for index, frame in enumerate(frames) if index % 25 == 0]
+        total_mb = sum(map(len, frames)) / 1e6
+        self.stdout.write(
+            f'{len(frames)} frames, {total_mb:.1f} MB, I-frames '
+            f'{sum(map(len, i_frames)) / len(i_frames) / 1024:.0f} KB mean'
+        )
+
+        for frame in frames[:30]:
+            if [bytes(nal) for nal in split_nal_units(frame)] != legacy_split_nal_units(frame):
+                raise AssertionError('video.nal and the legacy splitter disagree')
+            if annexb_to_avcc(frame) != legacy_to_avcc(frame):
+                raise AssertionError('annexb_to_avcc and the legacy conversion disagree')
+
+        cases = (
+            ('split, I-frames', i_frames, legacy_split_nal_units, split_nal_units),
+            ('split, all frames', frames, legacy_split_nal_units, split_nal_units),
+            ('Annex B -> AVCC, all frames', frames, legacy_to_avcc, annexb_to_avcc),
+        )
+        for label, data, legacy, current in cases:
+            before = self._best(lambda: [legacy(frame) for frame in data], options['repeat'])
+            after = self._best(lambda: [current(frame) for frame in data], options['repeat'])
+            self.stdout.write(
+                f'{label}: {before / len(data) * 1e6:,.0f} us/frame -> {after / len(data) * 1e6:,.1f} us/frame '
+                f'({before / after:,.0f}x)'
+            )
+
+        def convert():
+            converter = VideoConverter()
+            for frame in frames:
+                converter.add_nal_unit(frame)
+
+        elapsed = self._best(convert, options['repeat'])
+        self.stdout.write(
+            f'VideoConverter.add_nal_unit: {elapsed / len(frames) * 1e6:,.1f} us/frame, '
+            f'{total_mb / elapsed:,.0f} MB/s'
+        )
+
+    @staticmethod
+    def _best(run, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    @staticmethod
+    def _frame(rng, is_keyframe, slices):
+        """Annex B access unit: SPS + PPS before I-frames, `slices` slice NAL units."""
+        size = rng.randint(100_000, 300_000) if is_keyframe else rng.randint(10_000, 40_000)
+        parts = [START_CODE + SPS, START_CODE + PPS] if is_keyframe else []
+        for index in range(slices):
+            # Payload with emulation prevention applied: no 00 00 0x inside a NAL unit
+            payload = rng.randbytes(size // slices).replace(b'\x00\x00', b'\x00\x01')
+            header = bytes([0x65 if is_keyframe else 0x41, 0x88 if index == 0 else 0x1C])
+            parts.append(START_CODE + header + payload.rstrip(b'\x00'))
+        return b''.join(parts)
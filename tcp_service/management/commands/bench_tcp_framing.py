@@ -0,0 +1,185 @@
+"""
+Django Management Command to Benchmark TCP Frame Reassembly
+
+Feeds synthetic JT808 and JT1078 streams from many simulated dashcams through
+the shared framers and through the old `buffer += data` loops, and reports
+frames/sec and bytes copied per frame. Runs in memory, no sockets are opened.
+Run with: python manage.py bench_tcp_framing [--devices 1000]
+"""
+import random
+import struct
+import time
+
+from django.core.management.base import BaseCommand
+
+from tcp_service.protocol.constants import JT808_FLAG, JT1078_HEADER
+from tcp_service.protocol.jt1078_parser import find_packet_start, get_packet_size
+from tcp_service.tcp.framing import JT808Framer, JT1078Framer
+
+
+class LegacyJT808Buffer:
+    """The pre-framing JT808 loop, with copy accounting."""
+
+    def __init__(self):
+        self.buffer = b""
+        self.frames = 0
+        self.bytes_copied = 0
+
+    def frames_from(self, data):
+        self.bytes_copied += len(self.buffer) + len(data)
+        self.buffer += data
+        while len(self.buffer) >= 2:
+            start = self.buffer.find(bytes([JT808_FLAG]))
+            if start < 0:
+                self.buffer = b""
+                break
+            if start > 0:
+                self.buffer = self.buffer[start:]
+                self.bytes_copied += len(self.buffer)
+            end = self.buffer.find(bytes([JT808_FLAG]), 1)
+            if end < 0:
+                break
+            message_data = self.buffer[:end + 1]
+            self.buffer = self.buffer[end + 1:]
+            self.bytes_copied += len(message_data) + len(self.buffer)
+            self.frames += 1
+            yield message_data
+
+
+class LegacyJT1078Buffer:
+    """The pre-framing JT1078 loop, with copy accounting."""
+
+    def __init__(self):
+        self.buffer = b""
+        self.frames = 0
+        self.bytes_copied = 0
+
+    def packets_from(self, data):
+        self.bytes_copied += len(self.buffer) + len(data)
+        self.buffer += data
+        while len(self.buffer) >= 30:
+            header_pos = find_packet_start(self.buffer)
+            if header_pos < 0:
+                self.buffer = self.buffer[-3:] if len(self.buffer) > 3 else self.buffer
+                break
+            if header_pos > 0:
+                self.buffer = self.buffer[header_pos:]
+                self.bytes_copied += len(self.buffer)
+            if len(self.buffer) < 30:
+                break
+            packet_size = get_packet_size(self.buffer)
+            if packet_size == 0:
+                self.buffer = self.buffer[4:]
+                self.bytes_copied += len(self.buffer)
+                continue
+            if len(self.buffer) < packet_size:
+                break
+            packet_data = self.buffer[:packet_size]
+            self.buffer = self.buffer[packet_size:]
+            self.bytes_copied += len(packet_data) + len(self.buffer)
+            self.frames += 1
+            yield packet_data
+
+
+class Command(BaseCommand):
+    help = 'Benchmark JT808/JT1078 frame reassembly (frames/sec, bytes copied per frame)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--devices',
+            type=int,
+            default=1000,
+            help='Number of simulated dashcam connections (default: 1000)'
+        )
+        parser.add_argument(
+            '--jt808-frames',
+            type=int,
+            default=200,
+            help='JT808 messages per device (default: 200)'
+        )
+        parser.add_argument(
+            '--jt1078-packets',
+            type=int,
+            default=100,
+            help='JT1078 video packets per device (default: 100)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        devices = options['devices']
+
+        jt808_streams = [
+            self._chunk(self._jt808_stream(rng, options['jt808_frames']), rng, 4096)
+            for _ in range(devices)
+        ]
+        self._run('JT808', jt808_streams, LegacyJT808Buffer, JT808Framer, 'frames_from')
+
+        jt1078_streams = [
+            self._chunk(self._jt1078_stream(rng, options['jt1078_packets']), rng, 65536)
+            for _ in range(devices)
+        ]
+        self._run('JT1078', jt1078_streams, LegacyJT1078Buffer, JT1078Framer, 'packets_from')
+
+    def _run(self, name, streams, legacy_class, framer_class, method):
+        results = {}
+        for label, buffer_class in (('legacy', legacy_class), ('framer', framer_class)):
+            buffers = [buffer_class() for _ in streams]
+            started = time.perf_counter()
+            # Interleave reads round-robin like concurrent connections on one loop
+            for read_index in range(max(len(chunks) for chunks in streams)):
+                for buffer, chunks in zip(buffers, streams):
+                    if read_index < len(chunks):
+                        for _ in getattr(buffer, method)(chunks[read_index]):
+                            pass
+            elapsed = time.perf_counter() - started
+            frames = sum(buffer.frames for buffer in buffers)
+            copied = sum(buffer.bytes_copied for buffer in buffers)
+            results[label] = frames
+            self.stdout.write(
+                f'{name} {label}: {frames} frames from {len(streams)} devices in {elapsed:.2f}s, '
+                f'{frames / elapsed:,.0f} frames/s, {copied / max(frames, 1):,.0f} bytes copied/frame'
+            )
+
+        if results['legacy'] != results['framer']:
+            self.stdout.write(self.style.ERROR(f'{name}: frame counts differ'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{name}: frame counts match'))
+
+    @staticmethod
+    def _chunk(stream, rng, max_read):
+        """Split a byte stream into TCP-like reads of random size."""
+        chunks = []
+        offset = 0
+        while offset < len(stream):
+            size = rng.randint(1, max_read)
+            chunks.append(stream[offset:offset + size])
+            offset += size
+        return chunks
+
+    @staticmethod
+    def _jt808_stream(rng, count):
+        """0x7E-delimited messages of location-report size, body free of flag bytes."""
+        frames = []
+        for _ in range(count):
+            body = bytes(rng.choice(range(0x7E)) for _ in range(rng.randint(20, 120)))
+            frames.append(bytes([JT808_FLAG]) + body + bytes([JT808_FLAG]))
+        return b"".join(frames)
+
+    @staticmethod
+    def _jt1078_stream(rng, count):
+        """Video packets with a 30-byte header and up to ~950 byte bodies."""
+        packets = []
+        for _ in range(count):
+            body = rng.randbytes(rng.randint(200, 950))
+            header = (
+                JT1078_HEADER + bytes([0x81, 0x62]) + struct.pack('>H', rng.randint(0, 65535))
+                + bytes(6) + bytes([1, 0x10]) + struct.pack('>QHH', 0, 0, 0) + struct.pack('>H', len(body))
+            )
+            packets.append(header + body)
+        return b"".join(packets)
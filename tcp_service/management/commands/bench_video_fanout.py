@@ -0,0 +1,171 @@
+"""
+Django Management Command to Benchmark Live Video Fan-out
+
+Plays a synthetic 25 fps stream in real time to many viewers of one camera,
+one of which is slow to send (a viewer on a bad network), and reports the
+latency of the other viewers and what the slow viewer lost. Runs once the old
+way, every viewer deserializing its own copy of the event and the segment
+sent to one viewer after the other, and once through the stream hub. Runs in
+memory, no Redis or sockets needed.
+Run with: python manage.py bench_video_fanout [--viewers 60] [--seconds 10]
+"""
+import asyncio
+import base64
+import random
+import time
+
+from channels_redis.serializers import registry
+from django.core.management.base import BaseCommand
+
+from tcp_service.video.stream_hub import StreamHub, VideoMessage
+from tcp_service.video.ws_frame import pack_video_frame
+from tcp_service.websocket.consumer import DashcamVideoConsumer
+
+PHONE = '013800138000'
+FPS = 25
+# A frame sent later than this after it was published counts as a stall
+STALL_SECONDS = 0.2
+
+
+class Command(BaseCommand):
+    help = 'Benchmark live video fan-out to many viewers with one slow viewer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--viewers',
+            type=int,
+            default=60,
+            help='WebSocket viewers of the camera (default: 60)'
+        )
+        parser.add_argument(
+            '--seconds',
+            type=int,
+            default=10,
+            help='Stream length in seconds, played in real time (default: 10)'
+        )
+        parser.add_argument(
+            '--slow-ms',
+            type=int,
+            default=150,
+            help='Send time of the slow viewer per frame in ms (default: 150)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        events = []
+        for index in range(options['seconds'] * FPS):
+            is_keyframe = index % FPS == 0
+            # The segment starts with its index, so viewers can look up when it was published
+            data = index.to_bytes(6, 'big') + rng.randbytes(
+                rng.randint(40_000, 80_000) if is_keyframe else rng.randint(2_000, 12_000)
+            )
+            events.append({
+                'type': 'video.data',
+                'video_type': 'video',
+                'phone': PHONE,
+                'channel': 1,
+                'frame': pack_video_frame(data, is_keyframe=is_keyframe),
+                'codec': None,
+            })
+
+        for label, run in (('sequential', self._sequential), ('stream hub', self._hub)):
+            published = {}
+            viewers = self._viewers(options['viewers'], options['slow_ms'] / 1000, published)
+            elapsed, deserialized, resyncs = asyncio.run(run(events, viewers, published))
+            fast = sorted(latency for viewer in viewers[1:] for latency in viewer.latencies)
+            slow = viewers[0]
+            self.stdout.write(
+                f'{label}: fast viewers {fast[len(fast) // 2] * 1000:.2f} ms median, '
+                f'{fast[int(len(fast) * 0.99)] * 1000:.2f} ms p99, '
+                f'{sum(latency > STALL_SECONDS for latency in fast)}/{len(fast)} frames stalled; '
+                f'slow viewer {len(slow.latencies)}/{len(events)} frames, {resyncs} resyncs, '
+                f'{max(slow.latencies) * 1000:.0f} ms max latency; '
+                f'{deserialized / len(events):.0f} deserializations/frame; '
+                f'all sent after {elapsed:.1f} s'
+            )
+
+    @staticmethod
+    def _viewers(count, slow_seconds, published):
+        """Half JSON, half binary consumers recording latency per frame, the first one slow."""
+        viewers = []
+        for index in range(count):
+            consumer = DashcamVideoConsumer()
+            consumer.binary_video = index % 2 == 1
+            consumer.latencies = []
+            consumer.base_send = Command._base_send(consumer, slow_seconds if index == 0 else 0, published)
+            viewers.append(consumer)
+        return viewers
+
+    @staticmethod
+    def _base_send(consumer, delay, published):
+        async def base_send(message):
+            if delay:
+                await asyncio.sleep(delay)
+            if message.get('bytes') is not None:
+                index = int.from_bytes(message['bytes'][5:11], 'big')
+            else:
+                text = message['text']
+                start = text.index('"data": "') + 9
+                index = int.from_bytes(base64.b64decode(text[start:start + 8]), 'big')
+            consumer.latencies.append(time.perf_counter() - published[index])
+        return base_send
+
+    @staticmethod
+    async def _play(events, published, deliver):
+        """Publish events at FPS through deliver(serialized event), returns the stream's duration."""
+        serializer = registry.get_serializer('msgpack')
+        started = time.perf_counter()
+        for index, event in enumerate(events):
+            wait = started + index / FPS - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            # Latency counts from when the frame was due, a backed up sender delays it
+            published[index] = started + index / FPS
+            await deliver(serializer, serializer.serialize(event))
+        return started
+
+    async def _sequential(self, events, viewers, published):
+        """Every viewer deserializes its own copy, segments are sent one viewer after the other."""
+        deserialized = 0
+
+        async def deliver(serializer, message):
+            nonlocal deserialized
+            for consumer in viewers:
+                event = serializer.deserialize(message)
+                deserialized += 1
+                message_frame = VideoMessage.from_event(event)
+                if consumer.binary_video:
+                    await consumer.send(bytes_data=message_frame.frame)
+                else:
+                    await consumer.send(text_data=message_frame.text)
+
+        started = await self._play(events, published, deliver)
+        return time.perf_counter() - started, deserialized, 0
+
+    async def _hub(self, events, viewers, published):
+        """One deserialization per process, bounded queue per viewer."""
+        hub = StreamHub()
+        for consumer in viewers:
+            hub.add_viewer(PHONE, consumer)
+        deserialized = 0
+
+        async def deliver(serializer, message):
+            nonlocal deserialized
+            deserialized += 1
+            hub.publish(PHONE, VideoMessage.from_event(serializer.deserialize(message)))
+
+        started = await self._play(events, published, deliver)
+        fast = [hub.get_viewer(PHONE, consumer) for consumer in viewers[1:]]
+        while any(len(viewer) for viewer in fast):
+            await asyncio.sleep(0.001)
+        elapsed = time.perf_counter() - started
+        resyncs = hub.get_viewer(PHONE, viewers[0]).resyncs
+        for consumer in viewers:
+            hub.remove_viewer(PHONE, consumer)
+        return elapsed, deserialized, resyncs
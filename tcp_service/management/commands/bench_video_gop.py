@@ -0,0 +1,172 @@
+"""
+Django Management Command to Benchmark Live Video Fragmenting and Fast Start
+
+Feeds a synthetic H.264 stream through VideoConverter with different
+frames-per-fragment settings and reports fMP4 overhead per frame, build time
+and added latency. Then joins viewers at random points mid-stream and reports
+time-to-first-frame with the GOP replay against waiting for the next keyframe.
+Runs in memory, no sockets or Redis needed.
+Run with: python manage.py bench_video_gop [--seconds 60]
+"""
+import asyncio
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from tcp_service.video.converter import VideoConverter
+from tcp_service.video.gop_buffer import GopBuffer
+from tcp_service.video.stream_hub import VideoMessage, Viewer
+from tcp_service.video.ws_frame import pack_video_frame
+from tcp_service.websocket.consumer import DashcamVideoConsumer
+
+START_CODE = b'\x00\x00\x00\x01'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark fMP4 fragment aggregation and late-joiner time-to-first-frame'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seconds',
+            type=int,
+            default=60,
+            help='Stream length in seconds at 25 fps (default: 60)'
+        )
+        parser.add_argument(
+            '--gop',
+            type=int,
+            default=25,
+            help='Frames per GOP (default: 25)'
+        )
+        parser.add_argument(
+            '--joins',
+            type=int,
+            default=200,
+            help='Viewers joining at random points (default: 200)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        fps = 25
+        frames = self._h264_stream(rng, options['seconds'] * fps, options['gop'])
+        payload_bytes = sum(len(nal) for _, nal in frames)
+
+        for frames_per_fragment, label in ((1, '1 frame'), (5, '5 frames'), (0, '1 GOP')):
+            converter = VideoConverter(frames_per_fragment=frames_per_fragment)
+            output_bytes = 0
+            fragments = 0
+            waiting_frames = 0
+            pending_since = []
+            started = time.perf_counter()
+            for index, (packet, _) in enumerate(frames):
+                pending_since.append(index)
+                segment = converter.add_nal_unit(packet)
+                if segment:
+                    output_bytes += len(segment)
+                    fragments += 1
+                    # Frames not flushed yet stay pending
+                    flushed = pending_since[:len(pending_since) - len(converter.pending_frames)]
+                    waiting_frames += sum(index - arrived for arrived in flushed)
+                    pending_since = pending_since[len(flushed):]
+            elapsed = time.perf_counter() - started
+            # The last fragment is still pending at the end of the stream
+            flushed_frames = len(frames) - len(converter.pending_frames)
+            flushed_payload = payload_bytes - sum(len(sample) - 4 for sample, _ in converter.pending_frames)
+            self.stdout.write(
+                f'{label} per fragment: {fragments} fragments, '
+                f'{(output_bytes - flushed_payload) / flushed_frames:.1f} bytes overhead/frame, '
+                f'{elapsed * 1e6 / len(frames):.1f} us/frame, '
+                f'+{waiting_frames / len(frames) * 1000 / fps:.0f} ms mean latency'
+            )
+
+        self._time_to_first_frame(rng, frames, fps, options['joins'])
+
+    def _time_to_first_frame(self, rng, frames, fps, joins):
+        converter = VideoConverter()
+        buffer = GopBuffer()
+        snapshots = {}
+        join_points = set(rng.sample(range(len(frames)), min(joins, len(frames))))
+        keyframe_indexes = [index for index, (_, nal) in enumerate(frames) if nal[0] & 0x1F == 5]
+
+        for index, (packet, _) in enumerate(frames):
+            segment = converter.add_nal_unit(packet)
+            if not segment:
+                continue
+            if buffer.init_frame is None:
+                buffer.set_init(pack_video_frame(converter.get_init_segment(), is_init=True,
+                                                 codec=converter.get_codec_string()))
+            buffer.add(pack_video_frame(segment, is_keyframe=converter.last_segment_keyframe),
+                       converter.last_segment_keyframe)
+            if index in join_points:
+                snapshots[index] = buffer.replay()
+
+        replay_times = []
+        replay_bytes = []
+        for snapshot in snapshots.values():
+            first_sent, sent_bytes = asyncio.run(self._replay(snapshot))
+            replay_times.append(first_sent)
+            replay_bytes.append(sent_bytes)
+
+        # Without a replay a viewer can start at the next keyframe at best (and only
+        # if it has the init segment, which used to be sent once per stream)
+        keyframe_waits = []
+        for index in snapshots:
+            next_keyframe = next((k for k in keyframe_indexes if k > index), None)
+            if next_keyframe is not None:
+                keyframe_waits.append((next_keyframe - index) * 1000 / fps)
+
+        self.stdout.write(
+            f'late join, wait for next keyframe: {sum(keyframe_waits) / max(len(keyframe_waits), 1):.0f} ms mean, '
+            f'{max(keyframe_waits, default=0):.0f} ms max (no init segment before this change)'
+        )
+        self.stdout.write(
+            f'late join, GOP replay: {sum(replay_times) / len(replay_times) * 1000:.3f} ms mean to first frame, '
+            f'{sum(replay_bytes) / len(replay_bytes) / 1024:.0f} KB sent on join'
+        )
+
+    @staticmethod
+    async def _replay(frames):
+        """(seconds until the first frame is sent, bytes sent) for one joining viewer."""
+        consumer = DashcamVideoConsumer()
+        consumer.binary_video = True
+        sent = []
+
+        async def base_send(message):
+            sent.append((time.perf_counter(), len(message['bytes'])))
+
+        consumer.base_send = base_send
+        viewer = Viewer(consumer)
+        viewer.hold_for_replay(consumer.REPLAY_TIMEOUT)
+        started = time.perf_counter()
+        viewer.replay([VideoMessage('013800138000', None, frame) for frame in frames])
+        while len(viewer):
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        viewer.close()
+        # The first media frame after init is the first one that can be shown
+        first_frame = sent[1][0] if len(sent) > 1 else sent[0][0]
+        return first_frame - started, sum(size for _, size in sent)
+
+    @staticmethod
+    def _h264_stream(rng, count, gop):
+        """[(Annex B packet, frame NAL)], IDR every `gop` frames, SPS/PPS ahead of each IDR."""
+        # x264 1280x720, High profile level 3.1, 25 fps
+        sps = bytes.fromhex('6764001facd9405005bb011000000300100000030320f1831960')
+        pps = bytes([0x68, 0xEE, 0x3C, 0x80])
+        frames = []
+        for index in range(count):
+            if index % gop == 0:
+                nal = bytes([0x65]) + rng.randbytes(rng.randint(20_000, 40_000)).replace(b'\x00', b'\x01')
+                packet = START_CODE + sps + START_CODE + pps + START_CODE + nal
+            else:
+                nal = bytes([0x41]) + rng.randbytes(rng.randint(1_500, 6_000)).replace(b'\x00', b'\x01')
+                packet = START_CODE + nal
+            frames.append((packet, nal))
+        return frames
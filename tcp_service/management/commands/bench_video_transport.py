@@ -0,0 +1,143 @@
+"""
+Django Management Command to Benchmark Dashcam Video Transport
+
+Pushes synthetic fMP4 segments through the channel layer serializer to a
+number of viewers, once the old way (base64 JSON events, delivered to every
+viewer's channel) and then through the stream hub with binary frames for
+JSON and binary clients, and reports frames/sec per viewer and bytes sent
+per frame. Runs in memory, no Redis or sockets needed.
+Run with: python manage.py bench_video_transport [--viewers 20]
+"""
+import asyncio
+import base64
+import random
+import time
+
+from channels_redis.serializers import registry
+from django.core.management.base import BaseCommand
+
+from tcp_service.video.stream_hub import StreamHub, VideoMessage
+from tcp_service.video.ws_frame import pack_video_frame
+from tcp_service.websocket.consumer import DashcamVideoConsumer
+
+
+def legacy_event(sim, data, channel):
+    """Channel layer event as the TCP server built it before binary frames."""
+    return {
+        'type': 'video.data',
+        'video_type': 'video',
+        'phone': sim,
+        'channel': channel,
+        'data': base64.b64encode(data).decode('utf-8'),
+        'codec': None,
+    }
+
+
+def binary_event(sim, data, channel):
+    return {
+        'type': 'video.data',
+        'video_type': 'video',
+        'phone': sim,
+        'channel': channel,
+        'frame': pack_video_frame(data, channel=channel),
+        'codec': None,
+    }
+
+
+class LegacyVideoConsumer(DashcamVideoConsumer):
+    """video_data as it was before binary frames and the stream hub."""
+
+    async def video_data(self, event):
+        await self.send_json({
+            'type': event.get('video_type', 'video'),
+            'phone': event.get('phone'),
+            'channel': event.get('channel'),
+            'data': event.get('data'),
+            'codec': event.get('codec'),
+        })
+
+
+class Command(BaseCommand):
+    help = 'Benchmark base64 JSON vs binary video frames (frames/sec per viewer)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--viewers',
+            type=int,
+            default=20,
+            help='WebSocket viewers per device (default: 20)'
+        )
+        parser.add_argument(
+            '--segments',
+            type=int,
+            default=500,
+            help='fMP4 segments to send (default: 500)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # P-frames of a few KB with an occasional large keyframe
+        segments = [
+            rng.randbytes(rng.randint(40_000, 120_000) if index % 25 == 0 else rng.randint(2_000, 15_000))
+            for index in range(options['segments'])
+        ]
+        cases = (
+            ('legacy json', LegacyVideoConsumer, legacy_event, False),
+            ('json', DashcamVideoConsumer, binary_event, False),
+            ('binary', DashcamVideoConsumer, binary_event, True),
+        )
+        for label, consumer_class, make_event, binary in cases:
+            elapsed, sent_bytes = asyncio.run(
+                self._run(segments, options['viewers'], consumer_class, make_event, binary)
+            )
+            self.stdout.write(
+                f'{label}: {len(segments) / elapsed:,.0f} frames/s per viewer '
+                f'({options["viewers"]} viewers), {sent_bytes / (len(segments) * options["viewers"]):,.0f} bytes/frame sent'
+            )
+
+    @staticmethod
+    async def _run(segments, viewer_count, consumer_class, make_event, binary):
+        """Returns (elapsed seconds, bytes sent to all viewers)."""
+        serializer = registry.get_serializer('msgpack')
+        sent = [0]
+
+        async def base_send(message):
+            sent[0] += len(message.get('bytes') or message.get('text'))
+
+        viewers = []
+        for _ in range(viewer_count):
+            consumer = consumer_class()
+            consumer.base_send = base_send
+            consumer.binary_video = binary
+            viewers.append(consumer)
+
+        started = time.perf_counter()
+        if consumer_class is LegacyVideoConsumer:
+            for data in segments:
+                event = make_event('013800138000', data, 1)
+                for consumer in viewers:
+                    # channels_redis serialized the event once per member channel and
+                    # each consumer deserialized its own copy
+                    await consumer.video_data(serializer.deserialize(serializer.serialize(event)))
+            return time.perf_counter() - started, sent[0]
+
+        hub = StreamHub(queue_size=len(segments), max_lag=float('inf'))
+        for consumer in viewers:
+            hub.add_viewer('013800138000', consumer)
+        for data in segments:
+            # One hub channel per process receives and deserializes the event
+            event = serializer.deserialize(serializer.serialize(make_event('013800138000', data, 1)))
+            hub.publish('013800138000', VideoMessage.from_event(event))
+            await asyncio.sleep(0)
+        while any(len(viewer) for viewer in hub.viewers['013800138000'].values()):
+            await asyncio.sleep(0)
+        elapsed = time.perf_counter() - started
+        for consumer in viewers:
+            hub.remove_viewer('013800138000', consumer)
+        return elapsed, sent[0]
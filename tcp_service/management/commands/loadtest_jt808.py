@@ -0,0 +1,246 @@
+"""
+Django Management Command to Load Test the JT808 Server
+
+Simulates many JT808 terminals against a running start_tcp_servers: each
+one connects, registers (0x0100), authenticates (0x0102) and then sends a
+heartbeat (0x0002) or location report (0x0200) every --interval seconds,
+matching the platform responses by sequence number. Reports connections,
+messages per second and response latency percentiles.
+
+Terminals whose phone numbers are not dashcams in the Device table are
+answered with failure results, they still exercise framing, parsing and
+routing; the result codes are counted separately.
+Run with: python manage.py loadtest_jt808 [--terminals 5000] [--duration 60]
+"""
+import asyncio
+import random
+import resource
+import struct
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tcp_service.protocol.constants import JT808MsgID
+from tcp_service.protocol.jt808_parser import build_message, encode_datetime_bcd, parse_message
+from tcp_service.tcp.framing import JT808Framer
+
+
+def registration_body(phone):
+    """Province, city, manufacturer, model, terminal ID, plate color, plate."""
+    return (struct.pack('>HH', 11, 0) + b'LOADT' + b'LOADTEST'.ljust(20, b'\x00')
+            + phone[-7:].encode() + b'\x01' + f'LT{phone[-6:]}'.encode())
+
+
+def location_body(rng):
+    """Alarm and status flags, position, altitude, speed, course and time."""
+    latitude = int((27.7 + rng.random() * 0.1) * 1e6)
+    longitude = int((85.3 + rng.random() * 0.1) * 1e6)
+    return (struct.pack('>IIIIHHH', 0, 0x0002, latitude, longitude, 1300,
+                        rng.randrange(0, 800), rng.randrange(0, 360))
+            + encode_datetime_bcd(datetime.now()))
+
+
+class Stats:
+    def __init__(self):
+        self.connected = 0
+        self.connect_errors = 0
+        self.disconnects = 0
+        self.sent = 0
+        self.responses = 0
+        self.failures = 0
+        self.latencies = []
+
+
+class Terminal:
+    """One simulated device: a connection, its sequence numbers and in-flight requests."""
+
+    def __init__(self, phone, stats, rng):
+        self.phone = phone
+        self.stats = stats
+        self.rng = rng
+        self.seq = 0
+        self.pending = {}
+        self.auth_code = asyncio.get_running_loop().create_future()
+        self.writer = None
+
+    async def send(self, msg_id, body=b''):
+        self.seq = (self.seq + 1) % 65536
+        self.pending[self.seq] = time.perf_counter()
+        self.writer.write(build_message(msg_id, self.phone, self.seq, body))
+        self.stats.sent += 1
+        await self.writer.drain()
+
+    async def read(self, reader):
+        framer = JT808Framer()
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                return
+            for frame in framer.frames_from(data):
+                message = parse_message(frame)
+                if not message or len(message['body']) < 3:
+                    continue
+                body = message['body']
+                sent = self.pending.pop(struct.unpack('>H', body[:2])[0], None)
+                if sent is None:
+                    continue
+                self.stats.responses += 1
+                self.stats.latencies.append(time.perf_counter() - sent)
+                if message['msg_id'] == JT808MsgID.REGISTRATION_RESPONSE:
+                    result = body[2]
+                    auth_code = body[3:].decode(errors='ignore')
+                else:
+                    result = body[4] if len(body) > 4 else 0
+                    auth_code = ''
+                if result:
+                    self.stats.failures += 1
+                # The first response answers the registration, rejected terminals go on regardless
+                if not self.auth_code.done():
+                    self.auth_code.set_result(auth_code or 'loadtest')
+
+    async def run(self, host, port, interval, deadline, locations):
+        try:
+            reader, self.writer = await asyncio.open_connection(host, port)
+        except OSError:
+            self.stats.connect_errors += 1
+            return
+        self.stats.connected += 1
+        reading = asyncio.create_task(self.read(reader))
+        try:
+            await self.send(JT808MsgID.TERMINAL_REGISTRATION, registration_body(self.phone))
+            auth_code = await asyncio.wait_for(self.auth_code, timeout=30)
+            await self.send(JT808MsgID.TERMINAL_AUTH, auth_code.encode())
+            # Spread the terminals' reports over the interval
+            await asyncio.sleep(self.rng.random() * interval)
+            while time.monotonic() < deadline and not reading.done():
+                if locations:
+                    await self.send(JT808MsgID.LOCATION_REPORT, location_body(self.rng))
+                else:
+                    await self.send(JT808MsgID.TERMINAL_HEARTBEAT)
+                await asyncio.sleep(interval)
+        except (OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            if reading.done():
+                self.stats.disconnects += 1
+            reading.cancel()
+            self.writer.close()
+
+
+class Command(BaseCommand):
+    help = 'Simulate many JT808 terminals against a running JT808 server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='JT808 server host (default: 127.0.0.1)')
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=settings.TCP_SERVICE_JT808_PORT,
+            help='JT808 server port (default: 6665)'
+        )
+        parser.add_argument(
+            '--terminals',
+            type=int,
+            default=1000,
+            help='Simulated terminals (default: 1000)'
+        )
+        parser.add_argument(
+            '--connect-rate',
+            type=int,
+            default=500,
+            help='New connections per second (default: 500)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=10.0,
+            help='Seconds between reports of a terminal (default: 10)'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=60.0,
+            help='Seconds to run after the last terminal connected (default: 60)'
+        )
+        parser.add_argument(
+            '--locations',
+            action='store_true',
+            help='Send location reports instead of heartbeats (writes to the database)'
+        )
+        parser.add_argument(
+            '--phone-start',
+            type=int,
+            default=900000000000,
+            help='Phone number of the first terminal, the others count up (default: 900000000000)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=1,
+            help='Random seed (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        # Every terminal is a socket
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = options['terminals'] + 100
+        if soft < wanted:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+            if hard < wanted:
+                self.stdout.write(self.style.WARNING(f'Open file limit {hard} is below {wanted}, raise ulimit -n'))
+        asyncio.run(self._run(options))
+
+    async def _run(self, options):
+        stats = Stats()
+        rng = random.Random(options['seed'])
+        count = options['terminals']
+        ramp = count / options['connect_rate']
+        deadline = time.monotonic() + ramp + options['duration']
+        self.stdout.write(
+            f"{count} terminals -> {options['host']}:{options['port']}, "
+            f"{ramp:.1f} s ramp-up, {options['duration']:.0f} s at full load"
+        )
+
+        started = time.monotonic()
+        tasks = []
+        progress = asyncio.create_task(self._progress(stats, started))
+        for index in range(count):
+            terminal = Terminal(f"{options['phone_start'] + index:012d}", stats, random.Random(rng.random()))
+            tasks.append(asyncio.create_task(
+                terminal.run(options['host'], options['port'], options['interval'], deadline, options['locations'])
+            ))
+            await asyncio.sleep(1 / options['connect_rate'])
+        await asyncio.gather(*tasks)
+        progress.cancel()
+        elapsed = time.monotonic() - started
+
+        latencies = sorted(stats.latencies)
+
+        def percentile(fraction):
+            return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000 if latencies else 0
+
+        self.stdout.write(
+            f'connected {stats.connected}/{count} ({stats.connect_errors} connect errors, '
+            f'{stats.disconnects} dropped by the server)'
+        )
+        self.stdout.write(
+            f'{stats.sent} messages, {stats.responses} responses ({stats.failures} failure results), '
+            f'{stats.responses / elapsed:,.0f} responses/s'
+        )
+        self.stdout.write(
+            f'response latency p50 {percentile(0.5):.1f} ms, p95 {percentile(0.95):.1f} ms, '
+            f'p99 {percentile(0.99):.1f} ms, max {percentile(1):.1f} ms'
+        )
+        unanswered = stats.sent - stats.responses
+        if unanswered:
+            self.stdout.write(self.style.WARNING(f'{unanswered} messages without a response'))
+
+    async def _progress(self, stats, started):
+        while True:
+            await asyncio.sleep(5)
+            self.stdout.write(
+                f'{time.monotonic() - started:5.0f} s: {stats.connected} connected, '
+                f'{stats.sent} sent, {stats.responses} responses'
+            )
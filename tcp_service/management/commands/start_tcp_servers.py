@@ -2,13 +2,23 @@
 Django Management Command to Start TCP Servers
 
 Starts JT808 and JT1078 TCP servers for dashcam communication.
-Run with: python manage.py start_tcp_servers
+Run with: python manage.py start_tcp_servers [--workers N]
+
+With --workers N, N processes are forked and all bind the ports with
+SO_REUSEPORT, the kernel spreads new connections over them. Each worker has
+its own DeviceManager; stream commands find the worker holding a device
+through tcp.ownership (Redis). Crashed workers are restarted.
+uvloop is used for the event loop when installed (--no-uvloop to disable).
 """
 import asyncio
+import os
 import signal
+import socket
 import logging
+import time
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 
 logger = logging.getLogger(__name__)
 
@@ -49,30 +59,117 @@ class Command(BaseCommand):
             action='store_true',
             help='Start only JT1078 server (video only)'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Worker processes sharing the ports with SO_REUSEPORT (default: 1)'
+        )
+        parser.add_argument(
+            '--no-uvloop',
+            action='store_true',
+            help='Use the default asyncio event loop even if uvloop is installed'
+        )
     
     def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError('--workers must be at least 1')
+        if workers > 1 and not (hasattr(socket, 'SO_REUSEPORT') and hasattr(os, 'fork')):
+            raise CommandError('--workers needs SO_REUSEPORT and fork (Linux/BSD)')
+        
         self.stdout.write(self.style.SUCCESS('Starting TCP servers...'))
         
         # Configure logging
         logging.basicConfig(
             level=logging.INFO,
-            format='%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+            format='%(asctime)s [%(levelname)s] [%(process)d] %(name)s: %(message)s'
         )
         
+        if workers > 1:
+            self._run_workers(options)
+            return
+        
         # Run the servers
         try:
-            asyncio.run(self._run_servers(options))
+            self._run(options)
         except KeyboardInterrupt:
             self.stdout.write(self.style.WARNING('\nShutting down servers...'))
     
+    def _run(self, options):
+        """Run the servers on this process's event loop, uvloop if available."""
+        run = asyncio.run
+        if not options['no_uvloop']:
+            try:
+                import uvloop
+                run = uvloop.run
+            except ImportError:
+                pass
+        run(self._run_servers(options))
+    
+    def _run_workers(self, options):
+        """Fork the workers and restart any that dies until SIGINT/SIGTERM."""
+        # Children must not share the parent's database connections
+        connections.close_all()
+        children = {}
+        stopping = False
+        
+        def spawn(worker):
+            pid = os.fork()
+            if pid == 0:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                code = 0
+                try:
+                    self._run(options)
+                except KeyboardInterrupt:
+                    pass
+                except Exception:
+                    logger.exception(f"Worker {worker} failed")
+                    code = 1
+                finally:
+                    os._exit(code)
+            children[pid] = worker
+        
+        def shutdown(signum, frame):
+            nonlocal stopping
+            stopping = True
+            for pid in children:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+        
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+        for worker in range(options['workers']):
+            spawn(worker)
+        self.stdout.write(self.style.SUCCESS(f"Started {options['workers']} workers: {sorted(children)}"))
+        
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            worker = children.pop(pid, None)
+            if worker is not None and not stopping:
+                self.stdout.write(self.style.WARNING(
+                    f'Worker {worker} (pid {pid}) exited with status {status}, restarting'
+                ))
+                time.sleep(1)
+                spawn(worker)
+        
+        self.stdout.write(self.style.SUCCESS('TCP servers stopped.'))
+    
     async def _run_servers(self, options):
         """Run TCP servers asynchronously."""
         from tcp_service.tcp.device_manager import DeviceManager
         from tcp_service.tcp.jt808_server import JT808Server
         from tcp_service.tcp.jt1078_server import JT1078Server
         
-        # Shared device manager
+        # Shared device manager (per worker process)
         device_manager = DeviceManager()
+        reuse_port = options['workers'] > 1
         
         # Setup servers
         servers = []
@@ -82,7 +179,8 @@ class Command(BaseCommand):
             jt808_server = JT808Server(
                 host=options['jt808_host'],
                 port=options['jt808_port'],
-                device_manager=device_manager
+                device_manager=device_manager,
+                reuse_port=reuse_port
             )
             servers.append(jt808_server)
             self.stdout.write(
@@ -93,7 +191,8 @@ class Command(BaseCommand):
             jt1078_server = JT1078Server(
                 host=options['jt1078_host'],
                 port=options['jt1078_port'],
-                device_manager=device_manager
+                device_manager=device_manager,
+                reuse_port=reuse_port
             )
             servers.append(jt1078_server)
             self.stdout.write(
@@ -126,14 +225,20 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('TCP servers started!'))
         self.stdout.write('Press Ctrl+C to stop...\n')
         
-        # Wait for shutdown
+        # Wait for shutdown (signal) or a server failing
+        shutdown = asyncio.create_task(shutdown_event.wait())
         try:
-            await asyncio.gather(*tasks)
+            done, _ = await asyncio.wait([shutdown, *tasks], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is not shutdown and task.exception():
+                    logger.error(f"TCP server failed: {task.exception()}")
         except asyncio.CancelledError:
             pass
         finally:
             # Stop all servers
             for server in servers:
                 await server.stop()
+            for task in [shutdown, *tasks]:
+                task.cancel()
             
             self.stdout.write(self.style.SUCCESS('TCP servers stopped.'))
@@ -75,6 +75,7 @@ class JT1078PayloadType(IntEnum):
     G711U = 7
     G726 = 8
     AAC = 19
+    ADPCMA = 26  # IMA/DVI ADPCM
 
 
 class JT1078Channel(IntEnum):
@@ -110,6 +111,12 @@ DEFAULT_VIDEO_WIDTH = 1280
 DEFAULT_VIDEO_HEIGHT = 720
 DEFAULT_VIDEO_FPS = 25
 DEFAULT_VIDEO_TIMESCALE = 90000  # 90kHz for MPEG timing
+MAX_TIMESTAMP_GAP_MS = 2000  # Longer gaps between frame timestamps are treated as a jump
+DEFAULT_FRAMES_PER_FRAGMENT = 1  # Frames per moof + mdat, 0 = one GOP per fragment
+
+# Default Audio Parameters (JT1078 G.711/ADPCM audio is 8 kHz mono)
+DEFAULT_AUDIO_SAMPLE_RATE = 8000
+MAX_AV_DRIFT_MS = 100  # Audio further than this from the video clock is realigned
 
 # SMS Command Templates for BSJ Dashcam
 SMS_COMMAND_SERVER_POINT = "<SPBSJ*P:BSJGPS*D:82.180.145.220,6665>"
@@ -142,29 +142,32 @@ def get_packet_size(data: bytes) -> int:
     if data[0:4] != JT1078_HEADER:
         return 0
     
+    return get_packet_size_at(data, 0)
+
+
+def get_packet_size_at(buffer, offset: int) -> int:
+    """
+    Total size of the JT1078 packet whose header starts at buffer[offset].
+    
+    Reads the header in place (struct.unpack_from), so a receive buffer can be
+    scanned without slicing. The caller has checked the "01cd" header and that
+    at least 30 bytes are available from offset.
+    
+    Returns:
+        Total packet size in bytes, or 0 if invalid
+    """
     try:
-        data_type_byte = data[15]
-        data_type = (data_type_byte >> 4) & 0x0F
+        data_type = (buffer[offset + 15] >> 4) & 0x0F
         
-        # Determine header size based on data type
+        # Header size and body length offset depend on the data type
         if data_type <= 2:  # Video
-            header_size = 30
+            header_size, length_offset = 30, 28
         elif data_type == 3:  # Audio
-            header_size = 26
+            header_size, length_offset = 26, 24
         else:  # Transparent
-            header_size = 18
-        
-        if len(data) < header_size:
-            return 0
-        
-        # Get body length from appropriate offset
-        if data_type <= 2:
-            body_length = struct.unpack(">H", data[28:30])[0]
-        elif data_type == 3:
-            body_length = struct.unpack(">H", data[24:26])[0]
-        else:
-            body_length = struct.unpack(">H", data[16:18])[0]
+            header_size, length_offset = 18, 16
         
+        body_length = struct.unpack_from(">H", buffer, offset + length_offset)[0]
         return header_size + body_length
     
     except Exception:
@@ -14,6 +14,19 @@ from .constants import JT808MsgID, JT808_FLAG
 logger = logging.getLogger(__name__)
 
 
+# Escape sequences, 0x7D must be escaped before 0x7E so inserted 0x7D bytes aren't escaped twice
+_ESCAPE_BYTE = b"\x7d"
+_FLAG_BYTE = b"\x7e"
+_ESCAPED_ESCAPE = b"\x7d\x01"
+_ESCAPED_FLAG = b"\x7d\x02"
+
+# Bit shifts folding a little-endian integer of up to 2**k bytes onto its low byte, indexed by k
+_XOR_FOLD_SHIFTS = tuple(tuple(8 << i for i in reversed(range(k))) for k in range(33))
+
+# BCD byte -> two digit string, nibbles above 9 render as "10".."15" like the per-byte format did
+_BCD_DIGITS = tuple(f"{(b >> 4) & 0x0F}{b & 0x0F}" for b in range(256))
+
+
 def escape_data(data: bytes) -> bytes:
     """
     Escape special bytes in message body before transmission.
@@ -22,15 +35,7 @@ def escape_data(data: bytes) -> bytes:
         0x7E -> 0x7D 0x02
         0x7D -> 0x7D 0x01
     """
-    result = bytearray()
-    for b in data:
-        if b == 0x7E:  # Flag byte
-            result.extend([0x7D, 0x02])
-        elif b == 0x7D:  # Escape byte
-            result.extend([0x7D, 0x01])
-        else:
-            result.append(b)
-    return bytes(result)
+    return bytes(data).replace(_ESCAPE_BYTE, _ESCAPED_ESCAPE).replace(_FLAG_BYTE, _ESCAPED_FLAG)
 
 
 def unescape_data(data: bytes) -> bytes:
@@ -40,24 +45,15 @@ def unescape_data(data: bytes) -> bytes:
     Rules:
         0x7D 0x02 -> 0x7E
         0x7D 0x01 -> 0x7D
+    
+    A 0x7D followed by anything else is kept as is.
     """
-    result = bytearray()
-    i = 0
-    while i < len(data):
-        if data[i] == 0x7D and i + 1 < len(data):
-            if data[i + 1] == 0x02:
-                result.append(0x7E)
-                i += 2
-            elif data[i + 1] == 0x01:
-                result.append(0x7D)
-                i += 2
-            else:
-                result.append(data[i])
-                i += 1
-        else:
-            result.append(data[i])
-            i += 1
-    return bytes(result)
+    data = bytes(data)
+    if _ESCAPE_BYTE not in data:
+        return data
+    # Replacing 7D 02 first can't create a new 7D 01 pair (it emits 0x7E), so the
+    # two passes match a left-to-right scan
+    return data.replace(_ESCAPED_FLAG, _FLAG_BYTE).replace(_ESCAPED_ESCAPE, _ESCAPE_BYTE)
 
 
 def calculate_checksum(data: bytes) -> int:
@@ -65,11 +61,14 @@ def calculate_checksum(data: bytes) -> int:
     Calculate XOR checksum of all bytes.
     
     The checksum is calculated over all bytes between (not including) the flag bytes.
+    The frame is read as one integer and folded onto itself (value ^= value >> half)
+    until the low byte holds the XOR of every byte, log2(n) big-int operations
+    instead of n Python steps.
     """
-    checksum = 0
-    for b in data:
-        checksum ^= b
-    return checksum
+    value = int.from_bytes(data, "little")
+    for shift in _XOR_FOLD_SHIFTS[(len(data) - 1).bit_length()]:
+        value ^= value >> shift
+    return value & 0xFF
 
 
 def parse_bcd(data: bytes) -> str:
@@ -80,9 +79,10 @@ def parse_bcd(data: bytes) -> str:
         - High nibble (bits 4-7): first digit
         - Low nibble (bits 0-3): second digit
     """
-    result = ""
-    for b in data:
-        result += f"{(b >> 4) & 0x0F}{b & 0x0F}"
+    result = data.hex()
+    if not result.isdigit():
+        # Invalid nibbles (A-F), fall back to the lookup table
+        result = "".join(map(_BCD_DIGITS.__getitem__, data))
     return result.lstrip("0") or "0"
 
 
@@ -96,6 +96,8 @@ def encode_bcd(number: str, length: int = 6) -> bytes:
     """
     # Pad with zeros to required length
     number = number.zfill(length * 2)
+    if len(number) % 2 == 0 and number.isascii() and number.isdigit():
+        return bytes.fromhex(number)
     result = bytearray()
     for i in range(0, len(number), 2):
         high = int(number[i]) if i < len(number) else 0
@@ -0,0 +1,277 @@
+"""
+Dashcam Location Writer
+
+Write-behind queue for DashcamLocation rows of the JT808 location handler.
+Reports are deduplicated against the last point of each device kept in
+memory (same rule as before: a changed point is a new row, an unchanged one
+only moves updated_at of the latest row) and written in micro-batches, one
+bulk_create plus at most one UPDATE per batch, on a dedicated database
+thread so a slow database never blocks the event loop or the shared
+sync_to_async thread.
+
+The queue is bounded. When it is full submit() waits, which stops the
+connection task from reading its socket, so a database that falls behind
+slows the devices down (TCP backpressure) instead of growing memory.
+
+The first report of a device after a (re)start or a reconnect (forget()) is
+checked against its latest row in the database in the flush, one query for
+all such devices of a batch. With several workers a reconnecting device may
+land on another one, which stores points this process doesn't know about.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 0.2
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_QUEUE_SIZE = 10000
+METRICS_LOG_INTERVAL = 60
+
+LOCATION_FIELDS = (
+    'latitude', 'longitude', 'altitude', 'speed', 'direction', 'alarm_flags', 'status_flags',
+)
+
+
+def locations_equal(latest: dict, new_data: dict) -> bool:
+    """Check if two locations are equal (for deduplication)."""
+    try:
+        return (
+            abs(float(latest['latitude']) - float(new_data['latitude'])) < 0.000001 and
+            abs(float(latest['longitude']) - float(new_data['longitude'])) < 0.000001 and
+            abs(float(latest['speed']) - float(new_data['speed'])) < 0.1 and
+            int(latest['direction']) == int(new_data['direction']) and
+            int(latest['altitude']) == int(new_data['altitude'])
+        )
+    except Exception:
+        return False
+
+
+class _Report(NamedTuple):
+    phone: str
+    data: dict
+    time: datetime
+    # Same point as the previous one, only updated_at of the latest row moves
+    duplicate: bool
+    # First report of the device since start or reconnect, compare with its row in the database
+    check_db: bool
+
+
+class LocationWriter:
+    """
+    Batches DashcamLocation writes of one process.
+
+    A batch is flushed flush_interval seconds after its first report or as
+    soon as batch_size reports are queued.
+    """
+
+    def __init__(self, flush_interval: Optional[float] = None, batch_size: Optional[int] = None,
+                 queue_size: Optional[int] = None):
+        if flush_interval is None:
+            flush_interval = getattr(settings, 'TCP_SERVICE_LOCATION_FLUSH_MS', DEFAULT_FLUSH_INTERVAL * 1000) / 1000
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size or getattr(settings, 'TCP_SERVICE_LOCATION_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.queue_size = queue_size or getattr(settings, 'TCP_SERVICE_LOCATION_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Last stored point per device (event loop side)
+        self._last: Dict[str, dict] = {}
+        # Id of the latest row per device when known (database thread side)
+        self._last_id: Dict[str, int] = {}
+        # Metrics
+        self.inserted = 0
+        self.touched = 0
+        self.flushes = 0
+        self.errors = 0
+        self.last_flush_rows = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.blocked_submits = 0
+        self.blocked_seconds = 0.0
+
+    def start(self) -> None:
+        """Start the flush task on the running loop (submit() does it on first use)."""
+        if self._task and not self._task.done():
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._batch_ready = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dashcam-location-writer')
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush what is queued and stop the flush task."""
+        if not self._task:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            await self._flush(self._drain(self.batch_size))
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, phone: str, data: dict, now: datetime) -> None:
+        """
+        Queue a location report, waiting while the queue is full.
+
+        Args:
+            phone: Device phone number (stored as imei)
+            data: Location fields (LOCATION_FIELDS)
+            now: Report time, used for updated_at of duplicates
+        """
+        self.start()
+        last = self._last.get(phone)
+        duplicate = last is not None and locations_equal(last, data)
+        if not duplicate:
+            self._last[phone] = data
+        report = _Report(phone, data, now, duplicate, last is None)
+
+        if self._queue.full():
+            self.blocked_submits += 1
+            started = time.monotonic()
+            await self._queue.put(report)
+            self.blocked_seconds += time.monotonic() - started
+        else:
+            self._queue.put_nowait(report)
+        # The flush task holds the first report of the batch
+        if self._queue.qsize() >= self.batch_size - 1:
+            self._batch_ready.set()
+
+    def forget(self, phone: str) -> None:
+        """
+        Drop the last point of a disconnected device.
+
+        Its next report is compared with the database again, the device may
+        have reported to another process in the meantime.
+        """
+        self._last.pop(phone, None)
+
+    def metrics(self) -> dict:
+        """Queue depth, flush latency and write counters of this process."""
+        return {
+            'queue_depth': self._queue.qsize() if self._queue else 0,
+            'queue_size': self.queue_size,
+            'inserted': self.inserted,
+            'touched': self.touched,
+            'flushes': self.flushes,
+            'errors': self.errors,
+            'last_flush_rows': self.last_flush_rows,
+            'last_flush_seconds': round(self.last_flush_seconds, 4),
+            'max_flush_seconds': round(self.max_flush_seconds, 4),
+            'blocked_submits': self.blocked_submits,
+            'blocked_seconds': round(self.blocked_seconds, 3),
+        }
+
+    async def _run(self):
+        logged = time.monotonic()
+        while True:
+            first = await self._queue.get()
+            if self._queue.qsize() + 1 < self.batch_size:
+                self._batch_ready.clear()
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                except asyncio.CancelledError:
+                    # Stopping, write what was taken from the queue
+                    await self._flush([first] + self._drain(self.batch_size - 1))
+                    raise
+            await self._flush([first] + self._drain(self.batch_size - 1))
+
+            if time.monotonic() - logged >= METRICS_LOG_INTERVAL:
+                logged = time.monotonic()
+                logger.info(f"[LocationWriter] {self.metrics()}")
+
+    def _drain(self, limit: int) -> List[_Report]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _flush(self, batch: List[_Report]) -> None:
+        started = time.monotonic()
+        try:
+            inserted, touched = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._write, batch
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"[LocationWriter] Failed to write {len(batch)} reports: {e}")
+            # The points may not be stored, compare the next ones with the database again
+            for report in batch:
+                self._last.pop(report.phone, None)
+            return
+        elapsed = time.monotonic() - started
+        self.inserted += inserted
+        self.touched += touched
+        self.flushes += 1
+        self.last_flush_rows = len(batch)
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+
+    def _write(self, batch: List[_Report]):
+        """Write a batch on the database thread; returns (rows inserted, rows touched)."""
+        from ..models import DashcamLocation
+
+        close_old_connections()
+
+        # Latest row ids for first reports and for duplicates of rows inserted elsewhere
+        unresolved = {
+            report.phone for report in batch
+            if report.check_db or (report.duplicate and report.phone not in self._last_id)
+        }
+        # The latest row may have been written by another process since
+        for report in batch:
+            if report.check_db:
+                self._last_id.pop(report.phone, None)
+        if unresolved:
+            self._last_id.update(
+                DashcamLocation.objects.filter(imei__in=unresolved)
+                .values('imei').annotate(last_id=Max('id'))
+                .values_list('imei', 'last_id')
+            )
+        checked = {report.phone for report in batch if report.check_db and report.phone in self._last_id}
+        latest_rows = DashcamLocation.objects.in_bulk([self._last_id[phone] for phone in checked]) if checked else {}
+
+        rows = []
+        inserted_phones = set()
+        touch_ids = set()
+        touch_time = None
+        for report in batch:
+            duplicate = report.duplicate
+            if report.check_db and report.phone in checked:
+                row = latest_rows.get(self._last_id[report.phone])
+                duplicate = row is not None and locations_equal(
+                    {field: getattr(row, field) for field in LOCATION_FIELDS}, report.data
+                )
+            if not duplicate:
+                rows.append(DashcamLocation(imei=report.phone, **report.data))
+                inserted_phones.add(report.phone)
+            elif report.phone not in inserted_phones and report.phone in self._last_id:
+                # A row inserted earlier in this batch gets updated_at of the insert already
+                touch_ids.add(self._last_id[report.phone])
+                touch_time = max(touch_time or report.time, report.time)
+
+        if touch_ids:
+            DashcamLocation.objects.filter(id__in=touch_ids).update(updated_at=touch_time)
+        if rows:
+            DashcamLocation.objects.bulk_create(rows)
+            for phone in inserted_phones:
+                self._last_id.pop(phone, None)
+            # Backends returning primary keys from bulk inserts save a lookup
+            for row in rows:
+                if row.pk is not None:
+                    self._last_id[row.imei] = row.pk
+        return len(rows), len(touch_ids)
@@ -70,35 +70,16 @@ class NotificationDispatcher:
         """Check if device is inside/outside geofences."""
         try:
             from asgiref.sync import sync_to_async
-            from device.models import Device
-            from fleet.models import Geofence, GeofenceDevice
+            from shared.services.geofence_engine import vehicle_geofence_engine
             
-            # Get device
-            device = await sync_to_async(
-                Device.objects.filter(imei=imei).first,
-                thread_sensitive=True
-            )()
-            
-            if not device:
-                return
-            
-            # Get geofences for this device's vehicles
-            # This is a simplified version - full implementation would
-            # check against polygon boundaries
-            
-            geofences = await sync_to_async(
-                lambda: list(GeofenceDevice.objects.filter(
-                    device__imei=imei
-                ).select_related('geofence')),
-                thread_sensitive=True
-            )()
+            # Geofences assigned to this device's vehicles (prepared polygons are cached)
+            inside = await sync_to_async(
+                vehicle_geofence_engine.locate,
+                thread_sensitive=False
+            )(latitude, longitude, vehicles__vehicle__imei=imei)
             
-            for gf_device in geofences:
-                geofence = gf_device.geofence
-                # Check if point is inside geofence polygon
-                # This would require implementing point-in-polygon algorithm
-                # For now, just log
-                logger.debug(f"[Geofence] Checking {imei} against {geofence.name}")
+            if inside:
+                logger.debug(f"[Geofence] {imei} inside geofences {inside}")
         
         except ImportError:
             pass  # Models not available
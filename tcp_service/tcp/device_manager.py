@@ -10,6 +10,9 @@ from typing import Dict, Optional, Any
 from datetime import datetime
 from dataclasses import dataclass, field
 
+from ..video.stream_hub import StreamHub, VideoMessage
+from ..video.ws_frame import pack_video_frame
+
 logger = logging.getLogger(__name__)
 
 
@@ -49,6 +52,7 @@ class DeviceManager:
         self.video_connections: Dict[str, asyncio.StreamWriter] = {}
         self.seq_numbers: Dict[str, int] = {}
         self.websocket_clients: Dict[str, set] = {}  # phone -> set of websocket consumers
+        self.stream_hub = StreamHub()  # per-client send queues for broadcast_video
         self._lock = asyncio.Lock()
     
     def register_device(self, phone: str, auth_code: str = "", writer=None,
@@ -137,7 +141,8 @@ class DeviceManager:
         self.connections.pop(phone, None)
         self.video_connections.pop(phone, None)
         self.seq_numbers.pop(phone, None)
-        self.websocket_clients.pop(phone, None)
+        for client in self.websocket_clients.pop(phone, ()):
+            self.stream_hub.remove_viewer(phone, client)
         logger.info(f"[DeviceManager] Removed device: {phone}")
     
     def get_next_seq(self, phone: str) -> int:
@@ -157,6 +162,7 @@ class DeviceManager:
         if phone not in self.websocket_clients:
             self.websocket_clients[phone] = set()
         self.websocket_clients[phone].add(client)
+        self.stream_hub.add_viewer(phone, client)
         logger.debug(f"[DeviceManager] Added WebSocket client for {phone}")
     
     def remove_websocket_client(self, phone: str, client):
@@ -165,52 +171,37 @@ class DeviceManager:
             self.websocket_clients[phone].discard(client)
             if not self.websocket_clients[phone]:
                 del self.websocket_clients[phone]
+        self.stream_hub.remove_viewer(phone, client)
     
     def get_websocket_clients(self, phone: str) -> set:
         """Get all WebSocket clients for a device."""
         return self.websocket_clients.get(phone, set())
     
     async def broadcast_video(self, phone: str, data: bytes, is_init: bool = False, 
-                               codec: str = None, channel: int = 1):
+                               codec: str = None, channel: int = 1, frame: bytes = None,
+                               is_audio: bool = False):
         """
         Broadcast video data to all WebSocket clients for a device.
         
+        Queues the segment on each client's stream hub viewer without waiting,
+        a slow client drops frames instead of delaying the others. Binary
+        clients get the frame from video.ws_frame, others base64 JSON.
+        
         Args:
             phone: Device phone/SIM number
             data: Video data (fMP4 segment)
             is_init: True if this is an init segment
             codec: Codec string (only for init segment)
             channel: Camera channel (1=Front, 2=Rear)
+            frame: data already packed as a binary frame, optional
+            is_audio: True for segments of the audio track
         """
-        clients = self.get_websocket_clients(phone)
-        if not clients:
+        if not self.get_websocket_clients(phone):
             return
         
-        import base64
-        data_b64 = base64.b64encode(data).decode('utf-8')
-        
-        message = {
-            'type': 'init_segment' if is_init else 'video',
-            'phone': phone,
-            'channel': channel,
-            'data': data_b64,
-        }
-        
-        if is_init and codec:
-            message['codec'] = codec
-        
-        # Broadcast to all clients
-        disconnected = []
-        for client in clients:
-            try:
-                await client.send_json(message)
-            except Exception as e:
-                logger.warning(f"Failed to send to client: {e}")
-                disconnected.append(client)
-        
-        # Clean up disconnected clients
-        for client in disconnected:
-            self.remove_websocket_client(phone, client)
+        if frame is None:
+            frame = pack_video_frame(data, channel=channel, is_init=is_init, codec=codec, is_audio=is_audio)
+        self.stream_hub.publish(phone, VideoMessage(phone, channel, frame))
     
     def get_all_devices(self) -> list:
         """Get list of all connected devices."""
@@ -0,0 +1,135 @@
+"""
+TCP Stream Framing
+
+Shared frame reassembly for the JT808 and JT1078 servers.
+
+Incoming reads are appended to one bytearray per connection and frames are
+located with a read offset, so extracting a frame copies only that frame.
+The old `buffer += data` / `buffer = buffer[end + 1:]` approach copied the
+whole remaining buffer for every frame, which is quadratic on busy links.
+Consumed bytes are dropped in a single memmove once they make up most of the
+buffer.
+
+Frames are cut with a plain bytearray slice: at JT808/JT1078 frame sizes,
+creating a memoryview per frame costs more than the extra frame-sized copy.
+"""
+from typing import Iterator
+
+from ..protocol.constants import JT808_FLAG, JT1078_HEADER
+from ..protocol.jt1078_parser import get_packet_size_at
+
+# Minimum bytes needed before a JT1078 packet size can be read
+JT1078_MIN_PACKET = 30
+
+
+class FrameBuffer:
+    """
+    Append-only receive buffer with a read offset.
+
+    Subclasses scan self._buffer from self._pos and advance it past each frame.
+    Counters (frames, bytes_copied) are kept for benchmarks and debugging.
+    """
+
+    # Consumed prefix is only compacted once it is at least this large
+    COMPACT_MIN_BYTES = 64 * 1024
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pos = 0
+        self.frames = 0
+        self.bytes_copied = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer) - self._pos
+
+    def feed(self, data: bytes) -> None:
+        """Append received data."""
+        self._compact()
+        self._buffer += data
+        self.bytes_copied += len(data)
+
+    def _compact(self) -> None:
+        if self._pos == len(self._buffer):
+            # Fully consumed, reuse the allocation without moving anything
+            self._buffer.clear()
+            self._pos = 0
+        elif self._pos >= self.COMPACT_MIN_BYTES and self._pos * 2 >= len(self._buffer):
+            self.bytes_copied += len(self._buffer) - self._pos
+            del self._buffer[:self._pos]
+            self._pos = 0
+
+
+class JT808Framer(FrameBuffer):
+    """Splits a JT808 byte stream into 0x7E-delimited messages (flags included)."""
+
+    FLAG = bytes([JT808_FLAG])
+
+    def frames_from(self, data: bytes) -> Iterator[bytes]:
+        """Feed data and yield every complete message now available."""
+        self.feed(data)
+        # Hot loop works on locals, per-frame method calls cost more than the copies saved
+        buffer, flag = self._buffer, self.FLAG
+        pos, size = self._pos, len(buffer)
+
+        try:
+            while size - pos >= 2:
+                start = buffer.find(flag, pos)
+                if start < 0:
+                    # No start flag, everything buffered is garbage
+                    pos = size
+                    return
+                # Skip garbage before the start flag
+                pos = start
+
+                end = buffer.find(flag, pos + 1)
+                if end < 0:
+                    return  # Wait for more data
+
+                frame = bytes(buffer[pos:end + 1])
+                pos = end + 1
+                self.frames += 1
+                self.bytes_copied += 2 * len(frame)
+                # Offset is published before yielding so the consumer sees a consistent buffer
+                self._pos = pos
+                yield frame
+        finally:
+            self._pos = pos
+
+
+class JT1078Framer(FrameBuffer):
+    """Splits a JT1078 byte stream into length-delimited "01cd" packets."""
+
+    def packets_from(self, data: bytes) -> Iterator[bytes]:
+        """Feed data and yield every complete packet now available."""
+        self.feed(data)
+        buffer = self._buffer
+        pos, size = self._pos, len(buffer)
+
+        try:
+            while size - pos >= JT1078_MIN_PACKET:
+                header_pos = buffer.find(JT1078_HEADER, pos)
+                if header_pos < 0:
+                    # No header found, keep the last 3 bytes for a partial header
+                    pos = max(pos, size - 3)
+                    return
+                pos = header_pos
+                if size - pos < JT1078_MIN_PACKET:
+                    return
+
+                # Header fields are read in place, no slice of the buffer is made
+                packet_size = get_packet_size_at(buffer, pos)
+                if packet_size == 0:
+                    # Invalid packet, skip the header and resync
+                    pos += 4
+                    continue
+                if size - pos < packet_size:
+                    return  # Wait for more data
+
+                packet = bytes(buffer[pos:pos + packet_size])
+                pos += packet_size
+                self.frames += 1
+                self.bytes_copied += 2 * packet_size
+                self._pos = pos
+                yield packet
+        finally:
+            self._pos = pos
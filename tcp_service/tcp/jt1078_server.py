@@ -6,12 +6,20 @@ Listens on port 6664 for video data and broadcasts to WebSocket clients.
 """
 import asyncio
 import logging
-from typing import Optional, Dict
+from typing import Optional, Dict, Union
 
-from ..protocol.jt1078_parser import parse_video_packet, find_packet_start, get_packet_size, JT1078PacketAssembler
-from ..protocol.constants import JT1078_HEADER
+from django.conf import settings
+
+from ..protocol.constants import DEFAULT_FRAMES_PER_FRAGMENT, JT1078PayloadType
+from ..protocol.jt1078_parser import parse_video_packet, JT1078PacketAssembler
+from ..video.audio_converter import AudioConverter
 from ..video.converter import VideoConverter
+from ..video.hevc_converter import HevcConverter
+from ..video.gop_buffer import GopBuffer
+from ..video.recorder import DEFAULT_QUEUE_SIZE, DEFAULT_RETENTION_HOURS, RecordingWriter, StreamRecorder
+from ..video.ws_frame import pack_video_frame
 from .device_manager import DeviceManager
+from .framing import JT1078Framer
 
 logger = logging.getLogger(__name__)
 
@@ -23,12 +31,18 @@ class JT1078Server:
     Handles:
     - Video packet reception and parsing
     - Subpackage assembly for fragmented frames
-    - H.264 to fMP4 conversion
+    - H.264 / H.265 to fMP4 conversion, by the RTP payload type
+    - Audio to a second fMP4 track, timed on the video clock
     - Broadcasting to WebSocket clients
+    - Replaying init + current GOP to viewers joining mid-stream
+    - Recording the video to segment files (TCP_SERVICE_RECORDING_DIR)
     """
     
     def __init__(self, host: str = "0.0.0.0", port: int = 6664,
-                 device_manager: DeviceManager = None):
+                 device_manager: DeviceManager = None,
+                 frames_per_fragment: Optional[int] = None,
+                 recorder: Optional[Union[StreamRecorder, RecordingWriter]] = None,
+                 reuse_port: bool = False):
         """
         Initialize JT1078 video server.
         
@@ -36,29 +50,55 @@ class JT1078Server:
             host: Host to bind to
             port: Port to listen on
             device_manager: DeviceManager instance for broadcasting
+            frames_per_fragment: Frames per fMP4 fragment, 0 = one GOP
+                (default: TCP_SERVICE_VIDEO_FRAMES_PER_FRAGMENT)
+            recorder: Stream recorder (default: a RecordingWriter writing to
+                TCP_SERVICE_RECORDING_DIR on its own thread, none if that is empty)
+            reuse_port: Bind with SO_REUSEPORT, for several worker processes
         """
         self.host = host
         self.port = port
+        self.reuse_port = reuse_port
         self.device_manager = device_manager or DeviceManager()
         self.server: Optional[asyncio.Server] = None
         self._running = False
         
-        # Video converters per device/channel
+        if frames_per_fragment is None:
+            frames_per_fragment = getattr(settings, 'TCP_SERVICE_VIDEO_FRAMES_PER_FRAGMENT', DEFAULT_FRAMES_PER_FRAGMENT)
+        self.frames_per_fragment = frames_per_fragment
+        
+        if recorder is None and getattr(settings, 'TCP_SERVICE_RECORDING_DIR', ''):
+            recorder = RecordingWriter(
+                StreamRecorder(settings.TCP_SERVICE_RECORDING_DIR,
+                               getattr(settings, 'TCP_SERVICE_RECORDING_RETENTION_HOURS', DEFAULT_RETENTION_HOURS)),
+                getattr(settings, 'TCP_SERVICE_RECORDING_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)
+            )
+        self.recorder = recorder
+        
+        # Video converters and replay buffers per device/channel
         self.converters: Dict[str, VideoConverter] = {}
+        self.gop_buffers: Dict[str, GopBuffer] = {}
+        self.audio_converters: Dict[str, AudioConverter] = {}
         self.assembler = JT1078PacketAssembler()
+        # Audio has its own assembler, its subpackages must not mix with video frames
+        self.audio_assembler = JT1078PacketAssembler()
     
     async def start(self):
         """Start the TCP server."""
         self.server = await asyncio.start_server(
             self._handle_client,
             self.host,
-            self.port
+            self.port,
+            reuse_port=self.reuse_port or None
         )
         self._running = True
         
         addr = self.server.sockets[0].getsockname()
         logger.info(f"JT1078 Video Server started on {addr[0]}:{addr[1]}")
         
+        # Start channel layer listener for replay requests
+        asyncio.create_task(self._listen_channel_layer())
+        
         async with self.server:
             await self.server.serve_forever()
     
@@ -69,17 +109,121 @@ class JT1078Server:
             self.server.close()
             await self.server.wait_closed()
             logger.info("JT1078 Video Server stopped")
+        if self.recorder:
+            # Waits for queued fragments to be written, off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self.recorder.close_all)
     
     def _get_converter_key(self, sim: str, channel: int) -> str:
         """Generate key for converter lookup."""
         return f"{sim}_{channel}"
     
-    def _get_converter(self, sim: str, channel: int) -> VideoConverter:
-        """Get or create video converter for device/channel."""
+    def _get_converter(self, sim: str, channel: int,
+                       payload_type: Optional[int] = None) -> VideoConverter:
+        """
+        Get or create video converter for device/channel.
+        
+        H.265 payloads get an HevcConverter, anything else H.264. A device
+        switching codec gets a new converter and replay buffer, so the next
+        init segment describes the new codec.
+        """
+        key = self._get_converter_key(sim, channel)
+        converter_class = HevcConverter if payload_type == JT1078PayloadType.H265 else VideoConverter
+        converter = self.converters.get(key)
+        if type(converter) is not converter_class:
+            if converter is not None:
+                logger.info(f"[JT1078] {sim} ch{channel} switched to {converter_class.__name__}")
+                self.gop_buffers.pop(key, None)
+            converter = converter_class(frames_per_fragment=self.frames_per_fragment)
+            self.converters[key] = converter
+        return converter
+    
+    def _get_audio_converter(self, sim: str, channel: int, payload_type: int) -> AudioConverter:
+        """Get or create audio converter for device/channel, new one if the audio codec changes."""
+        key = self._get_converter_key(sim, channel)
+        converter = self.audio_converters.get(key)
+        if converter is None or converter.payload_type != payload_type:
+            converter = AudioConverter(payload_type)
+            self.audio_converters[key] = converter
+            buffer = self.gop_buffers.get(key)
+            if buffer:
+                buffer.set_audio_init(None)
+        return converter
+    
+    def _get_gop_buffer(self, sim: str, channel: int) -> GopBuffer:
+        """Get or create replay buffer for device/channel."""
         key = self._get_converter_key(sim, channel)
-        if key not in self.converters:
-            self.converters[key] = VideoConverter()
-        return self.converters[key]
+        if key not in self.gop_buffers:
+            self.gop_buffers[key] = GopBuffer()
+        return self.gop_buffers[key]
+    
+    async def _listen_channel_layer(self):
+        """Listen for replay requests from WebSocket consumers via Redis channel layer."""
+        try:
+            from channels.layers import get_channel_layer
+            channel_layer = get_channel_layer()
+            
+            if not channel_layer:
+                logger.warning("[JT1078] No channel layer configured, late-joiner replay disabled")
+                return
+            
+            # Unique across worker processes
+            channel_name = await channel_layer.new_channel('tcp_video')
+            
+            # Join the tcp_video group
+            await channel_layer.group_add('tcp_video', channel_name)
+            logger.info(f"[JT1078] Joined tcp_video group as {channel_name}")
+            
+            while self._running:
+                try:
+                    message = await asyncio.wait_for(
+                        channel_layer.receive(channel_name),
+                        timeout=5.0
+                    )
+                    
+                    msg_type = message.get('type', '')
+                    
+                    if msg_type == 'video.replay':
+                        await self._handle_replay_request(channel_layer, message)
+                    else:
+                        logger.debug(f"[JT1078] Unknown channel message type: {msg_type}")
+                
+                except asyncio.TimeoutError:
+                    continue
+                except Exception as e:
+                    logger.error(f"[JT1078] Error processing channel message: {e}")
+                    await asyncio.sleep(1)
+        
+        except Exception as e:
+            logger.error(f"[JT1078] Channel layer listener error: {e}")
+    
+    async def _handle_replay_request(self, channel_layer, message: dict) -> None:
+        """
+        Send init + buffered GOP of every channel of a device to one consumer.
+        
+        Only the process that holds the stream answers, the consumer forwards
+        the frames in order and then resumes live frames. Channels are in the
+        frame headers.
+        """
+        sim = message.get('phone')
+        reply_channel = message.get('reply_channel')
+        if not sim or not reply_channel:
+            return
+        
+        prefix = f"{sim}_"
+        frames = []
+        for key, buffer in list(self.gop_buffers.items()):
+            if key.startswith(prefix):
+                frames.extend(buffer.replay())
+        if not frames:
+            return
+        
+        # One message, so the consumer gets every channel's replay before live frames resume
+        await channel_layer.send(reply_channel, {
+            'type': 'video.replay',
+            'phone': sim,
+            'frames': frames,
+        })
+        logger.debug(f"[JT1078] Replayed {len(frames)} frames of {sim} to {reply_channel}")
     
     async def _handle_client(self, reader: asyncio.StreamReader,
                               writer: asyncio.StreamWriter):
@@ -93,7 +237,7 @@ class JT1078Server:
         addr = writer.get_extra_info('peername')
         logger.info(f"[JT1078] New video connection from {addr}")
         
-        buffer = b""
+        framer = JT1078Framer()
         current_sim = None
         
         try:
@@ -107,40 +251,8 @@ class JT1078Server:
                 if not data:
                     break
                 
-                buffer += data
-                
                 # Process video packets
-                while len(buffer) >= 30:
-                    # Find JT1078 header
-                    header_pos = find_packet_start(buffer)
-                    
-                    if header_pos < 0:
-                        # No header found, keep last 3 bytes for partial header
-                        buffer = buffer[-3:] if len(buffer) > 3 else buffer
-                        break
-                    
-                    if header_pos > 0:
-                        # Skip garbage before header
-                        buffer = buffer[header_pos:]
-                    
-                    if len(buffer) < 30:
-                        break
-                    
-                    # Get packet size
-                    packet_size = get_packet_size(buffer)
-                    if packet_size == 0:
-                        # Invalid packet, skip 4 bytes
-                        buffer = buffer[4:]
-                        continue
-                    
-                    if len(buffer) < packet_size:
-                        # Wait for more data
-                        break
-                    
-                    # Extract and parse packet
-                    packet_data = buffer[:packet_size]
-                    buffer = buffer[packet_size:]
-                    
+                for packet_data in framer.packets_from(data):
                     packet = parse_video_packet(packet_data)
                     if not packet:
                         continue
@@ -179,61 +291,111 @@ class JT1078Server:
         sim = packet["sim"]
         channel = packet["channel"]
         
-        # Skip audio for now
         if packet["is_audio"]:
+            await self._process_audio_packet(packet)
             return
         
         # Get converter for this device/channel
-        converter = self._get_converter(sim, channel)
+        converter = self._get_converter(sim, channel, packet.get("payload_type"))
         
         # Assemble fragmented frames
         frame_data = self.assembler.process_packet(packet)
         
         if frame_data:
             # Convert to fMP4 segment
-            segment = converter.process_packet(frame_data, 0)  # 0 = atomic (already assembled)
+            # 0 = atomic (already assembled), all subpackets of a frame carry its timestamp
+            segment = converter.process_packet(frame_data, 0, packet.get("timestamp"))
             
             if segment:
-                # Check if we need to send init segment first
-                if converter.frame_count == 1:
+                buffer = self._get_gop_buffer(sim, channel)
+                
+                # First segment of the stream, send and keep the init segment
+                if buffer.init_frame is None:
                     init_seg = converter.get_init_segment()
                     if init_seg:
                         codec = converter.get_codec_string()
-                        await self._broadcast_video(sim, init_seg, is_init=True, 
+                        init_frame = pack_video_frame(init_seg, channel=channel, is_init=True, codec=codec)
+                        buffer.set_init(init_frame)
+                        await self._broadcast_video(sim, init_seg, init_frame, is_init=True,
                                                    codec=codec, channel=channel)
                         logger.debug(f"[JT1078] Sent init segment for {sim} ch{channel}")
                 
-                # Broadcast video segment
-                await self._broadcast_video(sim, segment, channel=channel)
+                # Broadcast video segment, buffered first so a replay taken while the
+                # broadcast is in flight includes it (consumers drop the duplicate)
+                frame = pack_video_frame(segment, channel=channel, is_keyframe=converter.last_segment_keyframe)
+                buffer.add(frame, converter.last_segment_keyframe)
+                if self.recorder:
+                    self.recorder.record(sim, channel, converter.get_init_segment(), segment,
+                                         converter.last_segment_keyframe)
+                await self._broadcast_video(sim, segment, frame, channel=channel)
     
-    async def _broadcast_video(self, sim: str, data: bytes, is_init: bool = False,
-                                codec: str = None, channel: int = 1) -> None:
+    async def _process_audio_packet(self, packet: Dict) -> None:
+        """
+        Convert an audio packet to the stream's audio track and broadcast it.
+        
+        Audio is placed on the video track's timeline by its JT1078 timestamp,
+        frames arriving before the video has started are dropped.
+        """
+        sim = packet["sim"]
+        channel = packet["channel"]
+        
+        frame_data = self.audio_assembler.process_packet(packet)
+        if not frame_data:
+            return
+        
+        key = self._get_converter_key(sim, channel)
+        video = self.converters.get(key)
+        media_time = video.media_time(packet.get("timestamp")) if video else None
+        converter = self._get_audio_converter(sim, channel, packet.get("payload_type"))
+        segment = converter.process_frame(frame_data, media_time)
+        if not segment:
+            return
+        
+        buffer = self._get_gop_buffer(sim, channel)
+        if buffer.audio_init_frame is None:
+            codec = converter.get_codec_string()
+            init_frame = pack_video_frame(converter.get_init_segment(), channel=channel, is_init=True,
+                                          codec=codec, is_audio=True)
+            buffer.set_audio_init(init_frame)
+            await self._broadcast_video(sim, converter.get_init_segment(), init_frame, is_init=True,
+                                       codec=codec, channel=channel, is_audio=True)
+            logger.debug(f"[JT1078] Sent audio init segment for {sim} ch{channel}")
+        
+        frame = pack_video_frame(segment, channel=channel, is_audio=True)
+        buffer.add_audio(frame)
+        await self._broadcast_video(sim, segment, frame, channel=channel, is_audio=True)
+    
+    async def _broadcast_video(self, sim: str, data: bytes, frame: bytes, is_init: bool = False,
+                                codec: str = None, channel: int = 1, is_audio: bool = False) -> None:
         """
         Broadcast video data to WebSocket clients via Redis channel layer.
         
         Args:
             sim: Device SIM/phone number
             data: fMP4 segment data
+            frame: data packed as a binary frame (see video.ws_frame)
             is_init: True if this is an init segment
             codec: Codec string (for init segment)
             channel: Camera channel
+            is_audio: True for segments of the audio track
         """
         try:
-            import base64
             from channels.layers import get_channel_layer
             
             channel_layer = get_channel_layer()
             if channel_layer:
-                # Encode data as base64
-                data_b64 = base64.b64encode(data).decode('utf-8')
-                
-                # Send to video group for this device
+                # Send to video group for this device, raw frame bytes travel
+                # as msgpack bin (no base64)
+                if is_audio:
+                    video_type = 'audio_init_segment' if is_init else 'audio'
+                else:
+                    video_type = 'init_segment' if is_init else 'video'
                 await channel_layer.group_send(f'video_{sim}', {
                     'type': 'video.data',
-                    'video_type': 'init_segment' if is_init else 'video',
+                    'video_type': video_type,
                     'phone': sim,
                     'channel': channel,
-                    'data': data_b64,
+                    'frame': frame,
                     'codec': codec if is_init else None,
                 })
             else:
@@ -244,7 +406,9 @@ class JT1078Server:
                         data=data,
                         is_init=is_init,
                         codec=codec,
-                        channel=channel
+                        channel=channel,
+                        frame=frame,
+                        is_audio=is_audio
                     )
         except Exception as e:
             logger.error(f"[JT1078] Error broadcasting video for {sim}: {e}")
@@ -255,9 +419,16 @@ class JT1078Server:
         keys_to_remove = [k for k in self.converters.keys() if k.startswith(f"{sim}_")]
         for key in keys_to_remove:
             del self.converters[key]
+            self.gop_buffers.pop(key, None)
+        for key in [k for k in self.audio_converters.keys() if k.startswith(f"{sim}_")]:
+            del self.audio_converters[key]
         
         # Clear assembler buffers
         self.assembler.clear_buffer(sim)
+        self.audio_assembler.clear_buffer(sim)
+        
+        if self.recorder:
+            self.recorder.close(sim)
         
         # Update streaming status
         if self.device_manager:
@@ -4,6 +4,8 @@ JT808 TCP Server
 Asyncio-based TCP server for handling JT808 protocol communication with dashcam devices.
 Listens on port 6665 for GPS signaling and control messages.
 Uses Redis channel layer for cross-process communication with WebSocket consumers.
+Several worker processes can share the port (reuse_port), each records the
+devices it holds so stream commands reach the right one (see tcp.ownership).
 """
 import asyncio
 import logging
@@ -12,9 +14,11 @@ from typing import Optional
 from django.conf import settings
 
 from ..protocol.jt808_parser import parse_message, build_realtime_av_request, build_av_control
-from ..protocol.constants import JT808_FLAG
 from ..handlers.message_router import MessageRouter
 from .device_manager import DeviceManager
+from .framing import JT808Framer
+from .ownership import COMMAND_GROUP, OwnershipRegistry
+from ..services.location_writer import LocationWriter
 
 logger = logging.getLogger(__name__)
 
@@ -33,7 +37,8 @@ class JT808Server:
     """
     
     def __init__(self, host: str = "0.0.0.0", port: int = 6665, 
-                 device_manager: DeviceManager = None):
+                 device_manager: DeviceManager = None, reuse_port: bool = False,
+                 location_writer: Optional[LocationWriter] = None):
         """
         Initialize JT808 server.
         
@@ -41,11 +46,16 @@ class JT808Server:
             host: Host to bind to
             port: Port to listen on
             device_manager: DeviceManager instance
+            reuse_port: Bind with SO_REUSEPORT, for several worker processes
+            location_writer: Write-behind queue for location reports (default: a new one)
         """
         self.host = host
         self.port = port
+        self.reuse_port = reuse_port
         self.device_manager = device_manager or DeviceManager()
-        self.router = MessageRouter(self.device_manager)
+        self.location_writer = location_writer or LocationWriter()
+        self.router = MessageRouter(self.device_manager, self.location_writer)
+        self.ownership = OwnershipRegistry()
         self.server: Optional[asyncio.Server] = None
         self._running = False
     
@@ -54,7 +64,8 @@ class JT808Server:
         self.server = await asyncio.start_server(
             self._handle_client,
             self.host,
-            self.port
+            self.port,
+            reuse_port=self.reuse_port or None
         )
         self._running = True
         
@@ -77,12 +88,13 @@ class JT808Server:
                 logger.warning("[JT808] No channel layer configured, stream commands disabled")
                 return
             
-            # Create a unique channel name for this server instance
-            channel_name = f'tcp_server_{id(self)}'
+            # Unique across worker processes, commands for our devices are sent to it
+            channel_name = await channel_layer.new_channel('tcp_server')
+            self.ownership.channel_name = channel_name
             
-            # Join the tcp_commands group
-            await channel_layer.group_add('tcp_commands', channel_name)
-            logger.info(f"[JT808] Joined tcp_commands group as {channel_name}")
+            # Join the tcp_commands group (commands for devices without a recorded owner)
+            await channel_layer.group_add(COMMAND_GROUP, channel_name)
+            logger.info(f"[JT808] Joined {COMMAND_GROUP} group as {channel_name}")
             
             while self._running:
                 try:
@@ -192,6 +204,7 @@ class JT808Server:
             self.server.close()
             await self.server.wait_closed()
             logger.info("JT808 Server stopped")
+        await self.location_writer.stop()
     
     async def _handle_client(self, reader: asyncio.StreamReader, 
                               writer: asyncio.StreamWriter):
@@ -205,7 +218,7 @@ class JT808Server:
         addr = writer.get_extra_info('peername')
         logger.info(f"[JT808] New connection from {addr}")
         
-        buffer = b""
+        framer = JT808Framer()
         phone = None
         
         try:
@@ -219,28 +232,8 @@ class JT808Server:
                 if not data:
                     break
                 
-                buffer += data
-                
                 # Process complete messages (framed by 0x7E)
-                while len(buffer) >= 2:
-                    # Find start flag
-                    start = buffer.find(bytes([JT808_FLAG]))
-                    if start < 0:
-                        buffer = b""
-                        break
-                    
-                    if start > 0:
-                        buffer = buffer[start:]
-                    
-                    # Find end flag (after start)
-                    end = buffer.find(bytes([JT808_FLAG]), 1)
-                    if end < 0:
-                        break  # Wait for more data
-                    
-                    # Extract complete message
-                    message_data = buffer[:end + 1]
-                    buffer = buffer[end + 1:]
-                    
+                for message_data in framer.frames_from(data):
                     # Parse and handle message
                     msg = parse_message(message_data)
                     if msg:
@@ -274,6 +267,10 @@ class JT808Server:
                         if response:
                             writer.write(response)
                             await writer.drain()
+                        
+                        # Stream commands for this device are sent to this process
+                        if phone and self.device_manager.get_connection(phone) is writer:
+                            await self.ownership.claim(phone)
         
         except asyncio.CancelledError:
             logger.info(f"[JT808] Connection cancelled from {addr}")
@@ -300,10 +297,10 @@ class JT808Server:
             from asgiref.sync import sync_to_async
             from ..models import DashcamConnection
             
-            # Update database using sync_to_async
+            # Update database in the thread pool, not queued behind the shared thread
             await sync_to_async(
                 DashcamConnection.objects.filter(imei=phone).update,
-                thread_sensitive=True
+                thread_sensitive=False
             )(
                 is_connected=False,
                 disconnected_at=self._get_nepal_datetime()
@@ -314,6 +311,9 @@ class JT808Server:
         # Remove from memory manager
         if self.device_manager:
             self.device_manager.remove_device(phone)
+        # The device may reconnect to another worker, don't dedupe against a stale point
+        self.location_writer.forget(phone)
+        await self.ownership.release(phone)
     
     def _get_nepal_datetime(self):
         """Get current datetime in Nepal timezone."""
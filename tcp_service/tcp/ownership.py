@@ -0,0 +1,96 @@
+"""
+Connection Ownership
+
+With start_tcp_servers --workers N every worker process accepts its share of
+the device connections (SO_REUSEPORT), so the JT808 socket of a device lives
+in exactly one process. Each JT808 server records the devices it holds in
+the shared 'latest_state' cache (Redis in production) as phone -> its
+command channel, and WebSocket consumers send stream commands straight to
+that channel instead of broadcasting them to every worker.
+
+Entries expire after OWNERSHIP_TTL unless the owner refreshes them on
+device traffic, so the devices of a crashed worker fall back to the group
+broadcast until they reconnect to another one.
+"""
+import logging
+import time
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+CACHE_ALIAS = 'latest_state'
+COMMAND_GROUP = 'tcp_commands'
+# Seconds an entry lives without refresh, refreshed after a third of it
+OWNERSHIP_TTL = 180
+REFRESH_INTERVAL = OWNERSHIP_TTL / 3
+
+
+def _cache():
+    return caches[CACHE_ALIAS if CACHE_ALIAS in settings.CACHES else 'default']
+
+
+def _key(phone: str) -> str:
+    return f'dashcam_owner:{phone}'
+
+
+async def get_owner(phone: str) -> Optional[str]:
+    """Command channel of the process holding the device's JT808 connection, None if unknown."""
+    try:
+        return await _cache().aget(_key(phone))
+    except Exception as e:
+        logger.warning(f"[Ownership] Lookup failed for {phone}: {e}")
+        return None
+
+
+async def send_command(channel_layer, message: dict) -> None:
+    """
+    Send a stream command for message['phone'] to the JT808 server holding it.
+
+    Falls back to the tcp_commands group (every JT808 server, the one with
+    the connection acts on it) when no owner is recorded.
+    """
+    owner = await get_owner(message['phone'])
+    if owner:
+        await channel_layer.send(owner, message)
+    else:
+        await channel_layer.group_send(COMMAND_GROUP, message)
+
+
+class OwnershipRegistry:
+    """
+    Claims of one JT808 server process.
+
+    claim() is called on every message of a connection and only writes to
+    the cache when the claim is new or due for refresh.
+    """
+
+    def __init__(self):
+        # Command channel of this process, set once the channel layer listener runs
+        self.channel_name: Optional[str] = None
+        self._claimed: Dict[str, float] = {}
+
+    async def claim(self, phone: str) -> None:
+        """Record this process as the owner of a device's connection."""
+        if not self.channel_name:
+            return
+        now = time.monotonic()
+        if now - self._claimed.get(phone, float('-inf')) < REFRESH_INTERVAL:
+            return
+        self._claimed[phone] = now
+        try:
+            await _cache().aset(_key(phone), self.channel_name, timeout=OWNERSHIP_TTL)
+        except Exception as e:
+            logger.warning(f"[Ownership] Claim failed for {phone}: {e}")
+
+    async def release(self, phone: str) -> None:
+        """Drop the claim of a disconnected device, unless another process took it over."""
+        if self._claimed.pop(phone, None) is None:
+            return
+        try:
+            if await _cache().aget(_key(phone)) == self.channel_name:
+                await _cache().adelete(_key(phone))
+        except Exception as e:
+            logger.warning(f"[Ownership] Release failed for {phone}: {e}")
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import struct
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from tcp_service.protocol.constants import JT1078PayloadType
+from tcp_service.tcp.jt1078_server import JT1078Server
+from tcp_service.video import flac
+from tcp_service.video.audio_codecs import (
+    ALAW_TABLE, ULAW_TABLE, decode_g711, decode_ima_adpcm, split_adts, strip_hisi_header,
+)
+from tcp_service.video.audio_converter import AudioConverter
+from tcp_service.video.gop_buffer import GopBuffer
+from tcp_service.video.stream_hub import StreamHub, VideoMessage
+from tcp_service.video.ws_frame import pack_video_frame, unpack_video_frame
+from tcp_service.tests.test_stream_hub import settle, video_consumer
+
+START_CODE = b'\x00\x00\x00\x01'
+SPS = bytes.fromhex('6764001facd9405005bb011000000300100000030320f1831960')
+PPS = bytes([0x68, 0xEE, 0x3C, 0x80])
+PHONE = '013800138000'
+
+
+def alaw_reference(code):
+    """ITU-T G.711 reference decoder (g711.c alaw2linear)."""
+    code ^= 0x55
+    value = (code & 0x0F) << 4
+    segment = (code & 0x70) >> 4
+    if segment == 0:
+        value += 8
+    else:
+        value = (value + 0x108) << (segment - 1)
+    return value if code & 0x80 else -value
+
+
+def ulaw_reference(code):
+    """ITU-T G.711 reference decoder (g711.c ulaw2linear)."""
+    code = ~code & 0xFF
+    value = (((code & 0x0F) << 3) + 0x84) << ((code & 0x70) >> 4)
+    return 0x84 - value if code & 0x80 else value - 0x84
+
+
+def adts_frame(payload, sample_rate_index=11, channels=1):
+    """AAC LC ADTS frame without CRC."""
+    length = 7 + len(payload)
+    header = bytes([
+        0xFF, 0xF1,
+        (2 - 1) << 6 | sample_rate_index << 2 | channels >> 2,
+        (channels & 0x03) << 6 | length >> 11,
+        (length >> 3) & 0xFF,
+        (length & 0x07) << 5 | 0x1F,
+        0xFC,
+    ])
+    return header + payload
+
+
+def read_flac_frame(frame):
+    """(sample number, int16 samples) of a mono 16-bit VERBATIM frame, CRCs checked."""
+    assert frame[:2] == b'\xff\xf9'
+    number_length = 1
+    if frame[4] & 0x80:
+        number_length = next(n for n in range(2, 8) if not frame[4] & (0x80 >> n))
+    number = frame[4] & (0x7F >> number_length if number_length > 1 else 0x7F)
+    for byte in frame[5:4 + number_length]:
+        number = number << 6 | byte & 0x3F
+    offset = 4 + number_length
+    block_size = struct.unpack('>H', frame[offset:offset + 2])[0] + 1
+    assert flac.crc8(frame[:offset + 2]) == frame[offset + 2]
+    assert frame[offset + 3] == 0x02
+    samples = np.frombuffer(frame[offset + 4:offset + 4 + 2 * block_size], dtype='>i2')
+    assert len(frame) == offset + 6 + 2 * block_size
+    assert struct.unpack('>H', frame[-2:])[0] == flac.crc16(frame[:-2])
+    return number, samples
+
+
+def tfdt(segment):
+    index = segment.find(b'tfdt')
+    return struct.unpack('>Q', segment[index + 8:index + 16])[0]
+
+
+def mdat_payload(segment):
+    return segment[segment.find(b'mdat') + 4:]
+
+
+class G711Test(TestCase):
+    def test_tables_match_reference_decoder(self):
+        self.assertEqual(ALAW_TABLE.tolist(), [alaw_reference(code) for code in range(256)])
+        self.assertEqual(ULAW_TABLE.tolist(), [ulaw_reference(code) for code in range(256)])
+
+    def test_decode_is_table_lookup(self):
+        pcm = decode_g711(bytes([0xD5, 0x2A, 0xAA]), ALAW_TABLE)
+
+        self.assertEqual(pcm.dtype, np.int16)
+        self.assertEqual(pcm.tolist(), [8, -32256, 32256])
+
+    def test_hisilicon_header_stripped(self):
+        self.assertEqual(strip_hisi_header(b'\x00\x01\x02\x00abcd'), b'abcd')
+        self.assertEqual(strip_hisi_header(b'\x00\x01\x05\x00abcd'), b'\x00\x01\x05\x00abcd')
+        self.assertEqual(strip_hisi_header(b'\xd5\xd5'), b'\xd5\xd5')
+
+
+class AdpcmTest(TestCase):
+    def test_ima_codes_low_nibble_first(self):
+        """Test code 7 from step 7 adds 11 and jumps 8 steps, code 0 at step 16 adds 2"""
+        pcm = decode_ima_adpcm(b'\x00\x00\x00\x00\x07')
+
+        self.assertEqual(pcm.tolist(), [11, 13])
+
+    def test_predictor_clamped_and_state_header(self):
+        pcm = decode_ima_adpcm(struct.pack('<hBB', 32760, 88, 0) + b'\x77')
+
+        self.assertEqual(pcm.tolist(), [32767, 32767])
+        self.assertEqual(decode_ima_adpcm(struct.pack('<hBB', -100, 0, 0) + b'\x88').tolist(), [-100, -100])
+
+
+class AdtsTest(TestCase):
+    def test_split_frames_and_config(self):
+        data = adts_frame(b'\x21\x10') + adts_frame(b'\x21\x20\x30')
+
+        config, frames = split_adts(data)
+
+        self.assertEqual((config.object_type, config.sample_rate, config.channels), (2, 8000, 1))
+        self.assertEqual(config.audio_specific_config(), bytes([0x15, 0x88]))
+        self.assertEqual(frames, [b'\x21\x10', b'\x21\x20\x30'])
+
+    def test_not_adts(self):
+        self.assertEqual(split_adts(b'\x00' * 20), (None, []))
+        self.assertEqual(split_adts(adts_frame(b'\x01\x02')[:-1])[1], [])
+
+
+class FlacTest(TestCase):
+    def test_crc_check_values(self):
+        self.assertEqual(flac.crc8(b'123456789'), 0xF4)
+        self.assertEqual(flac.crc16(b'123456789'), 0xFEE8)
+
+    def test_verbatim_frame_round_trip(self):
+        samples = np.array([0, 1, -1, 32767, -32768] * 64, dtype=np.int16)
+        for sample_number in (0, 100, 100_000, 2 ** 32):
+            number, decoded = read_flac_frame(flac.encode_frame(samples, sample_number, 8000))
+
+            self.assertEqual(number, sample_number)
+            self.assertEqual(decoded.tolist(), samples.tolist())
+
+    def test_stream_info(self):
+        info = flac.stream_info(8000)
+
+        self.assertEqual(len(info), 34)
+        packed = int.from_bytes(info[10:18], 'big')
+        self.assertEqual((packed >> 44, (packed >> 41 & 7) + 1, (packed >> 36 & 31) + 1), (8000, 1, 16))
+
+
+class AudioConverterTest(TestCase):
+    def test_g711_to_flac_track(self):
+        converter = AudioConverter(JT1078PayloadType.G711A)
+        payload = bytes([0xD5, 0x2A]) * 160
+
+        self.assertIsNone(converter.process_frame(payload, None))
+        segment = converter.process_frame(b'\x00\x01\xa0\x00' + payload, 0.0)
+
+        init = converter.get_init_segment()
+        self.assertEqual(converter.get_codec_string(), 'flac')
+        for box in (b'soun', b'smhd', b'fLaC', b'dfLa'):
+            self.assertIn(box, init)
+        self.assertNotIn(b'vmhd', init)
+        number, samples = read_flac_frame(mdat_payload(segment))
+        self.assertEqual((number, samples[:2].tolist(), len(samples)), (0, [8, -32256], 320))
+
+    def test_decode_times_follow_video_clock(self):
+        """Test small jitter keeps frames contiguous, a larger gap realigns to the timestamp"""
+        converter = AudioConverter(JT1078PayloadType.G711U)
+        payload = b'\xff' * 320
+        times = [tfdt(converter.process_frame(payload, media_time)) for media_time in (0.5, 0.55, 0.58, 1.5)]
+
+        self.assertEqual(times, [4000, 4320, 4640, 12000])
+
+    def test_aac_passthrough(self):
+        converter = AudioConverter(JT1078PayloadType.AAC)
+        segment = converter.process_frame(adts_frame(b'\x21\x10') + adts_frame(b'\x21\x20'), 0.0)
+
+        self.assertEqual(converter.get_codec_string(), 'mp4a.40.2')
+        init = converter.get_init_segment()
+        self.assertIn(b'mp4a', init)
+        self.assertIn(bytes([0x05, 0x02, 0x15, 0x88]), init)  # DecoderSpecificInfo
+        self.assertEqual(mdat_payload(segment), b'\x21\x10\x21\x20')
+        index = segment.find(b'trun')
+        self.assertEqual(struct.unpack('>I', segment[index + 16:index + 20])[0], 1024)
+
+    def test_unsupported_codec_dropped(self):
+        converter = AudioConverter(JT1078PayloadType.G726)
+
+        self.assertIsNone(converter.process_frame(b'\x11' * 80, 0.0))
+        self.assertIsNone(converter.get_init_segment())
+
+
+class AudioPipelineTest(TestCase):
+    def packet(self, body, timestamp, is_audio=False, payload_type=JT1078PayloadType.H264):
+        return {'sim': PHONE, 'channel': 1, 'is_audio': is_audio, 'body': body, 'subpackage': 0,
+                'timestamp': timestamp, 'payload_type': payload_type}
+
+    def test_audio_joins_video_timeline_and_replay(self):
+        server = JT1078Server(frames_per_fragment=1)
+        broadcasts = []
+
+        async def broadcast(sim, data, frame, is_init=False, codec=None, channel=1, is_audio=False):
+            broadcasts.append(frame)
+
+        server._broadcast_video = broadcast
+        audio = self.packet(b'\xd5' * 320, 10_000, is_audio=True, payload_type=JT1078PayloadType.G711A)
+        idr = START_CODE + SPS + START_CODE + PPS + START_CODE + b'\x65' + b'\x11' * 50
+
+        async def run():
+            await server._process_video_packet(audio)  # before the video, dropped
+            await server._process_video_packet(self.packet(idr, 10_000))
+            await server._process_video_packet(dict(audio, timestamp=10_040))
+
+        async_to_sync(run)()
+
+        headers = [unpack_video_frame(frame)[0] for frame in broadcasts]
+        self.assertEqual([(h['is_init'], h['is_audio'], h['codec']) for h in headers], [
+            (True, False, 'avc1.64001F'), (False, False, None), (True, True, 'flac'), (False, True, None),
+        ])
+        self.assertEqual(tfdt(unpack_video_frame(broadcasts[3])[1].tobytes()), 320)
+        replay = server._get_gop_buffer(PHONE, 1).replay()
+        self.assertEqual(replay, [broadcasts[0], broadcasts[2], broadcasts[1], broadcasts[3]])
+
+    def test_audio_frames_do_not_count_as_gop_frames(self):
+        buffer = GopBuffer(max_frames=2)
+        buffer.set_init(b'init')
+        buffer.add_audio(b'a0')  # before the first keyframe
+        buffer.add(b'i', True)
+        for index in range(5):
+            buffer.add_audio(b'a%d' % index)
+        buffer.add(b'p', False)
+
+        self.assertEqual(buffer.replay(), [b'init', b'i', b'a0', b'a1', b'a2', b'a3', b'a4', b'p'])
+
+
+class AudioViewerTest(TestCase):
+    def test_audio_only_sent_to_viewers_that_asked(self):
+        hub = StreamHub()
+        video_only = video_consumer()
+        with_audio = video_consumer(binary=False)
+        with_audio.receive_audio = True
+        hub.add_viewer(PHONE, video_only)
+        hub.add_viewer(PHONE, with_audio)
+        init = VideoMessage(PHONE, 1, pack_video_frame(b'ftyp', is_init=True, codec='flac', is_audio=True))
+        segment = VideoMessage(PHONE, 1, pack_video_frame(b'moof', is_audio=True))
+
+        async def run():
+            hub.publish(PHONE, init)
+            hub.publish(PHONE, segment)
+            await settle(*hub.viewers[PHONE].values())
+
+        async_to_sync(run)()
+
+        self.assertEqual(video_only.sent, [])
+        messages = [json.loads(text) for text in with_audio.sent]
+        self.assertEqual([message['type'] for message in messages], ['audio_init_segment', 'audio'])
+        self.assertEqual(messages[0]['mime'], 'audio/mp4; codecs="flac"')
+
+    def test_replay_skips_audio_for_video_only_viewer(self):
+        consumer = video_consumer()
+        viewer = StreamHub().add_viewer(PHONE, consumer)
+        frames = [pack_video_frame(b'init', is_init=True), pack_video_frame(b'ainit', is_init=True, is_audio=True),
+                  pack_video_frame(b'key', is_keyframe=True), pack_video_frame(b'audio', is_audio=True)]
+
+        async def run():
+            viewer.hold_for_replay()
+            viewer.replay([VideoMessage(PHONE, None, frame) for frame in frames])
+            await settle(viewer)
+            await asyncio.sleep(0)
+
+        async_to_sync(run)()
+
+        self.assertEqual(consumer.sent, [frames[0], frames[2]])
@@ -0,0 +1,74 @@
+import struct
+from django.test import TestCase
+from tcp_service.protocol.constants import JT1078_HEADER
+from tcp_service.tcp.framing import JT808Framer, JT1078Framer
+
+
+def jt1078_packet(body, data_type=0x10):
+    header = JT1078_HEADER + bytes([0x81, 0x62]) + struct.pack('>H', 1) + bytes(6) + bytes([1, data_type])
+    if data_type >> 4 == 3:
+        # Audio: timestamp only
+        header += struct.pack('>Q', 0)
+    else:
+        # Video: timestamp, I-frame and frame interval
+        header += struct.pack('>QHH', 0, 0, 0)
+    return header + struct.pack('>H', len(body)) + body
+
+
+class JT808FramerTest(TestCase):
+    def test_frames_split_across_reads(self):
+        """Test messages fed one byte at a time come out whole and in order"""
+        stream = b'\x7eabc\x7e' + b'junk' + b'\x7edefg\x7e'
+        framer = JT808Framer()
+
+        frames = [frame for byte in stream for frame in framer.frames_from(bytes([byte]))]
+
+        self.assertEqual(frames, [b'\x7eabc\x7e', b'\x7edefg\x7e'])
+        self.assertEqual(len(framer), 0)
+
+    def test_many_frames_in_one_read(self):
+        """Test one read holding many messages yields all of them and keeps the partial tail"""
+        framer = JT808Framer()
+
+        frames = list(framer.frames_from(b'\x7e1\x7e\x7e2\x7e\x7e3'))
+
+        self.assertEqual(frames, [b'\x7e1\x7e', b'\x7e2\x7e'])
+        self.assertEqual(list(framer.frames_from(b'\x7e')), [b'\x7e3\x7e'])
+
+    def test_consumed_bytes_are_compacted(self):
+        """Test the buffer doesn't grow on a long-lived connection"""
+        framer = JT808Framer()
+        frame = b'\x7e' + b'x' * 100 + b'\x7e'
+
+        for _ in range(5000):
+            for _ in framer.frames_from(frame + frame[:50]):
+                pass
+            for _ in framer.frames_from(frame[50:]):
+                pass
+
+        self.assertEqual(framer.frames, 10000)
+        self.assertLess(len(framer._buffer), 2 * JT808Framer.COMPACT_MIN_BYTES)
+
+
+class JT1078FramerTest(TestCase):
+    def test_packets_split_across_reads(self):
+        """Test packets are reassembled from reads that split the header and body"""
+        packets = [jt1078_packet(b'a' * 100), jt1078_packet(b'b' * 5, data_type=0x30), jt1078_packet(b'c' * 700)]
+        stream = b'garbage' + b''.join(packets)
+        framer = JT1078Framer()
+
+        received = []
+        for offset in range(0, len(stream), 17):
+            received.extend(framer.packets_from(stream[offset:offset + 17]))
+
+        self.assertEqual(received, packets)
+
+    def test_keeps_partial_header_without_match(self):
+        """Test a read ending in a partial "01cd" keeps it for the next read"""
+        packet = jt1078_packet(b'z' * 40)
+        framer = JT1078Framer()
+
+        received = list(framer.packets_from(b'x' * 40 + packet[:2]))
+        received += list(framer.packets_from(packet[2:]))
+
+        self.assertEqual(received, [packet])
@@ -0,0 +1,227 @@
+import struct
+from django.test import TestCase
+from tcp_service.video.bitstream import BitReader, unescape_rbsp
+from tcp_service.video.converter import VideoConverter
+from tcp_service.video.h264_sps import parse_sps
+
+START_CODE = b'\x00\x00\x00\x01'
+# x264 1280x720, High profile level 3.1, VUI timing 25 fps
+SPS_720P = bytes.fromhex('6764001facd9405005bb011000000300100000030320f1831960')
+# Baseline 128x96, no VUI
+SPS_QCIF = bytes.fromhex('6742000af841a2')
+PPS = bytes([0x68, 0xEE, 0x3C, 0x80])
+
+
+class BitWriter:
+    """Builds test bitstreams field by field."""
+
+    def __init__(self):
+        self.bits = []
+
+    def u(self, count, value):
+        self.bits.extend((value >> shift) & 1 for shift in reversed(range(count)))
+        return self
+
+    def ue(self, value):
+        code = value + 1
+        return self.u(code.bit_length() * 2 - 1, code)
+
+    def se(self, value):
+        return self.ue(2 * value - 1 if value > 0 else -2 * value)
+
+    def nal(self, header):
+        """NAL unit with rbsp trailing bits and emulation prevention bytes, header as int or bytes."""
+        bits = self.bits + [1]
+        bits += [0] * (-len(bits) % 8)
+        rbsp = int(''.join(map(str, bits)), 2).to_bytes(len(bits) // 8, 'big')
+        escaped = bytearray(header if isinstance(header, bytes) else [header])
+        zeros = 0
+        for byte in rbsp:
+            if zeros >= 2 and byte <= 3:
+                escaped.append(3)
+                zeros = 0
+            escaped.append(byte)
+            zeros = zeros + 1 if byte == 0 else 0
+        return bytes(escaped)
+
+
+def high_profile_sps(width_mbs, height_map_units, crop=(0, 0, 0, 0), frame_mbs_only=True,
+                     sar=None, timing=None, chroma_format_idc=1, poc_type=0):
+    writer = BitWriter().u(8, 100).u(8, 0).u(8, 40).ue(0)
+    writer.ue(chroma_format_idc)
+    if chroma_format_idc == 3:
+        writer.u(1, 0)
+    writer.ue(0).ue(0).u(1, 0)
+    # Scaling matrix with one explicit 4x4 list
+    writer.u(1, 1).u(1, 1)
+    for _ in range(16):
+        writer.se(1)
+    writer.u(7 if chroma_format_idc != 3 else 11, 0)
+    writer.ue(0).ue(poc_type)
+    if poc_type == 0:
+        writer.ue(2)
+    elif poc_type == 1:
+        writer.u(1, 0).se(-1).se(2).ue(2).se(3).se(-4)
+    writer.ue(4).u(1, 0).ue(width_mbs - 1).ue(height_map_units - 1).u(1, frame_mbs_only)
+    if not frame_mbs_only:
+        writer.u(1, 0)
+    writer.u(1, 1)
+    writer.u(1, any(crop))
+    if any(crop):
+        for value in crop:
+            writer.ue(value)
+    writer.u(1, 1)  # VUI
+    writer.u(1, sar is not None)
+    if sar is not None:
+        writer.u(8, 255).u(16, sar[0]).u(16, sar[1])
+    writer.u(1, 0).u(1, 1).u(3, 5).u(1, 0).u(1, 1).u(24, 0x010101).u(1, 0)
+    writer.u(1, timing is not None)
+    if timing is not None:
+        writer.u(32, timing[0]).u(32, timing[1]).u(1, 1)
+    return writer.nal(0x67)
+
+
+class BitReaderTest(TestCase):
+    def test_fields_and_exp_golomb(self):
+        data = BitWriter().u(3, 5).ue(0).ue(1).ue(6).se(-3).se(4).ue(300).u(5, 17).nal(0x00)[1:]
+        reader = BitReader(data)
+
+        self.assertEqual(
+            [reader.read_bits(3), reader.read_ue(), reader.read_ue(), reader.read_ue(),
+             reader.read_se(), reader.read_se(), reader.read_ue(), reader.read_bits(5)],
+            [5, 0, 1, 6, -3, 4, 300, 17],
+        )
+
+    def test_read_past_end_raises(self):
+        reader = BitReader(b'\x00')
+        with self.assertRaises(ValueError):
+            reader.read_ue()
+        with self.assertRaises(ValueError):
+            BitReader(b'\xff').read_bits(9)
+
+    def test_emulation_prevention_removed(self):
+        self.assertEqual(unescape_rbsp(b'\x00\x00\x03\x01\x00\x00\x03\x00\x00\x03'), b'\x00\x00\x01\x00\x00\x00\x00')
+        self.assertEqual(unescape_rbsp(b'\x00\x00\x03\x00\x03'), b'\x00\x00\x00\x03')
+        self.assertEqual(unescape_rbsp(b'\x01\x02'), b'\x01\x02')
+
+
+class ParseSpsTest(TestCase):
+    def test_x264_720p(self):
+        info = parse_sps(SPS_720P)
+
+        self.assertEqual((info.profile_idc, info.level_idc), (100, 31))
+        self.assertEqual((info.width, info.height, info.fps), (1280, 720, 25.0))
+
+    def test_baseline_without_vui(self):
+        info = parse_sps(SPS_QCIF)
+
+        self.assertEqual((info.profile_idc, info.width, info.height, info.fps), (66, 128, 96, None))
+
+    def test_cropping_sar_and_fps(self):
+        """Test 1920x1088 coded, cropped by 8 rows (4 chroma units), 16:11 SAR, 25 fps"""
+        # num_units_in_tick = 1 needs an emulation prevention byte
+        sps = high_profile_sps(120, 68, crop=(0, 0, 0, 4), sar=(16, 11), timing=(1, 50))
+        self.assertIn(b'\x00\x00\x03', sps)
+
+        info = parse_sps(sps)
+
+        self.assertEqual((info.width, info.height), (1920, 1080))
+        self.assertEqual((info.sar_width, info.sar_height), (16, 11))
+        self.assertEqual(info.fps, 25.0)
+
+    def test_ntsc_frame_rate(self):
+        info = parse_sps(high_profile_sps(80, 45, timing=(1001, 60000)))
+
+        self.assertAlmostEqual(info.fps, 29.97, places=2)
+
+    def test_implausible_frame_rate_ignored(self):
+        info = parse_sps(high_profile_sps(80, 45, timing=(1, 90000)))
+
+        self.assertIsNone(info.fps)
+
+    def test_interlaced_and_poc_type_1(self):
+        """Test field coding doubles map units and crop rows"""
+        info = parse_sps(high_profile_sps(45, 18, crop=(2, 2, 0, 2), frame_mbs_only=False, poc_type=1))
+
+        self.assertEqual((info.width, info.height), (720 - 8, 576 - 8))
+        self.assertFalse(info.frame_mbs_only)
+
+    def test_chroma_444_crop_units(self):
+        info = parse_sps(high_profile_sps(40, 30, crop=(1, 1, 1, 1), chroma_format_idc=3))
+
+        self.assertEqual((info.width, info.height), (638, 478))
+
+    def test_truncated_vui_keeps_size(self):
+        sps = high_profile_sps(80, 45, timing=(1001, 60000))
+
+        info = parse_sps(sps[:-6])
+
+        self.assertEqual((info.width, info.height, info.fps), (1280, 720, None))
+
+    def test_invalid_sps_raises(self):
+        with self.assertRaises(ValueError):
+            parse_sps(PPS)
+        with self.assertRaises(ValueError):
+            parse_sps(SPS_720P[:5])
+
+
+def frame(nal_type, size=10):
+    nal = bytes([0x65 if nal_type == 5 else 0x41]) + b'\x22' * size
+    if nal_type == 5:
+        return START_CODE + SPS_720P + START_CODE + PPS + START_CODE + nal
+    return START_CODE + nal
+
+
+def sample_timing(segment):
+    """(base decode time, [sample durations]) of a single-fragment segment."""
+    index = segment.find(b'tfdt')
+    decode_time = struct.unpack('>Q', segment[index + 8:index + 16])[0]
+    index = segment.find(b'trun')
+    count = struct.unpack('>I', segment[index + 8:index + 12])[0]
+    durations = [struct.unpack('>I', segment[index + 16 + 16 * n:index + 20 + 16 * n])[0] for n in range(count)]
+    return decode_time, durations
+
+
+class ConverterTimingTest(TestCase):
+    def test_dimensions_and_fps_from_sps(self):
+        converter = VideoConverter()
+        converter.add_nal_unit(frame(5), 1_000)
+
+        self.assertEqual(converter.get_dimensions(), (1280, 720))
+        self.assertEqual(converter.fps, 25.0)
+        init = converter.get_init_segment()
+        index = init.find(b'tkhd')
+        self.assertEqual(struct.unpack('>II', init[index + 80:index + 88]), (1280 << 16, 720 << 16))
+
+    def test_decode_times_follow_device_timestamps(self):
+        """Test a 15 fps device (66 ms frames) gets 5940-tick samples instead of the 25 fps default"""
+        converter = VideoConverter()
+        timings = [sample_timing(converter.add_nal_unit(frame(5 if n == 0 else 1), 50_000 + n * 66))
+                   for n in range(4)]
+
+        self.assertEqual([decode_time for decode_time, _ in timings], [0, 5940, 11880, 17820])
+        self.assertEqual([durations for _, durations in timings[1:]], [[5940]] * 3)
+
+    def test_multi_frame_fragment_durations(self):
+        converter = VideoConverter(frames_per_fragment=3)
+        segments = [converter.add_nal_unit(frame(5 if n == 0 else 1), 1_000 + ms)
+                    for n, ms in enumerate((0, 40, 100, 140))]
+
+        self.assertEqual(sample_timing(segments[2]), (0, [3600, 5400, 5400]))
+
+    def test_bad_timestamps_fall_back_to_frame_rate(self):
+        """Test missing, repeated, backwards and jumping timestamps keep the timeline monotonic"""
+        converter = VideoConverter()
+        stamps = [10_000, None, 10_080, 10_080, 9_000, 60_000, 60_040]
+        decode_times = [sample_timing(converter.add_nal_unit(frame(5 if n == 0 else 1), ms))[0]
+                        for n, ms in enumerate(stamps)]
+
+        self.assertEqual(decode_times, [0, 3600, 7200, 10800, 14400, 18000, 21600])
+
+    def test_reset_clears_timeline(self):
+        converter = VideoConverter()
+        converter.add_nal_unit(frame(5), 5_000)
+        converter.add_nal_unit(frame(1), 5_040)
+        converter.reset()
+
+        self.assertEqual(sample_timing(converter.add_nal_unit(frame(5), 90_000))[0], 0)
@@ -0,0 +1,261 @@
+import json
+import struct
+from django.test import TestCase
+from tcp_service.protocol.constants import JT1078PayloadType
+from tcp_service.tcp.jt1078_server import JT1078Server
+from tcp_service.tests.test_h264_sps import BitWriter
+from tcp_service.video.converter import VideoConverter
+from tcp_service.video.fmp4_builder import FMP4Builder
+from tcp_service.video.h265_sps import parse_hevc_sps
+from tcp_service.video.hevc_converter import HevcConverter
+from tcp_service.video.stream_hub import VideoMessage
+from tcp_service.video.ws_frame import pack_video_frame
+
+START_CODE = b'\x00\x00\x00\x01'
+VPS = bytes.fromhex('40010c01ffff016000000300b0000003000003005dac09')
+PPS = bytes.fromhex('4401c172b46240')
+
+
+def hevc_sps(width=1280, height=720, conformance=(0, 0, 0, 0), profile_idc=1, tier=0, level_idc=93,
+             sub_layers=1, chroma_format_idc=1, bit_depth=8, scaling_list=False, pcm=False,
+             inter_rps=False, long_term=0, sar=None, timing=None):
+    writer = BitWriter().u(4, 0).u(3, sub_layers - 1).u(1, 1)
+    # profile_tier_level: compatible with its own profile (and Main for Main 10),
+    # progressive + non-packed + frame-only constraints
+    compatibility = 1 << (31 - profile_idc)
+    if profile_idc == 1:
+        compatibility |= 1 << 29
+    writer.u(2, 0).u(1, tier).u(5, profile_idc).u(32, compatibility).u(4, 0b1011).u(44, 0).u(8, level_idc)
+    for _ in range(sub_layers - 1):
+        writer.u(1, 1).u(1, 1)
+    if sub_layers > 1:
+        writer.u(2 * (9 - sub_layers), 0)
+    for _ in range(sub_layers - 1):
+        writer.u(88, 0).u(8, level_idc)
+
+    writer.ue(0).ue(chroma_format_idc)
+    if chroma_format_idc == 3:
+        writer.u(1, 0)
+    # Conformance window offsets are in chroma samples
+    sub_width = 2 if chroma_format_idc in (1, 2) else 1
+    sub_height = 2 if chroma_format_idc == 1 else 1
+    writer.ue(width + sub_width * (conformance[0] + conformance[1]))
+    writer.ue(height + sub_height * (conformance[2] + conformance[3]))
+    writer.u(1, any(conformance))
+    if any(conformance):
+        for value in conformance:
+            writer.ue(value)
+    writer.ue(bit_depth - 8).ue(bit_depth - 8).ue(4)
+    writer.u(1, 0)  # sub layer ordering info for the highest layer only
+    writer.ue(4).ue(2).ue(0)
+    writer.ue(0).ue(3).ue(0).ue(3).ue(1).ue(1)
+    writer.u(1, scaling_list)
+    if scaling_list:
+        writer.u(1, 1)
+        for size_id in range(4):
+            for matrix_id in range(0, 6, 3 if size_id == 3 else 1):
+                if matrix_id % 2:
+                    writer.u(1, 0).ue(1)
+                    continue
+                writer.u(1, 1)
+                if size_id > 1:
+                    writer.se(8)
+                for _ in range(min(64, 1 << (4 + (size_id << 1)))):
+                    writer.se(1)
+    writer.u(1, 1).u(1, 1)  # amp, sao
+    writer.u(1, pcm)
+    if pcm:
+        writer.u(4, 7).u(4, 7).ue(0).ue(2).u(1, 1)
+
+    # Reference picture sets: 1 negative + 1 positive, then 3 predicted from the previous set
+    writer.ue(4 if inter_rps else 1)
+    writer.ue(1).ue(1).ue(0).u(1, 1).ue(0).u(1, 1)
+    if inter_rps:
+        writer.u(1, 1).u(1, 0).ue(0).u(1, 1).u(1, 0).u(1, 1).u(1, 1)  # 3 deltas
+        writer.u(1, 1).u(1, 1).ue(1).u(1, 1).u(1, 1).u(1, 1).u(1, 0).u(1, 0)  # 3 deltas
+        writer.u(1, 1).u(1, 0).ue(0).u(1, 0).u(1, 1).u(1, 0).u(1, 0).u(1, 1).u(1, 0).u(1, 1)
+    writer.u(1, bool(long_term))
+    if long_term:
+        writer.ue(long_term)
+        for index in range(long_term):
+            writer.u(8, index).u(1, 1)
+    writer.u(1, 1).u(1, 1)
+
+    writer.u(1, 1)  # VUI
+    writer.u(1, sar is not None)
+    if sar is not None:
+        writer.u(8, 255).u(16, sar[0]).u(16, sar[1])
+    writer.u(1, 0).u(1, 1).u(3, 5).u(1, 0).u(1, 1).u(24, 0x010101)
+    writer.u(1, 1).ue(0).ue(0)
+    writer.u(3, 0).u(1, 1).ue(0).ue(0).ue(0).ue(0)
+    writer.u(1, timing is not None)
+    if timing is not None:
+        writer.u(32, timing[0]).u(32, timing[1]).u(1, 0)
+    writer.u(1, 0)
+    return writer.nal(b'\x42\x01')
+
+
+SPS = hevc_sps(timing=(1, 25))
+
+
+def slice_nal(nal_type, first=True, size=10):
+    return bytes([nal_type << 1, 0x01, 0x80 if first else 0x00]) + b'\x22' * size
+
+
+def access_unit(keyframe, slices=1):
+    parts = [VPS, SPS, PPS] if keyframe else []
+    parts += [slice_nal(19 if keyframe else 1, first=index == 0) for index in range(slices)]
+    return b''.join(START_CODE + nal for nal in parts)
+
+
+def find_box(data, box_type):
+    """Payload of the first box of a type, searched by name."""
+    index = data.find(box_type)
+    size = struct.unpack('>I', data[index - 4:index])[0]
+    return data[index + 4:index - 4 + size]
+
+
+class ParseHevcSpsTest(TestCase):
+    def test_main_profile_720p(self):
+        info = parse_hevc_sps(SPS)
+
+        self.assertEqual((info.general_profile_idc, info.general_level_idc, info.general_tier_flag), (1, 93, 0))
+        self.assertEqual((info.width, info.height, info.fps), (1280, 720, 25.0))
+        self.assertEqual(info.codec_string(), 'hvc1.1.6.L93.B0')
+
+    def test_conformance_window_in_chroma_units(self):
+        """Test 1920x1088 coded, cropped by 4 chroma rows"""
+        info = parse_hevc_sps(hevc_sps(1920, 1080, conformance=(0, 0, 0, 4)))
+
+        self.assertEqual((info.width, info.height), (1920, 1080))
+
+    def test_main10_high_tier_codec_string(self):
+        info = parse_hevc_sps(hevc_sps(profile_idc=2, tier=1, level_idc=150, bit_depth=10))
+
+        self.assertEqual(info.codec_string(), 'hvc1.2.4.H150.B0')
+        self.assertEqual((info.bit_depth_luma, info.bit_depth_chroma), (10, 10))
+
+    def test_fields_before_vui_are_skipped(self):
+        """Test sub-layers, scaling lists, PCM, predicted RPS and long-term refs keep the VUI aligned"""
+        info = parse_hevc_sps(hevc_sps(sub_layers=3, scaling_list=True, pcm=True, inter_rps=True,
+                                       long_term=2, sar=(4, 3), timing=(1001, 30000)))
+
+        self.assertEqual((info.max_sub_layers, info.sar_width, info.sar_height), (3, 4, 3))
+        self.assertAlmostEqual(info.fps, 29.97, places=2)
+
+    def test_chroma_444(self):
+        info = parse_hevc_sps(hevc_sps(640, 480, conformance=(1, 1, 1, 1), chroma_format_idc=3))
+
+        self.assertEqual((info.chroma_format_idc, info.width, info.height), (3, 640, 480))
+
+    def test_truncated_vui_keeps_size(self):
+        info = parse_hevc_sps(SPS[:-8])
+
+        self.assertEqual((info.width, info.height, info.fps), (1280, 720, None))
+
+    def test_invalid_sps_raises(self):
+        with self.assertRaises(ValueError):
+            parse_hevc_sps(PPS)
+        with self.assertRaises(ValueError):
+            parse_hevc_sps(SPS[:14])
+
+
+class HevcInitSegmentTest(TestCase):
+    def test_hvc1_sample_entry_with_parameter_sets(self):
+        init = FMP4Builder().build_hevc_init_segment(1280, 720, VPS, SPS, PPS, parse_hevc_sps(SPS))
+
+        self.assertIn(b'hvc1', find_box(init, b'ftyp'))
+        self.assertNotIn(b'avc1', init)
+        hvcc = find_box(init, b'hvcC')
+        self.assertEqual(hvcc[:13], bytes([1, 0x01]) + bytes.fromhex('60000000b00000000000') + bytes([93]))
+        self.assertEqual(hvcc[16] & 0x03, 1)  # chroma_format_idc
+        self.assertEqual(hvcc[21] & 0x03, 3)  # lengthSizeMinusOne
+        self.assertEqual(hvcc[22], 3)
+        arrays = hvcc[23:]
+        expected = b''
+        for nal_type, nal in ((32, VPS), (33, SPS), (34, PPS)):
+            expected += bytes([0x80 | nal_type]) + struct.pack('>HH', 1, len(nal)) + nal
+        self.assertEqual(arrays, expected)
+
+    def test_h264_init_segment_unchanged(self):
+        sps = bytes.fromhex('6764001facd9405005bb011000000300100000030320f1831960')
+        init = FMP4Builder().build_init_segment(1280, 720, sps, b'\x68\xee\x3c\x80')
+
+        self.assertIn(b'avc1', find_box(init, b'ftyp'))
+        self.assertEqual(find_box(init, b'avcC')[:4], bytes([1, 0x64, 0x00, 0x1F]))
+
+
+class HevcConverterTest(TestCase):
+    def test_init_segment_and_codec(self):
+        converter = HevcConverter()
+        self.assertIsNone(converter.add_nal_unit(START_CODE + slice_nal(1)))
+
+        segment = converter.add_nal_unit(access_unit(True), 1_000)
+
+        self.assertTrue(converter.is_initialized())
+        self.assertEqual(converter.get_codec_string(), 'hvc1.1.6.L93.B0')
+        self.assertEqual(converter.get_dimensions(), (1280, 720))
+        self.assertIn(b'hvcC', converter.get_init_segment())
+        self.assertTrue(converter.last_segment_keyframe)
+        self.assertIn(b'mdat', segment)
+
+    def test_samples_without_in_band_parameter_sets(self):
+        converter = HevcConverter(frames_per_fragment=0)
+        converter.add_nal_unit(access_unit(True, slices=2))
+        converter.add_nal_unit(access_unit(False))
+
+        idr = [slice_nal(19, first=True), slice_nal(19, first=False)]
+        self.assertEqual([sample for sample, _ in converter.pending_frames], [
+            b''.join(struct.pack('>I', len(nal)) + nal for nal in idr),
+            struct.pack('>I', 13) + slice_nal(1),
+        ])
+        self.assertEqual([keyframe for _, keyframe in converter.pending_frames], [True, False])
+
+        segment = converter.add_nal_unit(access_unit(True))
+        mdat = segment[segment.find(b'mdat') + 4:]
+        self.assertNotIn(VPS, mdat)
+        self.assertNotIn(SPS, mdat)
+
+    def test_cra_is_keyframe_and_sei_ignored(self):
+        converter = HevcConverter()
+        sei = bytes([39 << 1, 0x01, 0x05, 0x01])
+        converter.add_nal_unit(b''.join(START_CODE + nal for nal in (VPS, SPS, PPS, sei, slice_nal(21))))
+
+        self.assertTrue(converter.is_initialized())
+        self.assertTrue(converter.last_segment_keyframe)
+
+    def test_reset_clears_vps(self):
+        converter = HevcConverter()
+        converter.add_nal_unit(access_unit(True))
+        converter.reset()
+
+        self.assertIsNone(converter.vps)
+        self.assertIsNone(converter.add_nal_unit(START_CODE + SPS + START_CODE + PPS + START_CODE + slice_nal(19)))
+
+
+class CodecSelectionTest(TestCase):
+    def test_converter_follows_payload_type(self):
+        server = JT1078Server(frames_per_fragment=1)
+
+        self.assertIs(type(server._get_converter('013800138000', 1)), VideoConverter)
+        self.assertIs(type(server._get_converter('013800138000', 2, JT1078PayloadType.H265)), HevcConverter)
+
+    def test_codec_switch_replaces_converter_and_replay_buffer(self):
+        server = JT1078Server(frames_per_fragment=1)
+        h264 = server._get_converter('013800138000', 1, JT1078PayloadType.H264)
+        server._get_gop_buffer('013800138000', 1).set_init(b'avc1 init')
+
+        hevc = server._get_converter('013800138000', 1, JT1078PayloadType.H265)
+
+        self.assertIsNot(hevc, h264)
+        self.assertIs(server._get_converter('013800138000', 1, JT1078PayloadType.H265), hevc)
+        self.assertIsNone(server._get_gop_buffer('013800138000', 1).init_frame)
+
+    def test_init_message_advertises_mime_type(self):
+        frame = pack_video_frame(b'init', is_init=True, codec='hvc1.1.6.L93.B0')
+
+        message = json.loads(VideoMessage('013800138000', 1, frame).text)
+
+        self.assertEqual(message['codec'], 'hvc1.1.6.L93.B0')
+        self.assertEqual(message['mime'], 'video/mp4; codecs="hvc1.1.6.L93.B0"')
+        self.assertNotIn('mime', json.loads(VideoMessage('013800138000', 1, pack_video_frame(b'seg')).text))
@@ -0,0 +1,99 @@
+import random
+from django.test import TestCase
+from tcp_service.management.commands.bench_jt808_codec import (
+    legacy_calculate_checksum,
+    legacy_encode_bcd,
+    legacy_escape_data,
+    legacy_parse_bcd,
+    legacy_unescape_data,
+)
+from tcp_service.protocol.jt808_parser import (
+    build_message,
+    calculate_checksum,
+    encode_bcd,
+    escape_data,
+    parse_bcd,
+    parse_message,
+    unescape_data,
+)
+
+
+def random_frames(seed, count=500):
+    """Random byte strings biased towards the escape bytes and their suffixes."""
+    rng = random.Random(seed)
+    alphabet = [0x7D, 0x7E, 0x01, 0x02, 0x00, 0xFF]
+    frames = [b'', b'\x7d', b'\x7e', b'\x7d\x7d\x01', b'\x7d\x01\x02', b'\x7d\x7d\x02\x01']
+    for _ in range(count):
+        length = rng.randint(0, 300)
+        if rng.random() < 0.5:
+            frames.append(bytes(rng.choice(alphabet) for _ in range(length)))
+        else:
+            frames.append(rng.randbytes(length))
+    return frames
+
+
+class EscapeTest(TestCase):
+    def test_round_trip(self):
+        """Test unescape(escape(x)) == x and escaped data has no flag byte"""
+        for frame in random_frames(1):
+            escaped = escape_data(frame)
+            self.assertNotIn(b'\x7e', escaped)
+            self.assertEqual(unescape_data(escaped), frame)
+
+    def test_matches_per_byte_implementation(self):
+        """Test output is identical to the per-byte loops, including stray 0x7D bytes"""
+        for frame in random_frames(2):
+            self.assertEqual(escape_data(frame), legacy_escape_data(frame))
+            self.assertEqual(unescape_data(frame), legacy_unescape_data(frame))
+
+    def test_returns_bytes(self):
+        """Test bytearray input still returns bytes"""
+        self.assertIsInstance(escape_data(bytearray(b'\x7e')), bytes)
+        self.assertIsInstance(unescape_data(bytearray(b'ab')), bytes)
+        self.assertEqual(unescape_data(bytearray(b'\x7d\x02')), b'\x7e')
+
+
+class ChecksumTest(TestCase):
+    def test_matches_per_byte_xor(self):
+        """Test the folded checksum equals the XOR of every byte for all lengths"""
+        rng = random.Random(3)
+        for length in list(range(0, 70)) + [127, 128, 129, 1023, 1040, 70000]:
+            data = rng.randbytes(length)
+            self.assertEqual(calculate_checksum(data), legacy_calculate_checksum(data), length)
+
+    def test_bytearray_input(self):
+        self.assertEqual(calculate_checksum(bytearray(b'\x01\x02\x04')), 0x07)
+
+
+class BcdTest(TestCase):
+    def test_parse_matches_per_byte_implementation(self):
+        """Test valid and invalid (A-F nibble) BCD parse like before"""
+        rng = random.Random(4)
+        cases = [b'', b'\x00\x00', b'\x01\x38\x00\x13\x80\x00', b'\xab\xcd', b'\x0f\x00']
+        cases += [rng.randbytes(rng.randint(1, 10)) for _ in range(300)]
+        for data in cases:
+            self.assertEqual(parse_bcd(data), legacy_parse_bcd(data))
+
+    def test_encode_matches_per_byte_implementation(self):
+        for number in ['13800138000', '1', '', '012345678901', '1234567890123']:
+            self.assertEqual(encode_bcd(number), legacy_encode_bcd(number))
+        self.assertEqual(encode_bcd('1234', 2), b'\x12\x34')
+
+    def test_round_trip(self):
+        self.assertEqual(parse_bcd(encode_bcd('13800138000')), '13800138000')
+
+
+class MessageTest(TestCase):
+    def test_build_and_parse_round_trip(self):
+        """Test a message whose header and body contain escape bytes survives the wire"""
+        body = b'\x7e\x7d\x01\x7d\x02' + bytes(range(256))
+        frame = build_message(0x8001, '13800138000', 0x7E7D, body)
+
+        self.assertEqual(frame.count(b'\x7e'), 2)
+        message = parse_message(frame)
+
+        self.assertEqual(message['msg_id'], 0x8001)
+        self.assertEqual(message['phone'], '13800138000')
+        self.assertEqual(message['seq_num'], 0x7E7D)
+        self.assertEqual(message['body'], body)
+        self.assertEqual(calculate_checksum(message['raw_data']), 0)
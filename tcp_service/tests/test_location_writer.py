@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from asgiref.sync import async_to_sync
+from django.test import TransactionTestCase
+
+from tcp_service.models import DashcamLocation
+from tcp_service.services.location_writer import LocationWriter
+
+PHONE = '013800138000'
+T0 = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def point(latitude, speed=0):
+    return {
+        'latitude': latitude, 'longitude': 85.3, 'altitude': 1300, 'speed': speed,
+        'direction': 90, 'alarm_flags': 0, 'status_flags': 2,
+    }
+
+
+def write(writer, reports):
+    """Submit (phone, data, time) reports and flush them by stopping the writer."""
+
+    async def scenario():
+        for report in reports:
+            await writer.submit(*report)
+        await writer.stop()
+
+    async_to_sync(scenario)()
+
+
+# Writes happen on the writer's own database thread, outside a test transaction
+class LocationWriterTests(TransactionTestCase):
+
+    def test_changed_points_inserted_duplicates_touched(self):
+        """Test changed points become rows and repeats only move updated_at, in one batch"""
+        writer = LocationWriter(flush_interval=0.05)
+        write(writer, [
+            (PHONE, point(27.7), T0),
+            (PHONE, point(27.7), T0 + timedelta(seconds=10)),
+            (PHONE, point(27.8), T0 + timedelta(seconds=20)),
+            ('013800138001', point(27.9), T0),
+        ])
+
+        rows = DashcamLocation.objects.filter(imei=PHONE).order_by('id')
+        self.assertEqual([row.latitude for row in rows], [27.7, 27.8])
+        self.assertEqual(DashcamLocation.objects.filter(imei='013800138001').count(), 1)
+        self.assertEqual(writer.metrics()['flushes'], 1)
+        self.assertEqual(writer.metrics()['inserted'], 3)
+
+        # Next batch: repeat of the last point touches the stored row
+        writer = LocationWriter(flush_interval=0.05)
+        write(writer, [(PHONE, point(27.8), T0 + timedelta(seconds=30))])
+        self.assertEqual(DashcamLocation.objects.filter(imei=PHONE).count(), 2)
+        self.assertEqual(writer.metrics()['touched'], 1)
+        self.assertEqual(rows.last().updated_at.replace(tzinfo=None), T0 + timedelta(seconds=30))
+
+    def test_first_report_compared_with_database(self):
+        """Test the first report after a restart is not stored again when unchanged"""
+        DashcamLocation.objects.create(imei=PHONE, **point(27.7))
+
+        writer = LocationWriter(flush_interval=0.05)
+        write(writer, [
+            (PHONE, point(27.7), T0),
+            (PHONE, point(27.7), T0 + timedelta(seconds=10)),
+        ])
+        self.assertEqual(DashcamLocation.objects.filter(imei=PHONE).count(), 1)
+        self.assertEqual(writer.metrics()['inserted'], 0)
+
+    def test_reconnect_compared_with_database(self):
+        """Test a reconnected device is compared with rows another worker stored meanwhile"""
+        writer = LocationWriter(flush_interval=0.05)
+        write(writer, [(PHONE, point(27.7), T0)])
+        writer.forget(PHONE)
+
+        # Another worker stored a newer point while the device was connected there
+        DashcamLocation.objects.create(imei=PHONE, **point(27.8))
+
+        write(writer, [(PHONE, point(27.7), T0 + timedelta(seconds=30))])
+        rows = DashcamLocation.objects.filter(imei=PHONE).order_by('id')
+        self.assertEqual([row.latitude for row in rows], [27.7, 27.8, 27.7])
+
+    def test_full_queue_blocks_submit(self):
+        """Test submit waits while the queue is full and nothing is lost"""
+        writer = LocationWriter(flush_interval=0.1, batch_size=100, queue_size=2)
+        write(writer, [(PHONE, point(27.0 + index / 10, speed=index), T0) for index in range(6)])
+
+        metrics = writer.metrics()
+        self.assertGreater(metrics['blocked_submits'], 0)
+        self.assertEqual(DashcamLocation.objects.filter(imei=PHONE).count(), 6)
+        self.assertEqual(metrics['inserted'], 6)
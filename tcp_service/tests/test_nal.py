@@ -0,0 +1,82 @@
+import random
+import struct
+from django.test import TestCase
+from tcp_service.management.commands.bench_nal_split import legacy_split_nal_units, legacy_to_avcc
+from tcp_service.video.converter import VideoConverter
+from tcp_service.video.nal import annexb_to_avcc, split_nal_units, to_length_prefixed
+
+SPS = bytes.fromhex('6764001facd9405005bb011000000300100000030320f1831960')
+PPS = bytes([0x68, 0xEE, 0x3C, 0x80])
+
+
+class SplitNalUnitsTest(TestCase):
+    def test_three_and_four_byte_start_codes(self):
+        data = b'\x00\x00\x00\x01\x67\x01\x00\x00\x01\x68\x02\x00\x00\x00\x01\x65\x03\x04'
+
+        nal_units = split_nal_units(data)
+
+        self.assertEqual([bytes(nal) for nal in nal_units], [b'\x67\x01', b'\x68\x02', b'\x65\x03\x04'])
+        self.assertTrue(all(isinstance(nal, memoryview) for nal in nal_units))
+
+    def test_leading_bytes_and_trailing_zeros_dropped(self):
+        data = b'\xff\xee\x00\x00\x01\x41\x05\x00\x00\x00\x00\x00\x01\x41\x06\x00'
+
+        self.assertEqual([bytes(nal) for nal in split_nal_units(data)], [b'\x41\x05', b'\x41\x06'])
+
+    def test_data_without_start_code_is_one_nal(self):
+        self.assertEqual([bytes(nal) for nal in split_nal_units(b'\x65\x01\x02')], [b'\x65\x01\x02'])
+        self.assertEqual(split_nal_units(b''), [])
+
+    def test_empty_nal_units_skipped(self):
+        self.assertEqual([bytes(nal) for nal in split_nal_units(b'\x00\x00\x01\x00\x00\x01\x41\x07')], [b'\x41\x07'])
+
+    def test_matches_legacy_splitter(self):
+        rng = random.Random(3)
+        for _ in range(50):
+            parts = []
+            for _ in range(rng.randint(1, 5)):
+                payload = rng.randbytes(rng.randint(1, 200)).replace(b'\x00\x00', b'\x00\x01').rstrip(b'\x00')
+                parts.append(rng.choice((b'\x00\x00\x01', b'\x00\x00\x00\x01')) + b'\x41' + payload)
+            data = b''.join(parts)
+
+            self.assertEqual([bytes(nal) for nal in split_nal_units(data)], legacy_split_nal_units(data))
+            self.assertEqual(annexb_to_avcc(data), legacy_to_avcc(data))
+
+
+class LengthPrefixTest(TestCase):
+    def test_annexb_to_avcc(self):
+        data = b'\x00\x00\x00\x01\x67\x01\x00\x00\x01\x65' + b'\x09' * 300
+
+        self.assertEqual(annexb_to_avcc(data), struct.pack('>I', 2) + b'\x67\x01' + struct.pack('>I', 301) + b'\x65' + b'\x09' * 300)
+
+    def test_to_length_prefixed_accepts_views(self):
+        self.assertEqual(to_length_prefixed([memoryview(b'\x41\x01'), b'\x41']), b'\x00\x00\x00\x02\x41\x01\x00\x00\x00\x01\x41')
+
+
+class ConverterPictureTest(TestCase):
+    START = b'\x00\x00\x00\x01'
+
+    def mdat_payload(self, segment):
+        index = segment.find(b'mdat')
+        return segment[index + 4:]
+
+    def test_slices_of_a_picture_form_one_sample(self):
+        """Test first_mb_in_slice != 0 continues the picture, == 0 starts the next"""
+        converter = VideoConverter(frames_per_fragment=0)
+        idr_slices = [b'\x65\x88\xaa', b'\x65\x1c\xbb']
+        p_slices = [b'\x41\x9a\xcc', b'\x41\x02\xdd']
+        data = self.START + SPS + self.START + PPS + b''.join(self.START + nal for nal in idr_slices + p_slices)
+
+        converter.add_nal_unit(data)
+
+        self.assertEqual(converter.pending_frames, [
+            (to_length_prefixed(idr_slices), True),
+            (to_length_prefixed(p_slices), False),
+        ])
+
+    def test_sample_written_once_with_parameter_sets(self):
+        converter = VideoConverter()
+        segment = converter.add_nal_unit(self.START + SPS + self.START + PPS + self.START + b'\x65\x88\x11')
+
+        parameter_sets = struct.pack('>I', len(SPS)) + SPS + struct.pack('>I', len(PPS)) + PPS
+        self.assertEqual(self.mdat_payload(segment), parameter_sets + struct.pack('>I', 3) + b'\x65\x88\x11')
@@ -0,0 +1,134 @@
+import asyncio
+import socket
+import unittest
+
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer
+from django.core.cache import caches
+from django.test import TestCase
+
+from tcp_service.tcp import ownership
+from tcp_service.tcp.jt808_server import JT808Server
+from tcp_service.tcp.ownership import OwnershipRegistry, get_owner, send_command
+
+PHONE = '013800138000'
+
+
+class OwnershipRegistryTests(TestCase):
+
+    def setUp(self):
+        caches['latest_state'].clear()
+        self.addCleanup(caches['latest_state'].clear)
+
+    def test_claim_and_release(self):
+        """Test a claim names the process's channel and a release removes it"""
+        registry = OwnershipRegistry()
+        registry.channel_name = 'tcp_server.a'
+
+        async def scenario():
+            await registry.claim(PHONE)
+            claimed = await get_owner(PHONE)
+            await registry.release(PHONE)
+            return claimed, await get_owner(PHONE)
+
+        self.assertEqual(async_to_sync(scenario)(), ('tcp_server.a', None))
+
+    def test_release_keeps_newer_owner(self):
+        """Test a process releasing a device another process took over leaves its claim"""
+        first, second = OwnershipRegistry(), OwnershipRegistry()
+        first.channel_name, second.channel_name = 'tcp_server.a', 'tcp_server.b'
+
+        async def scenario():
+            await first.claim(PHONE)
+            await second.claim(PHONE)
+            await first.release(PHONE)
+            return await get_owner(PHONE)
+
+        self.assertEqual(async_to_sync(scenario)(), 'tcp_server.b')
+
+    def test_claims_are_refreshed_not_rewritten(self):
+        """Test repeated claims only write again after the refresh interval"""
+        registry = OwnershipRegistry()
+        registry.channel_name = 'tcp_server.a'
+
+        async def scenario():
+            await registry.claim(PHONE)
+            await caches['latest_state'].adelete(ownership._key(PHONE))
+            await registry.claim(PHONE)
+            skipped = await get_owner(PHONE)
+            registry._claimed[PHONE] -= ownership.REFRESH_INTERVAL
+            await registry.claim(PHONE)
+            return skipped, await get_owner(PHONE)
+
+        self.assertEqual(async_to_sync(scenario)(), (None, 'tcp_server.a'))
+
+    def test_no_claims_without_channel(self):
+        """Test a server without a channel layer records nothing"""
+        async_to_sync(OwnershipRegistry().claim)(PHONE)
+        self.assertIsNone(async_to_sync(get_owner)(PHONE))
+
+
+class SendCommandTests(TestCase):
+
+    def setUp(self):
+        caches['latest_state'].clear()
+        self.addCleanup(caches['latest_state'].clear)
+
+    def test_command_goes_to_owner_only(self):
+        """Test a command for an owned device reaches only the owning server"""
+        layer = InMemoryChannelLayer()
+        registry = OwnershipRegistry()
+
+        async def scenario():
+            owner = await layer.new_channel('tcp_server')
+            other = await layer.new_channel('tcp_server')
+            for name in (owner, other):
+                await layer.group_add(ownership.COMMAND_GROUP, name)
+            registry.channel_name = owner
+            await registry.claim(PHONE)
+            await send_command(layer, {'type': 'stream.request', 'phone': PHONE})
+            received = await asyncio.wait_for(layer.receive(owner), 1)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(other), 0.05)
+            return received
+
+        self.assertEqual(async_to_sync(scenario)()['type'], 'stream.request')
+
+    def test_unowned_command_is_broadcast(self):
+        """Test a command for a device without owner goes to every server"""
+        layer = InMemoryChannelLayer()
+
+        async def scenario():
+            names = [await layer.new_channel('tcp_server') for _ in range(2)]
+            for name in names:
+                await layer.group_add(ownership.COMMAND_GROUP, name)
+            await send_command(layer, {'type': 'stream.stop', 'phone': PHONE})
+            return [await asyncio.wait_for(layer.receive(name), 1) for name in names]
+
+        received = async_to_sync(scenario)()
+        self.assertEqual([message['type'] for message in received], ['stream.stop', 'stream.stop'])
+
+
+@unittest.skipUnless(hasattr(socket, 'SO_REUSEPORT'), 'SO_REUSEPORT not available')
+class ReusePortTests(TestCase):
+
+    def test_workers_share_the_port(self):
+        """Test two servers with reuse_port bind the same port"""
+
+        async def scenario():
+            first = JT808Server('127.0.0.1', 0, reuse_port=True)
+            asyncio.create_task(first.start())
+            while first.server is None:
+                await asyncio.sleep(0.01)
+            second = JT808Server('127.0.0.1', first.server.sockets[0].getsockname()[1], reuse_port=True)
+            started = asyncio.create_task(second.start())
+            while second.server is None and not started.done():
+                await asyncio.sleep(0.01)
+            failed = started.done()
+            for server in (first, second):
+                await server.stop()
+            for task in asyncio.all_tasks() - {asyncio.current_task()}:
+                task.cancel()
+            return failed
+
+        self.assertFalse(async_to_sync(scenario)())
@@ -0,0 +1,241 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.models import User
+from device.models.device import Device
+from tcp_service.tcp.jt1078_server import JT1078Server
+from tcp_service.video.recorder import FLAG_CONTINUES, RecordingWriter, StreamRecorder, _read_index, find_recording
+from tcp_service.views import dashcam_recording
+from tcp_service.tests.test_video_gop import idr, p_frame
+
+SIM = '013800138000'
+# 2025-01-01 12:59:50 UTC
+T0 = datetime(2025, 1, 1, 12, 59, 50, tzinfo=timezone.utc).timestamp()
+
+
+def at(seconds):
+    return datetime.fromtimestamp(T0 + seconds, timezone.utc)
+
+
+class RecorderTestCase(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.recorder = StreamRecorder(self.root)
+        self.addCleanup(self.recorder.close_all)
+
+    def record_gops(self, init, start, gops, step=1.0, gop_length=4, channel=1):
+        """Record GOPs of gop_length fragments, one fragment per step seconds; returns the fragments."""
+        fragments = []
+        for index in range(gops * gop_length):
+            fragment = f'{start + index * step:08.1f}'.encode() * 4
+            is_key = index % gop_length == 0
+            self.recorder.record(SIM, channel, init, fragment, is_key, now=T0 + start + index * step)
+            fragments.append(fragment)
+        return fragments
+
+    def finish(self, seconds, channel=1):
+        """Close the files and set their modification time to T0 + seconds, as if written live."""
+        self.recorder.close_all()
+        directory = os.path.join(self.root, SIM, f'ch{channel}')
+        for name in os.listdir(directory):
+            os.utime(os.path.join(directory, name), (T0 + seconds, T0 + seconds))
+
+    def files(self, channel=1):
+        return sorted(os.listdir(os.path.join(self.root, SIM, f'ch{channel}')))
+
+    def read(self, recording):
+        return b''.join(recording.iter_bytes())
+
+
+class StreamRecorderTests(RecorderTestCase):
+
+    def test_segment_file_starts_with_init_and_first_keyframe(self):
+        """Test fragments before the first keyframe are skipped and the index lists keyframes only"""
+        self.recorder.record(SIM, 1, b'INIT', b'orphan', False, now=T0)
+        fragments = self.record_gops(b'INIT', 1, gops=2)
+        self.recorder.close_all()
+
+        self.assertEqual(self.files(), ['20250101-125951.idx', '20250101-125951.mp4'])
+        path = os.path.join(self.root, SIM, 'ch1', '20250101-125951')
+        with open(path + '.mp4', 'rb') as f:
+            self.assertEqual(f.read(), b'INIT' + b''.join(fragments))
+        flags, records = _read_index(path + '.idx')
+        self.assertEqual(flags, 0)
+        self.assertEqual(records['time'].tolist(), [int((T0 + 1) * 1000), int((T0 + 5) * 1000)])
+        self.assertEqual(records['offset'].tolist(), [4, 4 + sum(map(len, fragments[:4]))])
+
+    def test_rotates_at_first_keyframe_of_new_hour(self):
+        """Test a new hour starts a new file at its first keyframe, flagged as continuing"""
+        fragments = self.record_gops(b'INIT', 0, gops=5, step=1.0)
+        self.recorder.close_all()
+
+        # 12:59:50 - 13:00:09, the keyframe at 13:00:02 opens the second file
+        self.assertEqual(self.files(), ['20250101-125950.idx', '20250101-125950.mp4',
+                                        '20250101-130002.idx', '20250101-130002.mp4'])
+        flags, _ = _read_index(os.path.join(self.root, SIM, 'ch1', '20250101-130002.idx'))
+        self.assertEqual(flags, FLAG_CONTINUES)
+
+        recording = find_recording(self.root, SIM, 1, at(0), at(30))
+        self.assertEqual(self.read(recording), b'INIT' + b''.join(fragments))
+
+    def test_new_init_segment_starts_new_timeline(self):
+        """Test a changed init segment opens an unflagged file a range does not cross into"""
+        first = self.record_gops(b'INIT', 0, gops=1)
+        self.record_gops(b'INIT2', 4, gops=1)
+        self.recorder.close_all()
+
+        flags, _ = _read_index(os.path.join(self.root, SIM, 'ch1', '20250101-125954.idx'))
+        self.assertEqual(flags, 0)
+        recording = find_recording(self.root, SIM, 1, at(0), at(8))
+        self.assertEqual(self.read(recording), b'INIT' + b''.join(first))
+
+    def test_range_snaps_to_keyframes(self):
+        """Test a range starts at the keyframe before start and ends before the keyframe after end"""
+        fragments = self.record_gops(b'INIT', 0, gops=4)
+
+        recording = find_recording(self.root, SIM, 1, at(5.5), at(9))
+        self.assertEqual(self.read(recording), b'INIT' + b''.join(fragments[4:12]))
+
+        # Open-ended tail: up to what is on disk
+        recording = find_recording(self.root, SIM, 1, at(13), at(60))
+        self.assertEqual(self.read(recording), b'INIT' + b''.join(fragments[12:]))
+
+        # Byte ranges of the footage span the init segment and the files
+        whole = self.read(recording)
+        self.assertEqual(b''.join(recording.iter_bytes(2, 9, chunk_size=3)), whole[2:10])
+
+    def test_range_without_footage(self):
+        """Test ranges before, after and on other streams than a recording find nothing"""
+        self.record_gops(b'INIT', 0, gops=1)
+        self.finish(4)
+        self.assertIsNone(find_recording(self.root, SIM, 1, at(-60), at(-10)))
+        self.assertIsNone(find_recording(self.root, SIM, 1, at(10), at(20)))
+        self.assertIsNotNone(find_recording(self.root, SIM, 1, at(-10), at(2)))
+        self.assertIsNone(find_recording(self.root, SIM, 2, at(0), at(10)))
+        self.assertIsNone(find_recording(self.root, '99', 1, at(0), at(10)))
+
+    def test_old_files_are_pruned(self):
+        """Test files older than the retention are deleted when a stream opens a file"""
+        self.recorder.retention_hours = 1
+        self.record_gops(b'INIT', 0, gops=1)
+        self.recorder.close_all()
+        self.record_gops(b'INIT', 7200, gops=1)
+
+        self.assertEqual(self.files(), ['20250101-145950.idx', '20250101-145950.mp4'])
+
+    def test_server_records_converted_video(self):
+        """Test the JT1078 server appends its fMP4 output to the recording"""
+        server = JT1078Server(frames_per_fragment=1, recorder=self.recorder)
+
+        async def broadcast(*args, **kwargs):
+            pass
+
+        server._broadcast_video = broadcast
+        server.assembler.process_packet = lambda packet: packet['body']
+        for body in (p_frame(), idr(), p_frame(), idr()):
+            async_to_sync(server._process_video_packet)(
+                {'sim': SIM, 'channel': 1, 'is_audio': False, 'body': body}
+            )
+        init = server.converters[f'{SIM}_1'].get_init_segment()
+        server._cleanup_device(SIM)
+
+        name = [name for name in self.files() if name.endswith('.mp4')][0]
+        with open(os.path.join(self.root, SIM, 'ch1', name), 'rb') as f:
+            data = f.read()
+        _, records = _read_index(os.path.join(self.root, SIM, 'ch1', name[:-4] + '.idx'))
+        self.assertTrue(data.startswith(init))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(data[records['offset'][0] + 4:records['offset'][0] + 8], b'moof')
+
+
+class RecordingWriterTests(RecorderTestCase):
+
+    def test_records_on_writer_thread(self):
+        """Test queued fragments are written by the writer thread in order"""
+        writer = RecordingWriter(self.recorder)
+        fragments = [b'k0', b'p1', b'k2']
+        for index, fragment in enumerate(fragments):
+            writer.record(SIM, 1, b'INIT', fragment, fragment.startswith(b'k'), now=T0 + index)
+        writer.close_all()
+
+        with open(os.path.join(self.root, SIM, 'ch1', '20250101-125950.mp4'), 'rb') as f:
+            self.assertEqual(f.read(), b'INIT' + b''.join(fragments))
+
+    def test_full_queue_drops_until_keyframe(self):
+        """Test a stream that lost a fragment resumes at its next keyframe"""
+        writer = RecordingWriter(self.recorder, queue_size=0)
+        writer.record(SIM, 1, b'INIT', b'k0', True, now=T0)
+        writer.queue_size = 10
+        writer.record(SIM, 1, b'INIT', b'p1', False, now=T0 + 1)
+        writer.record(SIM, 1, b'INIT', b'k2', True, now=T0 + 2)
+        writer.record(SIM, 1, b'INIT', b'p3', False, now=T0 + 3)
+        writer.close_all()
+
+        self.assertEqual(writer.dropped, 2)
+        with open(os.path.join(self.root, SIM, 'ch1', '20250101-125952.mp4'), 'rb') as f:
+            self.assertEqual(f.read(), b'INITk2p3')
+
+
+class RecordingEndpointTests(RecorderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.device = Device.objects.create(imei='111111111111111', phone='9800000001', sim='NTC',
+                                            model='EC08', type='dashcam', serial_number=SIM)
+        self.user = User.objects.create(phone='9800000009', username='9800000009')
+        self.fragments = self.record_gops(b'INIT', 0, gops=2)
+        self.body = b'INIT' + b''.join(self.fragments)
+        self.finish(8)
+        settings = override_settings(TCP_SERVICE_RECORDING_DIR=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get(self, params, **headers):
+        url = f'/api/tcp-service/dashcam/recording/{self.device.imei}/1/'
+        request = APIRequestFactory().get(url, params, **headers)
+        force_authenticate(request, user=self.user)
+        return dashcam_recording(request, imei=self.device.imei, channel=1)
+
+    def test_serves_range_as_mp4(self):
+        """Test a time range is served whole with length and range support headers"""
+        response = self.get({'start': at(0).isoformat(), 'end': at(60).isoformat()})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], str(len(self.body)))
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+
+    def test_byte_ranges(self):
+        """Test Range requests get 206 with Content-Range, unsatisfiable ones 416"""
+        params = {'start': at(0).isoformat(), 'end': at(60).isoformat()}
+
+        response = self.get(params, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.body)}')
+        self.assertEqual(b''.join(response.streaming_content), self.body[10:20])
+
+        response = self.get(params, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.body[-5:])
+
+        response = self.get(params, HTTP_RANGE=f'bytes={len(self.body)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.body)}')
+
+    def test_invalid_requests(self):
+        """Test bad times, overlong ranges, missing footage and disabled recording"""
+        self.assertEqual(self.get({'start': 'yesterday', 'end': at(60).isoformat()}).status_code, 400)
+        self.assertEqual(self.get({'start': at(60).isoformat(), 'end': at(0).isoformat()}).status_code, 400)
+        self.assertEqual(self.get({'start': at(0).isoformat(),
+                                   'end': (at(0) + timedelta(days=2)).isoformat()}).status_code, 400)
+        self.assertEqual(self.get({'start': at(3600).isoformat(), 'end': at(3660).isoformat()}).status_code, 404)
+        with override_settings(TCP_SERVICE_RECORDING_DIR=''):
+            self.assertEqual(self.get({'start': at(0).isoformat(), 'end': at(60).isoformat()}).status_code, 404)
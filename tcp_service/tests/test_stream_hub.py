@@ -0,0 +1,258 @@
+import asyncio
+import json
+from unittest import mock
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.test import TestCase, override_settings
+from tcp_service.video.stream_hub import StreamHub, VideoMessage, Viewer
+from tcp_service.video.ws_frame import pack_video_frame
+from tcp_service.websocket.consumer import DashcamVideoConsumer
+
+PHONE = '013800138000'
+
+
+def video_consumer(binary=True):
+    """Consumer collecting sent payloads in consumer.sent; sends wait while consumer.blocked is cleared."""
+    consumer = DashcamVideoConsumer()
+    consumer.binary_video = binary
+    consumer.sent = []
+    consumer.blocked = None
+
+    async def base_send(message):
+        if consumer.blocked is not None:
+            await consumer.blocked.wait()
+        consumer.sent.append(message.get('bytes') or message.get('text'))
+
+    consumer.base_send = base_send
+    return consumer
+
+
+def message(name, is_keyframe=False, is_init=False):
+    return VideoMessage(PHONE, 1, pack_video_frame(name, is_init=is_init, is_keyframe=is_keyframe))
+
+
+async def settle(*viewers):
+    while any(len(viewer) for viewer in viewers):
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+class VideoMessageTest(TestCase):
+    def test_json_text_is_built_once(self):
+        msg = message(b'segment')
+
+        self.assertIs(msg.text, msg.text)
+        self.assertEqual(json.loads(msg.text), {
+            'type': 'video', 'phone': PHONE, 'channel': 1, 'codec': None, 'data': 'c2VnbWVudA==',
+        })
+
+    def test_header_fields_from_frame(self):
+        msg = VideoMessage(PHONE, None, pack_video_frame(b'init', channel=2, is_init=True, codec='avc1.64001F'))
+
+        self.assertEqual((msg.channel, msg.video_type, msg.codec, msg.is_init), (2, 'init_segment', 'avc1.64001F', True))
+
+
+class ViewerTest(TestCase):
+    def test_lagging_viewer_drops_until_keyframe(self):
+        """Test a full queue drops P-frames, and the next keyframe replaces the backlog"""
+        consumer = video_consumer()
+
+        async def run():
+            consumer.blocked = asyncio.Event()
+            viewer = Viewer(consumer, queue_size=3)
+            viewer.offer(message(b'init', is_init=True))
+            await asyncio.sleep(0)
+            # init is being sent, k1 p1 p2 fill the queue, p3 is dropped
+            for name in (b'k1', b'p1', b'p2', b'p3'):
+                viewer.offer(message(name, is_keyframe=name == b'k1'))
+            self.assertTrue(viewer.waiting_for_keyframe)
+            viewer.offer(message(b'p4'))
+            viewer.offer(message(b'k2', is_keyframe=True))
+            viewer.offer(message(b'p5'))
+            metrics = viewer.metrics()
+            consumer.blocked.set()
+            await settle(viewer)
+            viewer.close()
+            return metrics
+
+        metrics = async_to_sync(run)()
+
+        self.assertEqual([frame[5:] for frame in consumer.sent], [b'init', b'k2', b'p5'])
+        self.assertEqual(metrics['dropped_frames'], 5)
+        self.assertEqual(metrics['resyncs'], 1)
+        self.assertEqual(metrics['queued_frames'], 2)
+        self.assertFalse(metrics['waiting_for_keyframe'])
+
+    def test_keyframe_keeps_queued_init_segment(self):
+        consumer = video_consumer()
+
+        async def run():
+            consumer.blocked = asyncio.Event()
+            viewer = Viewer(consumer, queue_size=2)
+            viewer.offer(message(b'k0', is_keyframe=True))
+            await asyncio.sleep(0)
+            viewer.offer(message(b'init', is_init=True))
+            viewer.offer(message(b'p1'))
+            viewer.offer(message(b'k1', is_keyframe=True))
+            consumer.blocked.set()
+            await settle(viewer)
+            viewer.close()
+
+        async_to_sync(run)()
+
+        self.assertEqual([frame[5:] for frame in consumer.sent], [b'k0', b'init', b'k1'])
+
+    def test_old_backlog_counts_as_lagging(self):
+        consumer = video_consumer()
+
+        async def run():
+            consumer.blocked = asyncio.Event()
+            viewer = Viewer(consumer, max_lag=-1)
+            viewer.offer(message(b'k0', is_keyframe=True))
+            viewer.offer(message(b'p1'))
+            viewer.offer(message(b'p2'))
+            waiting = viewer.waiting_for_keyframe
+            viewer.close()
+            return waiting
+
+        self.assertTrue(async_to_sync(run)())
+
+
+class StreamHubTest(TestCase):
+    def test_slow_viewer_does_not_delay_others(self):
+        slow, fast, plain = video_consumer(), video_consumer(), video_consumer(binary=False)
+
+        async def run():
+            slow.blocked = asyncio.Event()
+            hub = StreamHub(queue_size=2)
+            for consumer in (slow, fast, plain):
+                hub.add_viewer(PHONE, consumer)
+            messages = [message(b'k0', is_keyframe=True), message(b'p1'), message(b'p2'), message(b'p3')]
+            for msg in messages:
+                hub.publish(PHONE, msg)
+                await asyncio.sleep(0)
+            await settle(hub.get_viewer(PHONE, fast), hub.get_viewer(PHONE, plain))
+            stats = {item['transport']: item for item in hub.metrics() if item['sent_frames']}
+            for consumer in (slow, fast, plain):
+                hub.remove_viewer(PHONE, consumer)
+            return messages, stats
+
+        messages, stats = async_to_sync(run)()
+
+        self.assertEqual(fast.sent, [msg.frame for msg in messages])
+        # JSON viewers all get the same prepared text
+        self.assertEqual(plain.sent, [msg.text for msg in messages])
+        self.assertIs(plain.sent[0], messages[0].text)
+        self.assertEqual(slow.sent, [])
+        self.assertEqual(stats['binary']['sent_frames'], 4)
+        self.assertEqual(stats['json']['phone'], PHONE)
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    def test_one_group_member_per_stream(self):
+        """Test viewers of a stream share one channel-layer subscription"""
+        first, second = video_consumer(), video_consumer(binary=False)
+        frame = pack_video_frame(b'k0', is_keyframe=True)
+
+        async def run():
+            hub = StreamHub()
+            await hub.subscribe(PHONE, first)
+            await hub.subscribe(PHONE, second)
+            channel_layer = get_channel_layer()
+            members = len(channel_layer.groups[f'video_{PHONE}'])
+            await channel_layer.group_send(f'video_{PHONE}', {
+                'type': 'video.data', 'video_type': 'video', 'phone': PHONE, 'channel': 1,
+                'frame': frame, 'codec': None,
+            })
+            while len(first.sent) < 1 or len(second.sent) < 1:
+                await asyncio.sleep(0.001)
+            await hub.unsubscribe(PHONE, first)
+            listening = PHONE in hub._listeners
+            await hub.unsubscribe(PHONE, second)
+            await asyncio.sleep(0)
+            return members, listening, hub._listeners, channel_layer.groups.get(f'video_{PHONE}')
+
+        members, listening_after_first, listeners, group = async_to_sync(run)()
+
+        self.assertEqual(members, 1)
+        self.assertEqual(first.sent, [frame])
+        self.assertTrue(listening_after_first)
+        self.assertEqual(listeners, {})
+        self.assertFalse(group)
+
+    @override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+    def test_resubscribe_keeps_new_listener(self):
+        """Test a cancelled listener finishing late doesn't drop its replacement"""
+        viewer = video_consumer()
+
+        async def run():
+            hub = StreamHub()
+            await hub.subscribe(PHONE, viewer)
+            await asyncio.sleep(0)
+            old = hub._listeners[PHONE]
+            # The cancelled listener runs its cleanup after the new subscribe
+            await hub.unsubscribe(PHONE, viewer)
+            await hub.subscribe(PHONE, viewer)
+            await asyncio.gather(old, return_exceptions=True)
+            listener = hub._listeners.get(PHONE)
+            await hub.unsubscribe(PHONE, viewer)
+            await asyncio.sleep(0)
+            return old, listener
+
+        old, listener = async_to_sync(run)()
+
+        self.assertIsNotNone(listener)
+        self.assertIsNot(listener, old)
+
+    def test_listener_rejoins_after_channel_layer_failure(self):
+        """Test viewers keep getting frames after receive raises"""
+        viewer = video_consumer()
+        frame = pack_video_frame(b'k0', is_keyframe=True)
+
+        class FlakyLayer:
+            def __init__(self):
+                self.channels = 0
+                self.discarded = []
+                self.failures = 1
+                self.delivered = False
+
+            async def new_channel(self, prefix):
+                self.channels += 1
+                return f'{prefix}{self.channels}'
+
+            async def group_add(self, group, channel):
+                pass
+
+            async def group_discard(self, group, channel):
+                self.discarded.append(channel)
+
+            async def receive(self, channel):
+                if self.failures:
+                    self.failures -= 1
+                    raise ConnectionError('Redis connection lost')
+                if self.delivered:
+                    await asyncio.Event().wait()
+                self.delivered = True
+                return {'type': 'video.data', 'video_type': 'video', 'phone': PHONE, 'channel': 1,
+                        'frame': frame, 'codec': None}
+
+        layer = FlakyLayer()
+
+        async def run():
+            hub = StreamHub()
+            hub.RETRY_DELAY = 0.001
+            await hub.subscribe(PHONE, viewer)
+            for _ in range(1000):
+                if viewer.sent:
+                    break
+                await asyncio.sleep(0.001)
+            await hub.unsubscribe(PHONE, viewer)
+            await asyncio.sleep(0)
+            return hub._listeners
+
+        with mock.patch('channels.layers.get_channel_layer', return_value=layer):
+            listeners = async_to_sync(run)()
+
+        self.assertEqual(viewer.sent, [frame])
+        self.assertEqual(layer.channels, 2)
+        self.assertEqual(layer.discarded, ['video_hub.1', 'video_hub.2'])
+        self.assertEqual(listeners, {})
@@ -0,0 +1,242 @@
+import asyncio
+import struct
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from tcp_service.tcp.jt1078_server import JT1078Server
+from tcp_service.video.converter import VideoConverter
+from tcp_service.video.fmp4_builder import FMP4Builder
+from tcp_service.video.gop_buffer import GopBuffer
+from tcp_service.video.stream_hub import VideoMessage, stream_hub
+from tcp_service.video.ws_frame import pack_video_frame, unpack_video_frame
+from tcp_service.websocket.consumer import DashcamVideoConsumer
+
+START_CODE = b'\x00\x00\x00\x01'
+# x264 1280x720, High profile level 3.1, 25 fps
+SPS = bytes.fromhex('6764001facd9405005bb011000000300100000030320f1831960')
+PPS = bytes([0x68, 0xEE, 0x3C, 0x80])
+
+
+def idr(size=50):
+    return START_CODE + SPS + START_CODE + PPS + START_CODE + bytes([0x65]) + b'\x11' * size
+
+
+def p_frame(size=20):
+    return START_CODE + bytes([0x41]) + b'\x22' * size
+
+
+def trun_samples(segment):
+    """(sample_count, data_offset, moof size) of the first fragment in a segment."""
+    moof_size = struct.unpack('>I', segment[:4])[0]
+    index = segment.find(b'trun')
+    sample_count, data_offset = struct.unpack('>II', segment[index + 8:index + 16])
+    return sample_count, data_offset, moof_size
+
+
+def video_consumer():
+    consumer = DashcamVideoConsumer()
+    consumer.binary_video = True
+    consumer.sent = []
+
+    async def base_send(message):
+        consumer.sent.append(message['bytes'])
+
+    consumer.base_send = base_send
+    return consumer
+
+
+class FragmentBuilderTest(TestCase):
+    def test_multi_sample_fragment_layout(self):
+        """Test trun data offset points at the first sample and mdat holds all samples"""
+        samples = [(b'\x65' + b'a' * 100, True), (b'\x41' + b'b' * 40, False), (b'\x41' + b'c' * 10, False)]
+
+        segment = FMP4Builder().build_fragment(samples, 1, 0, 3600, SPS, PPS)
+
+        sample_count, data_offset, moof_size = trun_samples(segment)
+        self.assertEqual(sample_count, 3)
+        self.assertEqual(data_offset, moof_size + 8)
+        self.assertEqual(segment[moof_size + 4:moof_size + 8], b'mdat')
+        self.assertEqual(struct.unpack('>I', segment[moof_size:moof_size + 4])[0], len(segment) - moof_size)
+        # Keyframe sample carries SPS + PPS, then its own length-prefixed NAL
+        first = segment[data_offset:]
+        self.assertEqual(first[:4 + len(SPS)], struct.pack('>I', len(SPS)) + SPS)
+
+    def test_single_frame_segment_data_offset(self):
+        segment = FMP4Builder().build_media_segment(b'\x41xyz', 1, 0, 3600, False)
+
+        _, data_offset, moof_size = trun_samples(segment)
+        self.assertEqual(data_offset, moof_size + 8)
+        self.assertTrue(segment.endswith(struct.pack('>I', 4) + b'\x41xyz'))
+
+
+class ConverterFragmentTest(TestCase):
+    def test_one_frame_per_fragment_by_default(self):
+        converter = VideoConverter()
+
+        self.assertIsNotNone(converter.add_nal_unit(idr()))
+        self.assertTrue(converter.last_segment_keyframe)
+        self.assertIsNotNone(converter.add_nal_unit(p_frame()))
+        self.assertFalse(converter.last_segment_keyframe)
+        self.assertEqual(converter.fragment_count, 2)
+
+    def test_n_frames_per_fragment(self):
+        """Test frames are packed N per fragment and a keyframe flushes early"""
+        converter = VideoConverter(frames_per_fragment=3)
+
+        outputs = [converter.add_nal_unit(packet) for packet in (idr(), p_frame(), p_frame(), p_frame(), idr())]
+
+        self.assertEqual([output is not None for output in outputs], [False, False, True, False, True])
+        self.assertEqual(trun_samples(outputs[2])[0], 3)
+        # The IDR flushed the single pending P-frame, a fragment never spans a keyframe
+        self.assertEqual(trun_samples(outputs[4])[0], 1)
+        self.assertFalse(converter.last_segment_keyframe)
+        self.assertEqual(len(converter.pending_frames), 1)
+
+    def test_gop_per_fragment(self):
+        converter = VideoConverter(frames_per_fragment=0)
+
+        outputs = [converter.add_nal_unit(packet) for packet in [idr()] + [p_frame()] * 9 + [idr()]]
+
+        self.assertTrue(all(output is None for output in outputs[:-1]))
+        self.assertEqual(trun_samples(outputs[-1])[0], 10)
+        self.assertTrue(converter.last_segment_keyframe)
+
+
+class GopBufferTest(TestCase):
+    def test_replay_is_init_and_current_gop(self):
+        buffer = GopBuffer()
+        self.assertEqual(buffer.replay(), [])
+
+        buffer.set_init(b'init')
+        buffer.add(b'p-before-first-key', False)
+        buffer.add(b'key1', True)
+        buffer.add(b'p1', False)
+        buffer.add(b'key2', True)
+        buffer.add(b'p2', False)
+
+        self.assertEqual(buffer.replay(), [b'init', b'key2', b'p2'])
+
+    def test_oversized_gop_is_dropped_until_next_keyframe(self):
+        buffer = GopBuffer(max_frames=3)
+        buffer.set_init(b'init')
+        for frame, is_keyframe in ((b'key', True), (b'p1', False), (b'p2', False), (b'p3', False), (b'p4', False)):
+            buffer.add(frame, is_keyframe)
+
+        self.assertEqual(buffer.replay(), [b'init'])
+        buffer.add(b'key2', True)
+        self.assertEqual(buffer.replay(), [b'init', b'key2'])
+
+
+class LateJoinTest(TestCase):
+    PHONE = '013800138000'
+
+    def run_viewer(self, consumer, steps, timeout=60):
+        """Run steps(viewer) against a viewer of the process hub waiting for a replay."""
+        async def run():
+            viewer = stream_hub.add_viewer(self.PHONE, consumer)
+            viewer.hold_for_replay(timeout)
+            try:
+                await steps(viewer)
+                while len(viewer):
+                    await asyncio.sleep(0)
+                await asyncio.sleep(0)
+            finally:
+                stream_hub.remove_viewer(self.PHONE, consumer)
+
+        async_to_sync(run)()
+
+    def test_replay_then_live(self):
+        """Test live frames are held until the replay, and the in-flight duplicate is dropped"""
+        consumer = video_consumer()
+        init = pack_video_frame(b'init', is_init=True, codec='avc1.64001F')
+        key = pack_video_frame(b'key', is_keyframe=True)
+        p1 = pack_video_frame(b'p1')
+        p2 = pack_video_frame(b'p2')
+
+        async def steps(viewer):
+            viewer.offer(VideoMessage(self.PHONE, 1, key))
+            await consumer.video_replay({'type': 'video.replay', 'phone': self.PHONE, 'frames': [init, key, p1]})
+            viewer.offer(VideoMessage(self.PHONE, 1, p1))
+            viewer.offer(VideoMessage(self.PHONE, 1, p2))
+            self.assertFalse(viewer.awaiting_replay)
+
+        self.run_viewer(consumer, steps)
+
+        self.assertEqual(consumer.sent, [init, key, p1, p2])
+
+    def test_live_init_cancels_replay(self):
+        """Test a stream starting after the request goes live on its init segment"""
+        consumer = video_consumer()
+        init = pack_video_frame(b'init', is_init=True)
+
+        async def steps(viewer):
+            viewer.offer(VideoMessage(self.PHONE, 1, init))
+            await consumer.video_replay({'type': 'video.replay', 'phone': self.PHONE, 'frames': [b'stale']})
+
+        self.run_viewer(consumer, steps)
+
+        self.assertEqual(consumer.sent, [init])
+
+    def test_live_resumes_after_timeout(self):
+        consumer = video_consumer()
+        frame = pack_video_frame(b'p')
+
+        async def steps(viewer):
+            viewer.offer(VideoMessage(self.PHONE, 1, frame))
+
+        self.run_viewer(consumer, steps, timeout=-1)
+
+        self.assertEqual(consumer.sent, [frame])
+
+
+class RecordingChannelLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, channel, message):
+        self.sent.append((channel, message))
+
+
+class ServerReplayTest(TestCase):
+    def test_replay_request_sends_buffered_frames_of_device(self):
+        server = JT1078Server(frames_per_fragment=1)
+        server._get_gop_buffer('013800138000', 1).set_init(b'init1')
+        server._get_gop_buffer('013800138000', 1).add(b'key1', True)
+        server._get_gop_buffer('013800138000', 2).set_init(b'init2')
+        server._get_gop_buffer('99', 1).set_init(b'other')
+        layer = RecordingChannelLayer()
+
+        async_to_sync(server._handle_replay_request)(
+            layer, {'phone': '013800138000', 'reply_channel': 'consumer.1'}
+        )
+
+        self.assertEqual(layer.sent, [('consumer.1', {
+            'type': 'video.replay', 'phone': '013800138000', 'frames': [b'init1', b'key1', b'init2'],
+        })])
+
+    def test_no_reply_without_buffer(self):
+        layer = RecordingChannelLayer()
+
+        async_to_sync(JT1078Server()._handle_replay_request)(layer, {'phone': '1', 'reply_channel': 'c'})
+
+        self.assertEqual(layer.sent, [])
+
+    def test_processed_packets_fill_buffer_with_keyframe_flags(self):
+        """Test the server keeps init + GOP frames as broadcast, flags set"""
+        server = JT1078Server(frames_per_fragment=1)
+        broadcasts = []
+
+        async def broadcast(sim, data, frame, is_init=False, codec=None, channel=1):
+            broadcasts.append(frame)
+
+        server._broadcast_video = broadcast
+        # Bodies are whole frames already
+        server.assembler.process_packet = lambda packet: packet['body']
+        for body in (idr(), p_frame()):
+            async_to_sync(server._process_video_packet)(
+                {'sim': '013800138000', 'channel': 1, 'is_audio': False, 'body': body}
+            )
+
+        replay = server._get_gop_buffer('013800138000', 1).replay()
+        self.assertEqual(replay, broadcasts)
+        headers = [unpack_video_frame(frame)[0] for frame in replay]
+        self.assertEqual([(h['is_init'], h['is_keyframe']) for h in headers], [(True, False), (False, True), (False, False)])
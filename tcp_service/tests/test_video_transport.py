@@ -0,0 +1,155 @@
+import asyncio
+import base64
+import json
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from tcp_service.tcp.device_manager import DeviceManager
+from tcp_service.video.stream_hub import StreamHub, VideoMessage
+from tcp_service.video.ws_frame import pack_video_frame, unpack_video_frame
+from tcp_service.websocket.consumer import DashcamVideoConsumer
+
+
+def video_consumer(binary):
+    """Consumer whose sent messages are collected in consumer.sent."""
+    consumer = DashcamVideoConsumer()
+    consumer.binary_video = binary
+    consumer.sent = []
+
+    async def base_send(message):
+        consumer.sent.append(message)
+
+    consumer.base_send = base_send
+    return consumer
+
+
+async def settle(hub):
+    """Wait until every viewer of the hub has sent its queue."""
+    while any(len(viewer) for viewers in hub.viewers.values() for viewer in viewers.values()):
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+def deliver(events, *consumers):
+    """Pass channel-layer video events to consumers through a stream hub."""
+    async def run():
+        hub = StreamHub()
+        for consumer in consumers:
+            hub.add_viewer('013800138000', consumer)
+        for event in events:
+            hub.publish('013800138000', VideoMessage.from_event(event))
+        await settle(hub)
+        for consumer in consumers:
+            hub.remove_viewer('013800138000', consumer)
+
+    async_to_sync(run)()
+
+
+class VideoFrameTest(TestCase):
+    def test_init_frame_round_trip(self):
+        """Test init frames carry channel, flag, codec id and codec string"""
+        frame = pack_video_frame(b'ftypmoov', channel=2, is_init=True, codec='avc1.64001F')
+
+        header, segment = unpack_video_frame(frame)
+
+        self.assertEqual(header, {
+            'version': 1, 'is_init': True, 'is_keyframe': False, 'is_audio': False, 'channel': 2,
+            'codec_id': 1, 'codec': 'avc1.64001F',
+        })
+        self.assertEqual(bytes(segment), b'ftypmoov')
+
+    def test_media_frame_has_five_byte_header(self):
+        frame = pack_video_frame(b'moofmdat', channel=1, codec='hvc1.1.6.L93.B0')
+
+        self.assertEqual(frame[:5], bytes([1, 0, 1, 2, 0]))
+        self.assertEqual(frame[5:], b'moofmdat')
+
+    def test_invalid_frames_raise(self):
+        with self.assertRaises(ValueError):
+            unpack_video_frame(b'\x01\x00')
+        with self.assertRaises(ValueError):
+            unpack_video_frame(bytes([9, 0, 1, 0, 0]))
+        with self.assertRaises(ValueError):
+            unpack_video_frame(bytes([1, 1, 1, 1, 10]) + b'avc1')
+
+
+class ConsumerVideoDataTest(TestCase):
+    def event(self, data=b'segment', **extra):
+        return {
+            'type': 'video.data',
+            'video_type': 'video',
+            'phone': '013800138000',
+            'channel': 1,
+            'frame': pack_video_frame(data, channel=1),
+            'codec': None,
+            **extra,
+        }
+
+    def test_binary_viewer_gets_frame_bytes(self):
+        consumer = video_consumer(binary=True)
+        event = self.event()
+
+        deliver([event], consumer)
+
+        self.assertEqual(consumer.sent, [{'type': 'websocket.send', 'bytes': event['frame']}])
+
+    def test_json_viewer_gets_base64_message(self):
+        """Test old clients still get the base64 JSON message"""
+        consumer = video_consumer(binary=False)
+
+        deliver([self.event(b'\x00\x01json')], consumer)
+
+        message = json.loads(consumer.sent[0]['text'])
+        self.assertEqual(message, {
+            'type': 'video',
+            'phone': '013800138000',
+            'channel': 1,
+            'codec': None,
+            'data': base64.b64encode(b'\x00\x01json').decode(),
+        })
+
+    def test_json_viewers_see_each_frame(self):
+        """Test the per-message base64 doesn't leak into the next frame"""
+        consumer = video_consumer(binary=False)
+
+        deliver([self.event(b'first'), self.event(b'second')], consumer)
+
+        payloads = [base64.b64decode(json.loads(message['text'])['data']) for message in consumer.sent]
+        self.assertEqual(payloads, [b'first', b'second'])
+
+    def test_base64_event_from_old_server(self):
+        """Test events carrying base64 'data' instead of 'frame' work for both transports"""
+        event = self.event()
+        del event['frame']
+        event.update(video_type='init_segment', data=base64.b64encode(b'init').decode(), codec='avc1.640028')
+        binary, plain = video_consumer(binary=True), video_consumer(binary=False)
+
+        deliver([event], binary, plain)
+
+        header, segment = unpack_video_frame(binary.sent[0]['bytes'])
+        self.assertTrue(header['is_init'])
+        self.assertEqual(header['codec'], 'avc1.640028')
+        self.assertEqual(bytes(segment), b'init')
+        self.assertEqual(json.loads(plain.sent[0]['text'])['data'], event['data'])
+
+
+class DeviceManagerBroadcastTest(TestCase):
+    def test_mixed_clients(self):
+        """Test binary and JSON clients of one device each get their format"""
+        manager = DeviceManager()
+        binary, plain = video_consumer(binary=True), video_consumer(binary=False)
+        manager.add_websocket_client('013800138000', binary)
+        manager.add_websocket_client('013800138000', plain)
+
+        async def broadcast():
+            await manager.broadcast_video('013800138000', b'init', is_init=True, codec='avc1.640028', channel=2)
+            await settle(manager.stream_hub)
+
+        async_to_sync(broadcast)()
+
+        header, segment = unpack_video_frame(binary.sent[0]['bytes'])
+        self.assertEqual((header['channel'], header['codec']), (2, 'avc1.640028'))
+        self.assertEqual(bytes(segment), b'init')
+        message = json.loads(plain.sent[0]['text'])
+        self.assertEqual(message['type'], 'init_segment')
+        self.assertEqual(message['codec'], 'avc1.640028')
+        self.assertEqual(base64.b64decode(message['data']), b'init')
@@ -8,4 +8,5 @@ urlpatterns = [
     path('dashcam/command/', views.dashcam_command, name='dashcam-command'),
     path('dashcam/devices/', views.dashcam_devices, name='dashcam-devices'),
     path('dashcam/status/<str:imei>/', views.dashcam_connection_status, name='dashcam-status'),
+    path('dashcam/recording/<str:imei>/<int:channel>/', views.dashcam_recording, name='dashcam-recording'),
 ]
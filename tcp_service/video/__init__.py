@@ -1,7 +1,17 @@
+from .audio_converter import AudioConverter
 from .converter import VideoConverter
 from .fmp4_builder import FMP4Builder
+from .hevc_converter import HevcConverter
+from .stream_hub import StreamHub, VideoMessage
+from .ws_frame import pack_video_frame, unpack_video_frame
 
 __all__ = [
+    'AudioConverter',
     'VideoConverter',
     'FMP4Builder',
+    'HevcConverter',
+    'StreamHub',
+    'VideoMessage',
+    'pack_video_frame',
+    'unpack_video_frame',
 ]
@@ -0,0 +1,181 @@
+"""
+JT1078 Audio to fMP4 Converter
+
+Converts JT1078 audio frames of one device channel to an fMP4 audio track
+(its own init segment, played next to the video in the same MediaSource):
+- AAC (ADTS) is passed through as mp4a
+- G.711A / G.711U / IMA ADPCM are decoded to 16-bit PCM and carried as
+  uncompressed FLAC (see video.flac), which MSE plays everywhere
+
+Decode times come from the JT1078 timestamps mapped onto the video track's
+timeline, so audio and video stay in sync.
+"""
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from . import flac
+from .audio_codecs import (
+    ALAW_TABLE, ULAW_TABLE, decode_g711, decode_ima_adpcm, split_adts, strip_hisi_header,
+)
+from .fmp4_builder import FMP4Builder
+from ..protocol.constants import DEFAULT_AUDIO_SAMPLE_RATE, MAX_AV_DRIFT_MS, JT1078PayloadType
+
+logger = logging.getLogger(__name__)
+
+AAC_FRAME_SAMPLES = 1024
+FLAC_CODEC = 'flac'
+
+# Payload types decoded to PCM, and their decoders
+PCM_DECODERS = {
+    JT1078PayloadType.G711A: lambda payload: decode_g711(payload, ALAW_TABLE),
+    JT1078PayloadType.G711U: lambda payload: decode_g711(payload, ULAW_TABLE),
+    JT1078PayloadType.ADPCMA: decode_ima_adpcm,
+}
+SUPPORTED_PAYLOAD_TYPES = frozenset(PCM_DECODERS) | {JT1078PayloadType.AAC}
+
+
+class AudioConverter:
+    """
+    Converts the audio frames of one stream to fMP4 segments.
+
+    The init segment is built from the first usable frame (the AAC config
+    comes from its ADTS header). Every frame becomes one moof + mdat; each
+    audio sample is a sync sample, so a viewer can start at any segment.
+
+    Timing: frames are laid end to end by sample count. The timeline is
+    (re)aligned to the video clock (the frame's JT1078 timestamp relative to
+    the video track's decode time 0) at the first frame and whenever the two
+    drift apart by more than MAX_AV_DRIFT_MS, e.g. after dropped audio.
+    """
+
+    def __init__(self, payload_type: int, sample_rate: int = DEFAULT_AUDIO_SAMPLE_RATE):
+        self.payload_type = payload_type
+        self.default_sample_rate = sample_rate
+        self.sample_rate = sample_rate
+        self.channels = 1
+        self.codec: Optional[str] = None
+        self.init_segment: Optional[bytes] = None
+        self.builder = FMP4Builder(timescale=sample_rate)
+        self.frame_count = 0
+        self.fragment_count = 0
+        # Decode time (in samples) where the next frame goes
+        self.next_decode_time: Optional[int] = None
+        self._warned = False
+
+    @property
+    def supported(self) -> bool:
+        return self.payload_type in SUPPORTED_PAYLOAD_TYPES
+
+    def process_frame(self, payload: bytes, media_time: Optional[float]) -> Optional[bytes]:
+        """
+        Convert one JT1078 audio frame.
+
+        Args:
+            payload: Audio frame body
+            media_time: Seconds of the frame on the video timeline, None while
+                        the video track hasn't started (the frame is dropped)
+
+        Returns:
+            fMP4 media segment (moof + mdat), or None
+        """
+        if not self.supported:
+            if not self._warned:
+                logger.warning(f"Audio payload type {self.payload_type} is not supported, dropping audio")
+                self._warned = True
+            return None
+        if media_time is None or media_time < 0 or not payload:
+            return None
+
+        payload = strip_hisi_header(payload)
+        if self.payload_type == JT1078PayloadType.AAC:
+            samples = self._aac_samples(payload)
+        else:
+            samples = self._pcm_samples(payload, media_time)
+        if not samples:
+            return None
+
+        durations = [duration for _, duration in samples]
+        decode_time = self._decode_time(media_time, sum(durations))
+        self.frame_count += 1
+        self.fragment_count += 1
+        return self.builder.build_fragment(
+            [(sample, True) for sample, _ in samples],
+            sequence_number=self.fragment_count,
+            decode_time=decode_time,
+            duration=durations[-1],
+            durations=durations,
+            length_prefixed=True
+        )
+
+    def _aac_samples(self, payload: bytes) -> List[Tuple[bytes, int]]:
+        """Raw AAC access units of ADTS data, 1024 samples each."""
+        config, frames = split_adts(payload)
+        if config is None:
+            return []
+        if self.init_segment is None:
+            self.sample_rate = config.sample_rate
+            self.channels = config.channels or 1
+            self.builder.timescale = self.sample_rate
+            self.codec = f'mp4a.40.{config.object_type}'
+            self.init_segment = self.builder.build_audio_init_segment(
+                self.builder.build_aac_sample_entry(config.audio_specific_config(),
+                                                    self.channels, self.sample_rate)
+            )
+            logger.info(f"Initialized audio: AAC {self.sample_rate} Hz, {self.channels} ch, codec={self.codec}")
+        return [(frame, AAC_FRAME_SAMPLES) for frame in frames]
+
+    def _pcm_samples(self, payload: bytes, media_time: float) -> List[Tuple[bytes, int]]:
+        """Decoded PCM as FLAC frames, at most flac.MAX_BLOCK_SIZE samples each."""
+        pcm: np.ndarray = PCM_DECODERS[self.payload_type](payload)
+        if not len(pcm):
+            return []
+        if self.init_segment is None:
+            self.codec = FLAC_CODEC
+            self.init_segment = self.builder.build_audio_init_segment(
+                self.builder.build_flac_sample_entry(flac.stream_info(self.sample_rate),
+                                                     self.channels, self.sample_rate)
+            )
+            logger.info(f"Initialized audio: payload type {self.payload_type} as PCM/FLAC "
+                        f"{self.sample_rate} Hz, codec={self.codec}")
+
+        # FLAC frames carry their first sample number, it is the decode time
+        sample_number = self._peek_decode_time(media_time)
+        frames = []
+        for start in range(0, len(pcm), flac.MAX_BLOCK_SIZE):
+            block = pcm[start:start + flac.MAX_BLOCK_SIZE]
+            frames.append((flac.encode_frame(block, sample_number + start, self.sample_rate), len(block)))
+        return frames
+
+    def _peek_decode_time(self, media_time: float) -> int:
+        """Decode time the next frame will get, without advancing the timeline."""
+        target = round(media_time * self.sample_rate)
+        drift = MAX_AV_DRIFT_MS * self.sample_rate // 1000
+        if self.next_decode_time is None or abs(target - self.next_decode_time) > drift:
+            return target
+        return self.next_decode_time
+
+    def _decode_time(self, media_time: float, duration: int) -> int:
+        """Place a frame of duration samples on the timeline, realigning on drift."""
+        decode_time = self._peek_decode_time(media_time)
+        self.next_decode_time = decode_time + duration
+        return decode_time
+
+    def get_init_segment(self) -> Optional[bytes]:
+        """Get the initialization segment if available."""
+        return self.init_segment
+
+    def get_codec_string(self) -> Optional[str]:
+        """Get the codec string for MediaSource (mp4a.40.2, flac)."""
+        return self.codec
+
+    def reset(self):
+        """Reset converter state for a new stream."""
+        self.init_segment = None
+        self.codec = None
+        self.sample_rate = self.builder.timescale = self.default_sample_rate
+        self.channels = 1
+        self.frame_count = 0
+        self.fragment_count = 0
+        self.next_decode_time = None
@@ -0,0 +1,78 @@
+"""
+Bitstream Reader
+
+Bit-level reading of H.264/H.265 parameter sets: emulation prevention
+removal (NAL payload -> RBSP), fixed-width fields and exp-Golomb codes.
+"""
+
+EMULATION_PREVENTION = b'\x00\x00\x03'
+
+
+def unescape_rbsp(data: bytes) -> bytes:
+    """
+    Remove emulation prevention bytes (00 00 03 -> 00 00) from a NAL payload.
+
+    bytes.replace scans left to right without overlaps and resumes after each
+    match, which is exactly the spec's rule that zero counting restarts after
+    a removed 03.
+    """
+    if EMULATION_PREVENTION not in data:
+        return bytes(data)
+    return bytes(data).replace(EMULATION_PREVENTION, b'\x00\x00')
+
+
+class BitReader:
+    """
+    MSB-first reader over an RBSP.
+
+    The whole buffer is held as one integer, so a field is a shift and a
+    mask and an exp-Golomb prefix is found with int.bit_length() instead of
+    a loop over bits.
+
+    Raises:
+        ValueError: on reads past the end of the data
+    """
+
+    def __init__(self, data: bytes):
+        self._value = int.from_bytes(data, 'big')
+        self._size = len(data) * 8
+        self.position = 0
+
+    @property
+    def bits_left(self) -> int:
+        return self._size - self.position
+
+    def read_bits(self, count: int) -> int:
+        """Unsigned integer of `count` bits, u(n)."""
+        if count == 0:
+            return 0
+        end = self.position + count
+        if end > self._size:
+            raise ValueError('Read past the end of the bitstream')
+        self.position = end
+        return (self._value >> (self._size - end)) & ((1 << count) - 1)
+
+    def read_flag(self) -> bool:
+        return bool(self.read_bits(1))
+
+    def skip_bits(self, count: int) -> None:
+        if self.position + count > self._size:
+            raise ValueError('Read past the end of the bitstream')
+        self.position += count
+
+    def read_ue(self) -> int:
+        """Unsigned exp-Golomb code, ue(v)."""
+        left = self._size - self.position
+        remaining = self._value & ((1 << left) - 1)
+        if not remaining:
+            raise ValueError('Read past the end of the bitstream')
+        leading_zeros = left - remaining.bit_length()
+        if leading_zeros > 31:
+            raise ValueError('Exp-Golomb code longer than 32 bits')
+        self.position += leading_zeros
+        return self.read_bits(leading_zeros + 1) - 1
+
+    def read_se(self) -> int:
+        """Signed exp-Golomb code, se(v): 1, 2, 3, 4 -> 1, -1, 2, -2."""
+        code = self.read_ue()
+        return (code + 1) // 2 if code & 1 else -(code // 2)
@@ -2,13 +2,19 @@
 H.264 to fMP4 Video Converter
 
 Converts raw H.264 NAL units from JT1078 packets to fragmented MP4 format
-for browser playback using MediaSource Extensions (MSE).
+for browser playback using MediaSource Extensions (MSE). H.265 streams use
+the HevcConverter subclass (video.hevc_converter).
 """
 import logging
 from typing import Optional, List, Tuple
 
 from .fmp4_builder import FMP4Builder
-from ..protocol.constants import DEFAULT_VIDEO_WIDTH, DEFAULT_VIDEO_HEIGHT, DEFAULT_VIDEO_FPS, DEFAULT_VIDEO_TIMESCALE
+from .h264_sps import parse_sps
+from .nal import split_nal_units, to_length_prefixed
+from ..protocol.constants import (
+    DEFAULT_VIDEO_WIDTH, DEFAULT_VIDEO_HEIGHT, DEFAULT_VIDEO_FPS, DEFAULT_VIDEO_TIMESCALE,
+    DEFAULT_FRAMES_PER_FRAGMENT, MAX_TIMESTAMP_GAP_MS,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -19,16 +25,31 @@ class VideoConverter:
     
     Browser MSE requires:
     1. Init segment (ftyp + moov) - sent once with codec info
-    2. Media segments (moof + mdat) - sent for each frame
+    2. Media segments (moof + mdat) - sent for each fragment of frames
     
     NAL unit types:
     - Type 1: Non-IDR slice (P/B frame)
     - Type 5: IDR slice (I-frame / keyframe)
     - Type 7: SPS (Sequence Parameter Set)
     - Type 8: PPS (Picture Parameter Set)
+    
+    The slices of one picture (first_mb_in_slice restarting at 0 starts the
+    next) form one sample, stored length-prefixed (AVCC) as MP4 needs it.
+    
+    Frames are packed frames_per_fragment at a time into one moof + mdat
+    (multi-sample trun), 0 packs a whole GOP. Fragments always start on a
+    keyframe boundary, so a pending fragment is flushed when an IDR arrives.
+    
+    Decode times follow the device's JT1078 timestamps (milliseconds), a
+    sample lasts until the next frame. Missing, repeated or jumping
+    timestamps fall back to the frame rate from the SPS VUI (or
+    DEFAULT_VIDEO_FPS) without breaking the timeline.
     """
     
-    def __init__(self):
+    # Prepend SPS/PPS to keyframe samples
+    IN_BAND_PARAMETER_SETS = True
+    
+    def __init__(self, frames_per_fragment: int = DEFAULT_FRAMES_PER_FRAGMENT):
         self.initialized = False
         self.init_segment: Optional[bytes] = None
         self.width = DEFAULT_VIDEO_WIDTH
@@ -36,26 +57,42 @@ class VideoConverter:
         self.fps = DEFAULT_VIDEO_FPS
         self.timescale = DEFAULT_VIDEO_TIMESCALE
         self.sps: Optional[bytes] = None
+        self.sps_info = None
         self.pps: Optional[bytes] = None
         self.frame_count = 0
+        self.fragment_count = 0
+        self.frames_per_fragment = frames_per_fragment
         self.builder = FMP4Builder()
         
+        # Frames waiting for the current fragment: [(AVCC sample, is_keyframe)]
+        self.pending_frames: List[Tuple[bytes, bool]] = []
+        # Decode time of each pending frame, in timescale units
+        self.pending_times: List[int] = []
+        # Device timestamp (ms) at decode time 0, decode time and duration of the last frame
+        self.timestamp_origin: Optional[int] = None
+        self.last_decode_time: Optional[int] = None
+        self.last_duration: Optional[int] = None
+        # Whether the last returned segment starts with a keyframe
+        self.last_segment_keyframe = False
+        
         # Buffer for assembling fragmented frames
         self.frame_accumulator = b""
     
-    def process_packet(self, body: bytes, subpackage: int) -> Optional[bytes]:
+    def process_packet(self, body: bytes, subpackage: int,
+                       timestamp: Optional[int] = None) -> Optional[bytes]:
         """
         Process a JT1078 packet and return fMP4 segment when ready.
         
         Args:
             body: NAL unit data from JT1078 packet
             subpackage: Subpackage type (0=Atomic, 1=First, 2=Last, 3=Middle)
+            timestamp: JT1078 frame timestamp in milliseconds, optional
         
         Returns:
             fMP4 media segment bytes, or None if not ready
         """
         if subpackage == 0:  # Atomic - complete frame
-            return self.add_nal_unit(body)
+            return self.add_nal_unit(body, timestamp)
         elif subpackage == 1:  # First fragment
             self.frame_accumulator = body
             return None
@@ -66,144 +103,174 @@ class VideoConverter:
             self.frame_accumulator += body
             complete_frame = self.frame_accumulator
             self.frame_accumulator = b""
-            return self.add_nal_unit(complete_frame)
+            return self.add_nal_unit(complete_frame, timestamp)
         return None
     
-    def add_nal_unit(self, nal_data: bytes) -> Optional[bytes]:
+    def add_nal_unit(self, nal_data: bytes, timestamp: Optional[int] = None) -> Optional[bytes]:
         """
         Process NAL units and return fMP4 segment when ready.
         
         Args:
             nal_data: H.264 data (may contain multiple NAL units)
+            timestamp: Device timestamp of the frame in milliseconds, optional
         
         Returns:
-            fMP4 media segment bytes, or None
+            fMP4 media segment bytes (one or more moof + mdat), or None
         """
         if not nal_data or len(nal_data) < 4:
             return None
         
-        # Split data into individual NAL units
-        nal_units = self._split_nal_units(nal_data)
-        segment = None
+        segments = []
+        picture = []  # VCL NAL units of the current picture
+        picture_is_keyframe = False
         
-        for nal_unit in nal_units:
-            if not nal_unit:
+        for nal_unit in split_nal_units(nal_data):
+            is_keyframe = self._handle_nal_unit(nal_unit)
+            if is_keyframe is None:  # Parameter set or other non-slice NAL unit
                 continue
             
-            # NAL type is in bits 0-4 of first byte
-            nal_type = nal_unit[0] & 0x1F
+            if picture and self._starts_picture(nal_unit):
+                segments.extend(self._queue_picture(picture, picture_is_keyframe, timestamp))
+                picture = []
+                picture_is_keyframe = False
             
-            if nal_type == 7:  # SPS
-                self.sps = nal_unit
-                self._parse_sps(nal_unit)
-                logger.debug(f"Got SPS: {len(nal_unit)} bytes, {self.width}x{self.height}")
+            if is_keyframe and not self.initialized and self._has_parameter_sets():
+                self.initialized = True
+                self.init_segment = self._create_init_segment()
+                logger.info(f"Initialized video: {self.width}x{self.height}, codec={self._get_codec_string()}")
             
-            elif nal_type == 8:  # PPS
-                self.pps = nal_unit
-                logger.debug(f"Got PPS: {len(nal_unit)} bytes")
-            
-            elif nal_type == 5:  # IDR frame (keyframe)
-                if self.sps and self.pps and not self.initialized:
-                    self.initialized = True
-                    self.init_segment = self._create_init_segment()
-                    logger.info(f"Initialized video: {self.width}x{self.height}, codec={self._get_codec_string()}")
-                
-                if self.initialized:
-                    segment = self._create_media_segment(nal_unit, is_keyframe=True)
-                    self.frame_count += 1
-            
-            elif nal_type == 1:  # Non-IDR frame
-                if self.initialized:
-                    segment = self._create_media_segment(nal_unit, is_keyframe=False)
-                    self.frame_count += 1
+            picture.append(nal_unit)
+            picture_is_keyframe = picture_is_keyframe or is_keyframe
+        
+        if picture:
+            segments.extend(self._queue_picture(picture, picture_is_keyframe, timestamp))
         
-        return segment
+        if not segments:
+            return None
+        self.last_segment_keyframe = segments[0][1]
+        return b"".join(segment for segment, _ in segments)
     
-    def _split_nal_units(self, data: bytes) -> List[bytes]:
+    def _handle_nal_unit(self, nal_unit: memoryview) -> Optional[bool]:
         """
-        Split data containing multiple NAL units with Annex B start codes.
+        Store parameter sets, classify slices.
         
-        H.264 Annex B uses:
-        - 4-byte start code: 00 00 00 01
-        - 3-byte start code: 00 00 01
+        Returns:
+            None for non-slice NAL units, else whether the slice is a keyframe (IDR)
         """
-        nal_units = []
-        i = 0
+        # NAL type is in bits 0-4 of first byte
+        nal_type = nal_unit[0] & 0x1F
         
-        while i < len(data) - 3:
-            start_code_len = 0
-            
-            # Check for 4-byte start code (00 00 00 01)
-            if data[i:i+4] == b'\x00\x00\x00\x01':
-                start_code_len = 4
-            # Check for 3-byte start code (00 00 01)
-            elif data[i:i+3] == b'\x00\x00\x01':
-                start_code_len = 3
-            
-            if start_code_len > 0:
-                nal_start = i + start_code_len
-                # Find next start code
-                nal_end = self._find_next_start_code(data, nal_start)
-                
-                if nal_end > nal_start:
-                    nal_unit = data[nal_start:nal_end]
-                    if len(nal_unit) > 0:
-                        nal_units.append(nal_unit)
-                
-                i = nal_end
-            else:
-                i += 1
+        if nal_type == 1 or nal_type == 5:  # Non-IDR / IDR slice
+            return nal_type == 5
+        
+        if nal_type == 7:  # SPS
+            self.sps = bytes(nal_unit)
+            self._parse_sps(self.sps)
+            logger.debug(f"Got SPS: {len(nal_unit)} bytes, {self.width}x{self.height}")
+        elif nal_type == 8:  # PPS
+            self.pps = bytes(nal_unit)
+            logger.debug(f"Got PPS: {len(nal_unit)} bytes")
+        return None
+    
+    @staticmethod
+    def _starts_picture(nal_unit: memoryview) -> bool:
+        """Whether a slice is the first of its picture: first_mb_in_slice == 0 (ue "1")."""
+        return len(nal_unit) > 1 and bool(nal_unit[1] & 0x80)
+    
+    def _has_parameter_sets(self) -> bool:
+        """Whether the init segment can be built."""
+        return bool(self.sps and self.pps)
+    
+    def _queue_picture(self, nal_units: List[memoryview], is_keyframe: bool,
+                       timestamp: Optional[int]) -> List[Tuple[bytes, bool]]:
+        """Queue the slices of one picture as a sample, once the stream is initialized."""
+        if not self.initialized:
+            return []
+        return self._queue_frame(to_length_prefixed(nal_units), is_keyframe, timestamp)
+    
+    def _queue_frame(self, sample: bytes, is_keyframe: bool,
+                     timestamp: Optional[int] = None) -> List[Tuple[bytes, bool]]:
+        """
+        Add a frame to the pending fragment.
         
-        # If no start codes found, treat entire data as single NAL unit
-        if not nal_units and len(data) > 0:
-            nal_units.append(data)
+        Returns:
+            (segment, starts_with_keyframe) of the fragments completed by it
+        """
+        completed = []
+        if is_keyframe and self.pending_frames:
+            completed.append(self._flush_fragment())
+        
+        self.pending_frames.append((sample, is_keyframe))
+        self.pending_times.append(self._decode_time(timestamp))
+        self.frame_count += 1
         
-        return nal_units
+        if self.frames_per_fragment and len(self.pending_frames) >= self.frames_per_fragment:
+            completed.append(self._flush_fragment())
+        return completed
     
-    def _find_next_start_code(self, data: bytes, start: int) -> int:
-        """Find the position of the next start code."""
-        i = start
-        while i < len(data) - 2:
-            if data[i:i+3] == b'\x00\x00\x01':
-                # Check if it's a 4-byte start code
-                if i > 0 and data[i-1] == 0:
-                    return i - 1
-                return i
-            i += 1
-        return len(data)
+    def _nominal_duration(self) -> int:
+        """Frame duration in timescale units from the frame rate."""
+        return round(self.timescale / self.fps)
     
-    def _parse_sps(self, sps: bytes) -> None:
+    def _decode_time(self, timestamp: Optional[int]) -> int:
         """
-        Parse SPS to extract video dimensions.
+        Decode time of the next frame from its device timestamp (ms).
         
-        This is a simplified parser - full SPS parsing is complex.
-        We extract profile, level, and try to get dimensions.
+        A timestamp that is missing, not after the previous frame or more than
+        MAX_TIMESTAMP_GAP_MS after it continues the timeline by one nominal frame
+        duration instead, and later timestamps are taken relative to that.
         """
-        if len(sps) < 4:
-            return
+        if self.last_decode_time is None:
+            self.timestamp_origin = timestamp or None
+            self.last_decode_time = 0
+            return 0
         
-        # Profile and level are at fixed positions
-        profile_idc = sps[1]
-        level_idc = sps[3]
+        decode_time = None
+        if timestamp and self.timestamp_origin is not None:
+            candidate = (timestamp - self.timestamp_origin) * self.timescale // 1000
+            delta = candidate - self.last_decode_time
+            if 0 < delta <= MAX_TIMESTAMP_GAP_MS * self.timescale // 1000:
+                decode_time = candidate
         
-        # Default dimensions based on level
-        level_dimensions = {
-            30: (1280, 720),   # Level 3.0
-            31: (1280, 720),   # Level 3.1
-            32: (1920, 1080),  # Level 3.2
-            40: (1920, 1080),  # Level 4.0
-            41: (1920, 1080),  # Level 4.1
-            42: (2048, 1080),  # Level 4.2
-            50: (2560, 1920),  # Level 5.0
-            51: (4096, 2160),  # Level 5.1
-        }
+        if decode_time is None:
+            decode_time = self.last_decode_time + self._nominal_duration()
+            if timestamp:
+                # Rebase so the following timestamps continue from here
+                self.timestamp_origin = timestamp - decode_time * 1000 // self.timescale
         
-        if level_idc in level_dimensions:
-            self.width, self.height = level_dimensions[level_idc]
+        self.last_duration = decode_time - self.last_decode_time
+        self.last_decode_time = decode_time
+        return decode_time
+    
+    def media_time(self, timestamp: Optional[int]) -> Optional[float]:
+        """
+        Seconds on this stream's timeline of a device timestamp (ms).
         
-        # Try to parse actual dimensions from SPS (complex due to exp-golomb coding)
-        # For simplicity, we use reasonable defaults
-        logger.debug(f"SPS: profile={profile_idc}, level={level_idc}, dim={self.width}x{self.height}")
+        Lets other tracks of the device (audio) share the video clock. None
+        until the first frame with a timestamp has been queued.
+        """
+        if not timestamp or self.timestamp_origin is None:
+            return None
+        return (timestamp - self.timestamp_origin) / 1000
+    
+    def _parse_sps(self, sps: bytes) -> None:
+        """
+        Parse SPS to extract video dimensions and frame rate.
+        
+        Keeps the previous (or default) values if the SPS can't be parsed.
+        """
+        try:
+            info = parse_sps(sps)
+        except ValueError as e:
+            logger.warning(f"Failed to parse SPS, keeping {self.width}x{self.height}: {e}")
+            return
+        
+        self.sps_info = info
+        self.width, self.height = info.width, info.height
+        if info.fps:
+            self.fps = info.fps
+        logger.debug(f"SPS: profile={info.profile_idc}, level={info.level_idc}, "
+                     f"dim={self.width}x{self.height}, fps={info.fps}")
     
     def _create_init_segment(self) -> bytes:
         """Create the initialization segment (ftyp + moov)."""
@@ -214,21 +281,32 @@ class VideoConverter:
             self.pps
         )
     
-    def _create_media_segment(self, nal_data: bytes, is_keyframe: bool) -> bytes:
-        """Create a media segment (moof + mdat)."""
-        # Calculate timing
-        sample_duration = self.timescale // self.fps  # e.g., 3600 for 25fps at 90kHz
-        decode_time = self.frame_count * sample_duration
+    def _flush_fragment(self) -> Tuple[bytes, bool]:
+        """Create a media segment (moof + mdat) from the pending frames."""
+        # Each sample lasts until the next one, the next frame of the last one
+        # isn't known yet so it gets the latest frame interval
+        times = self.pending_times
+        durations = [end - start for start, end in zip(times, times[1:])]
+        durations.append(self.last_duration or self._nominal_duration())
+        self.fragment_count += 1
         
-        return self.builder.build_media_segment(
-            nal_data=nal_data,
-            sequence_number=self.frame_count + 1,
-            decode_time=decode_time,
-            duration=sample_duration,
-            is_keyframe=is_keyframe,
-            sps=self.sps,
-            pps=self.pps
+        # Parameter sets are repeated in-band on keyframes unless the sample
+        # entry forbids it
+        in_band = self.IN_BAND_PARAMETER_SETS
+        segment = self.builder.build_fragment(
+            self.pending_frames,
+            sequence_number=self.fragment_count,
+            decode_time=times[0],
+            duration=durations[-1],
+            sps=self.sps if in_band else None,
+            pps=self.pps if in_band else None,
+            durations=durations,
+            length_prefixed=True
         )
+        starts_with_keyframe = self.pending_frames[0][1]
+        self.pending_frames = []
+        self.pending_times = []
+        return segment, starts_with_keyframe
     
     def _get_codec_string(self) -> str:
         """
@@ -264,6 +342,17 @@ class VideoConverter:
         self.initialized = False
         self.init_segment = None
         self.sps = None
+        self.sps_info = None
         self.pps = None
+        self.fps = DEFAULT_VIDEO_FPS
+        self.width = DEFAULT_VIDEO_WIDTH
+        self.height = DEFAULT_VIDEO_HEIGHT
         self.frame_count = 0
+        self.fragment_count = 0
+        self.pending_frames = []
+        self.pending_times = []
+        self.timestamp_origin = None
+        self.last_decode_time = None
+        self.last_duration = None
+        self.last_segment_keyframe = False
         self.frame_accumulator = b""
@@ -0,0 +1,105 @@
+"""
+Uncompressed FLAC Frames
+
+Wraps 16-bit PCM in FLAC frames with VERBATIM subframes, i.e. PCM with a
+FLAC frame header and CRCs. MSE has no PCM in MP4, but every major browser
+plays FLAC in MP4 (codec "flac", ISO BMFF mapping: fLaC sample entry with a
+dfLa box, one FLAC frame per sample), so this is how decoded G.711/ADPCM
+audio reaches the player without an audio encoder.
+"""
+import struct
+
+import numpy as np
+
+# Frame header sample rate codes, other rates are taken from STREAMINFO (code 0)
+SAMPLE_RATE_CODES = {
+    8000: 0b0100,
+    16000: 0b0101,
+    22050: 0b0110,
+    24000: 0b0111,
+    32000: 0b1000,
+    44100: 0b1001,
+    48000: 0b1010,
+}
+MAX_BLOCK_SIZE = 65535
+
+
+def _crc_table(polynomial: int, width: int) -> list:
+    top = 1 << (width - 1)
+    mask = (1 << width) - 1
+    table = []
+    for byte in range(256):
+        crc = byte << (width - 8)
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial) if crc & top else crc << 1
+        table.append(crc & mask)
+    return table
+
+
+_CRC8 = _crc_table(0x07, 8)
+_CRC16 = _crc_table(0x8005, 16)
+
+
+def crc8(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc = _CRC8[crc ^ byte]
+    return crc
+
+
+def crc16(data: bytes) -> int:
+    crc = 0
+    table = _CRC16
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def stream_info(sample_rate: int, channels: int = 1, bits_per_sample: int = 16,
+                min_block_size: int = 16, max_block_size: int = MAX_BLOCK_SIZE) -> bytes:
+    """STREAMINFO metadata block body (34 bytes), frame sizes and total samples unknown."""
+    packed = (sample_rate << 44) | ((channels - 1) << 41) | ((bits_per_sample - 1) << 36)
+    return (struct.pack('>HH', min_block_size, max_block_size) + b'\x00' * 6
+            + packed.to_bytes(8, 'big') + b'\x00' * 16)
+
+
+def _coded_number(value: int) -> bytes:
+    """FLAC's UTF-8-like variable length coding of the frame's first sample number."""
+    if value < 0x80:
+        return bytes([value])
+    length = 2
+    while value >= 1 << (5 * length + 1):
+        length += 1
+    data = bytearray()
+    for _ in range(length - 1):
+        data.insert(0, 0x80 | (value & 0x3F))
+        value >>= 6
+    data.insert(0, ((0xFF00 >> length) & 0xFF) | value)
+    return bytes(data)
+
+
+def encode_frame(samples: np.ndarray, sample_number: int, sample_rate: int) -> bytes:
+    """
+    One mono 16-bit FLAC frame with a VERBATIM subframe.
+
+    Uses the variable block size strategy (header carries the sample number),
+    so frames of any length can follow each other.
+
+    Args:
+        samples: int16 PCM, at most MAX_BLOCK_SIZE samples
+        sample_number: Index of the first sample in the stream
+        sample_rate: Sample rate in Hz
+    """
+    if not 0 < len(samples) <= MAX_BLOCK_SIZE:
+        raise ValueError(f'FLAC frame needs 1-{MAX_BLOCK_SIZE} samples, got {len(samples)}')
+    header = bytearray(b'\xff\xf9')  # sync code, variable block size
+    # Block size as 16 bits at the end of the header, sample rate, mono, 16 bits per sample
+    header.append(0b0111 << 4 | SAMPLE_RATE_CODES.get(sample_rate, 0))
+    header.append(0b0000 << 4 | 0b100 << 1)
+    header += _coded_number(sample_number)
+    header += struct.pack('>H', len(samples) - 1)
+    header.append(crc8(header))
+
+    # Subframe: VERBATIM (000001), no wasted bits, big-endian samples
+    frame = bytes(header) + b'\x02' + samples.astype('>i2').tobytes()
+    return frame + struct.pack('>H', crc16(frame))
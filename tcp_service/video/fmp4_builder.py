@@ -5,7 +5,9 @@ Builds fragmented MP4 boxes for browser playback using MediaSource Extensions.
 Based on ISO/IEC 14496-12 (MP4 file format) specification.
 """
 import struct
-from typing import Optional
+from typing import List, Optional, Tuple
+
+from .h265_sps import NAL_PPS, NAL_SPS, NAL_VPS, HevcSpsInfo
 
 
 class FMP4Builder:
@@ -17,8 +19,8 @@ class FMP4Builder:
     - Media segments: moof + mdat (sent for each frame/group)
     """
     
-    def __init__(self):
-        self.timescale = 90000  # 90kHz, standard for MPEG
+    def __init__(self, timescale: int = 90000):
+        self.timescale = timescale  # 90kHz for video, the sample rate for audio
     
     def box(self, box_type: bytes, data: bytes) -> bytes:
         """
@@ -32,7 +34,7 @@ class FMP4Builder:
         size = 8 + len(data)
         return struct.pack('>I', size) + box_type + data
     
-    def build_ftyp(self) -> bytes:
+    def build_ftyp(self, compatible_brands: bytes = b'isomiso2avc1mp41') -> bytes:
         """
         Build File Type Box (ftyp).
         
@@ -40,11 +42,11 @@ class FMP4Builder:
         """
         major_brand = b'isom'
         minor_version = struct.pack('>I', 512)
-        compatible_brands = b'isomiso2avc1mp41'
         
         return self.box(b'ftyp', major_brand + minor_version + compatible_brands)
     
-    def build_moov(self, width: int, height: int, sps: bytes, pps: bytes) -> bytes:
+    def build_moov(self, width: int, height: int, sps: bytes, pps: bytes,
+                   sample_entry: Optional[bytes] = None, handler: bytes = b'vide') -> bytes:
         """
         Build Movie Box (moov) for init segment.
         
@@ -52,9 +54,14 @@ class FMP4Builder:
             - mvhd: Movie header
             - trak: Track (video)
             - mvex: Movie extends (for fragmented MP4)
+        
+        sample_entry replaces the avc1 entry built from sps/pps (e.g. hvc1),
+        handler b'soun' makes it an audio track.
         """
+        if sample_entry is None:
+            sample_entry = self._build_avc1(width, height, sps, pps)
         mvhd = self._build_mvhd()
-        trak = self._build_trak(width, height, sps, pps)
+        trak = self._build_trak(width, height, sample_entry, handler)
         mvex = self._build_mvex()
         
         return self.box(b'moov', mvhd + trak + mvex)
@@ -86,14 +93,15 @@ class FMP4Builder:
             0, 0, 0x40000000
         )
     
-    def _build_trak(self, width: int, height: int, sps: bytes, pps: bytes) -> bytes:
+    def _build_trak(self, width: int, height: int, sample_entry: bytes,
+                    handler: bytes = b'vide') -> bytes:
         """Build Track Box (trak)."""
-        tkhd = self._build_tkhd(width, height)
-        mdia = self._build_mdia(width, height, sps, pps)
+        tkhd = self._build_tkhd(width, height, volume=0x0100 if handler == b'soun' else 0)
+        mdia = self._build_mdia(sample_entry, handler)
         
         return self.box(b'trak', tkhd + mdia)
     
-    def _build_tkhd(self, width: int, height: int) -> bytes:
+    def _build_tkhd(self, width: int, height: int, volume: int = 0) -> bytes:
         """Build Track Header Box (tkhd)."""
         data = bytes([
             0x00,  # version
@@ -107,7 +115,7 @@ class FMP4Builder:
         data += b'\x00' * 8  # reserved
         data += struct.pack('>H', 0)  # layer
         data += struct.pack('>H', 0)  # alternate_group
-        data += struct.pack('>H', 0)  # volume
+        data += struct.pack('>H', volume)  # volume (8.8 fixed point, audio only)
         data += struct.pack('>H', 0)  # reserved
         data += self._build_matrix()  # matrix
         data += struct.pack('>I', width << 16)  # width (16.16 fixed point)
@@ -115,11 +123,11 @@ class FMP4Builder:
         
         return self.box(b'tkhd', data)
     
-    def _build_mdia(self, width: int, height: int, sps: bytes, pps: bytes) -> bytes:
+    def _build_mdia(self, sample_entry: bytes, handler: bytes = b'vide') -> bytes:
         """Build Media Box (mdia)."""
         mdhd = self._build_mdhd()
-        hdlr = self._build_hdlr()
-        minf = self._build_minf(width, height, sps, pps)
+        hdlr = self._build_hdlr(handler)
+        minf = self._build_minf(sample_entry, handler)
         
         return self.box(b'mdia', mdhd + hdlr + minf)
     
@@ -138,26 +146,26 @@ class FMP4Builder:
         
         return self.box(b'mdhd', data)
     
-    def _build_hdlr(self) -> bytes:
+    def _build_hdlr(self, handler: bytes = b'vide') -> bytes:
         """Build Handler Reference Box (hdlr)."""
         data = bytes([
             0x00,  # version
             0x00, 0x00, 0x00,  # flags
         ])
         data += struct.pack('>I', 0)  # pre_defined
-        data += b'vide'  # handler_type (video)
+        data += handler  # handler_type (vide / soun)
         data += b'\x00' * 12  # reserved
-        data += b'VideoHandler\x00'  # name
+        data += b'SoundHandler\x00' if handler == b'soun' else b'VideoHandler\x00'  # name
         
         return self.box(b'hdlr', data)
     
-    def _build_minf(self, width: int, height: int, sps: bytes, pps: bytes) -> bytes:
+    def _build_minf(self, sample_entry: bytes, handler: bytes = b'vide') -> bytes:
         """Build Media Information Box (minf)."""
-        vmhd = self._build_vmhd()
+        media_header = self._build_smhd() if handler == b'soun' else self._build_vmhd()
         dinf = self._build_dinf()
-        stbl = self._build_stbl(width, height, sps, pps)
+        stbl = self._build_stbl(sample_entry)
         
-        return self.box(b'minf', vmhd + dinf + stbl)
+        return self.box(b'minf', media_header + dinf + stbl)
     
     def _build_vmhd(self) -> bytes:
         """Build Video Media Header Box (vmhd)."""
@@ -170,6 +178,14 @@ class FMP4Builder:
         
         return self.box(b'vmhd', data)
     
+    def _build_smhd(self) -> bytes:
+        """Build Sound Media Header Box (smhd)."""
+        data = bytes([0x00, 0x00, 0x00, 0x00])  # version + flags
+        data += struct.pack('>H', 0)  # balance
+        data += struct.pack('>H', 0)  # reserved
+        
+        return self.box(b'smhd', data)
+    
     def _build_dinf(self) -> bytes:
         """Build Data Information Box (dinf)."""
         dref = self._build_dref()
@@ -188,9 +204,9 @@ class FMP4Builder:
         
         return self.box(b'dref', data)
     
-    def _build_stbl(self, width: int, height: int, sps: bytes, pps: bytes) -> bytes:
+    def _build_stbl(self, sample_entry: bytes) -> bytes:
         """Build Sample Table Box (stbl)."""
-        stsd = self._build_stsd(width, height, sps, pps)
+        stsd = self._build_stsd(sample_entry)
         stts = self._build_stts()
         stsc = self._build_stsc()
         stsz = self._build_stsz()
@@ -198,23 +214,30 @@ class FMP4Builder:
         
         return self.box(b'stbl', stsd + stts + stsc + stsz + stco)
     
-    def _build_stsd(self, width: int, height: int, sps: bytes, pps: bytes) -> bytes:
+    def _build_stsd(self, sample_entry: bytes) -> bytes:
         """Build Sample Description Box (stsd)."""
-        avc1 = self._build_avc1(width, height, sps, pps)
-        
         data = bytes([
             0x00,  # version
             0x00, 0x00, 0x00,  # flags
         ])
         data += struct.pack('>I', 1)  # entry_count
-        data += avc1
+        data += sample_entry
         
         return self.box(b'stsd', data)
     
     def _build_avc1(self, width: int, height: int, sps: bytes, pps: bytes) -> bytes:
         """Build AVC Sample Entry Box (avc1)."""
-        avcc = self._build_avcc(sps, pps)
-        
+        return self._build_visual_sample_entry(b'avc1', width, height, self._build_avcc(sps, pps))
+    
+    def _build_hvc1(self, width: int, height: int, vps: bytes, sps: bytes, pps: bytes,
+                    sps_info: HevcSpsInfo) -> bytes:
+        """Build HEVC Sample Entry Box (hvc1), parameter sets only in hvcC."""
+        hvcc = self._build_hvcc(vps, sps, pps, sps_info)
+        return self._build_visual_sample_entry(b'hvc1', width, height, hvcc)
+    
+    def _build_visual_sample_entry(self, box_type: bytes, width: int, height: int,
+                                   config: bytes) -> bytes:
+        """Build a VisualSampleEntry with its decoder configuration box."""
         data = b'\x00' * 6  # reserved
         data += struct.pack('>H', 1)  # data_reference_index
         data += b'\x00' * 16  # pre_defined + reserved
@@ -227,9 +250,47 @@ class FMP4Builder:
         data += b'\x00' * 32  # compressorname
         data += struct.pack('>H', 0x0018)  # depth (24-bit)
         data += struct.pack('>h', -1)  # pre_defined
-        data += avcc
+        data += config
+        
+        return self.box(box_type, data)
+    
+    def _build_audio_sample_entry(self, box_type: bytes, channels: int, sample_rate: int,
+                                  config: bytes) -> bytes:
+        """Build an AudioSampleEntry (mp4a, fLaC) with its configuration box."""
+        data = b'\x00' * 6  # reserved
+        data += struct.pack('>H', 1)  # data_reference_index
+        data += b'\x00' * 8  # reserved
+        data += struct.pack('>H', channels)  # channelcount
+        data += struct.pack('>H', 16)  # samplesize
+        data += struct.pack('>H', 0)  # pre_defined
+        data += struct.pack('>H', 0)  # reserved
+        data += struct.pack('>I', sample_rate << 16)  # samplerate (16.16 fixed point)
+        data += config
+        
+        return self.box(box_type, data)
+    
+    def _build_esds(self, audio_specific_config: bytes) -> bytes:
+        """Build Elementary Stream Descriptor Box (esds) for AAC."""
+        def descriptor(tag: int, payload: bytes) -> bytes:
+            return bytes([tag, len(payload)]) + payload
+        
+        decoder_config = descriptor(0x04, bytes([
+            0x40,  # objectTypeIndication: MPEG-4 Audio
+            0x15,  # streamType audio (5) << 2 | reserved 1
+        ]) + b'\x00' * 3 + struct.pack('>II', 0, 0)  # bufferSizeDB, max/avg bitrate
+            + descriptor(0x05, audio_specific_config))
+        sl_config = descriptor(0x06, b'\x02')
+        es = descriptor(0x03, struct.pack('>HB', 1, 0) + decoder_config + sl_config)
         
-        return self.box(b'avc1', data)
+        return self.box(b'esds', b'\x00\x00\x00\x00' + es)  # version + flags
+    
+    def _build_dfla(self, stream_info: bytes) -> bytes:
+        """Build FLAC Specific Box (dfLa): the STREAMINFO block, marked last."""
+        data = bytes([0x00, 0x00, 0x00, 0x00])  # version + flags
+        data += bytes([0x80]) + len(stream_info).to_bytes(3, 'big')  # last block, STREAMINFO
+        data += stream_info
+        
+        return self.box(b'dfLa', data)
     
     def _build_avcc(self, sps: bytes, pps: bytes) -> bytes:
         """Build AVC Configuration Box (avcC)."""
@@ -263,6 +324,40 @@ class FMP4Builder:
         
         return self.box(b'avcC', data)
     
+    def _build_hvcc(self, vps: bytes, sps: bytes, pps: bytes, sps_info: HevcSpsInfo) -> bytes:
+        """Build HEVC Configuration Box (hvcC, ISO/IEC 14496-15 8.3.3)."""
+        data = bytes([
+            0x01,  # configurationVersion
+            sps_info.general_profile_space << 6 | sps_info.general_tier_flag << 5
+            | sps_info.general_profile_idc,
+        ])
+        data += struct.pack('>I', sps_info.general_profile_compatibility_flags)
+        data += sps_info.general_constraint_indicator_flags.to_bytes(6, 'big')
+        data += bytes([sps_info.general_level_idc])
+        data += struct.pack('>H', 0xF000)  # reserved + min_spatial_segmentation_idc (0)
+        data += bytes([
+            0xFC,  # reserved + parallelismType (0 = unknown)
+            0xFC | sps_info.chroma_format_idc,
+            0xF8 | sps_info.bit_depth_luma - 8,
+            0xF8 | sps_info.bit_depth_chroma - 8,
+        ])
+        data += struct.pack('>H', 0)  # avgFrameRate (unspecified)
+        data += bytes([
+            # constantFrameRate (0), numTemporalLayers, temporalIdNested,
+            # lengthSizeMinusOne (3 = 4 bytes)
+            sps_info.max_sub_layers << 3 | sps_info.temporal_id_nesting << 2 | 0x03,
+        ])
+        
+        arrays = ((NAL_VPS, vps), (NAL_SPS, sps), (NAL_PPS, pps))
+        data += bytes([len(arrays)])  # numOfArrays
+        for nal_type, nal_unit in arrays:
+            data += bytes([0x80 | nal_type])  # array_completeness (1) + NAL_unit_type
+            data += struct.pack('>H', 1)  # numNalus
+            data += struct.pack('>H', len(nal_unit))
+            data += nal_unit
+        
+        return self.box(b'hvcC', data)
+    
     def _build_stts(self) -> bytes:
         """Build Decoding Time to Sample Box (stts)."""
         data = bytes([0x00, 0x00, 0x00, 0x00])  # version + flags
@@ -314,12 +409,47 @@ class FMP4Builder:
         moov = self.build_moov(width, height, sps, pps)
         return ftyp + moov
     
+    def build_hevc_init_segment(self, width: int, height: int, vps: bytes, sps: bytes,
+                                pps: bytes, sps_info: HevcSpsInfo) -> bytes:
+        """
+        Build an H.265 init segment (ftyp + moov with an hvc1 sample entry).
+        
+        hvc1 keeps VPS/SPS/PPS in the hvcC box only (what Safari requires),
+        so H.265 media segments are built without in-band parameter sets.
+        """
+        ftyp = self.build_ftyp(b'isomiso6hvc1mp41')
+        hvc1 = self._build_hvc1(width, height, vps, sps, pps, sps_info)
+        moov = self.build_moov(width, height, sps, pps, sample_entry=hvc1)
+        return ftyp + moov
+    
+    def build_audio_init_segment(self, sample_entry: bytes) -> bytes:
+        """
+        Build an audio-only init segment (ftyp + moov with one sound track).
+        
+        The builder's timescale must be the sample rate. The sample entry
+        comes from build_aac_sample_entry or build_flac_sample_entry.
+        """
+        ftyp = self.build_ftyp(b'isomiso6mp41')
+        moov = self.build_moov(0, 0, None, None, sample_entry=sample_entry, handler=b'soun')
+        return ftyp + moov
+    
+    def build_aac_sample_entry(self, audio_specific_config: bytes, channels: int,
+                               sample_rate: int) -> bytes:
+        """mp4a sample entry for raw AAC access units."""
+        return self._build_audio_sample_entry(b'mp4a', channels, sample_rate,
+                                              self._build_esds(audio_specific_config))
+    
+    def build_flac_sample_entry(self, stream_info: bytes, channels: int, sample_rate: int) -> bytes:
+        """fLaC sample entry, one FLAC frame per sample."""
+        return self._build_audio_sample_entry(b'fLaC', channels, sample_rate,
+                                              self._build_dfla(stream_info))
+    
     def build_media_segment(self, nal_data: bytes, sequence_number: int,
                             decode_time: int, duration: int, 
                             is_keyframe: bool, sps: bytes = None, 
                             pps: bytes = None) -> bytes:
         """
-        Build media segment (moof + mdat).
+        Build media segment (moof + mdat) holding a single frame.
         
         Args:
             nal_data: NAL unit data (without start codes)
@@ -330,28 +460,62 @@ class FMP4Builder:
             sps: SPS to prepend (for keyframes)
             pps: PPS to prepend (for keyframes)
         """
-        # For keyframes, prepend SPS and PPS
-        if is_keyframe and sps and pps:
-            sps_with_length = struct.pack('>I', len(sps)) + sps
-            pps_with_length = struct.pack('>I', len(pps)) + pps
-            nal_with_length = sps_with_length + pps_with_length + struct.pack('>I', len(nal_data)) + nal_data
-        else:
-            nal_with_length = struct.pack('>I', len(nal_data)) + nal_data
-        
-        # Build moof
-        moof = self._build_moof(sequence_number, decode_time, duration, 
-                                len(nal_with_length), is_keyframe)
+        return self.build_fragment([(nal_data, is_keyframe)], sequence_number,
+                                   decode_time, duration, sps, pps)
+    
+    def build_fragment(self, samples: List[Tuple[bytes, bool]], sequence_number: int,
+                       decode_time: int, duration: int, sps: bytes = None,
+                       pps: bytes = None, durations: Optional[List[int]] = None,
+                       length_prefixed: bool = False) -> bytes:
+        """
+        Build media segment (moof + mdat) holding several frames.
         
-        # Build mdat
-        mdat = self.box(b'mdat', nal_with_length)
+        One traf with a multi-sample trun, so the box overhead is paid once
+        per fragment instead of once per frame.
         
-        return moof + mdat
+        Args:
+            samples: (nal_data, is_keyframe) per frame, in decode order
+            sequence_number: Fragment sequence number
+            decode_time: Base media decode time of the first sample
+            duration: Duration of every sample
+            sps: SPS to prepend to keyframes
+            pps: PPS to prepend to keyframes
+            durations: Duration per sample, overrides duration
+            length_prefixed: nal_data is already AVCC (4-byte length + NAL unit,
+                             possibly several), written as is
+        """
+        parameter_sets = b''
+        if sps and pps:
+            parameter_sets = struct.pack('>I', len(sps)) + sps + struct.pack('>I', len(pps)) + pps
+        
+        if durations is None:
+            durations = [duration] * len(samples)
+        
+        payloads = []
+        entries = []
+        for (nal_data, is_keyframe), sample_duration in zip(samples, durations):
+            # For keyframes, prepend SPS and PPS
+            prefix = parameter_sets if is_keyframe else b''
+            if length_prefixed:
+                payloads.extend((prefix, nal_data))
+                entries.append((len(prefix) + len(nal_data), is_keyframe, sample_duration))
+            else:
+                payloads.extend((prefix, struct.pack('>I', len(nal_data)), nal_data))
+                entries.append((len(prefix) + 4 + len(nal_data), is_keyframe, sample_duration))
+        
+        mdat_size = 8 + sum(size for size, _, _ in entries)
+        moof = self._build_moof(sequence_number, decode_time, entries)
+        return b''.join([moof, struct.pack('>I', mdat_size), b'mdat'] + payloads)
     
     def _build_moof(self, sequence_number: int, decode_time: int, 
-                    duration: int, sample_size: int, is_keyframe: bool) -> bytes:
+                    samples: List[Tuple[int, bool, int]]) -> bytes:
         """Build Movie Fragment Box (moof)."""
         mfhd = self._build_mfhd(sequence_number)
-        traf = self._build_traf(decode_time, duration, sample_size, is_keyframe)
+        # Sizes are fixed except for the trun sample table, so the data offset
+        # (moof size + mdat header) is known before the trun is built:
+        # moof header + mfhd + traf header + tfhd (16) + tfdt v1 (20) + trun
+        moof_size = 8 + len(mfhd) + 8 + 16 + 20 + self._trun_size(len(samples))
+        traf = self._build_traf(decode_time, samples, moof_size + 8)
         
         return self.box(b'moof', mfhd + traf)
     
@@ -361,12 +525,12 @@ class FMP4Builder:
         data += struct.pack('>I', sequence_number)
         return self.box(b'mfhd', data)
     
-    def _build_traf(self, decode_time: int, duration: int, 
-                    sample_size: int, is_keyframe: bool) -> bytes:
+    def _build_traf(self, decode_time: int, samples: List[Tuple[int, bool, int]],
+                    data_offset: int) -> bytes:
         """Build Track Fragment Box (traf)."""
         tfhd = self._build_tfhd()
         tfdt = self._build_tfdt(decode_time)
-        trun = self._build_trun(duration, sample_size, is_keyframe)
+        trun = self._build_trun(samples, data_offset)
         
         return self.box(b'traf', tfhd + tfdt + trun)
     
@@ -379,34 +543,25 @@ class FMP4Builder:
     
     def _build_tfdt(self, decode_time: int) -> bytes:
         """Build Track Fragment Decode Time Box (tfdt)."""
-        data = bytes([0x00, 0x00, 0x00, 0x00])  # version 0
-        data += struct.pack('>I', decode_time)
+        # Version 1, 64-bit decode time: 32 bits at 90 kHz wrap after 13 hours
+        data = bytes([0x01, 0x00, 0x00, 0x00])
+        data += struct.pack('>Q', decode_time)
         return self.box(b'tfdt', data)
     
-    def _build_trun(self, duration: int, sample_size: int, is_keyframe: bool) -> bytes:
+    @staticmethod
+    def _trun_size(sample_count: int) -> int:
+        """Size of a trun box: header + flags + count + offset + 16 bytes per sample."""
+        return 8 + 4 + 4 + 4 + 16 * sample_count
+    
+    def _build_trun(self, samples: List[Tuple[int, bool, int]], data_offset: int) -> bytes:
         """Build Track Run Box (trun)."""
         # flags: data-offset, sample-duration, sample-size, sample-flags, sample-composition-time-offset
         flags = 0x00000F01
         
-        # Sample flags
-        if is_keyframe:
-            sample_flags = 0x02000000  # is_sync
-        else:
-            sample_flags = 0x01010000  # depends on I-frame
-        
-        # Calculate data offset (moof size + mdat header)
-        # This is a simplified calculation
-        trun_size = 8 + 4 + 4 + 4 + 16  # box header + flags + count + offset + sample
-        traf_size = 8 + 16 + 12 + trun_size  # tfhd + tfdt + trun (approx)
-        moof_size = 8 + 16 + traf_size  # mfhd + traf
-        data_offset = moof_size + 8  # +8 for mdat header
-        
-        data = struct.pack('>I', flags)
-        data += struct.pack('>I', 1)  # sample_count
-        data += struct.pack('>I', data_offset)
-        data += struct.pack('>I', duration)
-        data += struct.pack('>I', sample_size)
-        data += struct.pack('>I', sample_flags)
-        data += struct.pack('>I', 0)  # composition_time_offset
+        data = struct.pack('>III', flags, len(samples), data_offset)
+        for sample_size, is_keyframe, duration in samples:
+            # Sample flags: is_sync for I-frames, depends on I-frame otherwise
+            sample_flags = 0x02000000 if is_keyframe else 0x01010000
+            data += struct.pack('>IIII', duration, sample_size, sample_flags, 0)  # composition_time_offset 0
         
         return self.box(b'trun', data)
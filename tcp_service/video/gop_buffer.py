@@ -0,0 +1,87 @@
+"""
+GOP Buffer
+
+Per-stream replay buffer for late joiners. Keeps the latest init segment
+and the media frames since the last keyframe, so a viewer joining mid-stream
+can be sent init + the current GOP and start decoding straight away instead
+of waiting for a stream restart.
+
+Frames are stored as packed binary frames (video.ws_frame), exactly what was
+broadcast, so a replay is only a list copy. Audio segments of the GOP's time
+span are kept in between the video frames, so a replayed GOP has sound.
+"""
+from collections import deque
+from typing import List, Optional
+
+# Defaults: 2 GOPs at 25 fps, 4 MB of video
+DEFAULT_MAX_FRAMES = 50
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+
+
+class GopBuffer:
+    """
+    Init segment + frames of the current GOP of one stream (device/channel).
+
+    A GOP larger than the limits is dropped as a whole, a partial GOP
+    without its keyframe can't be decoded anyway; buffering restarts at the
+    next keyframe.
+    """
+
+    def __init__(self, max_frames: int = DEFAULT_MAX_FRAMES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.init_frame: Optional[bytes] = None
+        self.audio_init_frame: Optional[bytes] = None
+        self._frames = deque()
+        self._video_frames = 0
+        self._bytes = 0
+        # Set once a GOP overflowed, until the next keyframe
+        self._waiting_for_keyframe = True
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def set_init(self, frame: bytes) -> None:
+        """Store a new init segment, frames of the previous one no longer apply."""
+        self.init_frame = frame
+        self._clear()
+
+    def set_audio_init(self, frame: Optional[bytes]) -> None:
+        """Store the audio track's init segment, None when the audio codec changed."""
+        self.audio_init_frame = frame
+
+    def add(self, frame: bytes, is_keyframe: bool) -> None:
+        """Add a media frame, a keyframe starts a new GOP."""
+        if is_keyframe:
+            self._clear()
+            self._waiting_for_keyframe = False
+        elif self._waiting_for_keyframe:
+            return
+
+        self._video_frames += 1
+        self._append(frame)
+
+    def add_audio(self, frame: bytes) -> None:
+        """Add an audio segment to the current GOP, max_frames counts video frames only."""
+        if not self._waiting_for_keyframe:
+            self._append(frame)
+
+    def replay(self) -> List[bytes]:
+        """Frames a new viewer needs, init first; empty until an init segment exists."""
+        if self.init_frame is None:
+            return []
+        if self.audio_init_frame is not None:
+            return [self.init_frame, self.audio_init_frame, *self._frames]
+        return [self.init_frame, *self._frames]
+
+    def _append(self, frame: bytes) -> None:
+        self._frames.append(frame)
+        self._bytes += len(frame)
+        if self._video_frames > self.max_frames or self._bytes > self.max_bytes:
+            self._clear()
+
+    def _clear(self) -> None:
+        self._frames.clear()
+        self._video_frames = 0
+        self._bytes = 0
+        self._waiting_for_keyframe = True
@@ -0,0 +1,172 @@
+"""
+H.264 Sequence Parameter Set Parser
+
+Decodes the fields of an SPS NAL unit (ITU-T H.264 7.3.2.1.1) needed for
+the fMP4 init segment: profile and level, the coded size with frame
+cropping applied, sample aspect ratio and the VUI frame rate.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from .bitstream import BitReader, unescape_rbsp
+
+# Profiles whose SPS carries chroma format, bit depth and scaling matrices
+HIGH_PROFILES = frozenset((100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135))
+
+# aspect_ratio_idc -> sample aspect ratio (Table E-1), 255 = explicit
+SAMPLE_ASPECT_RATIOS = {
+    1: (1, 1), 2: (12, 11), 3: (10, 11), 4: (16, 11), 5: (40, 33), 6: (24, 11),
+    7: (20, 11), 8: (32, 11), 9: (80, 33), 10: (18, 11), 11: (15, 11), 12: (64, 33),
+    13: (160, 99), 14: (4, 3), 15: (3, 2), 16: (2, 1),
+}
+EXTENDED_SAR = 255
+
+# Frame rates outside this range are treated as a broken VUI
+MIN_FPS = 1
+MAX_FPS = 240
+
+
+@dataclass
+class SpsInfo:
+    """Decoded H.264 SPS fields."""
+    profile_idc: int
+    constraint_flags: int
+    level_idc: int
+    width: int
+    height: int
+    chroma_format_idc: int = 1
+    bit_depth_luma: int = 8
+    frame_mbs_only: bool = True
+    sar_width: int = 1
+    sar_height: int = 1
+    fps: Optional[float] = None  # From VUI timing info, None when absent
+
+
+def parse_sps(nal_unit: bytes) -> SpsInfo:
+    """
+    Parse an SPS NAL unit (header byte included, no start code).
+
+    The VUI is optional and often truncated on cheap encoders, a VUI that
+    can't be read only leaves fps and aspect ratio at their defaults.
+
+    Raises:
+        ValueError: not an SPS, or truncated before the frame size
+    """
+    if len(nal_unit) < 4 or nal_unit[0] & 0x1F != 7:
+        raise ValueError('Not an H.264 SPS NAL unit')
+
+    reader = BitReader(unescape_rbsp(nal_unit[1:]))
+    profile_idc = reader.read_bits(8)
+    constraint_flags = reader.read_bits(8)
+    level_idc = reader.read_bits(8)
+    reader.read_ue()  # seq_parameter_set_id
+
+    chroma_format_idc = 1
+    separate_colour_plane = False
+    bit_depth_luma = 8
+    if profile_idc in HIGH_PROFILES:
+        chroma_format_idc = reader.read_ue()
+        if chroma_format_idc == 3:
+            separate_colour_plane = reader.read_flag()
+        bit_depth_luma = reader.read_ue() + 8
+        reader.read_ue()  # bit_depth_chroma_minus8
+        reader.skip_bits(1)  # qpprime_y_zero_transform_bypass_flag
+        if reader.read_flag():  # seq_scaling_matrix_present_flag
+            for index in range(8 if chroma_format_idc != 3 else 12):
+                if reader.read_flag():
+                    _skip_scaling_list(reader, 16 if index < 6 else 64)
+
+    reader.read_ue()  # log2_max_frame_num_minus4
+    pic_order_cnt_type = reader.read_ue()
+    if pic_order_cnt_type == 0:
+        reader.read_ue()  # log2_max_pic_order_cnt_lsb_minus4
+    elif pic_order_cnt_type == 1:
+        reader.skip_bits(1)  # delta_pic_order_always_zero_flag
+        reader.read_se()  # offset_for_non_ref_pic
+        reader.read_se()  # offset_for_top_to_bottom_field
+        for _ in range(reader.read_ue()):
+            reader.read_se()  # offset_for_ref_frame
+
+    reader.read_ue()  # max_num_ref_frames
+    reader.skip_bits(1)  # gaps_in_frame_num_value_allowed_flag
+    width_in_mbs = reader.read_ue() + 1
+    height_in_map_units = reader.read_ue() + 1
+    frame_mbs_only = reader.read_flag()
+    if not frame_mbs_only:
+        reader.skip_bits(1)  # mb_adaptive_frame_field_flag
+    reader.skip_bits(1)  # direct_8x8_inference_flag
+
+    crop_left = crop_right = crop_top = crop_bottom = 0
+    if reader.read_flag():  # frame_cropping_flag
+        crop_left = reader.read_ue()
+        crop_right = reader.read_ue()
+        crop_top = reader.read_ue()
+        crop_bottom = reader.read_ue()
+
+    # Crop offsets are in chroma sample units (7.4.2.1.1)
+    chroma_array_type = 0 if separate_colour_plane else chroma_format_idc
+    if chroma_array_type == 0:
+        crop_unit_x, crop_unit_y = 1, 1
+    else:
+        crop_unit_x = 1 if chroma_format_idc == 3 else 2
+        crop_unit_y = 2 if chroma_format_idc == 1 else 1
+    crop_unit_y *= 2 - frame_mbs_only
+
+    info = SpsInfo(
+        profile_idc=profile_idc,
+        constraint_flags=constraint_flags,
+        level_idc=level_idc,
+        width=width_in_mbs * 16 - crop_unit_x * (crop_left + crop_right),
+        height=(2 - frame_mbs_only) * height_in_map_units * 16 - crop_unit_y * (crop_top + crop_bottom),
+        chroma_format_idc=chroma_format_idc,
+        bit_depth_luma=bit_depth_luma,
+        frame_mbs_only=frame_mbs_only,
+    )
+    if info.width <= 0 or info.height <= 0:
+        raise ValueError(f'Invalid SPS frame size {info.width}x{info.height}')
+
+    try:
+        if reader.read_flag():  # vui_parameters_present_flag
+            _parse_vui(reader, info)
+    except ValueError:
+        pass
+    return info
+
+
+def _skip_scaling_list(reader: BitReader, size: int) -> None:
+    last_scale = next_scale = 8
+    for _ in range(size):
+        if next_scale:
+            next_scale = (last_scale + reader.read_se()) % 256
+        last_scale = next_scale or last_scale
+
+
+def _parse_vui(reader: BitReader, info: SpsInfo) -> None:
+    """Aspect ratio and timing info of the VUI (E.1.1), fields up to timing_info."""
+    if reader.read_flag():  # aspect_ratio_info_present_flag
+        aspect_ratio_idc = reader.read_bits(8)
+        if aspect_ratio_idc == EXTENDED_SAR:
+            sar = (reader.read_bits(16), reader.read_bits(16))
+        else:
+            sar = SAMPLE_ASPECT_RATIOS.get(aspect_ratio_idc, (1, 1))
+        if sar[0] and sar[1]:
+            info.sar_width, info.sar_height = sar
+
+    if reader.read_flag():  # overscan_info_present_flag
+        reader.skip_bits(1)  # overscan_appropriate_flag
+    if reader.read_flag():  # video_signal_type_present_flag
+        reader.skip_bits(4)  # video_format, video_full_range_flag
+        if reader.read_flag():  # colour_description_present_flag
+            reader.skip_bits(24)
+    if reader.read_flag():  # chroma_loc_info_present_flag
+        reader.read_ue()
+        reader.read_ue()
+
+    if reader.read_flag():  # timing_info_present_flag
+        num_units_in_tick = reader.read_bits(32)
+        time_scale = reader.read_bits(32)
+        if num_units_in_tick:
+            # One frame is two field ticks
+            fps = time_scale / (2 * num_units_in_tick)
+            if MIN_FPS <= fps <= MAX_FPS:
+                info.fps = fps
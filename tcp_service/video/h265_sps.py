@@ -0,0 +1,250 @@
+"""
+H.265/HEVC Sequence Parameter Set Parser
+
+Decodes the fields of an HEVC SPS NAL unit (ITU-T H.265 7.3.2.2) needed for
+the fMP4 init segment: the general profile_tier_level (hvcC and the MSE
+codec string), the picture size with the conformance window applied, bit
+depths and the VUI frame rate.
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+from .bitstream import BitReader, unescape_rbsp
+from .h264_sps import EXTENDED_SAR, MAX_FPS, MIN_FPS, SAMPLE_ASPECT_RATIOS
+
+# NAL unit types (Table 7-1)
+NAL_VPS = 32
+NAL_SPS = 33
+NAL_PPS = 34
+# IRAP pictures (BLA, IDR, CRA) are random access points
+NAL_IRAP_FIRST = 16
+NAL_IRAP_LAST = 23
+NAL_VCL_LAST = 31
+
+
+def nal_unit_type(nal_unit) -> int:
+    """HEVC NAL unit type from the first header byte."""
+    return (nal_unit[0] >> 1) & 0x3F
+
+
+@dataclass
+class HevcSpsInfo:
+    """Decoded HEVC SPS fields."""
+    general_profile_space: int
+    general_tier_flag: int
+    general_profile_idc: int
+    general_profile_compatibility_flags: int
+    general_constraint_indicator_flags: int  # 48 bits
+    general_level_idc: int
+    width: int
+    height: int
+    chroma_format_idc: int = 1
+    bit_depth_luma: int = 8
+    bit_depth_chroma: int = 8
+    max_sub_layers: int = 1
+    temporal_id_nesting: bool = True
+    sar_width: int = 1
+    sar_height: int = 1
+    fps: Optional[float] = None  # From VUI timing info, None when absent
+
+    def codec_string(self, sample_entry: str = 'hvc1') -> str:
+        """
+        MSE/RFC 6381 codec string, e.g. "hvc1.1.6.L93.B0".
+
+        Profile space letter + profile, compatibility flags bit-reversed in
+        hex, tier letter + level, then the constraint bytes with trailing
+        zero bytes left out.
+        """
+        space = ('', 'A', 'B', 'C')[self.general_profile_space]
+        compatibility = int(f'{self.general_profile_compatibility_flags:032b}'[::-1], 2)
+        tier = 'H' if self.general_tier_flag else 'L'
+        constraints = self.general_constraint_indicator_flags.to_bytes(6, 'big').rstrip(b'\x00')
+        parts = [sample_entry, f'{space}{self.general_profile_idc}', f'{compatibility:X}',
+                 f'{tier}{self.general_level_idc}']
+        parts.extend(f'{byte:X}' for byte in constraints)
+        return '.'.join(parts)
+
+
+def parse_hevc_sps(nal_unit: bytes) -> HevcSpsInfo:
+    """
+    Parse an HEVC SPS NAL unit (2-byte header included, no start code).
+
+    A VUI that can't be read only leaves fps and aspect ratio at their
+    defaults.
+
+    Raises:
+        ValueError: not an SPS, or truncated before the picture size
+    """
+    if len(nal_unit) < 15 or nal_unit_type(nal_unit) != NAL_SPS:
+        raise ValueError('Not an HEVC SPS NAL unit')
+
+    reader = BitReader(unescape_rbsp(nal_unit[2:]))
+    reader.skip_bits(4)  # sps_video_parameter_set_id
+    max_sub_layers_minus1 = reader.read_bits(3)
+    temporal_id_nesting = reader.read_flag()
+
+    # profile_tier_level(1, max_sub_layers_minus1), general part
+    profile_space = reader.read_bits(2)
+    tier_flag = reader.read_bits(1)
+    profile_idc = reader.read_bits(5)
+    compatibility_flags = reader.read_bits(32)
+    constraint_flags = reader.read_bits(48)
+    level_idc = reader.read_bits(8)
+    _skip_sub_layers(reader, max_sub_layers_minus1)
+
+    reader.read_ue()  # sps_seq_parameter_set_id
+    chroma_format_idc = reader.read_ue()
+    separate_colour_plane = False
+    if chroma_format_idc == 3:
+        separate_colour_plane = reader.read_flag()
+    width = reader.read_ue()
+    height = reader.read_ue()
+    if reader.read_flag():  # conformance_window_flag
+        # Offsets are in chroma sample units (7.4.3.2.1)
+        chroma_array_type = 0 if separate_colour_plane else chroma_format_idc
+        sub_width = 2 if chroma_array_type in (1, 2) else 1
+        sub_height = 2 if chroma_array_type == 1 else 1
+        width -= sub_width * (reader.read_ue() + reader.read_ue())
+        height -= sub_height * (reader.read_ue() + reader.read_ue())
+    if width <= 0 or height <= 0:
+        raise ValueError(f'Invalid SPS picture size {width}x{height}')
+
+    info = HevcSpsInfo(
+        general_profile_space=profile_space,
+        general_tier_flag=tier_flag,
+        general_profile_idc=profile_idc,
+        general_profile_compatibility_flags=compatibility_flags,
+        general_constraint_indicator_flags=constraint_flags,
+        general_level_idc=level_idc,
+        width=width,
+        height=height,
+        chroma_format_idc=chroma_format_idc,
+        bit_depth_luma=reader.read_ue() + 8,
+        bit_depth_chroma=reader.read_ue() + 8,
+        max_sub_layers=max_sub_layers_minus1 + 1,
+        temporal_id_nesting=temporal_id_nesting,
+    )
+
+    try:
+        _parse_to_vui(reader, info, max_sub_layers_minus1)
+    except ValueError:
+        pass
+    return info
+
+
+def _skip_sub_layers(reader: BitReader, max_sub_layers_minus1: int) -> None:
+    """Sub-layer part of profile_tier_level."""
+    profile_present = []
+    level_present = []
+    for _ in range(max_sub_layers_minus1):
+        profile_present.append(reader.read_flag())
+        level_present.append(reader.read_flag())
+    if max_sub_layers_minus1 > 0:
+        reader.skip_bits(2 * (8 - max_sub_layers_minus1))  # reserved_zero_2bits
+    for profile, level in zip(profile_present, level_present):
+        if profile:
+            reader.skip_bits(88)
+        if level:
+            reader.skip_bits(8)
+
+
+def _parse_to_vui(reader: BitReader, info: HevcSpsInfo, max_sub_layers_minus1: int) -> None:
+    """Skip the SPS fields between the bit depths and the VUI, then parse the VUI."""
+    log2_max_poc_lsb = reader.read_ue() + 4
+    sub_layer_ordering_info_present = reader.read_flag()
+    for _ in range(0 if sub_layer_ordering_info_present else max_sub_layers_minus1, max_sub_layers_minus1 + 1):
+        reader.read_ue()  # sps_max_dec_pic_buffering_minus1
+        reader.read_ue()  # sps_max_num_reorder_pics
+        reader.read_ue()  # sps_max_latency_increase_plus1
+    for _ in range(6):
+        # log2 coding/transform block sizes, max transform hierarchy depths
+        reader.read_ue()
+    if reader.read_flag():  # scaling_list_enabled_flag
+        if reader.read_flag():  # sps_scaling_list_data_present_flag
+            _skip_scaling_list_data(reader)
+    reader.skip_bits(2)  # amp_enabled_flag, sample_adaptive_offset_enabled_flag
+    if reader.read_flag():  # pcm_enabled_flag
+        reader.skip_bits(8)  # pcm sample bit depths
+        reader.read_ue()
+        reader.read_ue()
+        reader.skip_bits(1)  # pcm_loop_filter_disabled_flag
+
+    num_delta_pocs = []
+    num_short_term_ref_pic_sets = reader.read_ue()
+    for index in range(num_short_term_ref_pic_sets):
+        num_delta_pocs.append(_skip_short_term_ref_pic_set(reader, index, num_delta_pocs))
+
+    if reader.read_flag():  # long_term_ref_pics_present_flag
+        for _ in range(reader.read_ue()):
+            reader.skip_bits(log2_max_poc_lsb + 1)  # lt_ref_pic_poc_lsb_sps, used_by_curr_pic_lt_sps_flag
+    reader.skip_bits(2)  # sps_temporal_mvp_enabled_flag, strong_intra_smoothing_enabled_flag
+
+    if reader.read_flag():  # vui_parameters_present_flag
+        _parse_vui(reader, info)
+
+
+def _skip_scaling_list_data(reader: BitReader) -> None:
+    for size_id in range(4):
+        for _ in range(0, 6, 3 if size_id == 3 else 1):
+            if not reader.read_flag():  # scaling_list_pred_mode_flag
+                reader.read_ue()  # scaling_list_pred_matrix_id_delta
+                continue
+            if size_id > 1:
+                reader.read_se()  # scaling_list_dc_coef_minus8
+            for _ in range(min(64, 1 << (4 + (size_id << 1)))):
+                reader.read_se()
+
+
+def _skip_short_term_ref_pic_set(reader: BitReader, index: int, num_delta_pocs: list) -> int:
+    """Skip st_ref_pic_set(index) (7.3.7), returns its NumDeltaPocs."""
+    if index and reader.read_flag():  # inter_ref_pic_set_prediction_flag
+        reader.skip_bits(1)  # delta_rps_sign
+        reader.read_ue()  # abs_delta_rps_minus1
+        # In the SPS the reference set is always the previous one
+        count = 0
+        for _ in range(num_delta_pocs[index - 1] + 1):
+            used_by_curr_pic = reader.read_flag()
+            use_delta = used_by_curr_pic or reader.read_flag()
+            count += use_delta
+        return count
+
+    num_negative = reader.read_ue()
+    num_positive = reader.read_ue()
+    for _ in range(num_negative + num_positive):
+        reader.read_ue()  # delta_poc_minus1
+        reader.skip_bits(1)  # used_by_curr_pic_flag
+    return num_negative + num_positive
+
+
+def _parse_vui(reader: BitReader, info: HevcSpsInfo) -> None:
+    """Aspect ratio and timing info of the VUI (E.2.1)."""
+    if reader.read_flag():  # aspect_ratio_info_present_flag
+        aspect_ratio_idc = reader.read_bits(8)
+        if aspect_ratio_idc == EXTENDED_SAR:
+            sar = (reader.read_bits(16), reader.read_bits(16))
+        else:
+            sar = SAMPLE_ASPECT_RATIOS.get(aspect_ratio_idc, (1, 1))
+        if sar[0] and sar[1]:
+            info.sar_width, info.sar_height = sar
+
+    if reader.read_flag():  # overscan_info_present_flag
+        reader.skip_bits(1)
+    if reader.read_flag():  # video_signal_type_present_flag
+        reader.skip_bits(4)
+        if reader.read_flag():  # colour_description_present_flag
+            reader.skip_bits(24)
+    if reader.read_flag():  # chroma_loc_info_present_flag
+        reader.read_ue()
+        reader.read_ue()
+    reader.skip_bits(3)  # neutral_chroma, field_seq, frame_field_info_present flags
+    if reader.read_flag():  # default_display_window_flag
+        for _ in range(4):
+            reader.read_ue()
+
+    if reader.read_flag():  # vui_timing_info_present_flag
+        num_units_in_tick = reader.read_bits(32)
+        time_scale = reader.read_bits(32)
+        if num_units_in_tick:
+            fps = time_scale / num_units_in_tick
+            if MIN_FPS <= fps <= MAX_FPS:
+                info.fps = fps
@@ -0,0 +1,123 @@
+"""
+H.265 to fMP4 Video Converter
+
+VideoConverter for H.265/HEVC streams (JT1078 payload type 99): HEVC NAL
+unit types, VPS/SPS/PPS collection, an hvc1/hvcC init segment and the
+hvc1 codec string for MediaSource.
+"""
+import logging
+from typing import Optional
+
+from .converter import VideoConverter
+from .h265_sps import (
+    NAL_IRAP_FIRST, NAL_IRAP_LAST, NAL_PPS, NAL_SPS, NAL_VCL_LAST, NAL_VPS,
+    nal_unit_type, parse_hevc_sps,
+)
+
+logger = logging.getLogger(__name__)
+
+# Main profile, level 3.1, used until an SPS has been parsed
+DEFAULT_HEVC_CODEC = 'hvc1.1.6.L93.B0'
+
+
+class HevcConverter(VideoConverter):
+    """
+    Converts H.265 NAL units to fMP4 segments.
+
+    NAL unit types (2-byte header, type in bits 1-6 of the first byte):
+    - 0-31: Slice segments (VCL), 16-23 are IRAP pictures (IDR/CRA/BLA keyframes)
+    - 32: VPS (Video Parameter Set)
+    - 33: SPS (Sequence Parameter Set)
+    - 34: PPS (Picture Parameter Set)
+
+    A slice segment with first_slice_segment_in_pic_flag set starts the
+    next picture. hvc1 carries the parameter sets in the init segment only,
+    so samples hold the slice segments alone.
+    """
+
+    IN_BAND_PARAMETER_SETS = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.vps: Optional[bytes] = None
+
+    def _handle_nal_unit(self, nal_unit: memoryview) -> Optional[bool]:
+        """
+        Store parameter sets, classify slice segments.
+
+        Returns:
+            None for non-VCL NAL units, else whether the slice is a keyframe (IRAP)
+        """
+        if len(nal_unit) < 3:
+            return None
+        nal_type = nal_unit_type(nal_unit)
+
+        if nal_type <= NAL_VCL_LAST:
+            return NAL_IRAP_FIRST <= nal_type <= NAL_IRAP_LAST
+
+        if nal_type == NAL_VPS:
+            self.vps = bytes(nal_unit)
+            logger.debug(f"Got VPS: {len(nal_unit)} bytes")
+        elif nal_type == NAL_SPS:
+            self.sps = bytes(nal_unit)
+            self._parse_sps(self.sps)
+            logger.debug(f"Got SPS: {len(nal_unit)} bytes, {self.width}x{self.height}")
+        elif nal_type == NAL_PPS:
+            self.pps = bytes(nal_unit)
+            logger.debug(f"Got PPS: {len(nal_unit)} bytes")
+        return None
+
+    @staticmethod
+    def _starts_picture(nal_unit: memoryview) -> bool:
+        """first_slice_segment_in_pic_flag, the first bit after the NAL header."""
+        return bool(nal_unit[2] & 0x80)
+
+    def _has_parameter_sets(self) -> bool:
+        # hvcC needs the profile_tier_level from a parsed SPS
+        return bool(self.vps and self.sps and self.pps and self.sps_info)
+
+    def _parse_sps(self, sps: bytes) -> None:
+        """
+        Parse SPS to extract video dimensions, frame rate and profile.
+
+        Keeps the previous (or default) values if the SPS can't be parsed.
+        """
+        try:
+            info = parse_hevc_sps(sps)
+        except ValueError as e:
+            logger.warning(f"Failed to parse H.265 SPS, keeping {self.width}x{self.height}: {e}")
+            return
+
+        self.sps_info = info
+        self.width, self.height = info.width, info.height
+        if info.fps:
+            self.fps = info.fps
+        logger.debug(f"SPS: profile={info.general_profile_idc}, level={info.general_level_idc}, "
+                     f"dim={self.width}x{self.height}, fps={info.fps}")
+
+    def _create_init_segment(self) -> bytes:
+        """Create the initialization segment (ftyp + moov with hvc1/hvcC)."""
+        return self.builder.build_hevc_init_segment(
+            self.width,
+            self.height,
+            self.vps,
+            self.sps,
+            self.pps,
+            self.sps_info
+        )
+
+    def _get_codec_string(self) -> str:
+        """
+        Generate codec string from SPS for MediaSource.
+
+        Format: hvc1.P.C.TL.CC (profile, compatibility flags, tier + level,
+        constraint bytes), e.g. hvc1.1.6.L93.B0
+        """
+        if self.sps_info:
+            return self.sps_info.codec_string()
+        return DEFAULT_HEVC_CODEC
+
+    def reset(self):
+        """Reset converter state for a new stream."""
+        super().reset()
+        self.vps = None
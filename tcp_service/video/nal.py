@@ -0,0 +1,65 @@
+"""
+Annex B NAL Unit Scanning
+
+Splits H.264/H.265 Annex B byte streams (00 00 01 / 00 00 00 01 start
+codes) into NAL units and converts them to the length-prefixed (AVCC/HVCC)
+form MP4 samples use.
+
+Start codes are located with bytes.find, which runs in C, so a frame costs
+one call per NAL unit instead of one interpreter step per byte. NAL units
+are returned as memoryview slices of the input, nothing is copied until
+the sample is written.
+"""
+from typing import Iterable, List, Union
+
+START_CODE = b'\x00\x00\x01'
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+def split_nal_units(data: BytesLike) -> List[memoryview]:
+    """
+    Split Annex B data into NAL units (without start codes).
+
+    Bytes before the first start code are skipped, trailing zero bytes
+    (the leading zero of a 4-byte start code, trailing_zero_8bits) are
+    stripped. Data without any start code is returned as a single NAL unit.
+    """
+    if not data:
+        return []
+    view = memoryview(data)
+    find = (data if isinstance(data, (bytes, bytearray)) else bytes(data)).find
+
+    start = find(START_CODE)
+    if start < 0:
+        return [view]
+
+    nal_units = []
+    start += 3
+    end_of_data = len(view)
+    while start < end_of_data:
+        next_start = find(START_CODE, start)
+        end = end_of_data if next_start < 0 else next_start
+        # Zero bytes before a start code belong to it, not to the NAL unit
+        while end > start and view[end - 1] == 0:
+            end -= 1
+        if end > start:
+            nal_units.append(view[start:end])
+        if next_start < 0:
+            break
+        start = next_start + 3
+    return nal_units
+
+
+def to_length_prefixed(nal_units: Iterable[BytesLike]) -> bytes:
+    """Join NAL units as 4-byte big-endian length + NAL unit (AVCC sample format)."""
+    parts = []
+    for nal_unit in nal_units:
+        parts.append(len(nal_unit).to_bytes(4, 'big'))
+        parts.append(nal_unit)
+    return b''.join(parts)
+
+
+def annexb_to_avcc(data: BytesLike) -> bytes:
+    """Convert an Annex B access unit to length-prefixed NAL units in one pass."""
+    return to_length_prefixed(split_nal_units(data))
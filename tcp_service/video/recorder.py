@@ -0,0 +1,333 @@
+"""
+Stream Recorder
+
+Optional recorder stage of the JT1078 pipeline: appends the fMP4 fragments
+of every stream (device/channel) to hourly segment files on local disk, so
+incident footage can be reviewed later without asking the device for
+playback.
+
+Layout under the recording directory (times UTC):
+    <sim>/ch<channel>/<YYYYmmdd-HHMMSS>.mp4   init segment + fragments, playable as is
+    <sim>/ch<channel>/<YYYYmmdd-HHMMSS>.idx   keyframe index
+
+The index is an 8-byte header (magic, flags) and one fixed-width record
+(wall clock ms, byte offset) per fragment starting with a keyframe, in
+ascending order. A time range maps to a byte range by bisecting the index,
+and the footage is served from the memory-mapped segment as its init
+segment followed by that byte range (see find_recording), no re-muxing.
+
+The JT1078 server records through a RecordingWriter, which runs the
+StreamRecorder on its own thread so file writes, directory creation and
+pruning never block the event loop.
+
+Files rotate on the first keyframe of a new hour. A file continuing the
+previous one's timeline (same stream, same init segment) is flagged, so a
+range crossing the hour is served from both; a new init segment (codec or
+resolution change, reconnect) starts a new timeline.
+"""
+import logging
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAGIC = b'LRX1'
+INDEX_HEADER_SIZE = 8
+INDEX_RECORD = struct.Struct('<qQ')
+INDEX_DTYPE = np.dtype([('time', '<i8'), ('offset', '<u8')])
+# Index header flags
+FLAG_CONTINUES = 0x01
+
+FILE_TIME_FORMAT = '%Y%m%d-%H%M%S'
+DEFAULT_RETENTION_HOURS = 168
+DEFAULT_QUEUE_SIZE = 1000
+
+
+def stream_directory(root: str, sim: str, channel: int) -> str:
+    return os.path.join(root, sim, f'ch{channel}')
+
+
+class _Segment:
+    """An open segment file and its index."""
+
+    def __init__(self, directory: str, init_segment: bytes, started: float, continues: bool):
+        name = datetime.fromtimestamp(started, timezone.utc).strftime(FILE_TIME_FORMAT)
+        self.path = os.path.join(directory, f'{name}.mp4')
+        self.init_segment = init_segment
+        self.hour = int(started // 3600)
+        # Unbuffered, every fragment is one write and visible to readers right away.
+        # A file of the same name can only be from a stream that lasted under a second.
+        self.data = open(self.path, 'wb', buffering=0)
+        self.index = open(os.path.join(directory, f'{name}.idx'), 'wb', buffering=0)
+        self.offset = 0
+        self.index.write(INDEX_MAGIC + struct.pack('<I', FLAG_CONTINUES if continues else 0))
+        self._write(init_segment)
+
+    def append(self, fragment: bytes, is_keyframe: bool, now: float) -> None:
+        if is_keyframe:
+            # Data first, an index record never points past the end of the file
+            offset = self.offset
+            self._write(fragment)
+            self.index.write(INDEX_RECORD.pack(int(now * 1000), offset))
+        else:
+            self._write(fragment)
+
+    def _write(self, data: bytes) -> None:
+        self.data.write(data)
+        self.offset += len(data)
+
+    def close(self) -> None:
+        self.data.close()
+        self.index.close()
+
+
+class StreamRecorder:
+    """
+    Writes the fMP4 output of each stream to segment files.
+
+    Recording of a stream starts at its first keyframe fragment, fragments
+    before it can't be decoded on their own. Files older than
+    retention_hours are deleted when a stream opens a new file.
+
+    Not thread-safe and does blocking file I/O, use it from one thread
+    (RecordingWriter on the event loop).
+    """
+
+    def __init__(self, root: str, retention_hours: int = DEFAULT_RETENTION_HOURS):
+        self.root = root
+        self.retention_hours = retention_hours
+        self._segments: Dict[Tuple[str, int], _Segment] = {}
+
+    def record(self, sim: str, channel: int, init_segment: bytes, fragment: bytes,
+               is_keyframe: bool, now: Optional[float] = None) -> None:
+        """
+        Append one fMP4 fragment of a stream.
+
+        Args:
+            sim: Device SIM/phone number
+            channel: Camera channel
+            init_segment: The stream's current init segment
+            fragment: Media segment (moof + mdat)
+            is_keyframe: Whether the fragment starts with a keyframe
+            now: Wall clock time of the fragment (default: time.time())
+        """
+        if now is None:
+            now = time.time()
+        key = (sim, channel)
+        segment = self._segments.get(key)
+
+        if segment is not None and segment.init_segment != init_segment:
+            # New timeline, it must not be joined to the previous file
+            self.close(sim, channel)
+            segment = None
+        if segment is None or (is_keyframe and int(now // 3600) != segment.hour):
+            if not is_keyframe:
+                return
+            continues = segment is not None
+            if segment is not None:
+                segment.close()
+            segment = self._open(sim, channel, init_segment, now, continues)
+            self._segments[key] = segment
+
+        try:
+            segment.append(fragment, is_keyframe, now)
+        except OSError as e:
+            logger.error(f"[Recorder] Write to {segment.path} failed, recording restarts at the next keyframe: {e}")
+            self.close(sim, channel)
+
+    def _open(self, sim: str, channel: int, init_segment: bytes, now: float, continues: bool) -> _Segment:
+        directory = stream_directory(self.root, sim, channel)
+        os.makedirs(directory, exist_ok=True)
+        self._prune(directory, now)
+        segment = _Segment(directory, init_segment, now, continues)
+        logger.info(f"[Recorder] Recording {sim} ch{channel} to {segment.path}")
+        return segment
+
+    def _prune(self, directory: str, now: float) -> None:
+        """Delete segment files that started before the retention window."""
+        cutoff = datetime.fromtimestamp(now - self.retention_hours * 3600, timezone.utc).strftime(FILE_TIME_FORMAT)
+        for name in os.listdir(directory):
+            if name[:-4] < cutoff and name.endswith(('.mp4', '.idx')):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError as e:
+                    logger.warning(f"[Recorder] Could not delete {name}: {e}")
+
+    def close(self, sim: str, channel: Optional[int] = None) -> None:
+        """Close the open files of one stream, or of all channels of a device."""
+        for key in [k for k in self._segments if k[0] == sim and channel in (None, k[1])]:
+            self._segments.pop(key).close()
+
+    def close_all(self) -> None:
+        for segment in self._segments.values():
+            segment.close()
+        self._segments.clear()
+
+
+class RecordingWriter:
+    """
+    Runs a StreamRecorder on a dedicated writer thread.
+
+    record(), close() and close_all() only queue the call. At most
+    queue_size fragments are pending: when the disk falls behind, fragments
+    are dropped and the stream is recorded again from its next keyframe, a
+    fragment without its predecessors can't be decoded. Close calls are
+    never dropped.
+    """
+
+    def __init__(self, recorder: StreamRecorder, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.recorder = recorder
+        self.queue_size = queue_size
+        self._queue: queue.Queue = queue.Queue()
+        # Streams that lost a fragment, skipped until their next keyframe (caller side)
+        self._resync = set()
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name='stream-recorder', daemon=True)
+        self._thread.start()
+
+    def record(self, sim: str, channel: int, init_segment: bytes, fragment: bytes,
+               is_keyframe: bool, now: Optional[float] = None) -> None:
+        """Queue one fMP4 fragment of a stream, see StreamRecorder.record."""
+        key = (sim, channel)
+        if self._queue.qsize() >= self.queue_size or (key in self._resync and not is_keyframe):
+            if key not in self._resync:
+                logger.warning(f"[Recorder] Queue full, {sim} ch{channel} is recorded again from its next keyframe")
+                self._resync.add(key)
+            self.dropped += 1
+            return
+        self._resync.discard(key)
+        if now is None:
+            now = time.time()
+        self._queue.put((self.recorder.record, (sim, channel, init_segment, fragment, is_keyframe, now)))
+
+    def close(self, sim: str, channel: Optional[int] = None) -> None:
+        """Queue closing the files of one stream, or of all channels of a device."""
+        self._resync = {key for key in self._resync if not (key[0] == sim and channel in (None, key[1]))}
+        self._queue.put((self.recorder.close, (sim, channel)))
+
+    def close_all(self) -> None:
+        """Write what is queued and close every file, waits for the writer thread."""
+        self._resync.clear()
+        self._queue.put((self.recorder.close_all, ()))
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            method, args = self._queue.get()
+            try:
+                method(*args)
+            except Exception as e:
+                logger.error(f"[Recorder] {method.__name__} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+
+class RecordingRange(NamedTuple):
+    """
+    Footage of a time range as byte ranges of segment files.
+
+    pieces: (path, offset, length), the first piece is an init segment, the
+    whole is a playable fMP4.
+    """
+    pieces: List[Tuple[str, int, int]]
+    start: datetime
+    end: datetime
+
+    @property
+    def length(self) -> int:
+        return sum(length for _, _, length in self.pieces)
+
+    def iter_bytes(self, first: int = 0, last: Optional[int] = None,
+                   chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+        """Bytes first..last (inclusive) of the footage, read from memory-mapped files."""
+        if last is None:
+            last = self.length - 1
+        position = 0
+        for path, offset, length in self.pieces:
+            begin = max(first - position, 0)
+            end = min(last + 1 - position, length)
+            position += length
+            if begin >= end:
+                continue
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for chunk in range(offset + begin, offset + end, chunk_size):
+                    yield mapped[chunk:min(chunk + chunk_size, offset + end)]
+
+
+def _read_index(path: str) -> Tuple[int, np.ndarray]:
+    """Index flags and records of a segment, no records if the index is damaged."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != INDEX_MAGIC:
+        return 0, np.zeros(0, dtype=INDEX_DTYPE)
+    count = (len(data) - INDEX_HEADER_SIZE) // INDEX_DTYPE.itemsize
+    records = np.frombuffer(data, dtype=INDEX_DTYPE, count=count, offset=INDEX_HEADER_SIZE)
+    return struct.unpack_from('<I', data, 4)[0], records
+
+
+def find_recording(root: str, sim: str, channel: int, start: datetime, end: datetime) -> Optional[RecordingRange]:
+    """
+    Locate the recorded footage of a stream between start and end.
+
+    Starts at the last keyframe at or before start, so the first picture is
+    decodable, and ends at the first keyframe after end. Follows into the
+    next files while they continue the same timeline.
+
+    Returns:
+        RecordingRange, or None if nothing was recorded in the range
+    """
+    directory = stream_directory(root, sim, channel)
+    try:
+        names = sorted(name[:-4] for name in os.listdir(directory) if name.endswith('.idx'))
+    except FileNotFoundError:
+        return None
+    start_ms = int(start.timestamp() * 1000)
+    end_ms = int(end.timestamp() * 1000)
+
+    segments = []
+    for name in names:
+        data_path = os.path.join(directory, f'{name}.mp4')
+        flags, records = _read_index(os.path.join(directory, f'{name}.idx'))
+        if len(records) and os.path.exists(data_path):
+            segments.append((data_path, flags, records))
+
+    # The last file starting at or before start, unless it stopped before start
+    first = None
+    for position, (data_path, _, records) in enumerate(segments):
+        if records['time'][0] > end_ms:
+            break
+        if records['time'][0] <= start_ms:
+            if os.path.getmtime(data_path) * 1000 >= start_ms:
+                first = position
+        elif first is None:
+            first = position
+            break
+    if first is None:
+        return None
+
+    data_path, _, records = segments[first]
+    # Records are ascending, so the bisect maps times to byte offsets
+    at = max(int(np.searchsorted(records['time'], start_ms, side='right')) - 1, 0)
+    init_length = int(records['offset'][0])
+    pieces = [(data_path, 0, init_length)]
+    offset = int(records['offset'][at])
+    for position in range(first, len(segments)):
+        data_path, flags, records = segments[position]
+        if position > first:
+            if not flags & FLAG_CONTINUES or records['time'][0] > end_ms:
+                break
+            offset = int(records['offset'][0])
+        after = int(np.searchsorted(records['time'], end_ms, side='right'))
+        stop = int(records['offset'][after]) if after < len(records) else os.path.getsize(data_path)
+        pieces.append((data_path, offset, stop - offset))
+        if after < len(records):
+            break
+    return RecordingRange(pieces, start, end)
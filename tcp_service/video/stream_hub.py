@@ -0,0 +1,381 @@
+"""
+Stream Hub
+
+Per-process fan-out of live video to WebSocket viewers.
+
+One channel-layer subscription per stream and process: the first viewer of a
+device joins `video_{sim}` with a hub channel, later viewers in the same
+process only register locally. Each segment is therefore received and
+deserialized once per process, its JSON (base64) and binary forms are built
+at most once, and every viewer gets the prepared message through its own
+bounded queue and sender task, so a slow viewer never delays the others.
+
+A viewer whose queue is full (or whose oldest queued frame is too old) drops non-key frames and waits for the next
+keyframe (or init segment) to resync; a keyframe that finds the queue full
+replaces the backlog, nothing in it is needed to decode from there.
+"""
+import asyncio
+import base64
+import json
+import logging
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from .ws_frame import mime_type, pack_video_frame, unpack_video_frame
+
+logger = logging.getLogger(__name__)
+
+# Live frames queued per viewer before it counts as lagging (~2 s at 25 fps)
+DEFAULT_VIEWER_QUEUE_SIZE = 50
+
+# Age of the oldest queued frame at which a viewer counts as lagging
+DEFAULT_VIEWER_MAX_LAG = 1.0
+
+# Seconds live frames are held back waiting for an init + GOP replay
+DEFAULT_REPLAY_TIMEOUT = 2.0
+
+
+class VideoMessage:
+    """
+    One segment of a stream, with its wire forms built on first use.
+
+    All viewers in the process share the instance, so the base64 JSON text
+    and the binary frame are each encoded at most once.
+    """
+
+    __slots__ = ('phone', 'channel', 'video_type', 'codec', 'frame', 'is_init', 'is_keyframe',
+                 'is_audio', '_base64', '_text')
+
+    def __init__(self, phone: str, channel: int, frame: bytes, video_type: Optional[str] = None,
+                 codec: Optional[str] = None, data_base64: Optional[str] = None):
+        header, _ = unpack_video_frame(frame)
+        self.phone = phone
+        self.channel = channel if channel is not None else header['channel']
+        self.frame = frame
+        self.is_init = header['is_init']
+        self.is_keyframe = header['is_keyframe']
+        self.is_audio = header['is_audio']
+        if not video_type:
+            video_type = 'init_segment' if self.is_init else 'video'
+            if self.is_audio:
+                video_type = 'audio_init_segment' if self.is_init else 'audio'
+        self.video_type = video_type
+        self.codec = codec if codec is not None else header['codec']
+        self._base64 = data_base64
+        self._text = None
+
+    @classmethod
+    def from_event(cls, event: dict) -> 'VideoMessage':
+        """Build from a channel-layer video.data event, old base64-only events included."""
+        frame = event.get('frame')
+        data_base64 = None
+        if frame is None:
+            # Event from a TCP server still sending base64 'data'
+            data_base64 = event.get('data') or ''
+            frame = pack_video_frame(
+                base64.b64decode(data_base64),
+                channel=event.get('channel') or 1,
+                is_init=event.get('video_type') == 'init_segment',
+                codec=event.get('codec'),
+            )
+        return cls(event.get('phone'), event.get('channel'), frame,
+                   video_type=event.get('video_type'), codec=event.get('codec'),
+                   data_base64=data_base64)
+
+    @property
+    def size(self) -> int:
+        return len(self.frame)
+
+    @property
+    def text(self) -> str:
+        """JSON message for clients on the base64 transport."""
+        if self._text is None:
+            if self._base64 is None:
+                self._base64 = base64.b64encode(unpack_video_frame(self.frame)[1]).decode('ascii')
+            fields = {
+                'type': self.video_type,
+                'phone': self.phone,
+                'channel': self.channel,
+                'codec': self.codec,
+            }
+            if self.is_init:
+                # The SourceBuffer type the browser must support (H.264/H.265, AAC/FLAC)
+                fields['mime'] = mime_type(self.codec)
+            message = json.dumps(fields)
+            # Base64 never needs JSON escaping, splice it in rather than scan it in json.dumps
+            self._text = f'{message[:-1]}, "data": "{self._base64}"}}'
+        return self._text
+
+
+class Viewer:
+    """
+    Outgoing queue of one WebSocket client for one stream.
+
+    The client only needs `binary_video` and an async `send(text_data=, bytes_data=)`,
+    i.e. a DashcamVideoConsumer. Audio segments only go to clients with a true
+    `receive_audio`.
+    """
+
+    def __init__(self, client, queue_size: int = DEFAULT_VIEWER_QUEUE_SIZE,
+                 max_lag: float = DEFAULT_VIEWER_MAX_LAG):
+        self.client = client
+        self.queue_size = queue_size
+        self.max_lag = max_lag
+        self._queue = deque()  # (VideoMessage, enqueued_at)
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.waiting_for_keyframe = False
+        # Replay handshake: live frames are held until the replay arrives
+        self._replay_deadline: Optional[float] = None
+        self._replay_tail: Optional[bytes] = None
+        # Metrics
+        self.sent = 0
+        self.dropped = 0
+        self.resyncs = 0
+        self.last_latency = 0.0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    @property
+    def awaiting_replay(self) -> bool:
+        return self._replay_deadline is not None
+
+    def hold_for_replay(self, timeout: float = DEFAULT_REPLAY_TIMEOUT) -> None:
+        """Hold live frames back until replay() is called, an init segment arrives, or timeout."""
+        self._replay_deadline = time.monotonic() + timeout
+        self._replay_tail = None
+
+    def replay(self, messages: List[VideoMessage]) -> bool:
+        """Queue init + GOP of a running stream; ignored unless a replay is awaited."""
+        if self._replay_deadline is None:
+            return False
+        self._replay_deadline = None
+        self._queue.clear()
+        self.waiting_for_keyframe = False
+        if not self.receives_audio:
+            messages = [message for message in messages if not message.is_audio]
+        now = time.monotonic()
+        # A replay is a complete decodable start, it is queued whole regardless of the bound
+        self._queue.extend((message, now) for message in messages)
+        if messages:
+            self._replay_tail = messages[-1].frame
+        self._wake()
+        return True
+
+    @property
+    def receives_audio(self) -> bool:
+        return getattr(self.client, 'receive_audio', False)
+
+    def offer(self, message: VideoMessage) -> None:
+        """Queue a live segment without waiting, dropping frames if this viewer lags."""
+        if message.is_audio and not self.receives_audio:
+            return
+        if self._replay_deadline is not None:
+            if not message.is_init and time.monotonic() < self._replay_deadline:
+                return  # Covered by the replay on its way
+            # New stream (init segment) or no replay coming, go live
+            self._replay_deadline = None
+
+        if self._replay_tail is not None:
+            tail, self._replay_tail = self._replay_tail, None
+            if message.frame == tail:
+                return
+
+        restarts_decoding = message.is_init or message.is_keyframe
+        if self.waiting_for_keyframe and not restarts_decoding:
+            self.dropped += 1
+            return
+
+        now = time.monotonic()
+        if self._queue and (len(self._queue) >= self.queue_size or now - self._queue[0][1] > self.max_lag):
+            if not restarts_decoding:
+                # Frames after a gap can't be decoded until the next keyframe
+                self.waiting_for_keyframe = True
+                self.resyncs += 1
+                self.dropped += 1
+                return
+            self._drop_backlog()
+
+        self.waiting_for_keyframe = False
+        self._queue.append((message, now))
+        self._wake()
+
+    def _drop_backlog(self) -> None:
+        """Empty the queue for a keyframe, keeping init segments the client still needs."""
+        kept = [item for item in self._queue if item[0].is_init]
+        self.dropped += len(self._queue) - len(kept)
+        self._queue.clear()
+        self._queue.extend(kept)
+
+    def _wake(self) -> None:
+        self._ready.set()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            message, enqueued_at = self._queue.popleft()
+            try:
+                if self.client.binary_video:
+                    await self.client.send(bytes_data=message.frame)
+                else:
+                    await self.client.send(text_data=message.text)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[StreamHub] Failed to send to viewer: {e}")
+                continue
+            self.sent += 1
+            self.last_latency = time.monotonic() - enqueued_at
+
+    def close(self) -> None:
+        """Stop the sender task and discard queued frames."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._queue.clear()
+
+    def metrics(self) -> dict:
+        """Lag of this viewer: backlog, oldest queued frame age, drops."""
+        now = time.monotonic()
+        return {
+            'transport': 'binary' if self.client.binary_video else 'json',
+            'queued_frames': len(self._queue),
+            'queued_bytes': sum(message.size for message, _ in self._queue),
+            'lag_seconds': round(now - self._queue[0][1], 3) if self._queue else 0.0,
+            'last_latency_seconds': round(self.last_latency, 3),
+            'sent_frames': self.sent,
+            'dropped_frames': self.dropped,
+            'resyncs': self.resyncs,
+            'waiting_for_keyframe': self.waiting_for_keyframe,
+        }
+
+
+class StreamHub:
+    """
+    Viewers per stream and the channel-layer listener feeding them.
+
+    add_viewer/remove_viewer/publish are local only (DeviceManager uses them
+    directly); subscribe/unsubscribe also keep one `video_{sim}` group
+    membership per stream for this process. When the channel layer fails
+    (e.g. Redis drops) the listener joins the group again with a new
+    channel, backing off from RETRY_DELAY to MAX_RETRY_DELAY seconds, as long
+    as the stream has viewers.
+    """
+
+    RETRY_DELAY = 0.5
+    MAX_RETRY_DELAY = 30.0
+
+    def __init__(self, queue_size: int = DEFAULT_VIEWER_QUEUE_SIZE,
+                 max_lag: float = DEFAULT_VIEWER_MAX_LAG):
+        self.queue_size = queue_size
+        self.max_lag = max_lag
+        self.viewers: Dict[str, Dict[object, Viewer]] = {}
+        self._listeners: Dict[str, asyncio.Task] = {}
+
+    def add_viewer(self, sim: str, client) -> Viewer:
+        viewers = self.viewers.setdefault(sim, {})
+        if client not in viewers:
+            viewers[client] = Viewer(client, self.queue_size, self.max_lag)
+        return viewers[client]
+
+    def remove_viewer(self, sim: str, client) -> None:
+        viewers = self.viewers.get(sim)
+        if not viewers:
+            return
+        viewer = viewers.pop(client, None)
+        if viewer:
+            viewer.close()
+        if not viewers:
+            del self.viewers[sim]
+
+    def get_viewer(self, sim: str, client) -> Optional[Viewer]:
+        return self.viewers.get(sim, {}).get(client)
+
+    def publish(self, sim: str, message: VideoMessage) -> None:
+        """Offer a segment to every local viewer of a stream, never waits."""
+        for viewer in list(self.viewers.get(sim, {}).values()):
+            viewer.offer(message)
+
+    async def subscribe(self, sim: str, client) -> Viewer:
+        """Register a viewer and make sure this process listens to the stream's group."""
+        viewer = self.add_viewer(sim, client)
+        if sim not in self._listeners:
+            from channels.layers import get_channel_layer
+            channel_layer = get_channel_layer()
+            if channel_layer:
+                channel_name = await channel_layer.new_channel('video_hub.')
+                await channel_layer.group_add(f'video_{sim}', channel_name)
+                self._listeners[sim] = asyncio.get_running_loop().create_task(
+                    self._listen(channel_layer, sim, channel_name)
+                )
+        return viewer
+
+    async def unsubscribe(self, sim: str, client) -> None:
+        """Remove a viewer, the last one of a stream also leaves the group."""
+        self.remove_viewer(sim, client)
+        if sim not in self.viewers and sim in self._listeners:
+            self._listeners.pop(sim).cancel()
+
+    async def _listen(self, channel_layer, sim: str, channel_name: Optional[str]) -> None:
+        delay = self.RETRY_DELAY
+        try:
+            while True:
+                try:
+                    if channel_name is None:
+                        channel_name = await channel_layer.new_channel('video_hub.')
+                        await channel_layer.group_add(f'video_{sim}', channel_name)
+                    logger.info(f"[StreamHub] Listening to video_{sim} as {channel_name}")
+                    while True:
+                        event = await channel_layer.receive(channel_name)
+                        delay = self.RETRY_DELAY
+                        if event.get('type') != 'video.data':
+                            continue
+                        try:
+                            self.publish(sim, VideoMessage.from_event(event))
+                        except ValueError as e:
+                            logger.warning(f"[StreamHub] Bad video frame for {sim}: {e}")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"[StreamHub] Listener for {sim} failed, retrying in {delay:.1f}s: {e}")
+                    if channel_name is not None:
+                        await self._leave(channel_layer, sim, channel_name)
+                        channel_name = None
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.MAX_RETRY_DELAY)
+                    if sim not in self.viewers:
+                        return
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # A new subscribe may already have started the next listener of the stream
+            if self._listeners.get(sim) is asyncio.current_task():
+                self._listeners.pop(sim)
+            if channel_name is not None:
+                await self._leave(channel_layer, sim, channel_name)
+
+    @staticmethod
+    async def _leave(channel_layer, sim: str, channel_name: str) -> None:
+        try:
+            await channel_layer.group_discard(f'video_{sim}', channel_name)
+        except Exception:
+            pass
+
+    def metrics(self) -> List[dict]:
+        """Per-viewer lag metrics of every stream in this process."""
+        return [
+            {'phone': sim, **viewer.metrics()}
+            for sim, viewers in self.viewers.items()
+            for viewer in viewers.values()
+        ]
+
+
+# Process-wide hub used by DashcamVideoConsumer
+stream_hub = StreamHub()
@@ -0,0 +1,122 @@
+"""
+Binary WebSocket Video Frames
+
+Wire format of fMP4 segments sent to binary clients (`"transport": "binary"`
+in start_live). Every segment is one binary WebSocket message:
+
+    offset  size  field
+    0       1     version (1)
+    1       1     flags, bit 0 = init segment (ftyp + moov), bit 1 = segment starts
+                  with a keyframe, bit 2 = audio track, other bits reserved (0)
+    2       1     camera channel
+    3       1     codec id, see CODEC_IDS (0 = unknown)
+    4       1     codec string length N, 0 for media segments
+    5       N     codec string (ASCII, e.g. "avc1.64001F"), init segments only
+    5 + N   ...   fMP4 segment bytes
+
+The frame is built once by the TCP server and carried through the channel
+layer as raw bytes (channels_redis serializes events with msgpack, which keeps
+bytes as bin), so binary viewers forward it untouched. JSON clients still get
+the base64 `{"type", "phone", "channel", "data", "codec"}` messages, init
+segments also carry `"mime"`, the type to check with
+MediaSource.isTypeSupported and pass to addSourceBuffer (see mime_type).
+
+Audio (viewers that asked for it) is a separate fMP4 track with its own
+init segment, for a second SourceBuffer: audio flag set in binary frames,
+"audio_init_segment" / "audio" message types in JSON.
+"""
+import struct
+from typing import Optional, Tuple
+
+FRAME_VERSION = 1
+
+FLAG_INIT = 0x01
+FLAG_KEYFRAME = 0x02
+FLAG_AUDIO = 0x04
+
+# Codec string prefix -> codec id
+CODEC_IDS = {
+    'avc1': 1,
+    'hvc1': 2,
+    'hev1': 2,
+    'mp4a': 3,
+    'flac': 4,
+}
+AUDIO_CODEC_IDS = frozenset((CODEC_IDS['mp4a'], CODEC_IDS['flac']))
+
+HEADER = struct.Struct('>BBBBB')
+
+
+def codec_id(codec: Optional[str]) -> int:
+    """Codec id of an MSE codec string ("avc1.64001F" -> 1), 0 when unknown."""
+    if not codec:
+        return 0
+    return CODEC_IDS.get(codec.split('.', 1)[0], 0)
+
+
+def mime_type(codec: Optional[str]) -> Optional[str]:
+    """MSE type of a codec string: 'video/mp4; codecs="hvc1.1.6.L93.B0"', None when unknown."""
+    if not codec:
+        return None
+    media = 'audio' if codec_id(codec) in AUDIO_CODEC_IDS else 'video'
+    return f'{media}/mp4; codecs="{codec}"'
+
+
+def pack_video_frame(data: bytes, channel: int = 1, is_init: bool = False,
+                     codec: Optional[str] = None, is_keyframe: bool = False,
+                     is_audio: bool = False) -> bytes:
+    """
+    Prefix an fMP4 segment with the binary frame header.
+
+    Args:
+        data: fMP4 segment bytes
+        channel: Camera channel
+        is_init: True for an init segment
+        codec: Codec string, only written for init segments
+        is_keyframe: True if the media segment starts with a keyframe
+        is_audio: True for segments of the audio track
+    """
+    codec_bytes = codec.encode('ascii') if is_init and codec else b''
+    header = HEADER.pack(
+        FRAME_VERSION,
+        (FLAG_INIT if is_init else 0) | (FLAG_KEYFRAME if is_keyframe else 0)
+        | (FLAG_AUDIO if is_audio else 0),
+        channel & 0xFF,
+        codec_id(codec),
+        len(codec_bytes),
+    )
+    return b''.join((header, codec_bytes, data))
+
+
+def unpack_video_frame(frame: bytes) -> Tuple[dict, memoryview]:
+    """
+    Split a binary frame into its header fields and segment.
+
+    Returns:
+        ({'version', 'is_init', 'is_keyframe', 'is_audio', 'channel', 'codec_id', 'codec'},
+         segment view)
+
+    Raises:
+        ValueError: frame is truncated or has an unknown version
+    """
+    if len(frame) < HEADER.size:
+        raise ValueError('Video frame shorter than its header')
+    version, flags, channel, frame_codec_id, codec_length = HEADER.unpack_from(frame)
+    if version != FRAME_VERSION:
+        raise ValueError(f'Unsupported video frame version {version}')
+
+    payload_start = HEADER.size + codec_length
+    if len(frame) < payload_start:
+        raise ValueError('Video frame shorter than its codec string')
+
+    view = memoryview(frame)
+    header = {
+        'version': version,
+        'is_init': bool(flags & FLAG_INIT),
+        'is_keyframe': bool(flags & FLAG_KEYFRAME),
+        'is_audio': bool(flags & FLAG_AUDIO),
+        'channel': channel,
+        'codec_id': frame_codec_id,
+        'codec': bytes(view[HEADER.size:payload_start]).decode('ascii') or None,
+    }
+    return header, view[payload_start:]
@@ -1,10 +1,15 @@
 """
 TCP Service Views
 
-API endpoints for dashcam device management and SMS commands.
+API endpoints for dashcam device management, SMS commands and recorded footage.
 """
 import logging
+from datetime import timedelta
+
 from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -12,6 +17,7 @@ from rest_framework.response import Response
 
 from device.models import Device
 from .protocol.constants import SMS_COMMAND_SERVER_POINT, SMS_COMMAND_RESET
+from .video.recorder import find_recording
 
 logger = logging.getLogger(__name__)
 
@@ -222,3 +228,110 @@ def dashcam_connection_status(request, imei):
         },
         'connection': connection_data
     })
+
+
+# Longest time range one recording request may cover
+MAX_RECORDING_RANGE = timedelta(hours=24)
+
+
+def _parse_time(value):
+    """ISO 8601 date-time, naive values in the server time zone; None if invalid."""
+    try:
+        parsed = parse_datetime(value or '')
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _parse_byte_range(header, length):
+    """
+    First and last byte of a single-range `Range: bytes=` header.
+
+    Returns:
+        (first, last), None for no or an unsupported header (whole body),
+        or False if the range can't be satisfied
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, _, last = header[6:].strip().partition('-')
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            count = int(last)
+            return (max(length - count, 0), length - 1) if count > 0 and length else False
+        first = int(first)
+        last = min(int(last), length - 1) if last else length - 1
+    except ValueError:
+        return None
+    return (first, last) if first <= last else False
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def dashcam_recording(request, imei, channel):
+    """
+    Serve recorded footage of a dashcam channel as fMP4.
+    
+    GET /api/tcp-service/dashcam/recording/<imei>/<channel>/?start=<ISO 8601>&end=<ISO 8601>
+    
+    Footage starts at the last keyframe before start and ends at the first
+    keyframe after end, read straight from the segment files (no re-muxing).
+    Supports Range requests for seeking and resumed downloads.
+    """
+    recording_dir = getattr(settings, 'TCP_SERVICE_RECORDING_DIR', '')
+    if not recording_dir:
+        return Response(
+            {'error': 'Stream recording is not enabled'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    start = _parse_time(request.query_params.get('start'))
+    end = _parse_time(request.query_params.get('end'))
+    if not start or not end or end <= start:
+        return Response(
+            {'error': 'start and end date-times are required, end after start'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if end - start > MAX_RECORDING_RANGE:
+        return Response(
+            {'error': f'Range too long, at most {MAX_RECORDING_RANGE.total_seconds() / 3600:.0f} hours'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        device = Device.objects.get(imei=imei)
+    except Device.DoesNotExist:
+        return Response(
+            {'error': 'Device not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    # Streams are keyed by the number the device registers with
+    recording = find_recording(recording_dir, device.serial_number or imei, channel, start, end)
+    if not recording:
+        return Response(
+            {'error': 'No recording in this range'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    length = recording.length
+    byte_range = _parse_byte_range(request.META.get('HTTP_RANGE'), length)
+    if byte_range is False:
+        response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        response['Content-Range'] = f'bytes */{length}'
+        return response
+    
+    first, last = byte_range or (0, length - 1)
+    response = StreamingHttpResponse(
+        recording.iter_bytes(first, last),
+        content_type='video/mp4',
+        status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK
+    )
+    response['Content-Length'] = str(last - first + 1)
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = f'bytes {first}-{last}/{length}'
+    response['Content-Disposition'] = f'inline; filename="{imei}_ch{channel}_{start:%Y%m%d-%H%M%S}.mp4"'
+    return response
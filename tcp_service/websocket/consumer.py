@@ -4,7 +4,6 @@ Django Channels WebSocket Consumer for Dashcam Video Streaming
 Handles WebSocket connections from browser clients for live video streaming.
 Uses Redis channel layer for cross-process communication with TCP server.
 """
-import json
 import logging
 from typing import Optional
 from django.conf import settings
@@ -16,8 +15,10 @@ from asgiref.sync import sync_to_async
 from device.models import Device
 from ..models import DashcamConnection
 from ..tcp.device_manager import device_manager
+from ..tcp.ownership import send_command
 from ..protocol.jt808_parser import build_realtime_av_request, build_av_control
 from ..protocol.constants import JT808MsgID
+from ..video.stream_hub import VideoMessage, stream_hub
 
 logger = logging.getLogger(__name__)
 
@@ -29,16 +30,31 @@ class DashcamVideoConsumer(AsyncJsonWebsocketConsumer):
     Handles:
     - Client connection/disconnection
     - Start/stop live stream commands
-    - Video data forwarding from TCP server
-    - Device list queries
+    - Video data forwarding from TCP server, through the process-wide
+      stream hub (one channel-layer subscription per stream, bounded
+      per-viewer queues)
+    - Init + current GOP replay for streams that are already running
+    - Init segments name the codec the browser must support (H.264 or
+      H.265), as `codec` and `mime` in JSON messages, in the frame header
+      for binary clients
+    - Optional audio track (`"audio": true` in start_live), a second fMP4
+      stream with its own init segment
+    - Device list and viewer lag queries
     """
     
+    # Seconds live frames are held back waiting for a replay
+    REPLAY_TIMEOUT = 2.0
+    
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.subscribed_devices = set()
         self.current_phone = None
         # Track active streams to prevent duplicate requests: {(serial_number, channel): True}
         self.active_streams = {}
+        # Binary clients get segments as bytes frames (video.ws_frame) instead of base64 JSON
+        self.binary_video = False
+        # Audio track segments are only sent to clients that asked for them
+        self.receive_audio = False
     
     async def connect(self):
         """Handle WebSocket connection."""
@@ -48,9 +64,10 @@ class DashcamVideoConsumer(AsyncJsonWebsocketConsumer):
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection."""
-        # Leave all video groups
+        # Leave all streams
         for phone in self.subscribed_devices:
-            await self.channel_layer.group_discard(f'video_{phone}', self.channel_name)
+            await stream_hub.unsubscribe(phone, self)
+        self.subscribed_devices.clear()
         
         # Clear active streams tracking
         self.active_streams.clear()
@@ -65,6 +82,7 @@ class DashcamVideoConsumer(AsyncJsonWebsocketConsumer):
         - get_devices: List connected devices
         - start_live: Start live video stream
         - stop_live: Stop live video stream
+        - get_viewer_stats: Queue lag and drops of the viewers in this process
         """
         action = content.get('action')
         logger.info(f"[WebSocket] Received action: {action}, content: {content}")
@@ -79,6 +97,12 @@ class DashcamVideoConsumer(AsyncJsonWebsocketConsumer):
             elif action == 'stop_live':
                 await self._handle_stop_live(content)
             
+            elif action == 'get_viewer_stats':
+                await self.send_json({
+                    'type': 'viewer_stats',
+                    'viewers': stream_hub.metrics()
+                })
+            
             else:
                 await self.send_json({
                     'type': 'error',
@@ -137,12 +161,22 @@ class DashcamVideoConsumer(AsyncJsonWebsocketConsumer):
                 'action': 'start_live',
                 'phone': '123456789012',  # IMEI from frontend
                 'channel': 1,  # 1=Front, 2=Rear
-                'stream_type': 0  # 0=Main (HD), 1=Sub (SD)
+                'stream_type': 0,  # 0=Main (HD), 1=Sub (SD)
+                'transport': 'json',  # 'binary' for bytes frames, optional
+                'audio': False  # True to also receive the audio track, optional
             }
         """
         phone = content.get('phone')  # This is actually IMEI from frontend
         channel = content.get('channel', 1)
         stream_type = content.get('stream_type', 0)
+        transport = content.get('transport', 'json')
+        
+        if transport not in ('json', 'binary'):
+            await self.send_json({
+                'type': 'error',
+                'message': f'Unknown transport: {transport}'
+            })
+            return
         
         if not phone:
             await self.send_json({
@@ -182,21 +216,33 @@ class DashcamVideoConsumer(AsyncJsonWebsocketConsumer):
                 'action': 'start_live',
                 'success': True,
                 'phone': phone,  # Return original IMEI to frontend
-                'channel': channel
+                'channel': channel,
+                'transport': 'binary' if self.binary_video else 'json'
             })
             return
         
         # Mark stream as active
         self.active_streams[stream_key] = True
+        self.binary_video = transport == 'binary'
+        self.receive_audio = bool(content.get('audio', False))
         
-        # Join video group for this device to receive video data
-        await self.channel_layer.group_add(f'video_{serial_number}', self.channel_name)
+        # Subscribe to the device's video through the stream hub
+        viewer = await stream_hub.subscribe(serial_number, self)
         self.subscribed_devices.add(serial_number)
         self.current_phone = serial_number
         
-        # Send stream request via channel layer to TCP server process
+        # Ask the TCP server holding a running stream for init + current GOP. Live
+        # frames are held back until it arrives, they are part of the replay
         channel_layer = get_channel_layer()
-        await channel_layer.group_send('tcp_commands', {
+        viewer.hold_for_replay(self.REPLAY_TIMEOUT)
+        await channel_layer.group_send('tcp_video', {
+            'type': 'video.replay',
+            'phone': serial_number,
+            'reply_channel': self.channel_name,
+        })
+        
+        # Send stream request via channel layer to the TCP server process holding the device
+        await send_command(channel_layer, {
             'type': 'stream.request',
             'phone': serial_number,
             'channel': channel,
@@ -210,7 +256,9 @@ class DashcamVideoConsumer(AsyncJsonWebsocketConsumer):
             'action': 'start_live',
             'success': True,
             'phone': phone,  # Return original IMEI to frontend
-            'channel': channel
+            'channel': channel,
+            'transport': transport,
+            'audio': self.receive_audio
         })
         
         logger.info(f"[WebSocket] Started live stream for {serial_number} (IMEI: {phone}) ch{channel}")
@@ -243,13 +291,13 @@ class DashcamVideoConsumer(AsyncJsonWebsocketConsumer):
         stream_key = (serial_number, channel)
         self.active_streams.pop(stream_key, None)
         
-        # Leave video group for this device
-        await self.channel_layer.group_discard(f'video_{serial_number}', self.channel_name)
+        # Stop receiving this device's video
+        await stream_hub.unsubscribe(serial_number, self)
         self.subscribed_devices.discard(serial_number)
         
-        # Send stop command via channel layer to TCP server process
+        # Send stop command via channel layer to the TCP server process holding the device
         channel_layer = get_channel_layer()
-        await channel_layer.group_send('tcp_commands', {
+        await send_command(channel_layer, {
             'type': 'stream.stop',
             'phone': serial_number,
             'channel': channel,
@@ -353,17 +401,16 @@ class DashcamVideoConsumer(AsyncJsonWebsocketConsumer):
         """
         await self.send_json(data)
     
-    async def video_data(self, event):
+    async def video_replay(self, event):
         """
-        Handle video data from channel layer (sent by TCP server).
+        Handle init + buffered GOP frames of a running stream (sent by TCP server).
         
         Args:
-            event: Video data dict with type, phone, channel, data (base64)
+            event: dict with phone and frames (binary frames, init first per channel)
         """
-        await self.send_json({
-            'type': event.get('video_type', 'video'),
-            'phone': event.get('phone'),
-            'channel': event.get('channel'),
-            'data': event.get('data'),
-            'codec': event.get('codec'),
-        })
+        phone = event.get('phone')
+        viewer = stream_hub.get_viewer(phone, self)
+        if viewer is None or not viewer.awaiting_replay:
+            return  # Already live from an init segment, or unsubscribed
+        
+        viewer.replay([VideoMessage(phone, None, frame) for frame in event.get('frames') or []])